@@ -46,8 +46,7 @@ class LongTermCompanyAnalyzer:
     
     def _get_basic_info(self, symbol):
         """获取公司基础信息"""
-        conn = self.survival_analyzer.db_manager.get_connection()
-        try:
+        with self.survival_analyzer.db_manager.connection() as conn:
             query = """
                 SELECT s.symbol, s.name, s.industry, s.area,
                        a.totalAssets, a.outstanding, a.esp, a.bvps, a.pb,
@@ -63,8 +62,6 @@ class LongTermCompanyAnalyzer:
                                'totalAssets', 'outstanding', 'esp', 'bvps', 'pb', 'timeToMarket'], 
                               result))
             return {}
-        finally:
-            conn.close()
     
     def _analyze_survival(self, symbol):
         """分析公司存活年限"""
@@ -2,9 +2,12 @@
 """
 金融决策系统主应用
 """
-from flask import Flask, request, jsonify, render_template, redirect, url_for, session, send_from_directory
+from flask import Flask, request, jsonify, render_template, redirect, url_for, session, send_from_directory, Response, stream_with_context
 from functools import wraps
 import os
+import json
+import gzip
+import hashlib
 import sys
 import uuid
 import pandas as pd
@@ -13,26 +16,37 @@ from datetime import datetime, timedelta
 # 添加项目根目录到Python路径
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from core.auth import UserManager, login_required
+from core.auth import UserManager, login_required, user_manager
 from core.storage import db_manager
+from core.cache import cache_manager
 from core.data_source import DataSource
 from core.analyzer import TechnicalAnalyzer
-from core.backtest import BacktestEngine
-from core.visualization import ChartPlotter
+from core.backtest import BacktestEngine, MAStrategy, RSIStrategy
+from strategies.example_strategies import MACDStrategy, BollingerBandsStrategy, CompositeStrategy
+from core.optimizer import StrategyOptimizer, STRATEGY_REGISTRY
+from core.visualization import ChartPlotter, ReportGenerator, IMAGE_FORMATS
+from core.chart_cache import chart_cache, report_cache, data_fingerprint
 from utils.logger import logger
 from utils.config import config
+from utils.serialization import serialize_frame, dumps, LAYOUTS
 
 # 导入股票数据同步管理器
 from core.stock_sync import StockDataSynchronizer
-from core.sync_progress import sync_progress_manager
+from core.stock_search import stock_search, RANGE_FILTERS
+from core.catalog import table_catalog
+from core.table_browser import table_browser, parse_filter
+from core.akshare_download import akshare_downloader, interface_table
+from core.sync_progress import sync_progress_manager, FINISHED_STATUSES
+from core.jobs import job_manager, PROGRESS_STATUS, FAILURE, SUCCESS
 
 # 创建Flask应用
 app = Flask(__name__)
 app.secret_key = config.get('WEB.secret_key', 'your-secret-key-change-in-production')
 
-# 初始化用户管理器
-user_manager = UserManager()
+# 初始化用户管理器（与 login_required 共用全局实例及其会话缓存）
 user_manager.init_default_user()
+# 后台批量写入会话访问时间、清理过期会话
+user_manager.start_session_maintenance()
 
 # 设置session密钥
 app.secret_key = os.urandom(16)
@@ -41,13 +55,11 @@ app.config['SESSION_COOKIE_SECURE'] = False  # 开发环境设为False
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=7)
 
 # 全局实例
-user_manager = UserManager()
 data_source = DataSource()
 analyzer = TechnicalAnalyzer()
 backtest_engine = BacktestEngine()
-# 注释掉暂时不需要的模块
-# chart_plotter = ChartPlotter()
-# report_generator = ReportGenerator()
+chart_plotter = ChartPlotter()
+report_generator = ReportGenerator(chart_plotter, report_cache)
 
 
 def require_login(f):
@@ -74,6 +86,53 @@ def require_login(f):
     return decorated_function
 
 
+def _wants_async() -> bool:
+    """请求是否要求后台执行（查询参数 async=1 或 JSON 请求体中 async=true）"""
+    if request.args.get('async', '').lower() in ('1', 'true', 'yes'):
+        return True
+    body = request.get_json(silent=True)
+    return bool(isinstance(body, dict) and body.get('async'))
+
+
+def _job_submitted(job, message: str = '任务已提交'):
+    """后台任务已提交的响应，session_id 与 job_id 相同，可用于各进度接口"""
+    return jsonify({
+        'code': 200,
+        'message': message,
+        'data': {
+            'job_id': job.id,
+            'session_id': job.id
+        }
+    })
+
+
+def _layout() -> str:
+    """行情数据布局：records（默认，逐行记录）或 columns（按列，体积更小）"""
+    layout = request.args.get('format', 'records')
+    return layout if layout in LAYOUTS else 'records'
+
+
+def _json_response(payload, status: int = 200):
+    """
+    快速JSON响应：使用 utils.serialization 编码，
+    响应较大且客户端支持时gzip压缩，并带ETag，内容未变化时返回304
+    """
+    body = dumps(payload)
+    etag = hashlib.md5(body).hexdigest()
+    response = app.response_class(body, status=status, mimetype='application/json')
+
+    if len(body) >= config.get('WEB.gzip_min_bytes', 1024) and 'gzip' in request.accept_encodings:
+        response.set_data(gzip.compress(body, compresslevel=5))
+        response.headers['Content-Encoding'] = 'gzip'
+        etag += '-gz'
+    response.headers.add('Vary', 'Accept-Encoding')
+
+    if status == 200:
+        response.set_etag(etag)
+        response = response.make_conditional(request)
+    return response
+
+
 @app.route('/')
 def index():
     """主页"""
@@ -365,9 +424,7 @@ def get_stock_list():
     """获取股票列表"""
     try:
         # 从数据库获取股票列表
-        from core.storage import DatabaseManager
-        db = DatabaseManager()
-        stocks = db.get_stock_list()
+        stocks = db_manager.get_stock_list()
         
         return jsonify({
             'success': True,
@@ -382,6 +439,41 @@ def get_stock_list():
         }), 500
 
 
+@app.route('/api/stocks/search')
+@login_required
+def search_stocks():
+    """搜索股票：代码/名称/拼音首字母全文匹配，按 next_cursor 翻页"""
+    try:
+        ranges = {name: request.args.get(name, type=float) for name in RANGE_FILTERS}
+        result = stock_search.search(
+            keyword=request.args.get('keyword') or request.args.get('q'),
+            industry=request.args.get('industry'),
+            sort_by=request.args.get('sort_by', 'symbol'),
+            sort_order=request.args.get('sort_order', 'ASC'),
+            cursor=request.args.get('cursor'),
+            page=request.args.get('page', 1, type=int),
+            page_size=request.args.get('page_size', 20, type=int),
+            with_total=request.args.get('with_total', 'true').lower() != 'false',
+            **ranges
+        )
+        return jsonify({
+            'code': 200,
+            'message': '搜索成功',
+            'data': result
+        })
+    except ValueError as e:
+        return jsonify({
+            'code': 400,
+            'message': str(e)
+        }), 400
+    except Exception as e:
+        logger.error(f"搜索股票失败: {e}")
+        return jsonify({
+            'code': 500,
+            'message': f'搜索失败: {str(e)}'
+        }), 500
+
+
 @app.route('/api/stocks/<symbol>/data')
 @login_required
 def get_stock_data(symbol):
@@ -389,9 +481,7 @@ def get_stock_data(symbol):
     try:
         days = request.args.get('days', 90, type=int)
         
-        # 获取股票数据
-        from core.data_source import DataSource
-        data_source = DataSource()
+        # 获取股票数据（使用全局数据源，请求统计计入 /api/data_source/stats）
         df = data_source.get_stock_data(symbol, days=days)
         
         if df.empty:
@@ -400,24 +490,17 @@ def get_stock_data(symbol):
                 'message': '股票数据不存在'
             }), 404
         
-        # 处理NaN值
-        df = df.fillna(0)
-        
-        # 转换为字典格式
-        stock_data = []
-        for _, row in df.iterrows():
-            record = {
-                'date': row.name.strftime('%Y-%m-%d') if hasattr(row.name, 'strftime') else str(row.name),
-                'open': float(row.get('open', 0)),
-                'high': float(row.get('high', 0)),
-                'low': float(row.get('low', 0)),
-                'close': float(row.get('close', 0)),
-                'volume': int(row.get('volume', 0)),
-                'amount': float(row.get('amount', 0))
-            }
-            stock_data.append(record)
-        
-        return jsonify({
+        # 按列整体转换，NaN填充为0
+        stock_data = serialize_frame(df, {
+            'open': 'open',
+            'high': 'high',
+            'low': 'low',
+            'close': 'close',
+            'volume': 'volume',
+            'amount': 'amount'
+        }, int_fields=('volume',), layout=_layout())
+        
+        return _json_response({
             'code': 200,
             'message': '获取成功',
             'data': stock_data
@@ -483,6 +566,23 @@ def get_stock_chart(symbol):
     try:
         days = request.args.get('days', 90, type=int)
         chart_type = request.args.get('type', 'candlestick')
+        preset = request.args.get('preset', chart_plotter.preset)
+        image_format = request.args.get('format', chart_plotter.image_format).lower()
+        
+        if chart_type == 'candlestick':
+            plot = chart_plotter.plot_candlestick_chart
+        elif chart_type == 'indicators':
+            plot = chart_plotter.plot_technical_indicators
+        else:
+            return jsonify({
+                'code': 400,
+                'message': '不支持的图表类型'
+            }), 400
+        if preset not in chart_plotter.presets or image_format not in IMAGE_FORMATS:
+            return jsonify({
+                'code': 400,
+                'message': '不支持的渲染预设或图片格式'
+            }), 400
         
         # 获取数据
         df = data_source.get_stock_data(symbol, days=days)
@@ -493,18 +593,13 @@ def get_stock_chart(symbol):
             }), 404
         
         # 添加技术指标
-        df = analyzer.calculate_all_indicators(df)
+        df = analyzer.load_indicators(symbol, df)
         
-        # 生成图表
-        if chart_type == 'candlestick':
-            chart_path = chart_plotter.plot_candlestick_chart(df, symbol)
-        elif chart_type == 'indicators':
-            chart_path = chart_plotter.plot_technical_indicators(df, symbol)
-        else:
-            return jsonify({
-                'code': 400,
-                'message': '不支持的图表类型'
-            }), 400
+        # 生成图表：数据和渲染参数未变化时直接返回已生成的文件
+        chart_path = chart_cache.get_or_render(
+            f"{chart_type}_{symbol}", [data_fingerprint(df), preset, image_format], image_format,
+            lambda path: plot(df, symbol, save_path=path, preset=preset, image_format=image_format)
+        )
         
         # 返回图表路径
         return jsonify({
@@ -523,10 +618,83 @@ def get_stock_chart(symbol):
         }), 500
 
 
+@job_manager.task(name='backtest.run', bind=True, job_type='backtest')
+def backtest_task(ctx, symbol, strategy_name, days, initial_capital):
+    """回测任务：获取数据、运行回测并保存结果"""
+    ctx.update_progress(message=f'正在获取 {symbol} 行情数据...')
+    df = data_source.get_stock_data(symbol, days=days)
+    if df.empty:
+        raise LookupError('股票数据不存在')
+    
+    # 处理NaN值
+    df = df.fillna(0)
+    
+    # 选择策略
+    strategy_map = {
+        'MA策略': MAStrategy(),
+        'RSI策略': RSIStrategy(),
+        'MACD策略': MACDStrategy(),
+        '布林带策略': BollingerBandsStrategy(),
+        '综合策略': CompositeStrategy()
+    }
+    
+    strategy = strategy_map.get(strategy_name, MAStrategy())
+    
+    # 运行回测（每个任务使用独立的引擎，避免并发任务互相修改初始资金）
+    ctx.update_progress(message=f'正在回测 {strategy.name}...')
+    engine = BacktestEngine(initial_capital=initial_capital)
+    results = engine.run_backtest(strategy, df, symbol)
+    
+    # 保存结果
+    backtest_id = engine.save_backtest_result(results)
+    
+    # 处理NaN值
+    def clean_nan(obj):
+        if isinstance(obj, dict):
+            return {k: clean_nan(v) for k, v in obj.items()}
+        elif isinstance(obj, list):
+            return [clean_nan(item) for item in obj]
+        elif isinstance(obj, float) and pd.isna(obj):
+            return 0.0
+        else:
+            return obj
+    
+    # 准备返回数据
+    response_data = {
+        'backtest_id': backtest_id,
+        'strategy_name': results['strategy_name'],
+        'symbol': results['symbol'],
+        'start_date': results['start_date'],
+        'end_date': results['end_date'],
+        'initial_capital': float(results['initial_capital']),
+        'final_value': float(results['final_value']),
+        'total_return': float(results['total_return']),
+        'annual_return': float(results['annual_return']),
+        'max_drawdown': float(results['max_drawdown']),
+        'sharpe_ratio': float(results['sharpe_ratio']),
+        'trade_count': int(results['trade_count']),
+        'win_rate': float(results['win_rate'])
+    }
+    
+    # 处理equity_curve
+    if 'equity_curve' in results and hasattr(results['equity_curve'], 'index'):
+        equity_curve = results['equity_curve']
+        equity_dict = {}
+        for date, value in equity_curve.items():
+            date_str = date.strftime('%Y-%m-%d') if hasattr(date, 'strftime') else str(date)
+            equity_dict[date_str] = float(value) if pd.notna(value) else 0.0
+        response_data['equity_curve'] = equity_dict
+    else:
+        response_data['equity_curve'] = {}
+    
+    # 清理NaN值
+    return clean_nan(response_data)
+
+
 @app.route('/api/backtest/run', methods=['POST'])
 @login_required
 def run_backtest():
-    """运行回测"""
+    """运行回测（async=true 时后台执行，返回任务ID）"""
     try:
         data = request.json
         symbol = data.get('symbol')
@@ -540,88 +708,146 @@ def run_backtest():
                 'message': '请提供股票代码'
             }), 400
         
-        # 获取股票数据
-        df = data_source.get_stock_data(symbol, days=days)
-        if df.empty:
+        job = backtest_task.apply_async(args=(symbol, strategy_name, days, initial_capital))
+        if _wants_async():
+            return _job_submitted(job, '回测任务已提交')
+        
+        try:
+            response_data = job.get()
+        except LookupError as e:
             return jsonify({
                 'code': 404,
-                'message': '股票数据不存在'
+                'message': str(e)
             }), 404
         
-        # 处理NaN值
-        df = df.fillna(0)
-        
-        # 选择策略
-        strategy_map = {
-            'MA策略': MAStrategy(),
-            'RSI策略': RSIStrategy(),
-            'MACD策略': MACDStrategy(),
-            '布林带策略': BollingerBandsStrategy(),
-            '综合策略': CompositeStrategy()
-        }
+        return jsonify({
+            'code': 200,
+            'message': '回测完成',
+            'data': response_data
+        })
         
-        strategy = strategy_map.get(strategy_name, MAStrategy())
+    except Exception as e:
+        logger.error(f"回测运行失败: {e}")
+        return jsonify({
+            'code': 500,
+            'message': f'回测失败: {str(e)}'
+        }), 500
+
+
+@job_manager.task(name='backtest.optimize', bind=True, job_type='backtest')
+def optimize_task(ctx, df, symbol, strategy_name, param_grid, initial_capital, max_workers, **kwargs):
+    """参数优化任务：并行回测全部参数组合，返回按排序指标排名的结果表"""
+    optimizer = StrategyOptimizer(strategy_name, initial_capital=initial_capital, max_workers=max_workers)
+    ctx.update_progress(0, 0, f'开始优化 {strategy_name} 参数', strategy=optimizer.strategy_cls.__name__,
+                        symbol=symbol)
+
+    def on_progress(done, total):
+        # 大网格时按百分比节流写入进度
+        if done == total or done % max(total // 100, 1) == 0:
+            ctx.update_progress(done, total, f'已完成 {done}/{total} 个参数组合')
+        ctx.raise_if_cancelled()
+
+    table = optimizer.optimize(df, symbol, param_grid, progress_callback=on_progress, **kwargs)
+    return table.astype(object).where(table.notna(), None).to_dict(orient='records')
+
+
+@app.route('/api/backtest/optimize', methods=['POST'])
+@login_required
+def optimize_backtest():
+    """启动策略参数优化（后台执行）"""
+    try:
+        data = request.json
+        symbol = data.get('symbol')
+        strategy_name = data.get('strategy', 'MA策略')
+        param_grid = data.get('param_grid')
+        days = data.get('days', 252)
         
-        # 运行回测
-        backtest_engine.initial_capital = initial_capital
-        results = backtest_engine.run_backtest(strategy, df, symbol)
+        if not symbol or not param_grid:
+            return jsonify({
+                'code': 400,
+                'message': '请提供股票代码和参数网格'
+            }), 400
         
-        # 保存结果
-        backtest_id = backtest_engine.save_backtest_result(results)
+        if strategy_name not in STRATEGY_REGISTRY:
+            return jsonify({
+                'code': 400,
+                'message': f'不支持的策略: {strategy_name}'
+            }), 400
         
-        # 处理NaN值
-        def clean_nan(obj):
-            if isinstance(obj, dict):
-                return {k: clean_nan(v) for k, v in obj.items()}
-            elif isinstance(obj, list):
-                return [clean_nan(item) for item in obj]
-            elif isinstance(obj, float) and pd.isna(obj):
-                return 0.0
-            else:
-                return obj
+        df = data_source.get_stock_data(symbol, days=days)
+        if df.empty:
+            return jsonify({
+                'code': 404,
+                'message': '股票数据不存在'
+            }), 404
+        df = df.fillna(0)
         
-        # 准备返回数据
-        response_data = {
-            'backtest_id': backtest_id,
-            'strategy_name': results['strategy_name'],
-            'symbol': results['symbol'],
-            'start_date': results['start_date'],
-            'end_date': results['end_date'],
-            'initial_capital': float(results['initial_capital']),
-            'final_value': float(results['final_value']),
-            'total_return': float(results['total_return']),
-            'annual_return': float(results['annual_return']),
-            'max_drawdown': float(results['max_drawdown']),
-            'sharpe_ratio': float(results['sharpe_ratio']),
-            'trade_count': int(results['trade_count']),
-            'win_rate': float(results['win_rate'])
-        }
+        job = optimize_task.apply_async(
+            args=(df, symbol, strategy_name, param_grid, data.get('initial_capital', 1000000),
+                  data.get('max_workers')),
+            kwargs={
+                'method': data.get('method', 'grid'),
+                'n_iter': data.get('n_iter', 100),
+                'seed': data.get('seed'),
+                'sort_by': data.get('sort_by', 'sharpe_ratio')
+            }
+        )
         
-        # 处理equity_curve
-        if 'equity_curve' in results and hasattr(results['equity_curve'], 'index'):
-            equity_curve = results['equity_curve']
-            equity_dict = {}
-            for date, value in equity_curve.items():
-                date_str = date.strftime('%Y-%m-%d') if hasattr(date, 'strftime') else str(date)
-                equity_dict[date_str] = float(value) if pd.notna(value) else 0.0
-            response_data['equity_curve'] = equity_dict
-        else:
-            response_data['equity_curve'] = {}
+        return jsonify({
+            'code': 200,
+            'message': '参数优化任务已启动',
+            'data': {
+                'task_id': job.id,
+                'job_id': job.id
+            }
+        })
+    except Exception as e:
+        logger.error(f"启动参数优化失败: {e}")
+        return jsonify({
+            'code': 500,
+            'message': f'启动参数优化失败: {str(e)}'
+        }), 500
+
+
+@app.route('/api/backtest/optimize/<task_id>')
+@login_required
+def get_optimize_result(task_id):
+    """获取参数优化进度和结果"""
+    try:
+        job = job_manager.get_job(task_id)
+        if not job or job.get('task_name') != optimize_task.name:
+            return jsonify({
+                'code': 404,
+                'message': '优化任务不存在'
+            }), 404
         
-        # 清理NaN值
-        response_data = clean_nan(response_data)
+        progress = job.get('progress') or {}
+        results = job.get('result') if job['status'] == SUCCESS else None
+        # 只返回前N名，避免大网格时响应过大
+        top = request.args.get('top', 50, type=int)
+        task = {
+            'status': PROGRESS_STATUS.get(job['status'], 'running'),
+            'strategy': progress.get('strategy'),
+            'symbol': progress.get('symbol'),
+            'completed': progress.get('current', 0),
+            'total': progress.get('total', 0),
+            'percent': 100 if job['status'] == SUCCESS else progress.get('percent', 0),
+            'start_time': job.get('started_at') or job.get('created_at'),
+            'last_update': job.get('updated_at'),
+            'results': results[:top] if results is not None else None,
+            'error': job.get('error')
+        }
         
         return jsonify({
             'code': 200,
-            'message': '回测完成',
-            'data': response_data
+            'message': '获取优化结果成功',
+            'data': task
         })
-        
     except Exception as e:
-        logger.error(f"回测运行失败: {e}")
+        logger.error(f"获取参数优化结果失败: {e}")
         return jsonify({
             'code': 500,
-            'message': f'回测失败: {str(e)}'
+            'message': f'获取参数优化结果失败: {str(e)}'
         }), 500
 
 
@@ -681,7 +907,7 @@ def generate_report():
             }), 404
         
         # 添加技术指标
-        df = analyzer.calculate_all_indicators(df)
+        df = analyzer.load_indicators(symbol, df)
         
         # 分析股票
         analysis = analyzer.analyze_stock(symbol, df)
@@ -731,12 +957,72 @@ def get_market_sentiment():
         }), 500
 
 
+@app.route('/api/charts/cache/stats')
+@login_required
+def get_chart_cache_stats():
+    """获取图表和报告缓存的命中统计与目录占用"""
+    return jsonify({
+        'code': 200,
+        'message': '获取成功',
+        'data': {
+            'charts': chart_cache.stats(),
+            'reports': report_cache.stats()
+        }
+    })
+
+
+@app.route('/api/data_source/stats')
+@login_required
+def get_data_source_stats():
+    """获取行情数据本地读穿命中统计"""
+    return jsonify({
+        'code': 200,
+        'message': '获取成功',
+        'data': data_source.get_read_through_stats()
+    })
+
+
 # ================================
 # 数据同步API（需要登录）
 # ================================
 
 
 
+@job_manager.task(name='sync.latest', bind=True, job_type='sync')
+def sync_latest_task(ctx, days, batch_size, delay, use_snapshot=None):
+    """同步最新股票数据任务，session_id 即任务ID"""
+    synchronizer = StockDataSynchronizer()
+    ctx.on_cancel(synchronizer.stop)
+    return synchronizer.sync_latest_stock_data(
+        days=days,
+        batch_size=batch_size,
+        delay=delay,
+        session_id=ctx.job_id,
+        use_snapshot=use_snapshot
+    )
+
+
+@job_manager.task(name='sync.history', bind=True, job_type='sync')
+def sync_history_task(ctx, days, batch_size, delay):
+    """同步股票历史数据任务"""
+    synchronizer = StockDataSynchronizer()
+    ctx.on_cancel(synchronizer.stop)
+    count = synchronizer.sync_all_stock_daily_data(
+        days=days,
+        batch_size=batch_size,
+        delay=delay,
+        session_id=ctx.job_id
+    )
+    return {'success': count}
+
+
+@job_manager.task(name='sync.list', bind=True, job_type='sync')
+def sync_list_task(ctx):
+    """同步股票列表任务"""
+    count = StockDataSynchronizer().sync_stock_list(session_id=ctx.job_id)
+    return {'success': count}
+
+
 @app.route('/api/stocks/sync/latest', methods=['POST'])
 @login_required
 def sync_stock_latest():
@@ -746,38 +1032,12 @@ def sync_stock_latest():
         days = request.json.get('days', 30)
         batch_size = request.json.get('batch_size', 50)
         delay = request.json.get('delay', 1.0)
+        # 收盘后用全市场快照写入当天日线，默认按配置
+        use_snapshot = request.json.get('use_snapshot')
         
-        # 创建同步会话
-        session_id = str(uuid.uuid4())
-        
-        # 创建同步管理器
-        synchronizer = StockDataSynchronizer()
-        
-        # 在新线程中执行同步
-        def run_sync():
-            try:
-                result = synchronizer.sync_latest_stock_data(
-                    days=days, 
-                    batch_size=batch_size, 
-                    delay=delay,
-                    session_id=session_id
-                )
-            except Exception as e:
-                logger.error(f"同步最新股票数据失败: {e}")
-                sync_progress_manager.fail_sync(session_id, str(e))
-        
-        import threading
-        sync_thread = threading.Thread(target=run_sync)
-        sync_thread.daemon = True
-        sync_thread.start()
-        
-        return jsonify({
-            'code': 200,
-            'message': '同步任务已启动',
-            'data': {
-                'session_id': session_id
-            }
-        })
+        # 提交后台任务，任务ID即同步会话ID
+        job = sync_latest_task.apply_async(args=(days, batch_size, delay, use_snapshot))
+        return _job_submitted(job, '同步任务已启动')
     except Exception as e:
         logger.error(f"启动同步任务失败: {e}")
         return jsonify({
@@ -795,37 +1055,8 @@ def sync_stock_history():
         batch_size = request.json.get('batch_size', 50)
         delay = request.json.get('delay', 1.0)
         
-        # 创建同步会话
-        session_id = str(uuid.uuid4())
-        
-        # 创建同步管理器
-        synchronizer = StockDataSynchronizer()
-        
-        # 在新线程中执行同步
-        def run_sync():
-            try:
-                result = synchronizer.sync_all_stock_daily_data(
-                    days=days, 
-                    batch_size=batch_size, 
-                    delay=delay,
-                    session_id=session_id
-                )
-            except Exception as e:
-                logger.error(f"同步历史数据失败: {e}")
-                sync_progress_manager.fail_sync(session_id, str(e))
-        
-        import threading
-        sync_thread = threading.Thread(target=run_sync)
-        sync_thread.daemon = True
-        sync_thread.start()
-        
-        return jsonify({
-            'code': 200,
-            'message': '同步任务已启动',
-            'data': {
-                'session_id': session_id
-            }
-        })
+        job = sync_history_task.apply_async(args=(days, batch_size, delay))
+        return _job_submitted(job, '同步任务已启动')
     except Exception as e:
         logger.error(f"启动同步任务失败: {e}")
         return jsonify({
@@ -838,32 +1069,8 @@ def sync_stock_history():
 def sync_stock_list():
     """同步股票列表"""
     try:
-        # 创建同步会话
-        session_id = str(uuid.uuid4())
-        
-        # 创建同步管理器
-        synchronizer = StockDataSynchronizer()
-        
-        # 在新线程中执行同步
-        def run_sync():
-            try:
-                count = synchronizer.sync_stock_list(session_id=session_id)
-            except Exception as e:
-                logger.error(f"同步股票列表失败: {e}")
-                sync_progress_manager.fail_sync(session_id, str(e))
-        
-        import threading
-        sync_thread = threading.Thread(target=run_sync)
-        sync_thread.daemon = True
-        sync_thread.start()
-        
-        return jsonify({
-            'code': 200,
-            'message': '同步任务已启动',
-            'data': {
-                'session_id': session_id
-            }
-        })
+        job = sync_list_task.apply_async()
+        return _job_submitted(job, '同步任务已启动')
     except Exception as e:
         logger.error(f"启动同步任务失败: {e}")
         return jsonify({
@@ -874,9 +1081,17 @@ def sync_stock_list():
 @app.route('/api/stocks/sync/progress/<session_id>')
 @login_required
 def get_sync_progress(session_id):
-    """获取同步进度"""
+    """获取同步进度；带 wait 参数时长轮询，等到进度 seq 大于 since 或同步结束再返回"""
     try:
-        progress = sync_progress_manager.get_progress(session_id)
+        wait = request.args.get('wait', 0, type=float)
+        if wait > 0:
+            progress = sync_progress_manager.wait_for_change(
+                session_id,
+                since=request.args.get('since', type=int),
+                timeout=min(wait, 60)
+            )
+        else:
+            progress = sync_progress_manager.get_progress(session_id)
         if not progress:
             return jsonify({
                 'code': 404,
@@ -895,6 +1110,31 @@ def get_sync_progress(session_id):
             'message': f'获取同步进度失败: {str(e)}'
         }), 500
 
+@app.route('/api/stocks/sync/progress/<session_id>/stream')
+@login_required
+def stream_sync_progress(session_id):
+    """以 Server-Sent Events 推送同步进度，进度变化时推送，同步结束后关闭连接"""
+    def generate():
+        since = None
+        while True:
+            progress = sync_progress_manager.wait_for_change(session_id, since=since, timeout=15)
+            if progress is None:
+                progress = {'status': 'error', 'message': '同步会话不存在或已过期'}
+            elif since is not None and progress.get('seq', 0) <= since and progress['status'] not in FINISHED_STATUSES:
+                # 超时无变化，发送注释行保持连接
+                yield ': keepalive\n\n'
+                continue
+            
+            since = progress.get('seq', 0)
+            yield f"data: {json.dumps(progress, ensure_ascii=False, default=str)}\n\n"
+            if progress['status'] in FINISHED_STATUSES:
+                return
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 @app.route('/api/stocks/sync/single/<symbol>', methods=['POST'])
 @login_required
 def sync_single_stock(symbol):
@@ -933,6 +1173,102 @@ def sync_single_stock(symbol):
         }), 500
 
 
+# ================================
+# 后台任务API（需要登录）
+# ================================
+
+@app.route('/api/jobs')
+@login_required
+def list_jobs():
+    """列出后台任务，可按类型和状态筛选"""
+    try:
+        jobs = job_manager.list_jobs(
+            job_type=request.args.get('type') or None,
+            status=request.args.get('status') or None,
+            limit=min(request.args.get('limit', 50, type=int), 500)
+        )
+        return jsonify({
+            'code': 200,
+            'message': '获取成功',
+            'data': jobs
+        })
+    except Exception as e:
+        logger.error(f"获取任务列表失败: {e}")
+        return jsonify({
+            'code': 500,
+            'message': f'获取任务列表失败: {str(e)}'
+        }), 500
+
+@app.route('/api/jobs', methods=['POST'])
+@login_required
+def submit_job():
+    """提交已注册的后台任务：{"task": 任务名, "args": [...], "kwargs": {...}}"""
+    try:
+        body = request.get_json(silent=True) or {}
+        task = job_manager.tasks.get(body.get('task'))
+        if task is None:
+            return jsonify({
+                'code': 400,
+                'message': f"未知任务: {body.get('task')}",
+                'data': sorted(job_manager.tasks)
+            }), 400
+        
+        job = task.apply_async(args=tuple(body.get('args') or ()), kwargs=body.get('kwargs') or {})
+        return _job_submitted(job)
+    except Exception as e:
+        logger.error(f"提交任务失败: {e}")
+        return jsonify({
+            'code': 500,
+            'message': f'提交任务失败: {str(e)}'
+        }), 500
+
+@app.route('/api/jobs/<job_id>')
+@login_required
+def get_job(job_id):
+    """获取任务状态、进度和结果"""
+    try:
+        job = job_manager.get_job(job_id)
+        if not job:
+            return jsonify({
+                'code': 404,
+                'message': '任务不存在或已过期'
+            }), 404
+        
+        return jsonify({
+            'code': 200,
+            'message': '获取成功',
+            'data': job
+        })
+    except Exception as e:
+        logger.error(f"获取任务失败: {e}")
+        return jsonify({
+            'code': 500,
+            'message': f'获取任务失败: {str(e)}'
+        }), 500
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+@login_required
+def cancel_job(job_id):
+    """取消任务：排队中的任务不再执行，运行中的任务在下次检查时停止"""
+    try:
+        if not job_manager.cancel(job_id):
+            return jsonify({
+                'code': 404,
+                'message': '任务不存在或已结束'
+            }), 404
+        
+        return jsonify({
+            'code': 200,
+            'message': '已请求取消任务'
+        })
+    except Exception as e:
+        logger.error(f"取消任务失败: {e}")
+        return jsonify({
+            'code': 500,
+            'message': f'取消任务失败: {str(e)}'
+        }), 500
+
+
 # ================================
 # 行业列表API（需要登录）
 # ================================
@@ -943,7 +1279,7 @@ def get_industries():
     """获取股票行业列表"""
     try:
         import sqlite3
-        with sqlite3.connect('data/finance_data.db') as conn:
+        with db_manager.connection() as conn:
             conn.row_factory = sqlite3.Row
             cursor = conn.execute('''
                 SELECT DISTINCT industry 
@@ -1001,7 +1337,7 @@ def get_stock_info(symbol):
         # 获取股票信息 - 优先从数据库获取
         import sqlite3
         try:
-            with sqlite3.connect('data/finance_data.db') as conn:
+            with db_manager.connection() as conn:
                 conn.row_factory = sqlite3.Row
                 cursor = conn.execute('''
                     SELECT symbol, name, industry, market_cap, pe_ratio, pb_ratio, close, updated_at 
@@ -1103,7 +1439,7 @@ def get_stock_history(symbol):
             }), 404
         
         # 计算技术指标
-        df = analyzer.calculate_all_indicators(df)
+        df = analyzer.load_indicators(symbol, df)
         
         # 处理NaN值
         def clean_nan(value):
@@ -1111,20 +1447,17 @@ def get_stock_history(symbol):
                 return 0.0
             return float(value)
         
-        # 准备数据
-        history_data = []
-        for index, row in df.iterrows():
-            history_data.append({
-                'date': index.strftime('%Y-%m-%d'),
-                'open': clean_nan(row['open']),
-                'high': clean_nan(row['high']),
-                'low': clean_nan(row['low']),
-                'close': clean_nan(row['close']),
-                'volume': int(clean_nan(row['volume'])),
-                'ma20': clean_nan(row.get('MA20', 0)),
-                'ma50': clean_nan(row.get('MA50', 0)),
-                'rsi': clean_nan(row.get('RSI14', 0))
-            })
+        # 准备数据（按列整体转换，NaN填充为0）
+        history_data = serialize_frame(df, {
+            'open': 'open',
+            'high': 'high',
+            'low': 'low',
+            'close': 'close',
+            'volume': 'volume',
+            'ma20': ('MA20', 'MA_20'),
+            'ma50': 'MA50',
+            'rsi': ('RSI14', 'RSI')
+        }, int_fields=('volume',), layout=_layout())
         
         # 计算统计数据
         if not df.empty:
@@ -1142,7 +1475,7 @@ def get_stock_history(symbol):
         else:
             stats = {}
         
-        return jsonify({
+        return _json_response({
             'code': 200,
             'message': '获取成功',
             'data': {
@@ -1567,11 +1900,12 @@ def download_interface_data():
         df_renamed['download_time'] = datetime.now()
         
         # 插入数据
-        df_renamed.to_sql(table_name, db_manager.get_connection(), if_exists='append', index=False)
+        with db_manager.connection() as conn:
+            df_renamed.to_sql(table_name, conn, if_exists='append', index=False)
         
-        # 获取插入的记录数
-        count_query = f"SELECT COUNT(*) as count FROM {table_name}"
-        total_records = db_manager.query(count_query)[0]['count']
+        # 增量更新表目录并读取总记录数（目录中还没有该表时精确计数）
+        table_catalog.record_write(table_name, delta=len(df_renamed))
+        total_records = table_catalog.get_row_count(table_name)
         
         return jsonify({
             'code': 200,
@@ -1593,178 +1927,42 @@ def download_interface_data():
             'message': f'下载失败: {str(e)}'
         }), 500
 
+@job_manager.task(name='akshare.download_all', bind=True, job_type='akshare')
+def download_all_task(ctx, force: bool = False):
+    """后台任务：并发下载所有接口数据到本地数据库，force 为真时忽略更新频率全部重新下载"""
+    query = "SELECT interface_name, update_frequency FROM akshare_interfaces WHERE status = 'active'"
+    interfaces = db_manager.query(query)
+    
+    if not interfaces:
+        raise LookupError('没有找到可用的接口')
+    
+    return akshare_downloader.run(interfaces, ctx=ctx, force=force)
+
+
 @app.route('/api/akshare/interfaces/download/all', methods=['POST'])
 @login_required
 def download_all_interface_data():
-    """下载所有接口数据到本地数据库"""
+    """
+    下载所有接口数据到本地数据库，async=1 时只提交后台任务并返回 job_id；
+    仍在更新周期内的接口会跳过，force=1 时全部重新下载
+    """
     try:
-        # 获取所有接口
-        query = "SELECT interface_name FROM akshare_interfaces WHERE status = 'active'"
-        interfaces = db_manager.query(query)
+        job = download_all_task.delay(force=request.args.get('force', '0') in ('1', 'true'))
+        if _wants_async():
+            return _job_submitted(job, '批量下载任务已启动')
         
-        if not interfaces:
+        try:
+            data = job.get()
+        except LookupError as e:
             return jsonify({
                 'code': 404,
-                'message': '没有找到可用的接口'
+                'message': str(e)
             }), 404
         
-        import akshare as ak
-        results = []
-        
-        for interface in interfaces:
-            interface_name = interface['interface_name']
-            
-            # 验证接口是否存在
-            if not hasattr(ak, interface_name):
-                results.append({
-                    'interface_name': interface_name,
-                    'status': 'not_found',
-                    'message': f'接口不存在: {interface_name}'
-                })
-                continue
-            
-            try:
-                # 获取接口函数
-                func = getattr(ak, interface_name)
-                
-                # 尝试调用接口，增强错误处理
-                try:
-                    import requests
-                    import json
-                    
-                    df = None
-                    max_retries = 2
-                    
-                    for attempt in range(max_retries):
-                        try:
-                            # 特殊处理已知问题接口
-                            if interface_name == 'stock_a_indicator_lg':
-                                try:
-                                    df = func()
-                                except (json.JSONDecodeError, ValueError) as e:
-                                    # stock_a_indicator_lg接口经常返回空数据或格式错误
-                                    results.append({
-                                        'interface_name': interface_name,
-                                        'status': 'unavailable',
-                                        'message': 'A股技术指标接口暂时不可用',
-                                        'error': str(e),
-                                        'suggestion': '该接口数据源可能正在维护，建议跳过此接口'
-                                    })
-                                    break
-                                except Exception as e:
-                                    results.append({
-                                        'interface_name': interface_name,
-                                        'status': 'error',
-                                        'message': str(e),
-                                        'suggestion': '接口调用失败'
-                                    })
-                                    break
-                            else:
-                                # 普通接口调用
-                                try:
-                                    df = func()
-                                except TypeError:
-                                    # 如果接口需要参数
-                                    if interface_name.startswith('stock_') and 'hist' in interface_name:
-                                        df = func(symbol="000001", period="daily", adjust="")
-                                    elif interface_name.startswith('stock_') and 'spot' in interface_name:
-                                        df = func()
-                                    else:
-                                        df = func()
-                            
-                            # 如果成功获取数据，跳出重试循环
-                            if df is not None:
-                                break
-                                
-                        except (requests.exceptions.RequestException, json.JSONDecodeError) as net_error:
-                            if attempt == max_retries - 1:
-                                results.append({
-                                    'interface_name': interface_name,
-                                    'status': 'network_error',
-                                    'message': f'网络请求失败: {str(net_error)}',
-                                    'suggestion': '请检查网络连接'
-                                })
-                                break
-                            else:
-                                continue
-                        except Exception as e:
-                            if attempt == max_retries - 1:
-                                error_msg = str(e).lower()
-                                if 'json' in error_msg or 'decode' in error_msg:
-                                    results.append({
-                                        'interface_name': interface_name,
-                                        'status': 'data_error',
-                                        'message': '数据解析失败: 接口返回数据格式错误',
-                                        'suggestion': '接口数据源可能正在维护'
-                                    })
-                                elif 'connection' in error_msg or 'timeout' in error_msg:
-                                    results.append({
-                                        'interface_name': interface_name,
-                                        'status': 'network_error',
-                                        'message': '网络连接失败',
-                                        'suggestion': '请检查网络连接'
-                                    })
-                                else:
-                                    results.append({
-                                        'interface_name': interface_name,
-                                        'status': 'error',
-                                        'message': str(e),
-                                        'suggestion': '接口调用失败'
-                                    })
-                                break
-                            else:
-                                continue
-                    
-                    # 检查是否成功获取数据
-                    if df is not None and not df.empty:
-                        # 创建表并插入数据
-                        table_name = f"akshare_{interface_name}".replace('-', '_').replace('.', '_')
-                        
-                        df['download_time'] = datetime.now()
-                        df.to_sql(table_name, db_manager.get_connection(), if_exists='replace', index=False)
-                        
-                        results.append({
-                            'interface_name': interface_name,
-                            'status': 'success',
-                            'records': len(df),
-                            'table_name': table_name
-                        })
-                    elif df is not None and interface_name != 'stock_a_indicator_lg':
-                        # 避免重复记录stock_a_indicator_lg的错误
-                        results.append({
-                            'interface_name': interface_name,
-                            'status': 'empty',
-                            'records': 0,
-                            'message': '返回空数据'
-                        })
-                        
-                except Exception as e:
-                    results.append({
-                        'interface_name': interface_name,
-                        'status': 'error',
-                        'message': str(e),
-                        'suggestion': '接口调用失败'
-                    })
-                    
-            except Exception as e:
-                results.append({
-                    'interface_name': interface_name,
-                    'status': 'error',
-                    'message': str(e)
-                })
-        
-        success_count = len([r for r in results if r['status'] == 'success'])
-        total_records = sum([r.get('records', 0) for r in results])
-        
         return jsonify({
             'code': 200,
-            'message': f'批量下载完成，成功{success_count}个接口',
-            'data': {
-                'total_interfaces': len(interfaces),
-                'success_count': success_count,
-                'total_records': total_records,
-                'results': results
-            }
+            'message': f"批量下载完成，成功{data['success_count']}个接口，跳过{data['skipped_count']}个未到期接口",
+            'data': data
         })
         
     except Exception as e:
@@ -1783,9 +1981,7 @@ def get_company_data(symbol):
         days = request.args.get('days', 90, type=int)
         
         # 优先从本地数据库获取股票基本信息
-        from core.storage import DatabaseManager
-        db = DatabaseManager()
-        stock_info = db.get_stock_info(symbol)
+        stock_info = db_manager.get_stock_info(symbol)
         
         if not stock_info:
             # 如果本地没有，尝试从外部获取
@@ -1847,14 +2043,10 @@ def get_company_data(symbol):
             df = data_source.get_stock_data(symbol, days=days)
             if df.empty:
                 # 如果外部数据为空，使用本地历史数据
-                from core.storage import DatabaseManager
-                db = DatabaseManager()
-                df = db.get_stock_data(symbol, limit=days)
+                df = db_manager.get_stock_data(symbol, limit=days)
         except Exception as e:
             logger.warning(f"外部历史数据获取失败，使用本地数据: {e}")
-            from core.storage import DatabaseManager
-            db = DatabaseManager()
-            df = db.get_stock_data(symbol, limit=days)
+            df = db_manager.get_stock_data(symbol, limit=days)
         
         if df is None or df.empty:
             # 如果仍然没有数据，创建模拟数据
@@ -1884,59 +2076,31 @@ def get_company_data(symbol):
         
         # 计算技术指标
         try:
-            df = analyzer.calculate_all_indicators(df)
+            df = analyzer.load_indicators(symbol, df)
         except Exception as e:
             logger.warning(f"技术指标计算失败: {e}")
         
-        # 处理NaN值
-        def clean_nan(value):
-            if pd.isna(value):
-                return 0.0
-            return float(value)
-        
-        # 准备价格数据
-        prices = []
-        for index, row in df.iterrows():
-            date_str = str(index)
-            if hasattr(index, 'strftime'):
-                date_str = index.strftime('%Y-%m-%d')
-            else:
-                # 处理日期字符串中的时间部分
-                date_str = str(index).split(' ')[0]
-            
-            prices.append({
-                'date': date_str,
-                'open': clean_nan(row.get('open', row.get('close', 0))),
-                'high': clean_nan(row.get('high', row.get('close', 0))),
-                'low': clean_nan(row.get('low', row.get('close', 0))),
-                'close': clean_nan(row.get('close', 0)),
-                'volume': int(clean_nan(row.get('volume', 0)))
-            })
-        
-        # 准备技术指标数据
-        indicators = []
-        for index, row in df.iterrows():
-            date_str = str(index)
-            if hasattr(index, 'strftime'):
-                date_str = index.strftime('%Y-%m-%d')
-            else:
-                # 处理日期字符串中的时间部分
-                date_str = str(index).split(' ')[0]
-                
-            indicator_data = {
-                'date': date_str,
-                'close': clean_nan(row.get('close', 0))
-            }
-            
-            # 添加各种技术指标
-            for col in ['MA5', 'MA10', 'MA20', 'MA50', 'RSI14', 'MACD', 'MACD_signal', 'MACD_hist']:
-                if col in row:
-                    key = col.lower().replace('rsi14', 'rsi').replace('macd_signal', 'macd_signal').replace('macd_hist', 'macd_hist')
-                    indicator_data[key] = clean_nan(row[col])
-            
-            indicators.append(indicator_data)
+        # 准备价格数据和技术指标数据（按列整体转换，NaN填充为0；缺少开高低价时使用收盘价）
+        layout = _layout()
+        prices = serialize_frame(df, {
+            'open': ('open', 'close'),
+            'high': ('high', 'close'),
+            'low': ('low', 'close'),
+            'close': 'close',
+            'volume': 'volume'
+        }, int_fields=('volume',), layout=layout)
+        
+        # 技术指标只输出已计算出的列
+        indicator_fields = {'close': 'close'}
+        indicator_fields.update({
+            key: col for key, col in (
+                ('ma5', 'MA_5'), ('ma10', 'MA_10'), ('ma20', 'MA_20'), ('ma50', 'MA50'), ('rsi', 'RSI'),
+                ('macd', 'MACD'), ('macd_signal', 'MACD_Signal'), ('macd_hist', 'MACD_Histogram')
+            ) if col in df.columns
+        })
+        indicators = serialize_frame(df, indicator_fields, layout=layout)
         
-        return jsonify({
+        return _json_response({
             'code': 200,
             'message': '获取成功',
             'data': {
@@ -2041,33 +2205,18 @@ def stock_sync_page():
 @app.route('/api/database/tables', methods=['GET'])
 @login_required
 def get_database_tables():
-    """获取数据库所有表信息"""
+    """获取数据库所有表信息（读取表目录，不再逐表 COUNT(*)）"""
     try:
-        # 获取所有表
-        query = "SELECT name FROM sqlite_master WHERE type='table' ORDER BY name"
-        tables = db_manager.query(query)
+        catalog = table_catalog.list_tables()
         
         table_info = []
         total_records = 0
         interface_tables = 0
         data_tables = 0
         
-        for table in tables:
+        for table in catalog['tables']:
             table_name = table['name']
-            
-            # 获取记录数
-            count_query = f"SELECT COUNT(*) as count FROM {table_name}"
-            count_result = db_manager.query(count_query)
-            row_count = count_result[0]['count'] if count_result else 0
-            
-            # 获取列信息
-            columns_query = f"PRAGMA table_info({table_name})"
-            columns = db_manager.query(columns_query)
-            column_count = len(columns)
-            
-            # 分类
-            category = get_table_category(table_name)
-            description = get_table_description(table_name)
+            row_count = table['row_count']
             
             # 统计
             total_records += row_count
@@ -2079,10 +2228,12 @@ def get_database_tables():
             table_info.append({
                 'name': table_name,
                 'row_count': row_count,
-                'column_count': column_count,
-                'category': category,
-                'description': description,
-                'columns': [{'name': col['name'], 'type': col['type']} for col in columns]
+                'column_count': table['column_count'],
+                'category': get_table_category(table_name),
+                'description': get_table_description(table_name),
+                'columns': table['columns'],
+                'count_source': table['count_source'],
+                'updated_at': table['updated_at']
             })
         
         # 按记录数排序
@@ -2092,10 +2243,11 @@ def get_database_tables():
             'code': 200,
             'message': '获取数据库表信息成功',
             'data': {
-                'total_tables': len(tables),
+                'total_tables': len(table_info),
                 'total_records': total_records,
                 'interface_tables': interface_tables,
                 'data_tables': data_tables,
+                'last_refreshed': catalog['last_refreshed'],
                 'tables': table_info
             }
         })
@@ -2107,6 +2259,50 @@ def get_database_tables():
             'message': f'获取数据库表信息失败: {str(e)}'
         }), 500
 
+
+@job_manager.task(name='catalog.refresh', job_type='catalog')
+def catalog_refresh_task(exact=False, analyze=False):
+    """后台任务：全量刷新表目录"""
+    return table_catalog.refresh(exact=exact, analyze=analyze)
+
+
+@app.route('/api/database/tables/refresh', methods=['POST'])
+@login_required
+def refresh_database_tables():
+    """后台刷新表目录：mode=stat（默认，使用已有统计）/ analyze（抽样ANALYZE后估计）/ exact（逐表精确计数）"""
+    try:
+        mode = request.args.get('mode') or (request.get_json(silent=True) or {}).get('mode') or 'stat'
+        if mode not in ('stat', 'analyze', 'exact'):
+            return jsonify({
+                'code': 400,
+                'message': f'不支持的刷新模式: {mode}'
+            }), 400
+        job = catalog_refresh_task.delay(exact=mode == 'exact', analyze=mode == 'analyze')
+        return _job_submitted(job, '表目录刷新任务已启动')
+    except Exception as e:
+        logger.error(f"刷新表目录失败: {e}")
+        return jsonify({
+            'code': 500,
+            'message': f'刷新表目录失败: {str(e)}'
+        }), 500
+
+@app.route('/api/database/pool/stats', methods=['GET'])
+@login_required
+def get_database_pool_stats():
+    """获取数据库连接池指标"""
+    try:
+        return jsonify({
+            'code': 200,
+            'message': '获取连接池指标成功',
+            'data': db_manager.get_pool_stats()
+        })
+    except Exception as e:
+        logger.error(f"获取连接池指标失败: {e}")
+        return jsonify({
+            'code': 500,
+            'message': f'获取连接池指标失败: {str(e)}'
+        }), 500
+
 def get_table_category(table_name):
     """获取表的分类"""
     if table_name.startswith('akshare_interface'):
@@ -2133,13 +2329,13 @@ def get_table_category(table_name):
         return 'AKShare数据'
     elif table_name in ['stock_info', 'stock_daily']:
         return '股票基础数据'
-    elif table_name.startswith('technical_indicators'):
+    elif table_name.startswith('technical_indicators') or table_name in ['indicator_daily', 'indicator_state']:
         return '技术指标'
     elif table_name.startswith('backtest_'):
         return '回测数据'
     elif table_name.startswith('user'):
         return '用户管理'
-    elif table_name.startswith('sqlite_'):
+    elif table_name.startswith('sqlite_') or table_name == 'table_catalog':
         return '系统表'
     else:
         return '其他'
@@ -2160,11 +2356,15 @@ def get_table_description(table_name):
         # 股票基础数据
         'stock_info': '股票基础信息表，包含所有A股股票的基本信息',
         'stock_daily': '股票日线数据表，包含历史K线数据',
-        'technical_indicators': '技术指标表，存储计算的技术指标数据',
+        'technical_indicators': '技术指标表（旧格式），按指标逐行存储',
+        'indicator_daily': '物化技术指标表，每只股票每个交易日一行、每个指标一列，同步后增量刷新',
         'backtest_results': '回测结果表，存储策略回测的结果',
         'trades': '交易记录表，存储回测中的交易明细',
         'users': '用户表，存储系统用户信息',
         'user_sessions': '用户会话表，存储用户登录会话',
+        'table_catalog': '表目录，缓存每张表的行数和列结构',
+        'trading_calendar': '交易日历表，缓存上证指数日线的交易日，增量同步据此跳过非交易日',
+        'akshare_download_stats': 'AKShare接口下载统计表，记录每个接口的下载耗时、行数和最近成功时间',
         
         # AKShare股票数据
         'akshare_stock_balance_sheet_by_report_em': '资产负债表数据，包含A股公司资产负债信息',
@@ -2283,18 +2483,49 @@ def api_long_term_analysis():
             'message': f'获取失败: {str(e)}'
         }), 500
 
-# 全局变量用于进度跟踪
-analysis_progress = {}
-
 # ================================
 # 价值投资分析API接口
 # ================================
 
+@job_manager.task(name='value_analysis.top_stocks', bind=True, job_type='value_analysis')
+def value_top_stocks_task(ctx, limit, min_score, industry_filter):
+    """后台任务：批量评分并返回价值投资推荐股票"""
+    from simple_value_analyzer import SimpleValueAnalyzer
+
+    analyzer = SimpleValueAnalyzer()
+    ctx.update_progress(0, 0, '正在获取股票列表...')
+
+    # 获取股票数据并分析，有数量限制时多取一些用于筛选
+    stock_limit = None if limit is None else limit * 3
+    stocks_df = analyzer.get_all_stocks(stock_limit)
+    if stocks_df.empty:
+        raise LookupError('无法获取股票数据')
+
+    # 过滤股票
+    if industry_filter:
+        stocks_df = stocks_df[stocks_df['industry'] == industry_filter]
+
+    total_stocks = len(stocks_df)
+    ctx.update_progress(0, total_stocks, f'开始分析 {total_stocks} 只股票...')
+
+    # 全部股票一次性批量评分
+    scored = analyzer.score_frame(stocks_df)
+    ctx.update_progress(total_stocks, total_stocks, '分析完成')
+
+    # 应用最小评分过滤，按得分取前 limit 只
+    return analyzer.to_results(analyzer.top_stocks(scored, limit or None, min_score))
+
 @app.route('/api/value_analysis/progress/<session_id>')
 @require_login
 def get_analysis_progress(session_id):
     """获取分析进度"""
-    progress = analysis_progress.get(session_id, {})
+    job = job_manager.get_job(session_id)
+    progress = {}
+    if job:
+        progress = dict(job.get('progress') or {})
+        progress['status'] = PROGRESS_STATUS.get(job['status'], 'running')
+        if job['status'] == FAILURE:
+            progress['message'] = job.get('error')
     return jsonify({
         'code': 200,
         'data': progress
@@ -2303,7 +2534,7 @@ def get_analysis_progress(session_id):
 @app.route('/api/value_analysis/top_stocks')
 @require_login
 def get_top_value_stocks():
-    """获取价值投资分析结果"""
+    """获取价值投资分析结果，async=1 时只提交后台任务并返回 session_id"""
     import os  # 确保在函数作用域内导入os
     import uuid
     
@@ -2321,83 +2552,26 @@ def get_top_value_stocks():
             limit = int(limit_str)
             limit = min(max(limit, 1), 1000)  # 放宽限制到1000
         
-        # 初始化进度
-        analysis_progress[session_id] = {
-            'status': 'starting',
-            'current': 0,
-            'total': 0,
-            'percent': 0,
-            'message': '正在获取股票列表...'
-        }
-        
         # 导入简化版价值投资分析器
         import sys
         sys.path.append(os.path.dirname(os.path.abspath(__file__)))
         
         try:
-            from simple_value_analyzer import SimpleValueAnalyzer
-            
-            analyzer = SimpleValueAnalyzer()
+            import simple_value_analyzer  # noqa: F401  检查分析器是否可用
             
-            # 获取股票数据并分析
-            if limit is None:
-                stock_limit = None  # 获取全部股票
-            else:
-                stock_limit = limit * 3  # 获取更多股票用于筛选
-            stocks_df = analyzer.get_all_stocks(stock_limit)  # 获取股票数据
+            job = value_top_stocks_task.apply_async(args=(limit, min_score, industry_filter), job_id=session_id)
+            if _wants_async():
+                return _job_submitted(job, '分析任务已启动')
             
-            if stocks_df.empty:
-                analysis_progress[session_id]['status'] = 'error'
-                analysis_progress[session_id]['message'] = '无法获取股票数据'
+            try:
+                qualified_stocks = job.get()
+            except LookupError as e:
                 return jsonify({
                     'code': 404,
-                    'message': '无法获取股票数据',
+                    'message': str(e),
                     'session_id': session_id
                 })
             
-            # 过滤股票
-            if industry_filter:
-                stocks_df = stocks_df[stocks_df['industry'] == industry_filter]
-            
-            total_stocks = len(stocks_df)
-            analysis_progress[session_id]['total'] = total_stocks
-            analysis_progress[session_id]['message'] = f'开始分析 {total_stocks} 只股票...'
-            
-            qualified_stocks = []
-            current = 0
-            
-            for _, stock in stocks_df.iterrows():
-                try:
-                    current += 1
-                    symbol = stock.get('symbol', '未知')
-                    
-                    # 更新进度
-                    analysis_progress[session_id]['current'] = current
-                    analysis_progress[session_id]['percent'] = int((current / total_stocks) * 100)
-                    analysis_progress[session_id]['message'] = f'正在分析 {symbol}... ({current}/{total_stocks})'
-                    
-                    result = analyzer.analyze_stock(stock.to_dict())
-                    
-                    if result.get('qualified', False) and 'error' not in result:
-                        qualified_stocks.append(result)
-                        
-                except Exception as e:
-                    logger.error(f"分析股票失败 {stock.get('symbol', '未知')}: {e}")
-                    continue
-            
-            # 完成分析
-            analysis_progress[session_id]['status'] = 'completed'
-            analysis_progress[session_id]['percent'] = 100
-            analysis_progress[session_id]['message'] = '分析完成'
-            
-            # 按得分排序并应用最小评分过滤
-            qualified_stocks = [s for s in qualified_stocks if s.get('score', 0) >= min_score]
-            qualified_stocks.sort(key=lambda x: x['score'], reverse=True)
-            
-            # 应用数量限制
-            if limit:
-                qualified_stocks = qualified_stocks[:limit]
-            
             return jsonify({
                 'code': 200,
                 'message': '获取成功',
@@ -2465,9 +2639,6 @@ def get_top_value_stocks():
                 })
             else:
                 # 如果没有现有文件，使用扩展的演示数据
-                analysis_progress[session_id]['status'] = 'completed'
-                analysis_progress[session_id]['percent'] = 100
-                analysis_progress[session_id]['message'] = '分析完成(使用演示数据)'
                 demo_data = [
                     {
                         'symbol': '000001',
@@ -2723,31 +2894,20 @@ def quick_value_scan():
                     'message': '无法获取股票数据'
                 })
             
-            qualified_stocks = []
-            total_analyzed = 0
-            
-            for _, stock in stocks_df.iterrows():
-                try:
-                    result = analyzer.analyze_stock(stock.to_dict())
-                    total_analyzed += 1
-                    
-                    if result.get('qualified', False) and 'error' not in result:
-                        qualified_stocks.append(result)
-                            
-                except Exception as e:
-                    continue
+            scored = analyzer.score_frame(stocks_df)
+            total_analyzed = len(scored)
+            qualified_count = int(scored['qualified'].sum())
             
-            # 按得分排序并取前20名用于快速展示
-            qualified_stocks.sort(key=lambda x: x['score'], reverse=True)
-            top_stocks = qualified_stocks[:20]
+            # 按得分取前20名用于快速展示
+            top_stocks = analyzer.to_results(analyzer.top_stocks(scored, 20))
             
             return jsonify({
                 'code': 200,
                 'message': '扫描完成',
                 'data': {
                     'total_analyzed': total_analyzed,
-                    'qualified_count': len(qualified_stocks),
-                    'qualified_rate': round(len(qualified_stocks) / total_analyzed * 100, 2) if total_analyzed > 0 else 0,
+                    'qualified_count': qualified_count,
+                    'qualified_rate': round(qualified_count / total_analyzed * 100, 2) if total_analyzed > 0 else 0,
                     'top_stocks': top_stocks
                 }
             })
@@ -2794,94 +2954,108 @@ def quick_value_scan():
 @app.route('/api/akshare/interfaces/<interface_name>/data', methods=['GET'])
 @login_required
 def get_interface_data(interface_name):
-    """获取接口数据的分页显示"""
+    """
+    获取接口数据的分页显示
+
+    参数:
+        columns: 返回的列（逗号分隔），为空时返回全部列
+        filter: 列:运算符:值，可重复，列必须已建索引（运算符 eq/ne/gt/gte/lt/lte/prefix）
+        sort_by/sort_order: 排序列（必须已建索引）和顺序，默认按写入顺序
+        cursor: 上一页返回的 next_cursor，有游标时忽略 page
+        page/page_size: 页码和每页数量
+        with_total: 是否返回总数（默认返回）
+        format: records（默认）或 columns
+    """
+    table_name = interface_table(interface_name)
     try:
-        # 获取分页参数
-        page = int(request.args.get('page', 1))
-        page_size = int(request.args.get('page_size', 20))
-        
-        # 创建表名
-        table_name = f"akshare_{interface_name}"
-        table_name = table_name.replace('-', '_').replace('.', '_')
-        
-        # 检查表是否存在
-        check_query = """
-            SELECT name FROM sqlite_master 
-            WHERE type='table' AND name=?
-        """
-        table_exists = db_manager.query(check_query, [table_name])
-        
-        if not table_exists:
+        columns = [c.strip() for c in request.args.get('columns', '').split(',') if c.strip()]
+        filters = [parse_filter(expr) for expr in request.args.getlist('filter') if expr]
+        result = table_browser.browse(
+            table_name,
+            columns=columns,
+            filters=filters,
+            sort_by=request.args.get('sort_by') or None,
+            sort_order=request.args.get('sort_order', 'ASC'),
+            cursor=request.args.get('cursor') or None,
+            page=int(request.args.get('page', 1)),
+            page_size=int(request.args.get('page_size', 20)),
+            with_total=request.args.get('with_total', 'true').lower() != 'false'
+        )
+
+        rows = result.pop('rows')
+        if _layout() == 'columns':
+            result['records'] = {
+                col: [row[i] for row in rows] for i, col in enumerate(result['columns'])
+            }
+        else:
+            result['records'] = [dict(zip(result['columns'], row)) for row in rows]
+
+        return _json_response({
+            'code': 200,
+            'message': '获取数据成功' if rows or result['page'] > 1 else '数据为空',
+            'data': result
+        })
+
+    except LookupError:
+        return jsonify({
+            'code': 404,
+            'message': f'接口数据表不存在: {table_name}',
+            'suggestion': '请先下载该接口的数据到数据库'
+        }), 404
+    except ValueError as e:
+        return jsonify({
+            'code': 400,
+            'message': str(e)
+        }), 400
+    except Exception as e:
+        logger.error(f"获取接口数据失败: {e}")
+        return jsonify({
+            'code': 500,
+            'message': f'获取数据失败: {str(e)}'
+        }), 500
+
+
+@app.route('/api/akshare/interfaces/<interface_name>/indexes', methods=['POST'])
+@login_required
+def create_interface_index(interface_name):
+    """为接口数据表的列创建索引，建立索引后可按该列筛选和排序"""
+    table_name = interface_table(interface_name)
+    try:
+        data = request.get_json(silent=True) or {}
+        column = data.get('column')
+        if not column:
+            return jsonify({
+                'code': 400,
+                'message': '缺少列名参数 column'
+            }), 400
+        if not table_browser.table_exists(table_name):
             return jsonify({
                 'code': 404,
                 'message': f'接口数据表不存在: {table_name}',
                 'suggestion': '请先下载该接口的数据到数据库'
             }), 404
-        
-        # 获取总记录数
-        count_query = f"SELECT COUNT(*) as count FROM {table_name}"
-        total_records = db_manager.query(count_query)[0]['count']
-        
-        if total_records == 0:
-            return jsonify({
-                'code': 200,
-                'message': '数据为空',
-                'data': {
-                    'records': [],
-                    'columns': [],
-                    'total_records': 0,
-                    'page': page,
-                    'page_size': page_size,
-                    'table_name': table_name
-                }
-            })
-        
-        # 获取列名
-        columns_query = f"PRAGMA table_info({table_name})"
-        columns_info = db_manager.query(columns_query)
-        columns = [col['name'] for col in columns_info]
-        
-        # 计算分页偏移
-        offset = (page - 1) * page_size
-        
-        # 获取分页数据
-        data_query = f"""
-            SELECT * FROM {table_name}
-            LIMIT {page_size} OFFSET {offset}
-        """
-        records = db_manager.query(data_query)
-        
-        # 将记录转换为字典列表
-        records_list = []
-        for record in records:
-            record_dict = {}
-            for col in columns:
-                value = record.get(col)
-                # 处理日期时间格式
-                if hasattr(value, 'strftime'):
-                    value = value.strftime('%Y-%m-%d %H:%M:%S')
-                record_dict[col] = str(value) if value is not None else ''
-            records_list.append(record_dict)
-        
+
+        index_name = table_browser.create_index(table_name, column)
         return jsonify({
             'code': 200,
-            'message': '获取数据成功',
+            'message': '索引创建成功',
             'data': {
-                'records': records_list,
-                'columns': columns,
-                'total_records': total_records,
-                'page': page,
-                'page_size': page_size,
-                'total_pages': (total_records + page_size - 1) // page_size,
-                'table_name': table_name
+                'table_name': table_name,
+                'index_name': index_name,
+                'indexed_columns': table_browser.indexed_columns(table_name)
             }
         })
-        
+
+    except ValueError as e:
+        return jsonify({
+            'code': 400,
+            'message': str(e)
+        }), 400
     except Exception as e:
-        logger.error(f"获取接口数据失败: {e}")
+        logger.error(f"创建接口数据索引失败: {e}")
         return jsonify({
             'code': 500,
-            'message': f'获取数据失败: {str(e)}'
+            'message': f'创建索引失败: {str(e)}'
         }), 500
 
 if __name__ == '__main__':
@@ -0,0 +1,315 @@
+"""
+AKShare接口批量下载
+有界线程池并发调用接口，按 update_frequency 跳过仍在有效期内的数据表，
+新数据先写入临时表再原子替换；每个接口的耗时和行数记录在 akshare_download_stats，
+下次调度时耗时长的接口优先提交
+"""
+import json
+import threading
+import time
+from concurrent.futures import CancelledError, ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from utils.logger import logger
+from utils.config import config
+from core.storage import db_manager
+from core.table_browser import table_browser
+
+
+STATS_TABLE = 'akshare_download_stats'
+
+# 耗时的指数平均权重
+DURATION_ALPHA = 0.3
+
+
+def interface_table(interface_name: str) -> str:
+    """接口数据表名"""
+    return f"akshare_{interface_name}".replace('-', '_').replace('.', '_')
+
+
+def _now() -> str:
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+def is_fresh(frequency: Optional[str], last_success: Optional[str], now: datetime = None) -> bool:
+    """
+    按更新频率判断上次下载的数据是否仍然有效
+
+    日/周/月/季/年 分别要求上次下载在同一天/同一周/同一月/同一季度/同一年；
+    实时或未填写频率的接口每次都重新下载
+    """
+    if not frequency or not last_success:
+        return False
+    now = now or datetime.now()
+    try:
+        last = datetime.strptime(str(last_success)[:19], '%Y-%m-%d %H:%M:%S')
+    except ValueError:
+        return False
+
+    frequency = frequency.strip()
+    if frequency == '日':
+        return last.date() == now.date()
+    if frequency == '周':
+        return last.isocalendar()[:2] == now.isocalendar()[:2]
+    if frequency == '月':
+        return (last.year, last.month) == (now.year, now.month)
+    if frequency == '季':
+        return (last.year, (last.month - 1) // 3) == (now.year, (now.month - 1) // 3)
+    if frequency == '年':
+        return last.year == now.year
+    return False
+
+
+def _classify_error(interface_name: str, error: Exception) -> Dict[str, Any]:
+    """把接口调用异常转换为下载结果"""
+    import requests
+
+    if interface_name == 'stock_a_indicator_lg' and isinstance(error, (json.JSONDecodeError, ValueError)):
+        # stock_a_indicator_lg接口经常返回空数据或格式错误
+        return {
+            'status': 'unavailable',
+            'message': 'A股技术指标接口暂时不可用',
+            'error': str(error),
+            'suggestion': '该接口数据源可能正在维护，建议跳过此接口'
+        }
+    if isinstance(error, requests.exceptions.RequestException):
+        return {
+            'status': 'network_error',
+            'message': f'网络请求失败: {str(error)}',
+            'suggestion': '请检查网络连接'
+        }
+
+    error_msg = str(error).lower()
+    if 'json' in error_msg or 'decode' in error_msg:
+        return {
+            'status': 'data_error',
+            'message': '数据解析失败: 接口返回数据格式错误',
+            'suggestion': '接口数据源可能正在维护'
+        }
+    if 'connection' in error_msg or 'timeout' in error_msg:
+        return {
+            'status': 'network_error',
+            'message': '网络连接失败',
+            'suggestion': '请检查网络连接'
+        }
+    return {
+        'status': 'error',
+        'message': str(error),
+        'suggestion': '接口调用失败'
+    }
+
+
+class AKShareDownloader:
+    """AKShare接口批量下载调度器"""
+
+    def __init__(self,
+                 db_manager,
+                 browser=None,
+                 concurrency: int = None,
+                 max_retries: int = None,
+                 resolver: Callable[[str], Optional[Callable]] = None):
+        """
+        Args:
+            db_manager: 数据库管理器
+            browser: 数据表浏览器，负责整表替换并保留索引
+            concurrency: 同时调用的接口数，默认读取 AKSHARE_DOWNLOAD.concurrency
+            max_retries: 每个接口的最大尝试次数，默认读取 AKSHARE_DOWNLOAD.max_retries
+            resolver: 接口名 -> 接口函数，默认从 akshare 模块查找
+        """
+        self.db_manager = db_manager
+        self.browser = browser or table_browser
+        self.concurrency = concurrency or config.get('AKSHARE_DOWNLOAD.concurrency', 4)
+        self.max_retries = max_retries or config.get('AKSHARE_DOWNLOAD.max_retries', 2)
+        self.resolver = resolver or self._resolve_akshare
+        # 拉取并发进行，写入数据库串行，避免多个写事务争用锁
+        self._write_lock = threading.Lock()
+        self._cancel = threading.Event()
+
+    @staticmethod
+    def _resolve_akshare(interface_name: str) -> Optional[Callable]:
+        import akshare as ak
+        return getattr(ak, interface_name, None)
+
+    def get_stats(self, names: List[str] = None) -> Dict[str, Dict[str, Any]]:
+        """读取各接口的下载统计 {接口名: 统计}"""
+        query = f"SELECT * FROM {STATS_TABLE}"
+        params: list = []
+        if names:
+            query += f" WHERE interface_name IN ({','.join('?' * len(names))})"
+            params = list(names)
+        return {row['interface_name']: row for row in self.db_manager.query(query, params)}
+
+    def _record(self, interface_name: str, result: Dict[str, Any], duration: float):
+        """记录一次下载的耗时、行数和状态"""
+        now = _now()
+        success = result['status'] == 'success'
+        with self.db_manager.connection() as conn:
+            conn.execute(f'''
+                INSERT INTO {STATS_TABLE}
+                    (interface_name, table_name, status, rows, duration, avg_duration,
+                     last_attempt_at, last_success_at, message)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(interface_name) DO UPDATE SET
+                    table_name = excluded.table_name,
+                    status = excluded.status,
+                    rows = CASE WHEN excluded.last_success_at IS NOT NULL THEN excluded.rows ELSE rows END,
+                    duration = excluded.duration,
+                    avg_duration = CASE WHEN avg_duration IS NULL THEN excluded.duration
+                                        ELSE avg_duration * ? + excluded.duration * ? END,
+                    last_attempt_at = excluded.last_attempt_at,
+                    last_success_at = COALESCE(excluded.last_success_at, last_success_at),
+                    message = excluded.message
+            ''', (
+                interface_name, interface_table(interface_name), result['status'], result.get('records', 0),
+                round(duration, 3), round(duration, 3), now, now if success else None, result.get('message'),
+                1 - DURATION_ALPHA, DURATION_ALPHA
+            ))
+
+    def plan(self, interfaces: List[Dict[str, Any]], force: bool = False):
+        """
+        划分需要下载和仍然有效的接口
+
+        Returns:
+            (待下载接口名列表（按历史平均耗时从长到短）, 跳过的接口名列表)
+        """
+        names = [interface['interface_name'] for interface in interfaces]
+        stats = self.get_stats(names)
+        existing = {
+            row['name'] for row in self.db_manager.query("SELECT name FROM sqlite_master WHERE type = 'table'")
+        }
+
+        due, fresh = [], []
+        for interface in interfaces:
+            name = interface['interface_name']
+            stat = stats.get(name) or {}
+            if not force and interface_table(name) in existing and \
+                    is_fresh(interface.get('update_frequency'), stat.get('last_success_at')):
+                fresh.append(name)
+            else:
+                due.append(name)
+
+        # 耗时长的接口先提交，缩短整体完成时间；没有记录的接口视为最长
+        def expected_duration(name):
+            avg = (stats.get(name) or {}).get('avg_duration')
+            return float('inf') if avg is None else avg
+
+        due.sort(key=expected_duration, reverse=True)
+        return due, fresh
+
+    def _call(self, interface_name: str, func: Callable):
+        """调用接口，需要参数的行情接口使用默认参数"""
+        try:
+            return func()
+        except TypeError:
+            if interface_name.startswith('stock_') and 'hist' in interface_name:
+                return func(symbol="000001", period="daily", adjust="")
+            raise
+
+    def download_one(self, interface_name: str) -> Dict[str, Any]:
+        """下载单个接口到 akshare_<接口名> 表，返回下载结果"""
+        func = self.resolver(interface_name)
+        if func is None:
+            return {
+                'status': 'not_found',
+                'message': f'接口不存在: {interface_name}'
+            }
+
+        df = None
+        # 已知经常不可用的接口不重试
+        attempts = 1 if interface_name == 'stock_a_indicator_lg' else self.max_retries
+        for attempt in range(attempts):
+            if self._cancel.is_set():
+                raise InterruptedError("下载已取消")
+            try:
+                df = self._call(interface_name, func)
+                break
+            except Exception as e:
+                if attempt == attempts - 1:
+                    return _classify_error(interface_name, e)
+                logger.warning(f"接口 {interface_name} 第 {attempt + 1} 次调用失败: {e}")
+
+        if df is None or df.empty:
+            return {
+                'status': 'empty',
+                'records': 0,
+                'message': '返回空数据'
+            }
+
+        table_name = interface_table(interface_name)
+        df['download_time'] = datetime.now()
+        with self._write_lock:
+            self.browser.replace_frame(df, table_name)
+        return {
+            'status': 'success',
+            'records': len(df),
+            'table_name': table_name
+        }
+
+    def _timed_download(self, interface_name: str):
+        start = time.perf_counter()
+        result = self.download_one(interface_name)
+        return result, time.perf_counter() - start
+
+    def run(self, interfaces: List[Dict[str, Any]], ctx=None, force: bool = False) -> Dict[str, Any]:
+        """
+        批量下载
+
+        Args:
+            interfaces: [{'interface_name', 'update_frequency'}]
+            ctx: 任务上下文，用于上报进度和检查取消
+            force: 忽略更新频率，全部重新下载
+
+        Returns:
+            Dict: total_interfaces, success_count, skipped_count, total_records, seconds, results
+        """
+        self._cancel.clear()
+        due, fresh = self.plan(interfaces, force)
+        results = [{
+            'interface_name': name,
+            'status': 'fresh',
+            'message': '数据仍在更新周期内，跳过下载'
+        } for name in fresh]
+
+        total = len(due)
+        start = time.time()
+        logger.info(f"开始批量下载 {total} 个接口（跳过 {len(fresh)} 个），并发 {self.concurrency}")
+        if ctx is not None:
+            ctx.update_progress(0, total, f'开始下载 {total} 个接口')
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            futures = {pool.submit(self._timed_download, name): name for name in due}
+            for processed, future in enumerate(as_completed(futures), 1):
+                interface_name = futures[future]
+                try:
+                    result, duration = future.result()
+                except (InterruptedError, CancelledError):
+                    continue
+                except Exception as e:
+                    result, duration = {'status': 'error', 'message': str(e)}, 0.0
+                result = {'interface_name': interface_name, **result, 'duration': round(duration, 2)}
+                results.append(result)
+                self._record(interface_name, result, duration)
+
+                if ctx is not None:
+                    ctx.update_progress(processed, total, f'已完成 {interface_name}')
+                    if ctx.is_cancelled() and not self._cancel.is_set():
+                        self._cancel.set()
+                        for pending in futures:
+                            pending.cancel()
+
+        success_count = len([r for r in results if r['status'] == 'success'])
+        summary = {
+            'total_interfaces': len(interfaces),
+            'success_count': success_count,
+            'skipped_count': len(fresh),
+            'total_records': sum(r.get('records', 0) for r in results),
+            'seconds': round(time.time() - start, 2),
+            'results': results
+        }
+        logger.info(f"批量下载完成，成功 {success_count}/{total} 个接口，耗时 {summary['seconds']} 秒")
+        return summary
+
+
+# 全局下载调度器实例
+akshare_downloader = AKShareDownloader(db_manager)
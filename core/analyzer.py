@@ -6,40 +6,104 @@ import pandas as pd
 import numpy as np
 from typing import Dict, Tuple, Optional, List
 from utils.logger import logger
+from utils.config import config
+from core.cache import memoize
 import warnings
 warnings.filterwarnings('ignore')
 
+# calculate_all_indicators 支持的指标组，顺序即输出列顺序
+INDICATOR_GROUPS = ['MA', 'EMA', 'MACD', 'RSI', 'BOLL', 'KDJ', 'ATR', 'VOLUME']
+
+
+class _IndicatorInputs:
+    """指标计算的公共输入
+
+    原始价格列只从DataFrame取一次，各指标共用的中间结果（如同周期均线、
+    收盘价差分、前收盘价）只计算一次
+    """
+
+    def __init__(self, data: pd.DataFrame):
+        self.data = data
+        self._cache = {}
+
+    def _memo(self, key, func):
+        if key not in self._cache:
+            self._cache[key] = func()
+        return self._cache[key]
+
+    def column(self, name: str) -> pd.Series:
+        return self._memo(('column', name), lambda: self.data[name])
+
+    def rolling_mean(self, name: str, window: int) -> pd.Series:
+        return self._memo(('rolling_mean', name, window),
+                          lambda: self.column(name).rolling(window=window).mean())
+
+    def ewm_mean(self, name: str, span: int) -> pd.Series:
+        return self._memo(('ewm_mean', name, span), lambda: self.column(name).ewm(span=span).mean())
+
+    def diff(self, name: str) -> pd.Series:
+        return self._memo(('diff', name), lambda: self.column(name).diff())
+
+    def shift(self, name: str) -> pd.Series:
+        return self._memo(('shift', name), lambda: self.column(name).shift())
+
+
 class TechnicalAnalyzer:
     """技术分析器"""
     
     def __init__(self):
         logger.info("技术分析器初始化完成")
     
-    def calculate_all_indicators(self, data: pd.DataFrame) -> pd.DataFrame:
-        """计算所有技术指标"""
+    def calculate_all_indicators(self, data: pd.DataFrame, indicators: List[str] = None) -> pd.DataFrame:
+        """
+        计算技术指标
+
+        所有指标基于同一份输入列计算，最后一次性拼接成结果DataFrame，
+        不会在每个指标之间复制整张表
+
+        Args:
+            data: OHLCV数据
+            indicators: 需要计算的指标组（见 INDICATOR_GROUPS），默认全部
+        """
         try:
-            df = data.copy()
+            groups = INDICATOR_GROUPS if indicators is None else [g.upper() for g in indicators]
+            unknown = [g for g in groups if g not in INDICATOR_GROUPS]
+            if unknown:
+                raise ValueError(f"不支持的指标: {unknown}")
+            
+            inputs = _IndicatorInputs(data)
+            columns: Dict[str, pd.Series] = {}
             
             # 移动平均线
-            df = self.add_moving_averages(df)
+            if 'MA' in groups or 'EMA' in groups:
+                columns.update(self._moving_average_columns(
+                    inputs, [5, 10, 20, 60], sma='MA' in groups, ema='EMA' in groups))
             
             # MACD
-            df = self.add_macd(df)
+            if 'MACD' in groups:
+                columns.update(self._macd_columns(inputs))
             
             # RSI
-            df = self.add_rsi(df)
+            if 'RSI' in groups:
+                columns.update(self._rsi_columns(inputs))
             
             # 布林带
-            df = self.add_bollinger_bands(df)
+            if 'BOLL' in groups:
+                columns.update(self._bollinger_columns(inputs))
             
             # KDJ
-            df = self.add_kdj(df)
+            if 'KDJ' in groups:
+                columns.update(self._kdj_columns(inputs))
             
             # ATR
-            df = self.add_atr(df)
+            if 'ATR' in groups:
+                columns.update(self._atr_columns(inputs))
             
             # 成交量指标
-            df = self.add_volume_indicators(df)
+            if 'VOLUME' in groups:
+                columns.update(self._volume_columns(inputs))
+            
+            df = self._assemble(data, columns)
             
             logger.info("所有技术指标计算完成")
             return df
@@ -47,47 +111,84 @@ class TechnicalAnalyzer:
         except Exception as e:
             logger.error(f"计算技术指标失败: {e}")
             raise
-    
-    def add_moving_averages(self, data: pd.DataFrame, periods: List[int] = [5, 10, 20, 60]) -> pd.DataFrame:
-        """添加移动平均线"""
-        df = data.copy()
-        
+
+    def load_indicators(self, symbol: str, data: pd.DataFrame, db_manager=None) -> pd.DataFrame:
+        """
+        获取带技术指标的数据：优先读取 indicator_daily 中同步后物化的指标，
+        物化数据未覆盖 data 的全部日期（如当天行情已入库但指标尚未刷新）时现算
+
+        Args:
+            symbol: 股票代码
+            data: 以日期为索引的OHLCV数据
+            db_manager: 数据库管理器，默认使用全局实例
+        """
+        if (not config.get('TECHNICAL_ANALYSIS.use_materialized', True) or data.empty
+                or not isinstance(data.index, pd.DatetimeIndex)):
+            return self.calculate_all_indicators(data)
+
+        try:
+            if db_manager is None:
+                from core.storage import db_manager
+            index = data.index.normalize()
+            stored = db_manager.get_technical_indicators(
+                symbol, index[0].strftime('%Y-%m-%d'), index[-1].strftime('%Y-%m-%d'))
+            # 新鲜度检查：物化指标必须包含 data 的每个交易日（含最新一天）
+            if stored.empty or not index.isin(stored.index).all():
+                logger.debug(f"股票 {symbol} 的物化指标未覆盖到 {index[-1].date()}，现算技术指标")
+                return self.calculate_all_indicators(data)
+        except Exception as e:
+            logger.warning(f"读取物化指标失败，现算技术指标: {e}")
+            return self.calculate_all_indicators(data)
+
+        if 'turnover' not in data.columns:
+            # 与现算结果一致：没有成交额数据时不输出MFI
+            stored = stored.drop(columns=['MFI'], errors='ignore')
+        stored = stored.reindex(index)
+        return self._assemble(data, {name: stored[name] for name in stored.columns})
+
+    @staticmethod
+    def _assemble(data: pd.DataFrame, columns: Dict[str, pd.Series]) -> pd.DataFrame:
+        """把指标列拼接到原始数据后面，只生成一次结果DataFrame"""
+        if any(name in data.columns for name in columns):
+            # 已有同名列时保持逐列覆盖的语义
+            df = data.copy()
+            for name, values in columns.items():
+                df[name] = values
+            return df
+        indicators = pd.DataFrame({name: values.to_numpy() for name, values in columns.items()},
+                                  index=data.index)
+        return pd.concat([data, indicators], axis=1)
+
+    def _moving_average_columns(self, inputs: _IndicatorInputs, periods: List[int],
+                                sma: bool = True, ema: bool = True) -> Dict[str, pd.Series]:
+        columns = {}
         for period in periods:
             # 简单移动平均线
-            df[f'MA_{period}'] = df['close'].rolling(window=period).mean()
+            if sma:
+                columns[f'MA_{period}'] = inputs.rolling_mean('close', period)
             
             # 指数移动平均线
-            df[f'EMA_{period}'] = df['close'].ewm(span=period).mean()
-        
-        logger.debug(f"移动平均线计算完成: {periods}")
-        return df
-    
-    def add_macd(self, data: pd.DataFrame, fast: int = 12, slow: int = 26, signal: int = 9) -> pd.DataFrame:
-        """添加MACD指标"""
-        df = data.copy()
-        
-        # 计算快慢EMA
-        ema_fast = df['close'].ewm(span=fast).mean()
-        ema_slow = df['close'].ewm(span=slow).mean()
-        
+            if ema:
+                columns[f'EMA_{period}'] = inputs.ewm_mean('close', period)
+        return columns
+
+    def _macd_columns(self, inputs: _IndicatorInputs, fast: int = 12, slow: int = 26,
+                      signal: int = 9) -> Dict[str, pd.Series]:
         # MACD线
-        df['MACD'] = ema_fast - ema_slow
+        macd = inputs.ewm_mean('close', fast) - inputs.ewm_mean('close', slow)
         
         # 信号线
-        df['MACD_Signal'] = df['MACD'].ewm(span=signal).mean()
-        
-        # MACD柱状图
-        df['MACD_Histogram'] = df['MACD'] - df['MACD_Signal']
-        
-        logger.debug("MACD指标计算完成")
-        return df
-    
-    def add_rsi(self, data: pd.DataFrame, period: int = 14) -> pd.DataFrame:
-        """添加RSI指标"""
-        df = data.copy()
+        macd_signal = macd.ewm(span=signal).mean()
         
+        return {
+            'MACD': macd,
+            'MACD_Signal': macd_signal,
+            'MACD_Histogram': macd - macd_signal
+        }
+
+    def _rsi_columns(self, inputs: _IndicatorInputs, period: int = 14) -> Dict[str, pd.Series]:
         # 价格变化
-        delta = df['close'].diff()
+        delta = inputs.diff('close')
         
         # 上涨和下跌
         gains = delta.where(delta > 0, 0)
@@ -99,100 +200,135 @@ class TechnicalAnalyzer:
         
         # RS和RSI
         rs = avg_gains / avg_losses
-        df['RSI'] = 100 - (100 / (1 + rs))
-        
-        logger.debug(f"RSI指标计算完成: period={period}")
-        return df
-    
-    def add_bollinger_bands(self, data: pd.DataFrame, period: int = 20, std_dev: float = 2) -> pd.DataFrame:
-        """添加布林带"""
-        df = data.copy()
+        return {'RSI': 100 - (100 / (1 + rs))}
+
+    def _bollinger_columns(self, inputs: _IndicatorInputs, period: int = 20,
+                           std_dev: float = 2) -> Dict[str, pd.Series]:
+        close = inputs.column('close')
         
         # 中轨（移动平均线）
-        df['BB_Middle'] = df['close'].rolling(window=period).mean()
+        middle = inputs.rolling_mean('close', period)
         
         # 标准差
-        std = df['close'].rolling(window=period).std()
+        std = close.rolling(window=period).std()
         
         # 上轨和下轨
-        df['BB_Upper'] = df['BB_Middle'] + (std * std_dev)
-        df['BB_Lower'] = df['BB_Middle'] - (std * std_dev)
-        
-        # 布林带宽度
-        df['BB_Width'] = (df['BB_Upper'] - df['BB_Lower']) / df['BB_Middle']
-        
-        # %B指标
-        df['BB_Percent'] = (df['close'] - df['BB_Lower']) / (df['BB_Upper'] - df['BB_Lower'])
-        
-        logger.debug(f"布林带指标计算完成: period={period}, std_dev={std_dev}")
-        return df
-    
-    def add_kdj(self, data: pd.DataFrame, k_period: int = 9, d_period: int = 3, j_period: int = 3) -> pd.DataFrame:
-        """添加KDJ指标"""
-        df = data.copy()
-        
+        upper = middle + (std * std_dev)
+        lower = middle - (std * std_dev)
+        
+        return {
+            'BB_Middle': middle,
+            'BB_Upper': upper,
+            'BB_Lower': lower,
+            # 布林带宽度
+            'BB_Width': (upper - lower) / middle,
+            # %B指标
+            'BB_Percent': (close - lower) / (upper - lower)
+        }
+
+    def _kdj_columns(self, inputs: _IndicatorInputs, k_period: int = 9, d_period: int = 3,
+                     j_period: int = 3) -> Dict[str, pd.Series]:
         # 最高价和最低价
-        low_min = df['low'].rolling(window=k_period).min()
-        high_max = df['high'].rolling(window=k_period).max()
+        low_min = inputs.column('low').rolling(window=k_period).min()
+        high_max = inputs.column('high').rolling(window=k_period).max()
         
         # RSV
-        rsv = (df['close'] - low_min) / (high_max - low_min) * 100
-        
-        # K值
-        df['KDJ_K'] = rsv.ewm(com=d_period-1).mean()
+        rsv = (inputs.column('close') - low_min) / (high_max - low_min) * 100
         
-        # D值
-        df['KDJ_D'] = df['KDJ_K'].ewm(com=j_period-1).mean()
-        
-        # J值
-        df['KDJ_J'] = 3 * df['KDJ_K'] - 2 * df['KDJ_D']
-        
-        logger.debug(f"KDJ指标计算完成: K={k_period}, D={d_period}, J={j_period}")
-        return df
-    
-    def add_atr(self, data: pd.DataFrame, period: int = 14) -> pd.DataFrame:
-        """添加ATR（平均真实波幅）"""
-        df = data.copy()
+        # K值、D值、J值
+        k = rsv.ewm(com=d_period-1).mean()
+        d = k.ewm(com=j_period-1).mean()
+        return {'KDJ_K': k, 'KDJ_D': d, 'KDJ_J': 3 * k - 2 * d}
+
+    def _atr_columns(self, inputs: _IndicatorInputs, period: int = 14) -> Dict[str, pd.Series]:
+        high = inputs.column('high')
+        low = inputs.column('low')
+        prev_close = inputs.shift('close')
         
         # 真实波幅
-        high_low = df['high'] - df['low']
-        high_close = np.abs(df['high'] - df['close'].shift())
-        low_close = np.abs(df['low'] - df['close'].shift())
+        high_low = high - low
+        high_close = np.abs(high - prev_close)
+        low_close = np.abs(low - prev_close)
         
         true_range = pd.concat([high_low, high_close, low_close], axis=1).max(axis=1)
         
         # ATR
-        df['ATR'] = true_range.rolling(window=period).mean()
-        
-        logger.debug(f"ATR指标计算完成: period={period}")
-        return df
-    
-    def add_volume_indicators(self, data: pd.DataFrame) -> pd.DataFrame:
-        """添加成交量指标"""
-        df = data.copy()
+        atr = true_range.rolling(window=period).mean()
+        return {'ATR': atr}
+
+    def _volume_columns(self, inputs: _IndicatorInputs) -> Dict[str, pd.Series]:
+        volume = inputs.column('volume')
         
         # 成交量移动平均
-        df['Volume_MA_5'] = df['volume'].rolling(window=5).mean()
-        df['Volume_MA_10'] = df['volume'].rolling(window=10).mean()
-        
-        # 相对成交量
-        df['Volume_Ratio'] = df['volume'] / df['Volume_MA_10']
-        
-        # OBV (On Balance Volume)
-        price_change = df['close'].diff()
-        df['OBV'] = (df['volume'] * np.sign(price_change)).cumsum()
+        volume_ma_10 = inputs.rolling_mean('volume', 10)
+        columns = {
+            'Volume_MA_5': inputs.rolling_mean('volume', 5),
+            'Volume_MA_10': volume_ma_10,
+            # 相对成交量
+            'Volume_Ratio': volume / volume_ma_10,
+            # OBV (On Balance Volume)
+            'OBV': (volume * np.sign(inputs.diff('close'))).cumsum()
+        }
         
         # 资金流量指标 MFI
-        if 'turnover' in df.columns:
-            typical_price = (df['high'] + df['low'] + df['close']) / 3
-            money_flow = typical_price * df['volume']
+        if 'turnover' in inputs.data.columns:
+            typical_price = (inputs.column('high') + inputs.column('low') + inputs.column('close')) / 3
+            money_flow = typical_price * volume
+            prev_typical = typical_price.shift()
             
-            positive_flow = money_flow.where(typical_price > typical_price.shift(), 0).rolling(14).sum()
-            negative_flow = money_flow.where(typical_price < typical_price.shift(), 0).rolling(14).sum()
+            positive_flow = money_flow.where(typical_price > prev_typical, 0).rolling(14).sum()
+            negative_flow = money_flow.where(typical_price < prev_typical, 0).rolling(14).sum()
             
             mfi_ratio = positive_flow / negative_flow
-            df['MFI'] = 100 - (100 / (1 + mfi_ratio))
+            columns['MFI'] = 100 - (100 / (1 + mfi_ratio))
         
+        return columns
+
+    def _add_columns(self, data: pd.DataFrame, columns: Dict[str, pd.Series]) -> pd.DataFrame:
+        df = data.copy()
+        for name, values in columns.items():
+            df[name] = values
+        return df
+    
+    def add_moving_averages(self, data: pd.DataFrame, periods: List[int] = [5, 10, 20, 60]) -> pd.DataFrame:
+        """添加移动平均线"""
+        df = self._add_columns(data, self._moving_average_columns(_IndicatorInputs(data), periods))
+        logger.debug(f"移动平均线计算完成: {periods}")
+        return df
+    
+    def add_macd(self, data: pd.DataFrame, fast: int = 12, slow: int = 26, signal: int = 9) -> pd.DataFrame:
+        """添加MACD指标"""
+        df = self._add_columns(data, self._macd_columns(_IndicatorInputs(data), fast, slow, signal))
+        logger.debug("MACD指标计算完成")
+        return df
+    
+    def add_rsi(self, data: pd.DataFrame, period: int = 14) -> pd.DataFrame:
+        """添加RSI指标"""
+        df = self._add_columns(data, self._rsi_columns(_IndicatorInputs(data), period))
+        logger.debug(f"RSI指标计算完成: period={period}")
+        return df
+    
+    def add_bollinger_bands(self, data: pd.DataFrame, period: int = 20, std_dev: float = 2) -> pd.DataFrame:
+        """添加布林带"""
+        df = self._add_columns(data, self._bollinger_columns(_IndicatorInputs(data), period, std_dev))
+        logger.debug(f"布林带指标计算完成: period={period}, std_dev={std_dev}")
+        return df
+    
+    def add_kdj(self, data: pd.DataFrame, k_period: int = 9, d_period: int = 3, j_period: int = 3) -> pd.DataFrame:
+        """添加KDJ指标"""
+        df = self._add_columns(data, self._kdj_columns(_IndicatorInputs(data), k_period, d_period, j_period))
+        logger.debug(f"KDJ指标计算完成: K={k_period}, D={d_period}, J={j_period}")
+        return df
+    
+    def add_atr(self, data: pd.DataFrame, period: int = 14) -> pd.DataFrame:
+        """添加ATR（平均真实波幅）"""
+        df = self._add_columns(data, self._atr_columns(_IndicatorInputs(data), period))
+        logger.debug(f"ATR指标计算完成: period={period}")
+        return df
+    
+    def add_volume_indicators(self, data: pd.DataFrame) -> pd.DataFrame:
+        """添加成交量指标"""
+        df = self._add_columns(data, self._volume_columns(_IndicatorInputs(data)))
         logger.debug("成交量指标计算完成")
         return df
     
@@ -311,11 +447,12 @@ class TechnicalAnalyzer:
             logger.error(f"生成交易信号失败: {e}")
             return data
     
+    @memoize(ttl=300)
     def analyze_stock(self, symbol: str, data: pd.DataFrame) -> Dict[str, any]:
         """综合分析股票"""
         try:
-            # 计算所有技术指标
-            df = self.calculate_all_indicators(data)
+            # 计算所有技术指标（优先使用物化指标）
+            df = self.load_indicators(symbol, data)
             
             # 生成交易信号
             df = self.get_trading_signals(df)
@@ -5,21 +5,118 @@
 import sqlite3
 import hashlib
 import secrets
+import threading
+import time
 import uuid
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple
 from functools import wraps
 from flask import session, request, redirect, url_for, jsonify
 
 from utils.logger import logger
+from utils.config import config
 from core.storage import db_manager
 
 
+class SessionCache:
+    """
+    已验证会话的进程内TTL缓存
+
+    缓存 session_token -> user_id，条目在 ttl 秒或会话过期时间（取较早者）后失效；
+    本进程撤销会话时立即失效，其他进程撤销的会话最多延迟 ttl 秒生效。
+    最近访问时间先记录在内存中，由后台线程批量写库
+    """
+
+    def __init__(self, ttl: float = None, max_entries: int = None):
+        self.ttl = ttl if ttl is not None else config.get('AUTH.session_cache_ttl', 60)
+        self.max_entries = max_entries or config.get('AUTH.session_cache_max_entries', 10000)
+        # session_token -> (user_id, 缓存失效时间戳)
+        self._entries: Dict[str, Tuple[int, float]] = {}
+        # session_token -> 最近访问时间，等待批量写库
+        self._last_seen: Dict[str, str] = {}
+        self.counters = {'hits': 0, 'misses': 0, 'invalidations': 0}
+        self.lock = threading.Lock()
+
+    def get(self, session_token: str) -> Optional[int]:
+        """返回缓存的用户ID，未缓存或已失效返回 None"""
+        with self.lock:
+            entry = self._entries.get(session_token)
+            if entry is not None and entry[1] > time.time():
+                self.counters['hits'] += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[session_token]
+            self.counters['misses'] += 1
+            return None
+
+    def put(self, session_token: str, user_id: int, expires_at: datetime = None):
+        """缓存已验证的会话"""
+        valid_until = time.time() + self.ttl
+        if expires_at is not None:
+            valid_until = min(valid_until, expires_at.timestamp())
+        with self.lock:
+            if len(self._entries) >= self.max_entries:
+                now = time.time()
+                self._entries = {token: entry for token, entry in self._entries.items() if entry[1] > now}
+                if len(self._entries) >= self.max_entries:
+                    # 仍然超限时丢弃最早写入的一半
+                    tokens = list(self._entries)
+                    for token in tokens[:len(tokens) // 2]:
+                        del self._entries[token]
+            self._entries[session_token] = (user_id, valid_until)
+
+    def invalidate(self, session_token: str):
+        """使单个会话失效"""
+        with self.lock:
+            if self._entries.pop(session_token, None) is not None:
+                self.counters['invalidations'] += 1
+
+    def invalidate_user(self, user_id: int):
+        """使某个用户的全部会话失效"""
+        with self.lock:
+            tokens = [token for token, entry in self._entries.items() if entry[0] == user_id]
+            for token in tokens:
+                del self._entries[token]
+            self.counters['invalidations'] += len(tokens)
+
+    def clear(self):
+        with self.lock:
+            self._entries.clear()
+            self._last_seen.clear()
+
+    def touch(self, session_token: str):
+        """记录会话最近访问时间"""
+        with self.lock:
+            self._last_seen[session_token] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    def drain_last_seen(self) -> List[Tuple[str, str]]:
+        """取出待写库的最近访问时间 [(last_seen, session_token)]"""
+        with self.lock:
+            pending, self._last_seen = self._last_seen, {}
+        return [(seen, token) for token, seen in pending.items()]
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            stats = dict(self.counters, entries=len(self._entries), pending_last_seen=len(self._last_seen))
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        return stats
+
+
+# 进程内共享的会话缓存（各 UserManager 实例共用）
+session_cache = SessionCache()
+
+
 class UserManager:
     """用户管理器"""
     
-    def __init__(self):
+    # 后台维护线程（每个进程一个）
+    _maintenance_thread: Optional[threading.Thread] = None
+    _maintenance_lock = threading.Lock()
+    
+    def __init__(self, cache: SessionCache = None):
         self.db_path = db_manager.db_path
+        self.session_cache = cache or session_cache
         logger.info("用户管理器初始化完成")
     
     def _hash_password(self, password: str) -> str:
@@ -42,7 +139,7 @@ class UserManager:
         try:
             password_hash = self._hash_password(password)
             
-            with sqlite3.connect(self.db_path) as conn:
+            with db_manager.connection() as conn:
                 conn.execute('''
                     INSERT INTO users (username, password_hash, email, real_name, role)
                     VALUES (?, ?, ?, ?, ?)
@@ -61,7 +158,7 @@ class UserManager:
     def authenticate_user(self, username: str, password: str) -> Optional[Dict[str, Any]]:
         """用户认证"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with db_manager.connection() as conn:
                 conn.row_factory = sqlite3.Row
                 cursor = conn.execute('''
                     SELECT * FROM users 
@@ -97,7 +194,7 @@ class UserManager:
     def get_user_by_id(self, user_id: int) -> Optional[Dict[str, Any]]:
         """根据ID获取用户信息"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with db_manager.connection() as conn:
                 conn.row_factory = sqlite3.Row
                 cursor = conn.execute('''
                     SELECT * FROM users 
@@ -129,7 +226,7 @@ class UserManager:
             session_token = str(uuid.uuid4())
             expires_at = datetime.now() + timedelta(days=7)  # 7天过期
             
-            with sqlite3.connect(self.db_path) as conn:
+            with db_manager.connection() as conn:
                 # 清理过期会话
                 conn.execute('''
                     UPDATE user_sessions SET is_active = 0 
@@ -142,6 +239,7 @@ class UserManager:
                     VALUES (?, ?, ?)
                 ''', (user_id, session_token, expires_at))
                 
+            self.session_cache.put(session_token, user_id, expires_at)
             logger.info(f"用户会话创建成功: user_id={user_id}")
             return session_token
             
@@ -150,26 +248,46 @@ class UserManager:
             return None
     
     def validate_session(self, session_token: str) -> Optional[int]:
-        """验证会话"""
+        """验证会话，优先读取进程内缓存"""
+        if not session_token:
+            return None
+        
+        user_id = self.session_cache.get(session_token)
+        if user_id is not None:
+            self.session_cache.touch(session_token)
+            return user_id
+        
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with db_manager.connection() as conn:
                 cursor = conn.execute('''
-                    SELECT user_id FROM user_sessions 
+                    SELECT user_id, expires_at FROM user_sessions 
                     WHERE session_token = ? AND is_active = 1 
                     AND expires_at > CURRENT_TIMESTAMP
                 ''', (session_token,))
                 
                 result = cursor.fetchone()
-                return result[0] if result else None
                 
         except Exception as e:
             logger.error(f"验证会话失败: {e}")
             return None
+        
+        if not result:
+            return None
+        
+        user_id, expires_at = result
+        try:
+            expires_at = datetime.fromisoformat(str(expires_at))
+        except ValueError:
+            expires_at = None
+        self.session_cache.put(session_token, user_id, expires_at)
+        self.session_cache.touch(session_token)
+        return user_id
     
     def revoke_session(self, session_token: str):
         """撤销会话"""
+        self.session_cache.invalidate(session_token)
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with db_manager.connection() as conn:
                 conn.execute('''
                     UPDATE user_sessions SET is_active = 0 
                     WHERE session_token = ?
@@ -180,44 +298,93 @@ class UserManager:
         except Exception as e:
             logger.error(f"撤销会话失败: {e}")
     
+    def flush_last_seen(self) -> int:
+        """把缓存中的会话最近访问时间批量写库，返回写入的会话数"""
+        pending = self.session_cache.drain_last_seen()
+        if not pending:
+            return 0
+        try:
+            with db_manager.connection() as conn:
+                conn.executemany(
+                    "UPDATE user_sessions SET last_seen = ? WHERE session_token = ?", pending
+                )
+            return len(pending)
+        except Exception as e:
+            logger.error(f"写入会话访问时间失败: {e}")
+            return 0
+    
+    def purge_expired_sessions(self) -> int:
+        """删除已过期或已撤销的会话，返回删除的行数"""
+        try:
+            with db_manager.connection() as conn:
+                cursor = conn.execute('''
+                    DELETE FROM user_sessions 
+                    WHERE is_active = 0 OR expires_at < CURRENT_TIMESTAMP
+                ''')
+                purged = cursor.rowcount
+            if purged:
+                logger.info(f"清理了 {purged} 个过期会话")
+            return purged
+        except Exception as e:
+            logger.error(f"清理过期会话失败: {e}")
+            return 0
+    
+    def start_session_maintenance(self, flush_interval: float = None, purge_interval: float = None):
+        """启动后台线程：定期批量写入会话访问时间并清理过期会话（每个进程只启动一次）"""
+        flush_interval = flush_interval or config.get('AUTH.last_seen_flush_interval', 30)
+        purge_interval = purge_interval or config.get('AUTH.session_purge_interval', 3600)
+        
+        def run():
+            next_purge = time.monotonic()
+            while True:
+                time.sleep(flush_interval)
+                self.flush_last_seen()
+                if time.monotonic() >= next_purge:
+                    self.purge_expired_sessions()
+                    next_purge = time.monotonic() + purge_interval
+        
+        with UserManager._maintenance_lock:
+            if UserManager._maintenance_thread is None:
+                UserManager._maintenance_thread = threading.Thread(target=run, daemon=True)
+                UserManager._maintenance_thread.start()
+    
     def init_default_user(self):
         """初始化默认用户"""
         try:
-            # 检查是否已有管理员用户
-            with sqlite3.connect(self.db_path) as conn:
+            # 检查是否已有管理员用户和演示用户
+            # 先归还连接再创建用户，避免嵌套占用连接池
+            with db_manager.connection() as conn:
                 cursor = conn.execute('''
                     SELECT COUNT(*) FROM users WHERE role = 'admin'
                 ''')
-                
                 admin_count = cursor.fetchone()[0]
-                
-                if admin_count == 0:
-                    # 创建默认管理员用户
-                    self.create_user(
-                        username='admin',
-                        password='admin123',
-                        email='admin@finance.com',
-                        real_name='系统管理员',
-                        role='admin'
-                    )
-                    logger.info("默认管理员用户已创建: admin/admin123")
-                
-                # 创建默认普通用户（用于演示）
+
                 cursor = conn.execute('''
                     SELECT COUNT(*) FROM users WHERE username = 'demo'
                 ''')
-                
                 demo_count = cursor.fetchone()[0]
-                
-                if demo_count == 0:
-                    self.create_user(
-                        username='demo',
-                        password='demo123',
-                        email='demo@finance.com',
-                        real_name='演示用户',
-                        role='user'
-                    )
-                    logger.info("默认演示用户已创建: demo/demo123")
+
+            if admin_count == 0:
+                # 创建默认管理员用户
+                self.create_user(
+                    username='admin',
+                    password='admin123',
+                    email='admin@finance.com',
+                    real_name='系统管理员',
+                    role='admin'
+                )
+                logger.info("默认管理员用户已创建: admin/admin123")
+
+            # 创建默认普通用户（用于演示）
+            if demo_count == 0:
+                self.create_user(
+                    username='demo',
+                    password='demo123',
+                    email='demo@finance.com',
+                    real_name='演示用户',
+                    role='user'
+                )
+                logger.info("默认演示用户已创建: demo/demo123")
                     
         except Exception as e:
             logger.error(f"初始化默认用户失败: {e}")
@@ -233,8 +400,7 @@ def login_required(f):
                 return jsonify({'code': 401, 'message': '请先登录'}), 401
             return redirect(url_for('login'))
         
-        # 验证session token
-        user_manager = UserManager()
+        # 验证session token（使用全局实例，共享会话缓存）
         session_token = session.get('session_token')
         
         if not session_token or not user_manager.validate_session(session_token):
@@ -253,7 +419,6 @@ def admin_required(f):
     @wraps(f)
     @login_required
     def decorated_function(*args, **kwargs):
-        user_manager = UserManager()
         user_id = session.get('user_id')
         user = user_manager.get_user_by_id(user_id)
         
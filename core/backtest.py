@@ -11,6 +11,7 @@ import warnings
 warnings.filterwarnings('ignore')
 
 from utils.logger import logger
+from utils.config import config
 from core.analyzer import TechnicalAnalyzer
 from core.storage import db_manager
 
@@ -186,9 +187,22 @@ class Portfolio:
         return pd.DataFrame(data)
 
 
+def ratio_position_size(func):
+    """
+    标记 get_position_size 为“按 position_ratio 用现金整手买入、卖出信号全部卖出”的标准实现，
+    只有策略类实际使用的 get_position_size 带有该标记时回测引擎才走向量化执行路径
+    """
+    func.ratio_position_size = True
+    return func
+
+
 class Strategy(ABC):
     """策略基类"""
-    
+
+    # 买入信号时使用的现金比例。与带 @ratio_position_size 标记的 get_position_size 配合时，
+    # 回测引擎可据此走向量化执行路径；否则只能逐bar调用 get_position_size
+    position_ratio: Optional[float] = None
+
     def __init__(self, name: str):
         self.name = name
         self.analyzer = TechnicalAnalyzer()
@@ -229,6 +243,7 @@ class MAStrategy(Strategy):
         super().__init__(name)
         self.short_period = short_period
         self.long_period = long_period
+        self.position_ratio = 0.5
     
     def generate_signals(self, data: pd.DataFrame) -> pd.Series:
         """生成MA交叉信号"""
@@ -253,11 +268,12 @@ class MAStrategy(Strategy):
         
         return signals
     
+    @ratio_position_size
     def get_position_size(self, data: pd.DataFrame, signal: int, portfolio: Portfolio) -> int:
         """计算仓位大小（固定比例）"""
         if signal == 1:  # 买入信号
             # 使用50%资金买入
-            target_value = portfolio.cash * 0.5
+            target_value = portfolio.cash * self.position_ratio
             price = data['close'].iloc[-1]
             quantity = int(target_value / price / 100) * 100  # 按手数买入
             return quantity
@@ -278,6 +294,7 @@ class RSIStrategy(Strategy):
         self.rsi_period = rsi_period
         self.oversold = oversold
         self.overbought = overbought
+        self.position_ratio = 0.3
     
     def generate_signals(self, data: pd.DataFrame) -> pd.Series:
         """生成RSI信号"""
@@ -295,10 +312,11 @@ class RSIStrategy(Strategy):
         
         return signals
     
+    @ratio_position_size
     def get_position_size(self, data: pd.DataFrame, signal: int, portfolio: Portfolio) -> int:
         """计算仓位大小"""
         if signal == 1:  # 买入信号
-            target_value = portfolio.cash * 0.3  # 使用30%资金
+            target_value = portfolio.cash * self.position_ratio  # 使用30%资金
             price = data['close'].iloc[-1]
             quantity = int(target_value / price / 100) * 100
             return quantity
@@ -311,11 +329,30 @@ class RSIStrategy(Strategy):
 
 
 class BacktestEngine:
-    """回测引擎"""
-    
-    def __init__(self, initial_capital: float = 1000000, commission_rate: float = 0.0003):
+    """回测引擎
+
+    支持两种执行模式：
+        - vectorized: 向量化执行，净值曲线按数组整体计算，只在有信号的bar上推进持仓状态
+        - loop: 逐bar循环执行，作为参考实现，适用于任意自定义仓位规则的策略
+    """
+
+    ENGINES = ('vectorized', 'loop')
+    # A股交易单位（股/手）
+    lot_size = 100
+
+    def __init__(self, initial_capital: float = None, commission_rate: float = None, engine: str = None):
+        if initial_capital is None:
+            initial_capital = config.get('BACKTEST.initial_capital', 1000000)
+        if commission_rate is None:
+            commission_rate = config.get('BACKTEST.commission_rate', 0.0003)
+        if engine is None:
+            engine = config.get('BACKTEST.engine', 'vectorized')
+        if engine not in self.ENGINES:
+            raise ValueError(f"不支持的回测执行模式: {engine}")
+
         self.initial_capital = initial_capital
         self.commission_rate = commission_rate
+        self.engine = engine
         logger.info("回测引擎初始化完成")
     
     def run_backtest(self, 
@@ -323,7 +360,9 @@ class BacktestEngine:
                     data: pd.DataFrame,
                     symbol: str,
                     start_date: str = None,
-                    end_date: str = None) -> Dict[str, Any]:
+                    end_date: str = None,
+                    engine: str = None,
+                    indicators_ready: bool = False) -> Dict[str, Any]:
         """
         运行回测
         
@@ -333,6 +372,9 @@ class BacktestEngine:
             symbol: 股票代码
             start_date: 开始日期
             end_date: 结束日期
+            engine: 执行模式（vectorized/loop），默认使用引擎配置；
+                    策略未设置 position_ratio 或自定义了 get_position_size 时自动使用 loop
+            indicators_ready: data 已包含 calculate_all_indicators 的结果时跳过重复计算
         """
         try:
             logger.info(f"开始回测策略: {strategy.name}, 股票: {symbol}")
@@ -344,59 +386,185 @@ class BacktestEngine:
             if end_date:
                 df = df[df.index <= end_date]
             
-            # 初始化投资组合
-            portfolio = Portfolio(self.initial_capital, self.commission_rate)
-            
             # 计算技术指标
-            df = strategy.analyzer.calculate_all_indicators(df)
+            if not indicators_ready:
+                df = strategy.analyzer.calculate_all_indicators(df)
             
             # 生成交易信号
             signals = strategy.generate_signals(df)
-            
-            # 回测循环
-            equity_curve = []
-            daily_returns = []
-            
-            for i, (date, row) in enumerate(df.iterrows()):
-                current_price = row['close']
-                
-                # 更新持仓价格
-                portfolio.update_prices({symbol: current_price}, date)
-                
-                # 记录净值
-                portfolio_value = portfolio.total_value
-                equity_curve.append(portfolio_value)
-                
-                # 计算日收益率
-                if i > 0:
-                    daily_return = (portfolio_value - prev_value) / prev_value
-                    daily_returns.append(daily_return)
-                else:
-                    daily_returns.append(0)
-                
-                prev_value = portfolio_value
-                
-                # 执行交易信号
-                if i < len(signals) and signals.iloc[i] != 0:
-                    signal = signals.iloc[i]
-                    quantity = strategy.get_position_size(df.iloc[i:i+1], signal, portfolio)
-                    
-                    if signal == 1 and quantity > 0:  # 买入
-                        portfolio.buy(symbol, quantity, current_price, date)
-                    elif signal == -1 and quantity > 0:  # 卖出
-                        portfolio.sell(symbol, quantity, current_price, date)
+
+            engine = engine or self.engine
+            if engine not in self.ENGINES:
+                raise ValueError(f"不支持的回测执行模式: {engine}")
+            if engine == 'vectorized' and not self.supports_vectorized(strategy):
+                logger.debug(f"策略 {strategy.name} 使用自定义仓位规则，使用逐bar执行")
+                engine = 'loop'
+
+            if engine == 'vectorized':
+                portfolio, equity_curve, daily_returns = self._execute_vectorized(strategy, df, signals, symbol)
+            else:
+                portfolio, equity_curve, daily_returns = self._execute_loop(strategy, df, signals, symbol)
             
             # 计算回测结果
             results = self._calculate_performance_metrics(
                 portfolio, equity_curve, daily_returns, df.index, strategy.name, symbol
             )
+            results['engine'] = engine
             
-            logger.info(f"回测完成: {strategy.name}")
+            logger.info(f"回测完成: {strategy.name} ({engine})")
             return results
             
         except Exception as e:
             logger.error(f"回测运行失败: {e}")
             raise
+
+    @staticmethod
+    def supports_vectorized(strategy: Strategy) -> bool:
+        """策略设置了 position_ratio 且实际使用带 @ratio_position_size 标记的仓位规则"""
+        sizing = getattr(type(strategy), 'get_position_size', None)
+        return strategy.position_ratio is not None and getattr(sizing, 'ratio_position_size', False)
+
+    def _execute_loop(self,
+                      strategy: Strategy,
+                      df: pd.DataFrame,
+                      signals: pd.Series,
+                      symbol: str) -> Tuple[Portfolio, List[float], List[float]]:
+        """逐bar执行回测（参考实现）"""
+        portfolio = Portfolio(self.initial_capital, self.commission_rate)
+        equity_curve = []
+        daily_returns = []
+        
+        for i, (date, row) in enumerate(df.iterrows()):
+            current_price = row['close']
+            
+            # 更新持仓价格
+            portfolio.update_prices({symbol: current_price}, date)
+            
+            # 记录净值
+            portfolio_value = portfolio.total_value
+            equity_curve.append(portfolio_value)
+            
+            # 计算日收益率
+            if i > 0:
+                daily_return = (portfolio_value - prev_value) / prev_value
+                daily_returns.append(daily_return)
+            else:
+                daily_returns.append(0)
+            
+            prev_value = portfolio_value
+            
+            # 执行交易信号
+            if i < len(signals) and signals.iloc[i] != 0:
+                signal = signals.iloc[i]
+                window = df.iloc[i:i+1]
+                # 策略通过 data.name 识别要卖出的股票代码
+                window.name = symbol
+                quantity = strategy.get_position_size(window, signal, portfolio)
+                
+                if signal == 1 and quantity > 0:  # 买入
+                    portfolio.buy(symbol, quantity, current_price, date)
+                elif signal == -1 and quantity > 0:  # 卖出
+                    portfolio.sell(symbol, quantity, current_price, date)
+
+        return portfolio, equity_curve, daily_returns
+
+    def _execute_vectorized(self,
+                            strategy: Strategy,
+                            df: pd.DataFrame,
+                            signals: pd.Series,
+                            symbol: str) -> Tuple[Portfolio, np.ndarray, np.ndarray]:
+        """向量化执行回测
+
+        仓位规则为：买入信号按 position_ratio 使用现金整手（100股）买入，
+        资金不足（含手续费）时放弃；卖出信号全部卖出。交易以当日收盘价成交，
+        当日净值按交易前持仓计算，与逐bar执行结果一致。
+        """
+        dates = df.index
+        close = df['close'].to_numpy(dtype=float)
+        n = len(close)
+
+        sig = np.zeros(n, dtype=np.int64)
+        raw = np.nan_to_num(np.asarray(signals.to_numpy()[:n], dtype=float))
+        sig[:len(raw)] = raw.astype(np.int64)
+
+        ratio = strategy.position_ratio
+        rate = self.commission_rate
+        cash = float(self.initial_capital)
+        quantity_held = 0
+        entry_price = 0.0
+        entry_date = None
+        trades: List[Trade] = []
+
+        # 仓位只在信号bar上变化：依次推进这些事件，记录每个事件之后的现金与持股
+        cash_after = np.full(n, np.nan)
+        qty_after = np.zeros(n, dtype=np.int64)
+        changed = np.zeros(n, dtype=bool)
+
+        for i in np.flatnonzero((sig == 1) | (sig == -1)):
+            price = close[i]
+            date = dates[i]
+
+            if sig[i] == 1:
+                if not price > 0:
+                    continue
+                quantity = int(cash * ratio / price / 100) * 100
+                if quantity <= 0:
+                    continue
+                commission = quantity * price * rate
+                total_cost = quantity * price + commission
+                if cash < total_cost:
+                    continue
+                if quantity_held > 0:
+                    new_quantity = quantity_held + quantity
+                    entry_price = (quantity_held * entry_price + quantity * price) / new_quantity
+                    quantity_held = new_quantity
+                else:
+                    quantity_held = quantity
+                    entry_price = price
+                    entry_date = date
+                cash -= total_cost
+                trades.append(Trade(symbol, 'BUY', quantity, price, date, commission))
+            else:
+                if quantity_held <= 0:
+                    continue
+                quantity = quantity_held
+                commission = quantity * price * rate
+                cash += quantity * price - commission
+                quantity_held = 0
+                trades.append(Trade(symbol, 'SELL', quantity, price, date, commission))
+
+            cash_after[i] = cash
+            qty_after[i] = quantity_held
+            changed[i] = True
+
+        # 每个bar交易前的状态 = 上一个发生变化的bar之后的状态
+        last_change = np.maximum.accumulate(np.where(changed, np.arange(n), -1))
+        before = np.empty(n, dtype=np.int64)
+        before[0] = -1
+        before[1:] = last_change[:-1]
+        has_state = before >= 0
+        safe_before = np.where(has_state, before, 0)
+
+        cash_before = np.where(has_state, cash_after[safe_before], float(self.initial_capital))
+        qty_before = np.where(has_state, qty_after[safe_before], 0)
+
+        positions_value = np.where(qty_before != 0, qty_before * close, 0.0)
+        equity_curve = cash_before + positions_value
+
+        daily_returns = np.zeros(n)
+        if n > 1:
+            daily_returns[1:] = (equity_curve[1:] - equity_curve[:-1]) / equity_curve[:-1]
+
+        # 组装最终的投资组合，供绩效统计使用
+        portfolio = Portfolio(self.initial_capital, self.commission_rate)
+        portfolio.cash = cash
+        portfolio.trades = trades
+        if quantity_held > 0:
+            position = Position(symbol, quantity_held, entry_price, entry_date)
+            position.update_price(close[-1], dates[-1])
+            portfolio.positions[symbol] = position
+
+        return portfolio, equity_curve, daily_returns
     
     def _calculate_performance_metrics(self, 
                                      portfolio: Portfolio, 
@@ -438,16 +606,19 @@ class BacktestEngine:
         # 计算盈利交易
         profitable_trades = 0
         if total_trades > 1:
-            buy_trades = [t for t in trades if t.action == 'BUY']
-            sell_trades = [t for t in trades if t.action == 'SELL']
-            
-            for sell_trade in sell_trades:
-                # 找到对应的买入交易（简化处理，假设FIFO）
-                for buy_trade in buy_trades:
-                    if buy_trade.symbol == sell_trade.symbol and buy_trade.date <= sell_trade.date:
-                        if sell_trade.price > buy_trade.price:
-                            profitable_trades += 1
-                        break
+            # 每只股票的首笔买入（简化处理，假设FIFO）；交易按时间顺序记录
+            first_buys = {}
+            for trade in trades:
+                if trade.action == 'BUY':
+                    first_buys.setdefault(trade.symbol, trade)
+
+            for sell_trade in trades:
+                if sell_trade.action != 'SELL':
+                    continue
+                buy_trade = first_buys.get(sell_trade.symbol)
+                if buy_trade is not None and buy_trade.date <= sell_trade.date:
+                    if sell_trade.price > buy_trade.price:
+                        profitable_trades += 1
         
         win_rate = profitable_trades / (total_trades // 2) if total_trades > 1 else 0
         
@@ -472,106 +643,241 @@ class BacktestEngine:
         
         return results
     
-    def run_multi_stock_backtest(self, 
+    def run_multi_stock_backtest(self,
                                strategy: Strategy,
                                stock_data: Dict[str, pd.DataFrame],
-                               weights: Dict[str, float] = None) -> Dict[str, Any]:
+                               weights: Dict[str, float] = None,
+                               start_date: str = None,
+                               end_date: str = None,
+                               rebalance_days: int = None,
+                               indicators_ready: bool = False) -> Dict[str, Any]:
         """
         多股票组合回测
-        
+
+        各股票分别计算指标和信号，然后对齐到所有股票交易日的并集上，
+        交由 run_portfolio_backtest 按矩阵执行。某只股票没有行情的日期视为停牌，
+        当日不可交易，持仓按最近收盘价估值
+
         Args:
             strategy: 交易策略
             stock_data: 多只股票数据 {symbol: DataFrame}
-            weights: 股票权重 {symbol: weight}
+            weights: 股票权重 {symbol: weight}，默认等权
+            start_date: 开始日期
+            end_date: 结束日期
+            rebalance_days: 每隔多少个交易日把持有中的股票调回目标权重，默认只在信号日交易
+            indicators_ready: stock_data 已包含 calculate_all_indicators 的结果时跳过重复计算
         """
         try:
-            logger.info(f"开始多股票回测: {strategy.name}")
-            
-            if weights is None:
-                # 等权重分配
-                n_stocks = len(stock_data)
-                weights = {symbol: 1.0/n_stocks for symbol in stock_data.keys()}
-            
-            # 初始化组合投资组合
-            portfolio = Portfolio(self.initial_capital, self.commission_rate)
-            
-            # 获取所有日期的交集
-            all_dates = None
-            for symbol, data in stock_data.items():
-                if all_dates is None:
-                    all_dates = set(data.index)
-                else:
-                    all_dates = all_dates.intersection(set(data.index))
-            
-            all_dates = sorted(list(all_dates))
-            
-            # 为每只股票生成信号
-            all_signals = {}
+            logger.info(f"开始多股票回测: {strategy.name}, {len(stock_data)} 只股票")
+
+            closes, volumes, signals = {}, {}, {}
             for symbol, data in stock_data.items():
-                df = strategy.analyzer.calculate_all_indicators(data)
-                all_signals[symbol] = strategy.generate_signals(df)
-            
-            # 回测循环
-            equity_curve = []
-            daily_returns = []
-            
-            for i, date in enumerate(all_dates):
-                # 更新所有持仓价格
-                current_prices = {}
-                for symbol, data in stock_data.items():
-                    if date in data.index:
-                        current_prices[symbol] = data.loc[date, 'close']
-                
-                portfolio.update_prices(current_prices, date)
-                
-                # 记录净值
-                portfolio_value = portfolio.total_value
-                equity_curve.append(portfolio_value)
-                
-                # 计算日收益率
-                if i > 0:
-                    daily_return = (portfolio_value - prev_value) / prev_value
-                    daily_returns.append(daily_return)
-                else:
-                    daily_returns.append(0)
-                
-                prev_value = portfolio_value
-                
-                # 执行交易信号
-                for symbol in stock_data.keys():
-                    if date in all_signals[symbol].index and all_signals[symbol].loc[date] != 0:
-                        signal = all_signals[symbol].loc[date]
-                        price = current_prices[symbol]
-                        
-                        # 计算目标仓位
-                        target_value = portfolio.total_value * weights[symbol]
-                        current_value = portfolio.positions[symbol].market_value if symbol in portfolio.positions else 0
-                        
-                        if signal == 1:  # 买入信号
-                            if current_value < target_value:
-                                buy_value = target_value - current_value
-                                quantity = int(buy_value / price / 100) * 100
-                                if quantity > 0:
-                                    portfolio.buy(symbol, quantity, price, date)
-                        
-                        elif signal == -1:  # 卖出信号
-                            if symbol in portfolio.positions:
-                                quantity = portfolio.positions[symbol].quantity
-                                portfolio.sell(symbol, quantity, price, date)
-            
-            # 计算回测结果
-            results = self._calculate_performance_metrics(
-                portfolio, equity_curve, daily_returns, 
-                pd.DatetimeIndex(all_dates), strategy.name, "Portfolio"
-            )
-            
-            logger.info(f"多股票回测完成: {strategy.name}")
-            return results
-            
+                df = data.copy()
+                df.index = pd.to_datetime(df.index)
+                if start_date:
+                    df = df[df.index >= start_date]
+                if end_date:
+                    df = df[df.index <= end_date]
+                if df.empty:
+                    continue
+                if not indicators_ready:
+                    df = strategy.analyzer.calculate_all_indicators(df)
+                closes[symbol] = df['close']
+                if 'volume' in df.columns:
+                    volumes[symbol] = df['volume']
+                raw = np.asarray(strategy.generate_signals(df))[:len(df)]
+                signals[symbol] = pd.Series(raw, index=df.index[:len(raw)])
+
+            if not closes:
+                raise ValueError("没有可用于回测的股票数据")
+
+            # 按日期并集对齐；缺失值即停牌
+            prices = pd.concat(closes, axis=1).sort_index()
+            signal_matrix = pd.concat(signals, axis=1).reindex(prices.index)
+            tradable = None
+            if len(volumes) == len(closes):
+                tradable = pd.concat(volumes, axis=1).reindex(prices.index) > 0
+
+            return self.run_portfolio_backtest(prices, signal_matrix, weights, tradable,
+                                               rebalance_days, strategy.name)
+
         except Exception as e:
             logger.error(f"多股票回测失败: {e}")
             raise
-    
+
+    def run_portfolio_backtest(self,
+                               prices: pd.DataFrame,
+                               signals: pd.DataFrame,
+                               weights: Dict[str, float] = None,
+                               tradable: pd.DataFrame = None,
+                               rebalance_days: int = None,
+                               strategy_name: str = "组合策略") -> Dict[str, Any]:
+        """
+        基于 日期×股票 矩阵的组合回测
+
+        可直接使用 db_manager.get_price_matrix 得到的全市场价格矩阵。交易规则：
+            - 信号日先卖后买，均以当日收盘价成交，成交数量按手（lot_size 股）取整
+            - 卖出信号清仓；买入信号把仓位补足到 目标权重×组合净值，已超配时不减仓
+            - 设置 rebalance_days 时，每隔该天数把所有持有状态的股票调整到目标权重
+            - 现金不足以完成全部买单时，按股票顺序依次成交，买不起的跳过
+            - 不可交易（停牌、无价格、成交量为0）的股票当日信号忽略
+
+        Args:
+            prices: 收盘价矩阵，索引为日期，列为股票代码，NaN 表示当日无行情
+            signals: 信号矩阵（1买入/-1卖出/0持有），会对齐到 prices
+            weights: 股票权重 {symbol: weight}，默认等权
+            tradable: 可交易掩码矩阵，默认有价格即可交易
+            rebalance_days: 定期调仓间隔（交易日）
+            strategy_name: 结果中的策略名称
+        """
+        prices = prices.sort_index()
+        prices.index = pd.to_datetime(prices.index)
+        symbols = list(prices.columns)
+
+        close = prices.to_numpy(dtype=float)
+        sig = signals.reindex(index=prices.index, columns=symbols).fillna(0).to_numpy(dtype=float)
+        sig = np.sign(sig).astype(np.int8)
+
+        valid = np.isfinite(close) & (close > 0)
+        if tradable is not None:
+            mask = tradable.reindex(index=prices.index, columns=symbols)
+            valid &= mask.fillna(False).to_numpy(dtype=bool)
+
+        if weights is None:
+            w = np.full(len(symbols), 1.0 / len(symbols))
+        else:
+            w = np.array([weights.get(symbol, 0.0) for symbol in symbols], dtype=float)
+
+        portfolio, equity_curve = self._execute_portfolio(prices.index, symbols, close, sig, valid, w,
+                                                          rebalance_days)
+
+        daily_returns = np.zeros(len(equity_curve))
+        if len(equity_curve) > 1:
+            daily_returns[1:] = (equity_curve[1:] - equity_curve[:-1]) / equity_curve[:-1]
+
+        results = self._calculate_performance_metrics(
+            portfolio, equity_curve, daily_returns, prices.index, strategy_name, "Portfolio"
+        )
+        results['engine'] = 'vectorized'
+        results['symbol_count'] = len(symbols)
+
+        logger.info(f"组合回测完成: {strategy_name}, {len(symbols)} 只股票, {len(prices)} 个交易日")
+        return results
+
+    def _execute_portfolio(self,
+                           dates: pd.DatetimeIndex,
+                           symbols: List[str],
+                           close: np.ndarray,
+                           sig: np.ndarray,
+                           valid: np.ndarray,
+                           weights: np.ndarray,
+                           rebalance_days: int = None) -> Tuple[Portfolio, np.ndarray]:
+        """矩阵化执行组合回测
+
+        持仓只在有信号或调仓的日期变化：在这些日期上以向量运算处理全部股票的买卖，
+        两个事件之间的净值用 估值价格矩阵 @ 持股向量 一次算出
+        """
+        n_days, n_symbols = close.shape
+        lot = self.lot_size
+        rate = self.commission_rate
+        columns = np.arange(n_symbols)
+
+        # 估值价格：停牌日沿用最近一个收盘价，上市前为0
+        has_price = np.isfinite(close) & (close > 0)
+        last_row = np.maximum.accumulate(np.where(has_price, np.arange(n_days)[:, None], -1), axis=0)
+        mark = np.where(last_row >= 0, close[np.maximum(last_row, 0), columns], 0.0)
+
+        sig = np.where(valid, sig, 0)
+
+        rebalance = np.zeros(n_days, dtype=bool)
+        held_state = None
+        if rebalance_days:
+            rebalance[::rebalance_days] = True
+            # 持有状态：最近一次信号为买入
+            last_signal = np.maximum.accumulate(np.where(sig != 0, np.arange(n_days)[:, None], -1), axis=0)
+            held_state = (last_signal >= 0) & (sig[np.maximum(last_signal, 0), columns] == 1)
+
+        cash = float(self.initial_capital)
+        qty = np.zeros(n_symbols, dtype=np.int64)
+        entry_price = np.zeros(n_symbols)
+        entry_day = np.full(n_symbols, -1, dtype=np.int64)
+        equity_curve = np.empty(n_days)
+        records: List[tuple] = []
+
+        start = 0
+        for t in np.flatnonzero((sig != 0).any(axis=1) | rebalance):
+            # 事件日净值按交易前持仓计算
+            equity_curve[start:t + 1] = cash + mark[start:t + 1] @ qty
+            start = t + 1
+
+            ok = valid[t]
+            price = np.where(ok, close[t], np.nan)
+            rebalancing = rebalance[t]
+
+            # 卖出：卖出信号清仓，调仓日减持超配部分
+            sell = np.where(ok & (sig[t] == -1), qty, 0)
+            if rebalancing:
+                target = np.where(held_state[t], np.nan_to_num(equity_curve[t] * weights / price) // lot * lot, 0)
+                sell = np.maximum(sell, np.where(ok, qty - target.astype(np.int64), 0))
+            sell = np.clip(sell, 0, qty)
+            if sell.any():
+                idx = np.flatnonzero(sell)
+                value = sell[idx] * price[idx]
+                commission = value * rate
+                cash += float((value - commission).sum())
+                qty[idx] -= sell[idx]
+                entry_price[idx[qty[idx] == 0]] = 0.0
+                records.append((t, idx, 'SELL', sell[idx], price[idx], commission))
+
+            # 买入：补足到目标市值
+            wanted = ok & (sig[t] == 1)
+            if rebalancing:
+                wanted |= ok & held_state[t]
+            if not wanted.any():
+                continue
+            total_value = cash + mark[t] @ qty
+            gap = np.where(wanted, total_value * weights - qty * np.nan_to_num(price), 0.0)
+            buy = np.where(gap > 0, np.nan_to_num(gap / price) // lot * lot, 0).astype(np.int64)
+            idx = np.flatnonzero(buy)
+            if len(idx) == 0:
+                continue
+            value = buy[idx] * price[idx]
+            cost = value * (1 + rate)
+            if cost.sum() > cash:
+                # 现金不足：按股票顺序依次成交
+                keep = np.zeros(len(idx), dtype=bool)
+                remaining = cash
+                for k in range(len(idx)):
+                    if cost[k] <= remaining:
+                        keep[k] = True
+                        remaining -= cost[k]
+                idx, value, cost = idx[keep], value[keep], cost[keep]
+                if len(idx) == 0:
+                    continue
+            bought = buy[idx]
+            cash -= float(cost.sum())
+            new_qty = qty[idx] + bought
+            entry_price[idx] = (qty[idx] * entry_price[idx] + value) / new_qty
+            entry_day[idx] = np.where(qty[idx] == 0, t, entry_day[idx])
+            qty[idx] = new_qty
+            records.append((t, idx, 'BUY', bought, price[idx], value * rate))
+
+        equity_curve[start:] = cash + mark[start:] @ qty
+
+        # 组装最终的投资组合，供绩效统计使用
+        portfolio = Portfolio(self.initial_capital, self.commission_rate)
+        portfolio.cash = cash
+        for t, idx, action, quantities, trade_prices, commissions in records:
+            for s, quantity, trade_price, commission in zip(idx, quantities, trade_prices, commissions):
+                portfolio.trades.append(Trade(symbols[s], action, int(quantity), float(trade_price),
+                                              dates[t], float(commission)))
+        for s in np.flatnonzero(qty):
+            position = Position(symbols[s], int(qty[s]), float(entry_price[s]), dates[entry_day[s]])
+            position.update_price(float(mark[-1, s]), dates[-1])
+            portfolio.positions[symbols[s]] = position
+
+        return portfolio, equity_curve
+
     def save_backtest_result(self, results: Dict[str, Any]) -> int:
         """保存回测结果到数据库"""
         try:
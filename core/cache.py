@@ -0,0 +1,455 @@
+"""
+分级缓存模块
+进程内有界LRU内存缓存在前，磁盘或Redis作为后端存储，
+缓存条目为单个二进制块：固定长度的过期时间头 + pickle数据
+"""
+import copy
+import functools
+import hashlib
+import os
+import pickle
+import struct
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+import pandas as pd
+
+from utils.logger import logger
+from utils.config import config
+
+
+# 条目头：4字节魔数 + 8字节过期时间戳（小端 double）
+_MAGIC = b'FDC1'
+_HEADER = struct.Struct('<4sd')
+
+
+def pack_entry(value: Any, expires_at: float) -> bytes:
+    """序列化缓存条目"""
+    return _HEADER.pack(_MAGIC, expires_at) + pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def read_expiry(blob: bytes) -> Optional[float]:
+    """读取条目头中的过期时间，格式不合法返回 None"""
+    if len(blob) < _HEADER.size:
+        return None
+    magic, expires_at = _HEADER.unpack_from(blob)
+    return expires_at if magic == _MAGIC else None
+
+
+def unpack_entry(blob: bytes) -> Any:
+    """反序列化缓存条目数据部分"""
+    return pickle.loads(blob[_HEADER.size:])
+
+
+class MemoryLRU:
+    """按条目数和字节数双重限制的LRU缓存（非线程安全，由 CacheManager 加锁）"""
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.evictions = 0
+        # key -> (value, expires_at, size)
+        self._items: 'OrderedDict[str, Tuple[Any, float, int]]' = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, key: str, now: float) -> Tuple[bool, Any]:
+        """返回 (是否命中, 值)，过期条目直接删除"""
+        item = self._items.get(key)
+        if item is None:
+            return False, None
+        value, expires_at, _ = item
+        if now > expires_at:
+            self.delete(key)
+            return False, None
+        self._items.move_to_end(key)
+        return True, value
+
+    def set(self, key: str, value: Any, expires_at: float, size: int):
+        self.delete(key)
+        if size > self.max_bytes:
+            # 单个条目超过内存上限，只保存在后端
+            return
+        self._items[key] = (value, expires_at, size)
+        self.total_bytes += size
+        while len(self._items) > self.max_entries or self.total_bytes > self.max_bytes:
+            _, (_, _, evicted_size) = self._items.popitem(last=False)
+            self.total_bytes -= evicted_size
+            self.evictions += 1
+
+    def delete(self, key: str):
+        item = self._items.pop(key, None)
+        if item is not None:
+            self.total_bytes -= item[2]
+
+    def clear_expired(self, now: float) -> int:
+        expired = [key for key, (_, expires_at, _) in self._items.items() if now > expires_at]
+        for key in expired:
+            self.delete(key)
+        return len(expired)
+
+    def clear(self):
+        self._items.clear()
+        self.total_bytes = 0
+
+
+class DiskCacheBackend:
+    """磁盘缓存后端：每个键一个文件，文件名为键的SHA1"""
+
+    name = 'disk'
+
+    def __init__(self, cache_dir: str = "data/cache"):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{hashlib.sha1(key.encode('utf-8')).hexdigest()}.cache"
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def set(self, key: str, blob: bytes, ttl: float):
+        path = self._path(key)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(blob)
+        # 原子替换，并发读取不会看到写了一半的文件
+        os.replace(tmp_path, path)
+
+    def delete(self, key: str):
+        try:
+            self._path(key).unlink()
+        except FileNotFoundError:
+            pass
+
+    def clear_expired(self, now: float) -> int:
+        """只读取每个文件的条目头判断是否过期；旧格式的 .cache/.meta 文件一并清理"""
+        cleared = 0
+        for path in self.cache_dir.glob("*.meta"):
+            path.unlink(missing_ok=True)
+        for path in self.cache_dir.glob("*.cache"):
+            try:
+                with open(path, 'rb') as f:
+                    expires_at = read_expiry(f.read(_HEADER.size))
+                if expires_at is None or now > expires_at:
+                    path.unlink(missing_ok=True)
+                    cleared += 1
+            except OSError as e:
+                logger.warning(f"清理缓存文件 {path} 时出错: {e}")
+        return cleared
+
+    def clear(self):
+        for path in self.cache_dir.glob("*.cache"):
+            path.unlink(missing_ok=True)
+
+
+class RedisCacheBackend:
+    """Redis缓存后端，过期由Redis原生TTL处理"""
+
+    name = 'redis'
+
+    def __init__(self, client=None, prefix: str = None):
+        """
+        Args:
+            client: redis.Redis 兼容客户端（需支持 get/set(ex=)/delete/scan_iter），
+                默认按 config.yml 的 REDIS 配置创建
+            prefix: 键前缀，用于与其他应用共用同一个Redis库
+        """
+        if client is None:
+            import redis
+            client = redis.Redis(
+                host=config.get('REDIS.host', 'localhost'),
+                port=config.get('REDIS.port', 6379),
+                db=config.get('REDIS.db', 0),
+                password=config.get('REDIS.password'),
+                socket_timeout=config.get('REDIS.socket_timeout', 2),
+            )
+            client.ping()
+        self.client = client
+        self.prefix = prefix or config.get('REDIS.key_prefix', 'fds:cache:')
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(self.prefix + key)
+
+    def set(self, key: str, blob: bytes, ttl: float):
+        self.client.set(self.prefix + key, blob, ex=max(1, int(ttl + 0.999)))
+
+    def delete(self, key: str):
+        self.client.delete(self.prefix + key)
+
+    def clear_expired(self, now: float) -> int:
+        return 0
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=self.prefix + '*'))
+        if keys:
+            self.client.delete(*keys)
+
+
+def _create_backend(name: str, cache_dir: str):
+    """按名称创建后端，Redis不可用时退回磁盘"""
+    if name == 'none':
+        return None
+    if name == 'redis':
+        try:
+            return RedisCacheBackend()
+        except Exception as e:
+            logger.warning(f"Redis缓存不可用，改用磁盘缓存: {e}")
+    return DiskCacheBackend(cache_dir)
+
+
+def _key_parts(value: Any) -> Iterator[bytes]:
+    """生成参数的键片段
+
+    基本类型和容器按值区分，DataFrame/Series 按内容哈希区分，
+    其他对象（如方法的 self）只按类型区分
+    """
+    if value is None or isinstance(value, (bool, int, float, str, bytes)):
+        yield repr(value).encode('utf-8')
+    elif isinstance(value, (list, tuple)):
+        yield b'['
+        for item in value:
+            yield from _key_parts(item)
+            yield b','
+        yield b']'
+    elif isinstance(value, dict):
+        yield b'{'
+        for k in sorted(value, key=repr):
+            yield repr(k).encode('utf-8')
+            yield b':'
+            yield from _key_parts(value[k])
+            yield b','
+        yield b'}'
+    elif isinstance(value, (pd.DataFrame, pd.Series)):
+        yield type(value).__name__.encode('utf-8')
+        if isinstance(value, pd.DataFrame):
+            yield repr(list(value.columns)).encode('utf-8')
+        yield pd.util.hash_pandas_object(value, index=True).values.tobytes()
+    else:
+        yield f"<{type(value).__module__}.{type(value).__qualname__}>".encode('utf-8')
+
+
+def make_key(prefix: str, args: tuple, kwargs: Dict[str, Any]) -> str:
+    """由函数名和调用参数生成缓存键"""
+    digest = hashlib.sha1()
+    for part in _key_parts((args, kwargs)):
+        digest.update(part)
+    return f"{prefix}:{digest.hexdigest()}"
+
+
+def _cacheable(value: Any) -> bool:
+    """None 和空结果不缓存（通常表示数据获取失败）"""
+    if value is None:
+        return False
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return not value.empty
+    if isinstance(value, (dict, list, tuple)):
+        return len(value) > 0
+    return True
+
+
+def _copy_result(value: Any) -> Any:
+    """DataFrame/Series 和可变容器结果返回副本，避免调用方修改缓存中的对象"""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.copy()
+    if isinstance(value, (dict, list, set)):
+        return copy.deepcopy(value)
+    return value
+
+
+class CacheManager:
+    """分级缓存管理器：内存LRU + 磁盘/Redis后端"""
+
+    def __init__(self,
+                 cache_dir: str = None,
+                 backend=None,
+                 max_entries: int = None,
+                 max_memory_mb: float = None):
+        """
+        Args:
+            cache_dir: 磁盘后端目录
+            backend: 'disk' / 'redis' / 'none' 或后端实例，默认读取 CACHE.backend
+            max_entries: 内存缓存最大条目数
+            max_memory_mb: 内存缓存最大占用（按序列化大小估算）
+        """
+        cache_dir = cache_dir or config.get('CACHE.dir', 'data/cache')
+        if backend is None or isinstance(backend, str):
+            backend = _create_backend(backend or config.get('CACHE.backend', 'disk'), cache_dir)
+        self.backend = backend
+
+        max_entries = max_entries or config.get('CACHE.memory_max_entries', 1024)
+        max_memory_mb = max_memory_mb or config.get('CACHE.memory_max_mb', 256)
+        self.memory = MemoryLRU(max_entries, int(max_memory_mb * 1024 * 1024))
+
+        self.default_ttl = config.get('REDIS.cache_ttl', 3600)  # 默认1小时
+        self.memoize_enabled = config.get('CACHE.memoize', True)
+
+        self.lock = threading.Lock()
+        self.counters = {'memory_hits': 0, 'backend_hits': 0, 'misses': 0, 'sets': 0, 'expired': 0, 'errors': 0}
+        backend_name = self.backend.name if self.backend else 'none'
+        logger.info(f"缓存管理器初始化完成: 后端 {backend_name}, 内存上限 {max_entries} 条/{max_memory_mb}MB")
+
+    def _count(self, name: str):
+        with self.lock:
+            self.counters[name] += 1
+
+    def set(self, key: str, value: Any, ttl: int = None, persist: bool = True):
+        """
+        设置缓存
+
+        Args:
+            ttl: 过期秒数，默认 REDIS.cache_ttl
+            persist: 是否同时写入后端存储，False 时只保存在内存中
+        """
+        try:
+            if ttl is None:
+                ttl = self.default_ttl
+            expires_at = time.time() + ttl
+            blob = pack_entry(value, expires_at)
+
+            with self.lock:
+                self.memory.set(key, value, expires_at, len(blob))
+                self.counters['sets'] += 1
+
+            if persist and self.backend is not None:
+                self.backend.set(key, blob, ttl)
+
+            logger.debug(f"缓存已设置: {key}, TTL: {ttl}秒")
+
+        except Exception as e:
+            self._count('errors')
+            logger.error(f"设置缓存失败: {e}")
+
+    def lookup(self, key: str) -> Tuple[bool, Any]:
+        """查询缓存，返回 (是否命中, 值)，可区分缓存的 None 值"""
+        now = time.time()
+        with self.lock:
+            found, value = self.memory.get(key, now)
+            if found:
+                self.counters['memory_hits'] += 1
+                return True, value
+
+        try:
+            blob = self.backend.get(key) if self.backend is not None else None
+            if blob is not None:
+                expires_at = read_expiry(blob)
+                if expires_at is not None and now <= expires_at:
+                    value = unpack_entry(blob)
+                    with self.lock:
+                        self.memory.set(key, value, expires_at, len(blob))
+                        self.counters['backend_hits'] += 1
+                    logger.debug(f"缓存命中: {key}")
+                    return True, value
+                self.backend.delete(key)
+                self._count('expired')
+        except Exception as e:
+            self._count('errors')
+            logger.error(f"获取缓存失败: {e}")
+
+        self._count('misses')
+        return False, None
+
+    def get(self, key: str) -> Optional[Any]:
+        """获取缓存"""
+        return self.lookup(key)[1]
+
+    def delete(self, key: str):
+        """删除缓存"""
+        try:
+            with self.lock:
+                self.memory.delete(key)
+            if self.backend is not None:
+                self.backend.delete(key)
+            logger.debug(f"缓存已删除: {key}")
+
+        except Exception as e:
+            logger.error(f"删除缓存失败: {e}")
+
+    def clear_expired(self) -> int:
+        """清理过期缓存"""
+        try:
+            now = time.time()
+            with self.lock:
+                cleared = self.memory.clear_expired(now)
+            if self.backend is not None:
+                cleared += self.backend.clear_expired(now)
+            logger.info(f"清理了 {cleared} 个过期缓存")
+            return cleared
+
+        except Exception as e:
+            logger.error(f"清理过期缓存失败: {e}")
+            return 0
+
+    def clear(self):
+        """清空全部缓存"""
+        with self.lock:
+            self.memory.clear()
+        if self.backend is not None:
+            self.backend.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存命中统计"""
+        with self.lock:
+            stats = dict(self.counters)
+            stats.update({
+                'evictions': self.memory.evictions,
+                'memory_entries': len(self.memory),
+                'memory_bytes': self.memory.total_bytes,
+                'backend': self.backend.name if self.backend else 'none',
+            })
+        lookups = stats['memory_hits'] + stats['backend_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['memory_hits'] + stats['backend_hits']) / lookups, 4) if lookups else 0.0
+        return stats
+
+    def memoize(self, ttl: int = None, persist: bool = False, key_prefix: str = None) -> Callable:
+        """缓存函数结果的装饰器，参数见 memoize()"""
+        return memoize(ttl=ttl, persist=persist, key_prefix=key_prefix, cache=self)
+
+
+def memoize(ttl: int = None, persist: bool = False, key_prefix: str = None, cache: CacheManager = None) -> Callable:
+    """
+    缓存函数结果的装饰器
+
+    None、空 DataFrame 和空容器结果不缓存（通常表示数据获取失败）
+
+    Args:
+        ttl: 过期秒数
+        persist: 是否写入后端存储（跨进程/重启共享）
+        key_prefix: 键前缀，默认为函数的模块名和限定名
+        cache: 使用的缓存管理器，默认全局 cache_manager
+    """
+    def decorator(func: Callable) -> Callable:
+        prefix = key_prefix or f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            manager = cache or cache_manager
+            if not manager.memoize_enabled:
+                return func(*args, **kwargs)
+
+            key = make_key(prefix, args, kwargs)
+            found, value = manager.lookup(key)
+            if found:
+                return _copy_result(value)
+
+            value = func(*args, **kwargs)
+            if _cacheable(value):
+                manager.set(key, value, ttl=ttl, persist=persist)
+            return _copy_result(value)
+
+        return wrapper
+
+    return decorator
+
+
+# 全局实例
+cache_manager = CacheManager()
@@ -0,0 +1,198 @@
+"""
+数据库目录
+在 table_catalog 元数据表中保存每张表的行数和列结构，数据库管理页面直接读取目录，
+不再每次对所有表执行 COUNT(*) 和 PRAGMA table_info。
+下载/同步的写入方通过 record_write 增量更新目录；全量刷新可以精确计数，
+也可以读取 ANALYZE 后 sqlite_stat1 中的估计行数
+"""
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from utils.logger import logger
+from utils.config import config
+from core.storage import db_manager
+
+
+CATALOG_TABLE = 'table_catalog'
+
+# 行数来源
+SOURCE_EXACT = 'exact'      # COUNT(*)
+SOURCE_WRITER = 'writer'    # 写入方上报
+SOURCE_STAT = 'stat1'       # ANALYZE 统计（估计值）
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _now() -> str:
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+class TableCatalog:
+    """数据库表目录"""
+
+    def __init__(self, db_manager):
+        self.db_manager = db_manager
+
+    @staticmethod
+    def _columns(conn, table: str) -> List[Dict[str, str]]:
+        return [{'name': row[1], 'type': row[2]} for row in conn.execute(f"PRAGMA table_info({_quote(table)})")]
+
+    @staticmethod
+    def _exact_count(conn, table: str) -> int:
+        return conn.execute(f"SELECT COUNT(*) FROM {_quote(table)}").fetchone()[0]
+
+    @staticmethod
+    def _stat_counts(conn) -> Dict[str, int]:
+        """sqlite_stat1 中各表的行数（每个索引统计的第一个数字即表行数），未执行过 ANALYZE 时为空"""
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'").fetchone():
+            return {}
+        counts: Dict[str, int] = {}
+        for table, stat in conn.execute("SELECT tbl, stat FROM sqlite_stat1"):
+            try:
+                rows = int(str(stat).split()[0])
+            except (ValueError, IndexError):
+                continue
+            counts[table] = max(counts.get(table, 0), rows)
+        return counts
+
+    @staticmethod
+    def _table_names(conn) -> List[str]:
+        return [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name")]
+
+    @staticmethod
+    def _upsert(conn, table: str, row_count: int, columns: List[Dict[str, str]], source: str):
+        conn.execute(f'''
+            INSERT INTO {CATALOG_TABLE} (name, row_count, columns, count_source, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET
+                row_count = excluded.row_count,
+                columns = excluded.columns,
+                count_source = excluded.count_source,
+                updated_at = excluded.updated_at
+        ''', (table, row_count, json.dumps(columns, ensure_ascii=False), source, _now()))
+
+    def record_write(self, table: str, rows: int = None, delta: int = None):
+        """
+        写入方上报表的变化，失败只记录日志不影响写入
+
+        Args:
+            table: 表名
+            rows: 写入后的总行数（如 to_sql replace 写入的行数）
+            delta: 追加的行数；目录中还没有该表时改为精确计数
+        """
+        try:
+            with self.db_manager.connection() as conn:
+                source = SOURCE_WRITER
+                if rows is None:
+                    current = conn.execute(
+                        f"SELECT row_count FROM {CATALOG_TABLE} WHERE name = ?", (table,)
+                    ).fetchone()
+                    if current is not None and delta is not None:
+                        rows = current[0] + delta
+                    else:
+                        rows = self._exact_count(conn, table)
+                        source = SOURCE_EXACT
+                self._upsert(conn, table, rows, self._columns(conn, table), source)
+        except Exception as e:
+            logger.warning(f"更新表目录失败 {table}: {e}")
+
+    def get_row_count(self, table: str) -> Optional[int]:
+        """读取目录中的行数，目录中没有该表时返回 None"""
+        with self.db_manager.connection() as conn:
+            row = conn.execute(f"SELECT row_count FROM {CATALOG_TABLE} WHERE name = ?", (table,)).fetchone()
+        return row[0] if row else None
+
+    def refresh_table(self, table: str) -> int:
+        """精确统计单张表，返回行数"""
+        with self.db_manager.connection() as conn:
+            rows = self._exact_count(conn, table)
+            self._upsert(conn, table, rows, self._columns(conn, table), SOURCE_EXACT)
+        return rows
+
+    def refresh(self, exact: bool = False, analyze: bool = False) -> Dict[str, Any]:
+        """
+        全量刷新目录
+
+        Args:
+            exact: 对每张表执行 COUNT(*)；否则优先使用 sqlite_stat1 的估计行数
+            analyze: 先执行 ANALYZE（按 CATALOG.analysis_limit 抽样，大表也很快）
+        """
+        with self.db_manager.connection() as conn:
+            if analyze:
+                conn.execute(f"PRAGMA analysis_limit = {int(config.get('CATALOG.analysis_limit', 1000))}")
+                conn.execute("ANALYZE")
+            stats = {} if exact else self._stat_counts(conn)
+            tables = self._table_names(conn)
+            for table in tables:
+                if table in stats:
+                    rows, source = stats[table], SOURCE_STAT
+                else:
+                    rows, source = self._exact_count(conn, table), SOURCE_EXACT
+                self._upsert(conn, table, rows, self._columns(conn, table), source)
+            removed = self._remove_missing(conn, tables)
+
+        logger.info(f"表目录刷新完成，共 {len(tables)} 张表，移除 {removed} 张已删除的表")
+        return {'tables': len(tables), 'removed': removed, 'refreshed_at': _now()}
+
+    @staticmethod
+    def _remove_missing(conn, tables: List[str]) -> int:
+        existing = {row[0] for row in conn.execute(f"SELECT name FROM {CATALOG_TABLE}")}
+        missing = existing - set(tables)
+        conn.executemany(f"DELETE FROM {CATALOG_TABLE} WHERE name = ?", [(name,) for name in missing])
+        return len(missing)
+
+    def list_tables(self) -> Dict[str, Any]:
+        """
+        读取目录中的全部表
+
+        只对比 sqlite_master 的表名：新出现的表补充统计，已删除的表从目录移除，
+        其余表直接返回目录中的行数和列结构
+        """
+        with self.db_manager.connection() as conn:
+            tables = self._table_names(conn)
+            catalog = {
+                row[0]: row for row in conn.execute(
+                    f"SELECT name, row_count, columns, count_source, updated_at FROM {CATALOG_TABLE}"
+                )
+            }
+            new_tables = [table for table in tables if table not in catalog]
+            if new_tables:
+                stats = self._stat_counts(conn)
+                for table in new_tables:
+                    if table in stats:
+                        rows, source = stats[table], SOURCE_STAT
+                    else:
+                        rows, source = self._exact_count(conn, table), SOURCE_EXACT
+                    self._upsert(conn, table, rows, self._columns(conn, table), source)
+            if set(catalog) - set(tables):
+                self._remove_missing(conn, tables)
+            if new_tables:
+                catalog = {
+                    row[0]: row for row in conn.execute(
+                        f"SELECT name, row_count, columns, count_source, updated_at FROM {CATALOG_TABLE}"
+                    )
+                }
+
+        entries = []
+        for table in tables:
+            name, row_count, columns, source, updated_at = catalog[table]
+            columns = json.loads(columns) if columns else []
+            entries.append({
+                'name': name,
+                'row_count': row_count or 0,
+                'column_count': len(columns),
+                'columns': columns,
+                'count_source': source,
+                'updated_at': updated_at,
+            })
+        return {
+            'tables': entries,
+            'last_refreshed': max((entry['updated_at'] for entry in entries if entry['updated_at']), default=None),
+        }
+
+
+# 全局表目录实例
+table_catalog = TableCatalog(db_manager)
@@ -0,0 +1,176 @@
+"""
+图表与报告产物缓存
+按 (类型, 股票代码, 日期范围, 最后一根K线, 渲染参数) 计算内容摘要作为文件名，
+输入数据未变化时直接返回已生成的文件；目录总大小超过上限时按最近使用时间淘汰旧文件
+"""
+import glob
+import hashlib
+import json
+import os
+import threading
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+import pandas as pd
+
+from utils.logger import logger
+from utils.config import config
+
+
+# 修改渲染逻辑后递增，使旧产物全部失效
+CACHE_VERSION = 1
+
+
+def data_fingerprint(data: pd.DataFrame) -> Dict[str, Any]:
+    """行情数据指纹：日期范围、行数和最后一根K线"""
+    if data is None or data.empty:
+        return {'rows': 0}
+    last = data.iloc[-1]
+    return {
+        'start': str(data.index[0]).split(' ')[0],
+        'end': str(data.index[-1]).split(' ')[0],
+        'rows': len(data),
+        'close': float(last['close']) if 'close' in data.columns else None,
+        'volume': float(last['volume']) if 'volume' in data.columns else None,
+    }
+
+
+def cache_key(*parts: Any) -> str:
+    """对任意可JSON序列化的组成部分计算摘要"""
+    raw = json.dumps([CACHE_VERSION, *parts], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+class ChartCache:
+    """单个输出目录的内容寻址产物缓存"""
+
+    def __init__(self, directory: str, max_bytes: int = None):
+        """
+        Args:
+            directory: 产物目录（如 static/charts）
+            max_bytes: 目录总大小上限，默认读取 CHART_CACHE.max_mb；0 表示不限制
+        """
+        self.directory = directory
+        if max_bytes is None:
+            max_bytes = int(config.get('CHART_CACHE.max_mb', 200) * 1024 * 1024)
+        self.max_bytes = max_bytes
+        self.counters = {'hits': 0, 'misses': 0, 'evictions': 0, 'evicted_bytes': 0}
+        self.lock = threading.Lock()
+        # 同一产物并发请求时只渲染一次（按文件名分段加锁）
+        self._render_locks = [threading.Lock() for _ in range(32)]
+
+    def _find(self, stem: str) -> Optional[str]:
+        # 渲染时可能改变扩展名（如 webp 退回 png），按文件名主体查找
+        matches = glob.glob(os.path.join(glob.escape(self.directory), glob.escape(stem) + '.*'))
+        return matches[0] if matches else None
+
+    def get_or_render(self, name: str, parts: List[Any], ext: str, render_fn: Callable[[str], str]) -> str:
+        """
+        返回缓存产物路径，不存在时调用 render_fn 生成
+
+        Args:
+            name: 文件名前缀（如 candlestick_000001）
+            parts: 参与缓存键计算的组成部分
+            ext: 期望的文件扩展名
+            render_fn: 接收输出路径、返回实际写入路径的渲染函数
+        """
+        stem = f"{name}_{cache_key(name, *parts)[:16]}"
+
+        render_lock = self._render_locks[int(stem[-4:], 16) % len(self._render_locks)]
+
+        with render_lock:
+            path = self._find(stem)
+            if path is not None:
+                try:
+                    # 更新访问时间，淘汰时按最近使用排序
+                    os.utime(path)
+                    with self.lock:
+                        self.counters['hits'] += 1
+                    return path
+                except FileNotFoundError:
+                    # 刚好被淘汰，重新生成
+                    pass
+
+            os.makedirs(self.directory, exist_ok=True)
+            # 先写临时文件再原子替换，避免其他请求读到写了一半的文件
+            tmp_path = os.path.join(self.directory, f".tmp-{uuid.uuid4().hex}-{stem}.{ext}")
+            try:
+                written = render_fn(tmp_path)
+                path = os.path.join(self.directory, stem + os.path.splitext(written)[1])
+                os.replace(written, path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+            with self.lock:
+                self.counters['misses'] += 1
+
+        self.evict(keep=path)
+        return path
+
+    def _files(self) -> List[os.DirEntry]:
+        try:
+            with os.scandir(self.directory) as entries:
+                return [entry for entry in entries if entry.is_file() and not entry.name.startswith('.')]
+        except FileNotFoundError:
+            return []
+
+    def evict(self, keep: str = None) -> int:
+        """目录超过大小上限时按最近使用时间从旧到新删除文件，返回删除的文件数"""
+        if not self.max_bytes:
+            return 0
+
+        files = []
+        total = 0
+        for entry in self._files():
+            stat = entry.stat()
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+        if total <= self.max_bytes:
+            return 0
+
+        keep = os.path.abspath(keep) if keep else None
+        removed = 0
+        removed_bytes = 0
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            if os.path.abspath(path) == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"删除缓存文件失败 {path}: {e}")
+                continue
+            total -= size
+            removed += 1
+            removed_bytes += size
+
+        with self.lock:
+            self.counters['evictions'] += removed
+            self.counters['evicted_bytes'] += removed_bytes
+        if removed:
+            logger.info(f"{self.directory} 淘汰了 {removed} 个旧文件，释放 {removed_bytes} 字节")
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        """命中统计和目录占用"""
+        with self.lock:
+            stats = dict(self.counters)
+        files = self._files()
+        stats.update({
+            'directory': self.directory,
+            'files': len(files),
+            'bytes': sum(entry.stat().st_size for entry in files),
+            'max_bytes': self.max_bytes,
+        })
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        return stats
+
+
+# 全局产物缓存实例
+chart_cache = ChartCache('static/charts')
+report_cache = ChartCache('static/reports')
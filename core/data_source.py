@@ -17,6 +17,8 @@ except ImportError:
     from utils.config import config
 import time
 import functools
+import threading
+from core.cache import memoize
 
 class DataFetcher:
     """数据获取器基类"""
@@ -144,6 +146,41 @@ class StockDataFetcher(DataFetcher):
         
         return self._retry_request(_get_data)
     
+    # 全市场实时行情列名 -> stock_daily 列名（成交量与历史日线同为手，成交额为元，百分比字段单位为%）
+    SPOT_DAILY_COLUMNS = {
+        '代码': 'symbol',
+        '今开': 'open',
+        '最高': 'high',
+        '最低': 'low',
+        '最新价': 'close',
+        '成交量': 'volume',
+        '成交额': 'turnover',
+        '振幅': 'amplitude',
+        '涨跌幅': 'change_pct',
+        '涨跌额': 'change_amount',
+        '换手率': 'turnover_rate',
+    }
+
+    @classmethod
+    def spot_to_daily(cls, spot: pd.DataFrame, trade_date: str) -> pd.DataFrame:
+        """
+        把全市场实时行情快照转换为 trade_date 当天的日线（包含 symbol 和 date 列的长表）
+
+        收盘后的快照即当天的日线；没有成交（停牌）的股票价格为空，不包含在结果中
+        """
+        missing = [col for col in cls.SPOT_DAILY_COLUMNS if col not in spot.columns]
+        if missing:
+            raise ValueError(f"实时行情缺少必要的列: {missing}")
+
+        df = spot[list(cls.SPOT_DAILY_COLUMNS)].rename(columns=cls.SPOT_DAILY_COLUMNS)
+        df['symbol'] = df['symbol'].astype(str).str.zfill(6)
+        for col in df.columns.drop('symbol'):
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+        traded = df['close'].notna() & (df['close'] > 0) & (df['volume'].fillna(0) > 0)
+        df = df[traded].drop_duplicates('symbol')
+        df.insert(1, 'date', trade_date)
+        return df.reset_index(drop=True)
+
     def get_stock_info(self, symbol: str) -> Dict[str, Any]:
         """获取股票基本信息"""
         def _get_data():
@@ -227,49 +264,179 @@ class MarketDataFetcher(DataFetcher):
 
 class DataSource:
     """统一数据源接口"""
-    
-    def __init__(self):
+
+    # 本地 stock_daily 表中保存的行情字段（与 get_stock_hist 返回的列一致）
+    LOCAL_DAILY_COLUMNS = ['open', 'close', 'high', 'low', 'volume', 'turnover',
+                           'amplitude', 'change_pct', 'change_amount', 'turnover_rate']
+    # A股市场最早交易日之前的日期，用于未指定开始日期的全量请求
+    EARLIEST_DATE = datetime(1990, 1, 1)
+
+    def __init__(self, db_manager=None, read_through: bool = None):
         self.stock_fetcher = StockDataFetcher()
         self.market_fetcher = MarketDataFetcher()
+
+        if db_manager is None:
+            from core.storage import db_manager
+        self.db_manager = db_manager
+
+        if read_through is None:
+            read_through = config.get('DATA_SOURCE.read_through', True)
+        self.read_through = read_through
+        self.update_interval = config.get('DATA_SOURCE.update_interval', 300)
+
+        self._stats_lock = threading.Lock()
+        self.read_through_stats = {'hit': 0, 'partial': 0, 'miss': 0, 'remote_calls': 0, 'remote_errors': 0}
         logger.info("数据源初始化完成")
-    
-    def get_stock_data(self, 
-                      symbol: str, 
+
+    def get_stock_data(self,
+                      symbol: str,
                       period: str = "daily",
                       days: int = None,
                       start_date: str = None,
-                      end_date: str = None) -> pd.DataFrame:
+                      end_date: str = None,
+                      use_cache: bool = None) -> pd.DataFrame:
         """
         获取股票数据的统一接口
-        
+
+        日线数据默认走本地优先的读穿模式：请求区间已在本地 stock_daily 表中时直接返回，
+        否则只从AKShare补齐缺失的首尾日期并写回本地。
+
         Args:
             symbol: 股票代码
             period: 数据周期
             days: 获取最近多少天的数据
             start_date: 开始日期
             end_date: 结束日期
+            use_cache: 是否使用本地读穿，None表示按配置 DATA_SOURCE.read_through；
+                       同步任务需要直接拉取远程数据时传 False
         """
         if days and not start_date:
             start_date = (datetime.now() - timedelta(days=days)).strftime("%Y%m%d")
-        
+
         if not end_date:
             end_date = datetime.now().strftime("%Y%m%d")
-        
+
+        if use_cache is None:
+            use_cache = self.read_through
+
+        if use_cache and period == "daily":
+            return self._get_stock_data_read_through(symbol, start_date, end_date)
+
         return self.stock_fetcher.get_stock_hist(
             symbol=symbol,
             period=period,
             start_date=start_date,
             end_date=end_date
         )
+
+    def _get_stock_data_read_through(self, symbol: str, start_date: str, end_date: str) -> pd.DataFrame:
+        """本地优先读取日线数据，只向远程请求缺失的首尾区间"""
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        req_start = pd.to_datetime(start_date).to_pydatetime() if start_date else self.EARLIEST_DATE
+        req_end = min(pd.to_datetime(end_date).to_pydatetime(), today)
+
+        coverage = self.db_manager.get_daily_coverage(symbol)
+
+        # 计算缺失区间，保证补齐后覆盖区间仍然连续
+        missing = []
+        if coverage is None:
+            missing.append((req_start, req_end))
+            status = 'miss'
+        else:
+            cov_start = datetime.strptime(coverage['start_date'][:10], "%Y-%m-%d")
+            cov_end = self._effective_coverage_end(coverage, today)
+
+            if req_start < cov_start:
+                missing.append((req_start, cov_start - timedelta(days=1)))
+            if req_end > cov_end:
+                missing.append((cov_end + timedelta(days=1), req_end))
+            status = 'partial' if missing else 'hit'
+
+        fetched_ok = True
+        for gap_start, gap_end in missing:
+            try:
+                self._record_stat('remote_calls')
+                df = self.stock_fetcher.get_stock_hist(
+                    symbol=symbol,
+                    period="daily",
+                    start_date=gap_start.strftime("%Y%m%d"),
+                    end_date=gap_end.strftime("%Y%m%d")
+                )
+                if not df.empty:
+                    self.db_manager.save_stock_daily_data(symbol, df)
+            except Exception as e:
+                self._record_stat('remote_errors')
+                fetched_ok = False
+                if status == 'miss':
+                    raise
+                logger.warning(f"补齐股票 {symbol} 缺失数据失败，返回本地已有数据: {e}")
+
+        if missing and fetched_ok:
+            new_start = min([req_start] + [s for s, _ in missing])
+            new_end = max([req_end] + [e for _, e in missing])
+            self.db_manager.update_daily_coverage(
+                symbol, new_start.strftime("%Y-%m-%d"), new_end.strftime("%Y-%m-%d")
+            )
+
+        self._record_stat(status)
+        logger.debug(f"股票 {symbol} 本地读穿: {status}, 补齐区间 {len(missing)} 个")
+
+        df = self.db_manager.get_stock_daily_data(
+            symbol, req_start.strftime("%Y-%m-%d"), req_end.strftime("%Y-%m-%d")
+        )
+        if df.empty:
+            return df
+        return df[[col for col in self.LOCAL_DAILY_COLUMNS if col in df.columns]]
+
+    def _effective_coverage_end(self, coverage: Dict[str, Any], today: datetime) -> datetime:
+        """当日数据在盘中会变化，超过 update_interval 未刷新时视为未覆盖"""
+        cov_end = datetime.strptime(coverage['end_date'][:10], "%Y-%m-%d")
+        if cov_end < today:
+            return cov_end
+
+        updated_at = coverage.get('updated_at')
+        if updated_at:
+            age = (datetime.now() - datetime.strptime(updated_at[:19], "%Y-%m-%d %H:%M:%S")).total_seconds()
+            if age <= self.update_interval:
+                return cov_end
+        return today - timedelta(days=1)
+
+    def _record_stat(self, key: str):
+        with self._stats_lock:
+            self.read_through_stats[key] += 1
+
+    def get_read_through_stats(self) -> Dict[str, Any]:
+        """获取本地读穿命中统计"""
+        with self._stats_lock:
+            stats = dict(self.read_through_stats)
+        total = stats['hit'] + stats['partial'] + stats['miss']
+        stats['hit_rate'] = stats['hit'] / total if total else 0.0
+        return stats
     
+    def get_price_matrix(self,
+                         field: str = 'close',
+                         symbols: List[str] = None,
+                         start_date: str = None,
+                         end_date: str = None) -> pd.DataFrame:
+        """
+        获取本地全市场 日期×股票 价格矩阵（列式内存映射缓存）
+
+        适用于全市场扫描、多股票回测、相关性分析等需要大量股票行情的场景
+        """
+        return self.db_manager.get_price_matrix(field, symbols, start_date, end_date)
+
+    # 股票列表来自全市场实时行情，只在进程内短暂缓存，不写入后端
+    @memoize(ttl=60)
     def get_stock_list(self) -> pd.DataFrame:
         """获取股票列表"""
         return self.stock_fetcher.get_stock_list()
     
+    @memoize(ttl=3600, persist=True)
     def get_stock_info(self, symbol: str) -> Dict[str, Any]:
         """获取股票基本信息"""
         return self.stock_fetcher.get_stock_info(symbol)
     
+    @memoize(ttl=300)
     def get_market_data(self, index_code: str = "sh000001") -> pd.DataFrame:
         """获取市场指数数据"""
         return self.market_fetcher.get_market_index(index_code)
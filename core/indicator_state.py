@@ -0,0 +1,484 @@
+"""
+增量技术指标状态
+为每只股票保存指标计算的中间状态（EMA累加器、滚动窗口、KDJ的K/D值等），
+新增一根K线时 O(1) 推进全部指标，状态检查点保存在数据库中，
+避免每天收盘后对全部历史重新调用 calculate_all_indicators
+"""
+import json
+import math
+import time
+from collections import deque
+from itertools import groupby
+from typing import Any, Dict, Iterable, List, Optional
+
+import pandas as pd
+
+from utils.logger import logger
+
+
+STATE_VERSION = 1
+
+NAN = float('nan')
+
+
+def _isnan(value) -> bool:
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+def _float(value) -> float:
+    """行情字段转为浮点数，None 或无法解析的值记为 NaN"""
+    if value is None:
+        return NAN
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return NAN
+
+
+def _div(a: float, b: float) -> float:
+    """与 numpy 浮点除法一致：除以0得到 inf 或 NaN"""
+    if _isnan(a) or _isnan(b):
+        return NAN
+    if b == 0:
+        return NAN if a == 0 else math.copysign(math.inf, a)
+    return a / b
+
+
+class _EWM:
+    """指数加权均值，与 pandas ewm(adjust=True).mean() 一致"""
+
+    __slots__ = ('decay', 'num', 'den')
+
+    def __init__(self, alpha: float, num: float = 0.0, den: float = 0.0):
+        self.decay = 1.0 - alpha
+        self.num = num
+        self.den = den
+
+    @classmethod
+    def span(cls, span: int) -> '_EWM':
+        return cls(2.0 / (span + 1))
+
+    @classmethod
+    def com(cls, com: float) -> '_EWM':
+        return cls(1.0 / (1 + com))
+
+    def update(self, value: float) -> float:
+        self.num *= self.decay
+        self.den *= self.decay
+        if not _isnan(value):
+            self.num += value
+            self.den += 1.0
+        return self.num / self.den if self.den > 0 else NAN
+
+    def to_list(self) -> List[float]:
+        return [self.decay, self.num, self.den]
+
+    @classmethod
+    def from_list(cls, values: List[float]) -> '_EWM':
+        ewm = cls(0.0, values[1], values[2])
+        ewm.decay = values[0]
+        return ewm
+
+
+class _Window:
+    """定长滚动窗口，窗口未满或含NaN时统计结果为NaN（与 pandas rolling 一致）"""
+
+    __slots__ = ('size', 'values')
+
+    def __init__(self, size: int, values: Iterable[float] = ()):
+        self.size = size
+        self.values = deque(values, maxlen=size)
+
+    def push(self, value: float):
+        self.values.append(value)
+
+    def _ready(self) -> bool:
+        return len(self.values) == self.size and not any(_isnan(v) for v in self.values)
+
+    def sum(self) -> float:
+        return math.fsum(self.values) if self._ready() else NAN
+
+    def mean(self) -> float:
+        return self.sum() / self.size if self._ready() else NAN
+
+    def min(self) -> float:
+        return min(self.values) if self._ready() else NAN
+
+    def max(self) -> float:
+        return max(self.values) if self._ready() else NAN
+
+    def to_list(self) -> List[Any]:
+        return [self.size, list(self.values)]
+
+    @classmethod
+    def from_list(cls, values: List[Any]) -> '_Window':
+        return cls(values[0], values[1])
+
+
+class IndicatorState:
+    """单只股票的增量指标状态
+
+    参数与 TechnicalAnalyzer.calculate_all_indicators 的默认参数一致，
+    update 的输出与全量计算在同一根K线上的结果一致
+    """
+
+    MA_PERIODS = [5, 10, 20, 60]
+    MACD_FAST, MACD_SLOW, MACD_SIGNAL = 12, 26, 9
+    RSI_PERIOD = 14
+    BB_PERIOD, BB_STD = 20, 2
+    KDJ_PERIOD, KDJ_D, KDJ_J = 9, 3, 3
+    ATR_PERIOD = 14
+    MFI_PERIOD = 14
+
+    def __init__(self, symbol: str, has_turnover: bool = True):
+        self.symbol = symbol
+        self.has_turnover = has_turnover
+        self.last_date: Optional[str] = None
+        self.bars = 0
+        self.values: Dict[str, float] = {}
+        # 推进最后一根K线之前的状态，最后一根K线被修订时回退到这里重新推进
+        self.previous: Optional[Dict[str, Any]] = None
+
+        self.prev_close = NAN
+        self.prev_typical = NAN
+        self.obv = NAN
+
+        self.ewm: Dict[str, _EWM] = {f'EMA_{p}': _EWM.span(p) for p in self.MA_PERIODS}
+        self.ewm.update({
+            'MACD_FAST': _EWM.span(self.MACD_FAST),
+            'MACD_SLOW': _EWM.span(self.MACD_SLOW),
+            'MACD_SIGNAL': _EWM.span(self.MACD_SIGNAL),
+            'KDJ_K': _EWM.com(self.KDJ_D - 1),
+            'KDJ_D': _EWM.com(self.KDJ_J - 1),
+        })
+
+        longest = max(self.MA_PERIODS + [self.BB_PERIOD])
+        self.windows: Dict[str, _Window] = {
+            'close': _Window(longest),
+            'gains': _Window(self.RSI_PERIOD),
+            'losses': _Window(self.RSI_PERIOD),
+            'low': _Window(self.KDJ_PERIOD),
+            'high': _Window(self.KDJ_PERIOD),
+            'true_range': _Window(self.ATR_PERIOD),
+            'volume': _Window(10),
+            'positive_flow': _Window(self.MFI_PERIOD),
+            'negative_flow': _Window(self.MFI_PERIOD),
+        }
+
+    def _tail_mean(self, window: _Window, period: int) -> float:
+        """窗口中最近 period 个值的均值"""
+        if len(window.values) < period:
+            return NAN
+        tail = list(window.values)[-period:]
+        if any(_isnan(v) for v in tail):
+            return NAN
+        return math.fsum(tail) / period
+
+    def _tail_std(self, window: _Window, period: int) -> float:
+        if len(window.values) < period or period < 2:
+            return NAN
+        tail = list(window.values)[-period:]
+        mean = math.fsum(tail) / period
+        return math.sqrt(math.fsum((v - mean) ** 2 for v in tail) / (period - 1))
+
+    def update(self, bar: Dict[str, Any]) -> Optional[Dict[str, float]]:
+        """
+        推进一根K线
+
+        Args:
+            bar: 包含 date/open/high/low/close/volume（可选 turnover）的字典，缺失的字段为 None
+
+        Returns:
+            Dict[str, float]: 该K线上的全部指标值，列名与 calculate_all_indicators 一致；
+            没有收盘价的K线不推进指标，只记录日期，返回 None
+        """
+        close = _float(bar.get('close'))
+        if _isnan(close):
+            self.last_date = str(bar['date'])[:10]
+            return None
+        high = _float(bar.get('high'))
+        low = _float(bar.get('low'))
+        volume = _float(bar.get('volume'))
+        values: Dict[str, float] = {}
+        w = self.windows
+
+        # 移动平均线
+        w['close'].push(close)
+        for period in self.MA_PERIODS:
+            values[f'MA_{period}'] = self._tail_mean(w['close'], period)
+            values[f'EMA_{period}'] = self.ewm[f'EMA_{period}'].update(close)
+
+        # MACD
+        macd = self.ewm['MACD_FAST'].update(close) - self.ewm['MACD_SLOW'].update(close)
+        macd_signal = self.ewm['MACD_SIGNAL'].update(macd)
+        values['MACD'] = macd
+        values['MACD_Signal'] = macd_signal
+        values['MACD_Histogram'] = macd - macd_signal
+
+        # RSI（首根K线的涨跌记为0）
+        delta = close - self.prev_close
+        w['gains'].push(delta if delta > 0 else 0.0)
+        w['losses'].push(-delta if delta < 0 else 0.0)
+        rs = _div(w['gains'].mean(), w['losses'].mean())
+        values['RSI'] = 100 - _div(100, 1 + rs)
+
+        # 布林带
+        middle = self._tail_mean(w['close'], self.BB_PERIOD)
+        std = self._tail_std(w['close'], self.BB_PERIOD)
+        upper = middle + std * self.BB_STD
+        lower = middle - std * self.BB_STD
+        values['BB_Middle'] = middle
+        values['BB_Upper'] = upper
+        values['BB_Lower'] = lower
+        values['BB_Width'] = _div(upper - lower, middle)
+        values['BB_Percent'] = _div(close - lower, upper - lower)
+
+        # KDJ
+        w['low'].push(low)
+        w['high'].push(high)
+        low_min, high_max = w['low'].min(), w['high'].max()
+        rsv = _div(close - low_min, high_max - low_min) * 100
+        k = self.ewm['KDJ_K'].update(rsv)
+        d = self.ewm['KDJ_D'].update(k)
+        values['KDJ_K'] = k
+        values['KDJ_D'] = d
+        values['KDJ_J'] = 3 * k - 2 * d
+
+        # ATR（首根K线只有最高最低价之差）
+        ranges = [high - low, abs(high - self.prev_close), abs(low - self.prev_close)]
+        valid = [r for r in ranges if not _isnan(r)]
+        w['true_range'].push(max(valid) if valid else NAN)
+        values['ATR'] = w['true_range'].mean()
+
+        # 成交量指标
+        w['volume'].push(volume)
+        volume_ma_10 = self._tail_mean(w['volume'], 10)
+        values['Volume_MA_5'] = self._tail_mean(w['volume'], 5)
+        values['Volume_MA_10'] = volume_ma_10
+        values['Volume_Ratio'] = _div(volume, volume_ma_10)
+
+        if _isnan(delta):
+            values['OBV'] = NAN
+        elif _isnan(volume):
+            # 缺少成交量时沿用上一根K线的 OBV
+            values['OBV'] = self.obv
+        else:
+            sign = (delta > 0) - (delta < 0)
+            self.obv = (0.0 if _isnan(self.obv) else self.obv) + volume * sign
+            values['OBV'] = self.obv
+
+        # 资金流量指标 MFI
+        typical = (high + low + close) / 3
+        if self.has_turnover:
+            money_flow = typical * volume
+            w['positive_flow'].push(money_flow if typical > self.prev_typical else 0.0)
+            w['negative_flow'].push(money_flow if typical < self.prev_typical else 0.0)
+            mfi_ratio = _div(w['positive_flow'].sum(), w['negative_flow'].sum())
+            values['MFI'] = 100 - _div(100, 1 + mfi_ratio)
+
+        self.prev_close = close
+        self.prev_typical = typical
+        self.last_date = str(bar['date'])[:10]
+        self.bars += 1
+        self.values = values
+        return values
+
+    @classmethod
+    def from_history(cls, symbol: str, data: pd.DataFrame) -> 'IndicatorState':
+        """用历史日线数据（日期索引，按日期升序）预热状态"""
+        state = cls(symbol, has_turnover='turnover' in data.columns)
+        frame = data.reset_index()
+        frame = frame.rename(columns={frame.columns[0]: 'date'}) if 'date' not in frame.columns else frame
+        for bar in frame.to_dict(orient='records'):
+            state.update(bar)
+        return state
+
+    def snapshot(self):
+        """记录当前状态，作为下一根K线被修订时的回退点"""
+        self.previous = self._to_dict()
+
+    def rewind(self) -> Optional['IndicatorState']:
+        """回退到最后一根K线之前的状态，没有回退点时返回 None"""
+        return self._from_dict(self.previous) if self.previous else None
+
+    def to_json(self) -> str:
+        """序列化为检查点"""
+        return json.dumps(dict(self._to_dict(), previous=self.previous))
+
+    def _to_dict(self) -> Dict[str, Any]:
+        return {
+            'version': STATE_VERSION,
+            'symbol': self.symbol,
+            'has_turnover': self.has_turnover,
+            'last_date': self.last_date,
+            'bars': self.bars,
+            'prev_close': self.prev_close,
+            'prev_typical': self.prev_typical,
+            'obv': self.obv,
+            'ewm': {name: e.to_list() for name, e in self.ewm.items()},
+            'windows': {name: win.to_list() for name, win in self.windows.items()},
+            'values': self.values,
+        }
+
+    @classmethod
+    def from_json(cls, payload: str) -> Optional['IndicatorState']:
+        """从检查点恢复，版本不一致时返回 None（需要重新预热）"""
+        data = json.loads(payload)
+        if data.get('version') != STATE_VERSION:
+            return None
+        state = cls._from_dict(data)
+        state.previous = data.get('previous')
+        return state
+
+    @classmethod
+    def _from_dict(cls, data: Dict[str, Any]) -> 'IndicatorState':
+        state = cls(data['symbol'], data['has_turnover'])
+        state.last_date = data['last_date']
+        state.bars = data['bars']
+        state.prev_close = data['prev_close']
+        state.prev_typical = data['prev_typical']
+        state.obv = data['obv']
+        state.ewm = {name: _EWM.from_list(v) for name, v in data['ewm'].items()}
+        state.windows = {name: _Window.from_list(v) for name, v in data['windows'].items()}
+        state.values = data['values']
+        return state
+
+
+def _mark_last(items: Iterable[Any]) -> Iterable[tuple]:
+    """逐个返回 (元素, 是否为最后一个)"""
+    iterator = iter(items)
+    try:
+        current = next(iterator)
+    except StopIteration:
+        return
+    for item in iterator:
+        yield current, False
+        current = item
+    yield current, True
+
+
+# 物化指标宽表 indicator_daily 的指标列，名称和顺序与 calculate_all_indicators 的输出一致
+INDICATOR_COLUMNS = (
+    [name for p in IndicatorState.MA_PERIODS for name in (f'MA_{p}', f'EMA_{p}')]
+    + ['MACD', 'MACD_Signal', 'MACD_Histogram', 'RSI',
+       'BB_Middle', 'BB_Upper', 'BB_Lower', 'BB_Width', 'BB_Percent',
+       'KDJ_K', 'KDJ_D', 'KDJ_J', 'ATR',
+       'Volume_MA_5', 'Volume_MA_10', 'Volume_Ratio', 'OBV', 'MFI']
+)
+
+
+def indicator_row(symbol: str, date: str, values: Dict[str, float]) -> tuple:
+    """指标值转为 indicator_daily 的一行，NaN/inf 存为 NULL"""
+    row = [symbol, date]
+    for column in INDICATOR_COLUMNS:
+        value = values.get(column)
+        row.append(value if value is not None and math.isfinite(value) else None)
+    return tuple(row)
+
+
+class IndicatorStateUpdater:
+    """批量刷新所有股票的增量指标状态，并把每根K线的指标值物化到 indicator_daily"""
+
+    # 物化指标每批写入的行数
+    MATERIALIZE_BATCH = 5000
+
+    def __init__(self, db_manager=None):
+        if db_manager is None:
+            from core.storage import db_manager
+        self.db_manager = db_manager
+
+    def refresh(self, symbols: List[str] = None, materialize: bool = True) -> Dict[str, Any]:
+        """
+        读取每只股票检查点之后新增的日线，推进指标状态并写回检查点。
+        没有检查点（或检查点版本过旧）的股票用全部本地历史预热；
+        检查点之前的日线被修订过时，只有最后一根K线被修订的回退一根重新推进，否则从头预热
+
+        Args:
+            symbols: 需要刷新的股票，默认全部
+            materialize: 是否把新增K线的指标值写入 indicator_daily
+
+        Returns:
+            Dict: symbols(更新的股票数), bars(处理的K线数), rows(物化的指标行数), seconds(耗时)
+        """
+        start = time.time()
+        checkpoints = self.db_manager.load_indicator_states(symbols)
+        states: Dict[str, IndicatorState] = {}
+        for symbol, payload in checkpoints.items():
+            state = IndicatorState.from_json(payload)
+            if state is not None:
+                states[symbol] = state
+
+        # 版本过旧的检查点按无检查点处理，从头预热
+        stale = [s for s in checkpoints if s not in states]
+        if stale:
+            self.db_manager.delete_indicator_states(stale)
+
+        rewound, reset = [], []
+        for symbol, revised_from in self.db_manager.get_indicator_revisions(symbols).items():
+            state = states.pop(symbol, None)
+            previous = state.rewind() if state is not None and state.last_date == revised_from else None
+            if previous is not None:
+                states[symbol] = previous
+                rewound.append((symbol, previous.last_date, previous.to_json()))
+            else:
+                reset.append(symbol)
+        if rewound:
+            self.db_manager.rewind_indicator_states(rewound)
+        if reset:
+            self.db_manager.delete_indicator_states(reset)
+
+        records = []
+        failed = []
+        bar_count = 0
+        row_count = 0
+        indicator_rows = []
+        rows = self.db_manager.get_bars_after_indicator_state(symbols)
+        for symbol, bars in groupby(rows, key=lambda row: row['symbol']):
+            # 单只股票的数据异常不影响其他股票；失败的股票不写检查点，下次从旧检查点重新计算
+            try:
+                state = states.get(symbol)
+                for bar, last in _mark_last(bars):
+                    if state is None:
+                        state = IndicatorState(symbol, has_turnover='turnover' in bar)
+                    if last:
+                        state.snapshot()
+                    values = state.update(bar)
+                    bar_count += 1
+                    if materialize and values is not None:
+                        indicator_rows.append(indicator_row(symbol, state.last_date, values))
+                        if len(indicator_rows) >= self.MATERIALIZE_BATCH:
+                            row_count += self.db_manager.upsert_indicator_daily(indicator_rows)
+                            indicator_rows = []
+                records.append((symbol, state.last_date, state.to_json()))
+            except Exception as e:
+                failed.append(symbol)
+                logger.error(f"股票 {symbol} 增量指标计算失败: {e}")
+
+        # 先写指标再写检查点：中途失败时下次从旧检查点重新计算，重复写入幂等
+        if indicator_rows:
+            row_count += self.db_manager.upsert_indicator_daily(indicator_rows)
+        if records:
+            self.db_manager.save_indicator_states(records)
+
+        result = {
+            'symbols': len(records),
+            'bars': bar_count,
+            'rows': row_count,
+            'failed': failed,
+            'seconds': round(time.time() - start, 3)
+        }
+        logger.info(f"增量指标刷新完成: {result}")
+        return result
+
+    def rebuild(self, symbols: List[str] = None) -> Dict[str, Any]:
+        """丢弃检查点并从全部历史重新预热（历史数据被修订后使用）"""
+        self.db_manager.delete_indicator_states(symbols)
+        return self.refresh(symbols)
+
+    def get_latest(self, symbol: str) -> Optional[Dict[str, Any]]:
+        """获取股票最新的指标值"""
+        payload = self.db_manager.load_indicator_states([symbol]).get(symbol)
+        state = IndicatorState.from_json(payload) if payload else None
+        if state is None:
+            return None
+        return {'symbol': symbol, 'date': state.last_date, 'indicators': state.values}
@@ -0,0 +1,384 @@
+"""
+后台任务管理
+长耗时的API工作（行情同步、回测、批量下载等）提交到本地线程池执行，
+任务状态、进度和结果保存在数据库 jobs 表中，多个Web进程和服务重启后均可查询。
+接口参照 Celery（task/delay/apply_async/AsyncResult），但不需要消息中间件
+"""
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from utils.logger import logger
+from utils.config import config
+
+
+# 任务状态，与 Celery 的状态名一致
+PENDING = 'PENDING'
+STARTED = 'STARTED'
+PROGRESS = 'PROGRESS'
+SUCCESS = 'SUCCESS'
+FAILURE = 'FAILURE'
+REVOKED = 'REVOKED'
+
+UNFINISHED_STATES = (PENDING, STARTED, PROGRESS)
+READY_STATES = (SUCCESS, FAILURE, REVOKED)
+
+# 任务状态 -> 旧进度接口使用的状态
+PROGRESS_STATUS = {
+    PENDING: 'starting',
+    STARTED: 'running',
+    PROGRESS: 'running',
+    SUCCESS: 'completed',
+    FAILURE: 'error',
+    REVOKED: 'cancelled',
+}
+
+
+class JobCancelled(Exception):
+    """任务被取消"""
+
+
+class JobError(Exception):
+    """任务执行失败（原始异常不在当前进程时抛出）"""
+
+
+def _now() -> str:
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+class JobContext:
+    """任务运行上下文，作为绑定任务的第一个参数传入，用于上报进度和检查取消"""
+
+    def __init__(self, manager: 'JobManager', job_id: str, progress: Dict[str, Any] = None):
+        self.manager = manager
+        self.job_id = job_id
+        self.progress: Dict[str, Any] = dict(progress or {})
+        self._cancelled = threading.Event()
+        self._finished = threading.Event()
+        self._last_cancel_check = 0.0
+        self._callbacks: List[Callable[[], None]] = []
+        self._watcher: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def update_progress(self, current: int = None, total: int = None, message: str = None, **meta):
+        """更新进度，meta 为附加字段"""
+        with self._lock:
+            if current is not None:
+                self.progress['current'] = current
+            if total is not None:
+                self.progress['total'] = total
+            if message is not None:
+                self.progress['message'] = message
+            self.progress.update(meta)
+            current, total = self.progress.get('current'), self.progress.get('total')
+            if current is not None and total:
+                self.progress['percent'] = int(current / total * 100)
+            snapshot = dict(self.progress)
+        self.manager.db_manager.update_job(self.job_id, status=PROGRESS, progress=snapshot)
+
+    def set_progress(self, progress: Dict[str, Any]):
+        """整体替换进度内容"""
+        with self._lock:
+            self.progress = dict(progress)
+            snapshot = dict(self.progress)
+        self.manager.db_manager.update_job(self.job_id, status=PROGRESS, progress=snapshot)
+
+    def is_cancelled(self) -> bool:
+        """是否已请求取消；跨进程的取消标记按 cancel_poll_interval 节流查询数据库"""
+        if self._cancelled.is_set():
+            return True
+        now = time.monotonic()
+        if now - self._last_cancel_check >= self.manager.cancel_poll_interval:
+            self._last_cancel_check = now
+            if self.manager.db_manager.is_job_cancel_requested(self.job_id):
+                self._cancel()
+        return self._cancelled.is_set()
+
+    def raise_if_cancelled(self):
+        """已请求取消时抛出 JobCancelled"""
+        if self.is_cancelled():
+            raise JobCancelled(f"任务 {self.job_id} 已取消")
+
+    def on_cancel(self, callback: Callable[[], None]):
+        """注册取消回调（如通知同步引擎停止），由后台线程轮询取消标记后调用"""
+        self._callbacks.append(callback)
+        if self._watcher is None:
+            self._watcher = threading.Thread(target=self._watch, daemon=True)
+            self._watcher.start()
+
+    def _watch(self):
+        while not self._finished.wait(self.manager.cancel_poll_interval):
+            if self.is_cancelled():
+                return
+
+    def _cancel(self):
+        if self._cancelled.is_set():
+            return
+        self._cancelled.set()
+        for callback in self._callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"任务 {self.job_id} 取消回调失败: {e}")
+
+    def _finish(self):
+        self._finished.set()
+
+
+class AsyncResult:
+    """任务结果句柄（兼容 Celery AsyncResult 的常用属性）"""
+
+    def __init__(self, job_id: str, manager: 'JobManager' = None, _local: '_LocalRun' = None):
+        self.id = job_id
+        self.manager = manager or job_manager
+        self._local = _local
+
+    def __repr__(self):
+        return f"<AsyncResult: {self.id}>"
+
+    def _job(self) -> Dict[str, Any]:
+        return self.manager.get_job(self.id) or {}
+
+    @property
+    def state(self) -> str:
+        return self._job().get('status', PENDING)
+
+    status = state
+
+    @property
+    def info(self) -> Any:
+        """进行中返回进度，完成后返回结果，失败返回错误信息"""
+        job = self._job()
+        if job.get('status') == SUCCESS:
+            return job.get('result')
+        if job.get('status') == FAILURE:
+            return job.get('error')
+        return job.get('progress')
+
+    @property
+    def result(self) -> Any:
+        job = self._job()
+        return job.get('error') if job.get('status') == FAILURE else job.get('result')
+
+    def ready(self) -> bool:
+        return self.state in READY_STATES
+
+    def successful(self) -> bool:
+        return self.state == SUCCESS
+
+    def failed(self) -> bool:
+        return self.state == FAILURE
+
+    def revoke(self) -> bool:
+        return self.manager.cancel(self.id)
+
+    def get(self, timeout: float = None, interval: float = 0.2, propagate: bool = True) -> Any:
+        """等待任务完成并返回结果
+
+        任务在当前进程中执行时，失败会重新抛出原始异常，否则抛出 JobError
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            job = self._job()
+            status = job.get('status')
+            if status in READY_STATES:
+                break
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(f"等待任务 {self.id} 超时")
+            wait = interval if deadline is None else min(interval, max(0.0, deadline - time.monotonic()))
+            if self._local is not None:
+                self._local.done.wait(wait)
+            else:
+                time.sleep(wait)
+
+        if status == SUCCESS or not propagate:
+            return job.get('result') if status == SUCCESS else job.get('error')
+        if self._local is not None and self._local.error is not None:
+            raise self._local.error
+        if status == REVOKED:
+            raise JobCancelled(f"任务 {self.id} 已取消")
+        raise JobError(job.get('error') or '任务执行失败')
+
+
+class _LocalRun:
+    """当前进程内提交的任务的完成事件和原始异常"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.error: Optional[BaseException] = None
+
+
+class Task:
+    """已注册的任务"""
+
+    def __init__(self, manager: 'JobManager', func: Callable, name: str, bind: bool, job_type: str):
+        self.manager = manager
+        self.func = func
+        self.name = name
+        self.bind = bind
+        self.job_type = job_type
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def delay(self, *args, **kwargs) -> AsyncResult:
+        return self.apply_async(args, kwargs)
+
+    def apply_async(self, args: tuple = None, kwargs: Dict[str, Any] = None, job_id: str = None) -> AsyncResult:
+        return self.manager.submit(self.func, args=args, kwargs=kwargs, job_type=self.job_type,
+                                   job_id=job_id, bind=self.bind, task_name=self.name)
+
+
+class JobManager:
+    """后台任务管理器"""
+
+    def __init__(self, db_manager=None, max_workers: int = None):
+        if db_manager is None:
+            from core.storage import db_manager
+        self.db_manager = db_manager
+        self.max_workers = max_workers or config.get('JOBS.max_workers', 4)
+        self.cancel_poll_interval = config.get('JOBS.cancel_poll_interval', 1.0)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+
+        self.tasks: Dict[str, Task] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        self._contexts: Dict[str, JobContext] = {}
+
+        self._recover_interrupted()
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """线程池延迟创建；fork 出的子进程会重新创建自己的线程池"""
+        with self._executor_lock:
+            owner = f"{socket.gethostname()}:{os.getpid()}"
+            if self._executor is None or owner != self.owner:
+                self.owner = owner
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='job')
+            return self._executor
+
+    def _recover_interrupted(self):
+        """把本机已退出进程遗留的未完成任务标记为失败"""
+        try:
+            host = socket.gethostname()
+            for job in self.db_manager.list_jobs(statuses=UNFINISHED_STATES, limit=None):
+                owner_host, _, pid = (job.get('owner') or '').rpartition(':')
+                if owner_host != host or not pid.isdigit() or _pid_alive(int(pid)):
+                    continue
+                self.db_manager.update_job(job['job_id'], status=FAILURE, error='任务所在进程已退出',
+                                           finished_at=_now())
+                logger.warning(f"任务 {job['job_id']} 所在进程已退出，标记为失败")
+        except Exception as e:
+            logger.error(f"恢复中断任务失败: {e}")
+
+    def task(self, name: str = None, bind: bool = False, job_type: str = None) -> Callable[[Callable], Task]:
+        """注册任务的装饰器；bind=True 时任务函数的第一个参数为 JobContext"""
+        def decorator(func: Callable) -> Task:
+            task_name = name or f"{func.__module__}.{func.__qualname__}"
+            task = Task(self, func, task_name, bind, job_type or task_name.split('.')[0])
+            self.tasks[task_name] = task
+            return task
+        return decorator
+
+    def submit(self,
+               func: Callable,
+               args: tuple = None,
+               kwargs: Dict[str, Any] = None,
+               job_type: str = 'default',
+               job_id: str = None,
+               bind: bool = True,
+               task_name: str = None) -> AsyncResult:
+        """
+        提交任务到后台线程池
+
+        Args:
+            func: 任务函数，bind=True 时第一个参数为 JobContext
+            args/kwargs: 任务参数（只在当前进程内传递，不写入数据库）
+            job_type: 任务类型，用于分类查询
+            job_id: 指定任务ID，默认自动生成
+            bind: 是否传入 JobContext
+            task_name: 任务名称
+        """
+        job_id = job_id or str(uuid.uuid4())
+        executor = self.executor
+        self.db_manager.create_job(job_id, job_type, task_name or getattr(func, '__name__', 'job'), self.owner)
+        local = _LocalRun()
+        executor.submit(self._run, job_id, func, tuple(args or ()), dict(kwargs or {}), bind, local)
+        logger.info(f"任务已提交: {job_id} ({job_type})")
+        return AsyncResult(job_id, self, local)
+
+    def _run(self, job_id: str, func: Callable, args: tuple, kwargs: Dict[str, Any], bind: bool,
+             local: _LocalRun):
+        try:
+            if self.db_manager.is_job_cancel_requested(job_id):
+                self.db_manager.update_job(job_id, status=REVOKED, finished_at=_now())
+                return
+
+            context = JobContext(self, job_id)
+            self._contexts[job_id] = context
+            self.db_manager.update_job(job_id, status=STARTED, started_at=_now(), owner=self.owner)
+            try:
+                result = func(context, *args, **kwargs) if bind else func(*args, **kwargs)
+                status = REVOKED if context.is_cancelled() else SUCCESS
+                self.db_manager.update_job(job_id, status=status, result=result, finished_at=_now())
+                logger.info(f"任务完成: {job_id} ({status})")
+            except JobCancelled as e:
+                local.error = e
+                self.db_manager.update_job(job_id, status=REVOKED, finished_at=_now())
+                logger.info(f"任务已取消: {job_id}")
+            except Exception as e:
+                local.error = e
+                self.db_manager.update_job(job_id, status=FAILURE, error=str(e), finished_at=_now())
+                logger.error(f"任务执行失败 {job_id}: {e}")
+            finally:
+                context._finish()
+                self._contexts.pop(job_id, None)
+        except Exception as e:
+            logger.error(f"任务状态更新失败 {job_id}: {e}")
+        finally:
+            local.done.set()
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """获取任务状态、进度和结果"""
+        return self.db_manager.get_job(job_id)
+
+    def list_jobs(self, job_type: str = None, status: str = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """按创建时间倒序列出任务（不含结果内容）"""
+        jobs = self.db_manager.list_jobs(job_type=job_type, statuses=(status,) if status else None, limit=limit)
+        for job in jobs:
+            job.pop('result', None)
+        return jobs
+
+    def cancel(self, job_id: str) -> bool:
+        """请求取消任务；排队中的任务不再执行，运行中的任务在下次检查时停止"""
+        if not self.db_manager.request_job_cancel(job_id):
+            return False
+        context = self._contexts.get(job_id)
+        if context is not None:
+            context._cancel()
+        return True
+
+    def cleanup(self, max_age_hours: int = None, job_type: str = None) -> int:
+        """删除已结束且超过保留时间的任务"""
+        max_age_hours = max_age_hours or config.get('JOBS.retention_hours', 168)
+        cutoff = (datetime.now() - timedelta(hours=max_age_hours)).strftime('%Y-%m-%d %H:%M:%S')
+        return self.db_manager.delete_jobs(cutoff, READY_STATES, job_type)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+# 全局任务管理器
+job_manager = JobManager()
@@ -0,0 +1,231 @@
+"""
+策略参数优化器
+对 Strategy 子类做网格/随机参数搜索，参数组合分发到进程池并行回测，
+价格数据通过共享内存传给子进程，避免每个任务重复序列化整张行情表
+"""
+import itertools
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict, List, Optional, Type
+
+import numpy as np
+import pandas as pd
+
+from utils.logger import logger
+from utils.config import config
+from core.analyzer import TechnicalAnalyzer
+from core.backtest import BacktestEngine, Strategy, MAStrategy, RSIStrategy
+from strategies.example_strategies import (
+    MACDStrategy, BollingerBandsStrategy, CompositeStrategy, MomentumStrategy
+)
+
+
+# 可优化的策略，键与 /api/backtest/run 使用的策略名称一致
+STRATEGY_REGISTRY: Dict[str, Type[Strategy]] = {
+    'MA策略': MAStrategy,
+    'RSI策略': RSIStrategy,
+    'MACD策略': MACDStrategy,
+    '布林带策略': BollingerBandsStrategy,
+    '综合策略': CompositeStrategy,
+    '动量策略': MomentumStrategy,
+}
+
+# 参数之间的约束，不满足的组合不参与回测
+PARAM_CONSTRAINTS: Dict[Type[Strategy], Callable[[Dict[str, Any]], bool]] = {
+    MAStrategy: lambda p: p.get('short_period', 5) < p.get('long_period', 20),
+    RSIStrategy: lambda p: p.get('oversold', 30) < p.get('overbought', 70),
+    MACDStrategy: lambda p: p.get('fast', 12) < p.get('slow', 26),
+}
+
+RESULT_METRICS = ['sharpe_ratio', 'total_return', 'annual_return', 'max_drawdown', 'trade_count', 'win_rate']
+
+
+# ---------------------------------------------------------------------------
+# 子进程端：每个工作进程只挂载一次共享内存并计算一次技术指标
+# ---------------------------------------------------------------------------
+
+_worker_state: Dict[str, Any] = {}
+
+
+def _init_worker(shm_name: str, shape: tuple, columns: List[str], index_name: Optional[str],
+                 symbol: str, initial_capital: float, commission_rate: float, engine: str):
+    """工作进程初始化：从共享内存重建行情数据"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    block = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+
+    # 第0列为日期（纳秒时间戳），其余为价格列
+    index = pd.DatetimeIndex(block[:, 0].astype('int64'), name=index_name)
+    df = pd.DataFrame(block[:, 1:].copy(), index=index, columns=columns)
+    del block
+    shm.close()
+
+    _worker_state.update({
+        'data': TechnicalAnalyzer().calculate_all_indicators(df),
+        'symbol': symbol,
+        'engine': BacktestEngine(initial_capital, commission_rate, engine),
+    })
+
+
+def _run_one(strategy_cls: Type[Strategy], params: Dict[str, Any]) -> Dict[str, Any]:
+    """在工作进程中运行单个参数组合"""
+    return _evaluate(strategy_cls, params, _worker_state['data'], _worker_state['symbol'],
+                     _worker_state['engine'])
+
+
+def _evaluate(strategy_cls: Type[Strategy], params: Dict[str, Any], data: pd.DataFrame,
+              symbol: str, engine: BacktestEngine) -> Dict[str, Any]:
+    """回测一个参数组合，只返回排名所需的指标"""
+    row = dict(params)
+    try:
+        results = engine.run_backtest(strategy_cls(**params), data, symbol, indicators_ready=True)
+        for metric in RESULT_METRICS:
+            value = results[metric]
+            row[metric] = float(value) if pd.notna(value) else 0.0
+        row['error'] = None
+    except Exception as e:
+        for metric in RESULT_METRICS:
+            row[metric] = np.nan
+        row['error'] = str(e)
+    return row
+
+
+# ---------------------------------------------------------------------------
+# 主进程端
+# ---------------------------------------------------------------------------
+
+class StrategyOptimizer:
+    """策略参数优化器"""
+
+    def __init__(self,
+                 strategy_cls: Type[Strategy],
+                 initial_capital: float = None,
+                 commission_rate: float = None,
+                 max_workers: int = None,
+                 engine: str = None):
+        if isinstance(strategy_cls, str):
+            if strategy_cls not in STRATEGY_REGISTRY:
+                raise ValueError(f"不支持的策略: {strategy_cls}")
+            strategy_cls = STRATEGY_REGISTRY[strategy_cls]
+
+        # 进程数上限为 BACKTEST.optimizer_workers（0 表示CPU核数），调用方传入的值只能更小
+        limit = config.get('BACKTEST.optimizer_workers', 0) or os.cpu_count() or 1
+
+        self.strategy_cls = strategy_cls
+        self.initial_capital = initial_capital if initial_capital is not None else \
+            config.get('BACKTEST.initial_capital', 1000000)
+        self.commission_rate = commission_rate if commission_rate is not None else \
+            config.get('BACKTEST.commission_rate', 0.0003)
+        self.engine = engine or config.get('BACKTEST.engine', 'vectorized')
+        self.max_workers = max(1, min(int(max_workers or limit), limit))
+
+    def grid(self, param_grid: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+        """展开网格参数，过滤不满足约束的组合"""
+        keys = list(param_grid.keys())
+        combos = [dict(zip(keys, values)) for values in itertools.product(*(param_grid[k] for k in keys))]
+        return self._filter(combos)
+
+    def sample(self, param_grid: Dict[str, List[Any]], n_iter: int, seed: int = None) -> List[Dict[str, Any]]:
+        """从网格中随机抽取 n_iter 个不重复的组合"""
+        combos = self.grid(param_grid)
+        if n_iter >= len(combos):
+            return combos
+        return random.Random(seed).sample(combos, n_iter)
+
+    def _filter(self, combos: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        constraint = PARAM_CONSTRAINTS.get(self.strategy_cls)
+        if constraint is None:
+            return combos
+        return [p for p in combos if constraint(p)]
+
+    def optimize(self,
+                 data: pd.DataFrame,
+                 symbol: str,
+                 param_grid: Dict[str, List[Any]],
+                 method: str = 'grid',
+                 n_iter: int = 100,
+                 seed: int = None,
+                 sort_by: str = 'sharpe_ratio',
+                 progress_callback: Callable[[int, int], None] = None) -> pd.DataFrame:
+        """
+        运行参数优化
+
+        Args:
+            data: 行情数据（OHLCV，日期索引）
+            symbol: 股票代码
+            param_grid: 参数名 -> 候选值列表
+            method: grid（网格搜索）或 random（随机搜索）
+            n_iter: 随机搜索的组合数量
+            seed: 随机搜索的种子
+            sort_by: 排序指标，降序排列
+            progress_callback: 进度回调 (已完成数, 总数)
+
+        Returns:
+            DataFrame: 每行一个参数组合及其回测指标，按 sort_by 排序，含 rank 列
+        """
+        if method == 'grid':
+            combos = self.grid(param_grid)
+        elif method == 'random':
+            combos = self.sample(param_grid, n_iter, seed)
+        else:
+            raise ValueError(f"不支持的搜索方式: {method}")
+
+        if sort_by not in RESULT_METRICS:
+            raise ValueError(f"不支持的排序指标: {sort_by}")
+
+        if not combos:
+            return pd.DataFrame(columns=list(param_grid.keys()) + RESULT_METRICS + ['error', 'rank'])
+
+        prices = data.select_dtypes(include=[np.number]).astype(np.float64)
+        prices.index = pd.to_datetime(prices.index)
+
+        start = datetime.now()
+        workers = min(self.max_workers, len(combos))
+        logger.info(f"开始参数优化: {self.strategy_cls.__name__}, {len(combos)} 个组合, {workers} 个进程")
+
+        if workers <= 1:
+            rows = self._run_serial(prices, symbol, combos, progress_callback)
+        else:
+            rows = self._run_parallel(prices, symbol, combos, workers, progress_callback)
+
+        table = pd.DataFrame(rows)
+        table = table.sort_values(sort_by, ascending=False, na_position='last').reset_index(drop=True)
+        table['rank'] = np.arange(1, len(table) + 1)
+
+        elapsed = (datetime.now() - start).total_seconds()
+        logger.info(f"参数优化完成: {len(combos)} 个组合, 耗时 {elapsed:.2f}s")
+        return table
+
+    def _run_serial(self, prices, symbol, combos, progress_callback) -> List[Dict[str, Any]]:
+        """组合较少或只有一个进程时在当前进程执行"""
+        data = TechnicalAnalyzer().calculate_all_indicators(prices)
+        engine = BacktestEngine(self.initial_capital, self.commission_rate, self.engine)
+        rows = []
+        for i, params in enumerate(combos):
+            rows.append(_evaluate(self.strategy_cls, params, data, symbol, engine))
+            if progress_callback:
+                progress_callback(i + 1, len(combos))
+        return rows
+
+    def _run_parallel(self, prices, symbol, combos, workers, progress_callback) -> List[Dict[str, Any]]:
+        """进程池执行，行情数据放在共享内存中"""
+        block = np.column_stack([prices.index.asi8.astype(np.float64), prices.to_numpy()])
+        shm = shared_memory.SharedMemory(create=True, size=block.nbytes)
+        try:
+            np.ndarray(block.shape, dtype=np.float64, buffer=shm.buf)[:] = block
+            initargs = (shm.name, block.shape, list(prices.columns), prices.index.name,
+                        symbol, self.initial_capital, self.commission_rate, self.engine)
+
+            rows = []
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as pool:
+                futures = [pool.submit(_run_one, self.strategy_cls, params) for params in combos]
+                for future in as_completed(futures):
+                    rows.append(future.result())
+                    if progress_callback:
+                        progress_callback(len(rows), len(combos))
+            return rows
+        finally:
+            shm.close()
+            shm.unlink()
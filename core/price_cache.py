@@ -0,0 +1,331 @@
+"""
+全市场列式价格缓存
+把 stock_daily 中所有股票的OHLCV按字段存为 日期×股票 的 float64 矩阵文件，
+以共享交易日历为行轴，通过 np.memmap 零拷贝打开，
+全市场收盘价矩阵无需逐只股票查询SQLite即可在毫秒级载入
+"""
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from utils.logger import logger
+from utils.config import config
+
+
+CACHE_VERSION = 1
+FIELDS = ['open', 'high', 'low', 'close', 'volume', 'turnover']
+
+
+class PriceCache:
+    """列式内存映射价格缓存
+
+    目录结构：
+        current.json        指向当前生效的数据目录（原子替换）
+        <build_id>/meta.json   日历长度、股票列表、列容量、最后日期
+        <build_id>/calendar.npy  交易日历（datetime64[D]）
+        <build_id>/<field>.f8    C顺序 float64 矩阵，形状 (日期数, 列容量)
+
+    新交易日追加到矩阵末尾；新股票占用预留的空列，列容量用尽时整体重建
+    """
+
+    def __init__(self, cache_dir: str = None, db_manager=None, spare_columns: int = None):
+        if db_manager is None:
+            from core.storage import db_manager
+        self.db_manager = db_manager
+        self.cache_dir = Path(cache_dir or config.get('PRICE_CACHE.path') or
+                              Path(self.db_manager.db_path).parent / 'price_cache')
+        self.spare_columns = spare_columns if spare_columns is not None else \
+            config.get('PRICE_CACHE.spare_columns', 256)
+        self.lock = threading.RLock()
+        self._opened: Optional[Dict[str, Any]] = None
+        self._opened_key = None
+
+    # ------------------------------------------------------------------
+    # 读取
+    # ------------------------------------------------------------------
+
+    def _current_dir(self) -> Optional[Path]:
+        pointer = self.cache_dir / 'current.json'
+        if not pointer.exists():
+            return None
+        with open(pointer, 'r', encoding='utf-8') as f:
+            return self.cache_dir / json.load(f)['build_id']
+
+    def _open(self) -> Optional[Dict[str, Any]]:
+        """打开当前缓存，meta 变化后重新映射"""
+        with self.lock:
+            build_dir = self._current_dir()
+            if build_dir is None:
+                return None
+            meta_path = build_dir / 'meta.json'
+            key = (str(build_dir), meta_path.stat().st_mtime_ns)
+            if self._opened is not None and self._opened_key == key:
+                return self._opened
+
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get('version') != CACHE_VERSION:
+                return None
+
+            n_dates, capacity = meta['n_dates'], meta['capacity']
+            calendar = np.load(build_dir / 'calendar.npy')[:n_dates].astype('datetime64[ns]')
+            matrices = {
+                field: np.memmap(build_dir / f'{field}.f8', dtype=np.float64, mode='r',
+                                 shape=(n_dates, capacity)) if n_dates else
+                np.empty((0, capacity))
+                for field in FIELDS
+            }
+            self._opened = {
+                'meta': meta,
+                'dates': pd.DatetimeIndex(calendar, name='date'),
+                'symbols': meta['symbols'],
+                'columns': {symbol: i for i, symbol in enumerate(meta['symbols'])},
+                'matrices': matrices,
+            }
+            self._opened_key = key
+            return self._opened
+
+    def is_built(self) -> bool:
+        return self._open() is not None
+
+    def get_matrix(self,
+                   field: str = 'close',
+                   symbols: List[str] = None,
+                   start_date: str = None,
+                   end_date: str = None) -> pd.DataFrame:
+        """
+        获取 日期×股票 的价格矩阵
+
+        不指定 symbols 时返回全市场，数据直接是内存映射的只读视图（不复制）；
+        没有数据的位置为 NaN
+
+        Args:
+            field: open/high/low/close/volume/turnover
+            symbols: 股票代码列表
+            start_date: 开始日期
+            end_date: 结束日期
+        """
+        if field not in FIELDS:
+            raise ValueError(f"不支持的价格字段: {field}")
+        opened = self._open()
+        if opened is None:
+            raise RuntimeError("价格缓存尚未构建，请先调用 rebuild()")
+
+        dates = opened['dates']
+        start = dates.searchsorted(pd.Timestamp(start_date)) if start_date else 0
+        stop = dates.searchsorted(pd.Timestamp(end_date), side='right') if end_date else len(dates)
+        matrix = opened['matrices'][field]
+
+        if symbols is None:
+            n = len(opened['symbols'])
+            values = matrix[start:stop, :n]
+            columns = opened['symbols']
+        else:
+            columns = list(symbols)
+            index = [opened['columns'].get(s, -1) for s in columns]
+            values = np.full((stop - start, len(columns)), np.nan)
+            present = [i for i, col in enumerate(index) if col >= 0]
+            if present:
+                values[:, present] = matrix[start:stop, [index[i] for i in present]]
+
+        return pd.DataFrame(values, index=dates[start:stop], columns=pd.Index(columns, name='symbol'),
+                            copy=False)
+
+    def get_stock_frame(self, symbol: str, start_date: str = None, end_date: str = None) -> pd.DataFrame:
+        """获取单只股票的OHLCV（去掉没有数据的交易日），格式同 get_stock_daily_data"""
+        opened = self._open()
+        if opened is None or symbol not in opened['columns']:
+            return pd.DataFrame()
+        col = opened['columns'][symbol]
+        dates = opened['dates']
+        start = dates.searchsorted(pd.Timestamp(start_date)) if start_date else 0
+        stop = dates.searchsorted(pd.Timestamp(end_date), side='right') if end_date else len(dates)
+        df = pd.DataFrame({field: np.array(opened['matrices'][field][start:stop, col]) for field in FIELDS},
+                          index=dates[start:stop])
+        return df[df['close'].notna()]
+
+    def get_stats(self) -> Dict[str, Any]:
+        opened = self._open()
+        if opened is None:
+            return {'built': False}
+        meta = opened['meta']
+        return {
+            'built': True,
+            'build_id': meta['build_id'],
+            'dates': meta['n_dates'],
+            'symbols': len(meta['symbols']),
+            'capacity': meta['capacity'],
+            'last_date': meta['last_date'],
+            'updated_at': meta['updated_at'],
+        }
+
+    # ------------------------------------------------------------------
+    # 构建与增量更新
+    # ------------------------------------------------------------------
+
+    def _load_rows(self, where: str = '', params: List[Any] = None) -> pd.DataFrame:
+        query = f"SELECT symbol, date, {', '.join(FIELDS)} FROM stock_daily {where}"
+        with self.db_manager.connection() as conn:
+            return pd.read_sql_query(query, conn, params=params or [])
+
+    def _write_meta(self, build_dir: Path, meta: Dict[str, Any]):
+        meta['updated_at'] = time.strftime('%Y-%m-%d %H:%M:%S')
+        tmp = build_dir / 'meta.json.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp, build_dir / 'meta.json')
+
+    def _write_calendar(self, build_dir: Path, dates: pd.DatetimeIndex):
+        # 先写临时文件再替换，正在读取的进程不会看到截断的文件
+        tmp = build_dir / 'calendar.tmp.npy'
+        np.save(tmp, dates.values.astype('datetime64[D]'))
+        os.replace(tmp, build_dir / 'calendar.npy')
+
+    def rebuild(self) -> Dict[str, Any]:
+        """从 stock_daily 全量构建缓存，写入新目录后原子切换"""
+        with self.lock:
+            start = time.time()
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            build_id = f"build_{time.time_ns()}"
+            build_dir = self.cache_dir / build_id
+            build_dir.mkdir()
+
+            with self.db_manager.connection() as conn:
+                calendar = [row[0] for row in conn.execute("SELECT DISTINCT date FROM stock_daily ORDER BY date")]
+                symbols = [row[0] for row in conn.execute("SELECT DISTINCT symbol FROM stock_daily ORDER BY symbol")]
+
+            capacity = len(symbols) + self.spare_columns
+            dates = pd.DatetimeIndex(pd.to_datetime(calendar))
+            self._write_calendar(build_dir, dates)
+
+            rows = self._load_rows()
+            row_index = dates.get_indexer(pd.to_datetime(rows['date']))
+            col_index = pd.Index(symbols).get_indexer(rows['symbol'])
+
+            # 逐字段写入，任一时刻只有一个字段的矩阵在内存中
+            for field in FIELDS:
+                matrix = np.full((len(dates), capacity), np.nan)
+                matrix[row_index, col_index] = pd.to_numeric(rows[field], errors='coerce').to_numpy(dtype=np.float64)
+                matrix.tofile(build_dir / f'{field}.f8')
+                del matrix
+
+            meta = {
+                'version': CACHE_VERSION,
+                'build_id': build_id,
+                'n_dates': len(dates),
+                'capacity': capacity,
+                'symbols': symbols,
+                'last_date': calendar[-1] if calendar else None,
+            }
+            self._write_meta(build_dir, meta)
+            self._switch_to(build_id)
+
+            result = {'mode': 'rebuild', 'dates': len(dates), 'symbols': len(symbols),
+                      'rows': len(rows), 'seconds': round(time.time() - start, 3)}
+            logger.info(f"价格缓存全量构建完成: {result}")
+            return result
+
+    def _switch_to(self, build_id: str):
+        """原子切换当前目录并清理旧目录"""
+        tmp = self.cache_dir / 'current.json.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'build_id': build_id}, f)
+        os.replace(tmp, self.cache_dir / 'current.json')
+        self._opened = None
+
+        for path in self.cache_dir.iterdir():
+            if path.is_dir() and path.name.startswith('build_') and path.name != build_id:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def refresh(self, symbols: List[str] = None) -> Dict[str, Any]:
+        """
+        增量更新缓存
+
+        - 追加 last_date 之后的新交易日，并写入这些日期的全部行情；
+          last_date 当天的行情重新读取并原地覆盖（盘中快照写入后收盘数据会再次更新）
+        - 指定 symbols 时重新载入这些股票的全部历史（用于历史回填）
+        - 新出现的股票占用预留列；列容量不足、日历中间插入了新日期或缓存不存在时全量重建
+        """
+        with self.lock:
+            opened = self._open()
+            if opened is None:
+                return self.rebuild()
+
+            start = time.time()
+            meta = dict(opened['meta'])
+            build_dir = self.cache_dir / meta['build_id']
+            last_date = meta['last_date']
+
+            if symbols is not None and len(symbols) > len(meta['symbols']) / 2:
+                return self.rebuild()
+
+            with self.db_manager.connection() as conn:
+                if last_date:
+                    new_dates = [row[0] for row in conn.execute(
+                        "SELECT DISTINCT date FROM stock_daily WHERE date > ? ORDER BY date", (last_date,))]
+                else:
+                    new_dates = [row[0] for row in conn.execute(
+                        "SELECT DISTINCT date FROM stock_daily ORDER BY date")]
+
+            where, params = ("WHERE date >= ?", [last_date]) if last_date else ('', [])
+            rows = self._load_rows(where, params)
+            if symbols:
+                placeholders = ','.join(['?'] * len(symbols))
+                backfill = self._load_rows(f"WHERE symbol IN ({placeholders})", list(symbols))
+                if rows.empty:
+                    rows = backfill
+                elif not backfill.empty:
+                    rows = pd.concat([rows, backfill], ignore_index=True)
+
+            if rows.empty and not new_dates:
+                return {'mode': 'incremental', 'dates': 0, 'symbols': 0, 'rows': 0,
+                        'seconds': round(time.time() - start, 3)}
+
+            calendar = opened['dates'].append(pd.DatetimeIndex(pd.to_datetime(new_dates)))
+            row_index = calendar.get_indexer(pd.to_datetime(rows['date']))
+            if (row_index < 0).any():
+                # 回填数据中出现了日历里没有的历史日期
+                return self.rebuild()
+
+            new_symbols = sorted(set(rows['symbol']) - set(opened['columns']))
+            all_symbols = meta['symbols'] + new_symbols
+            if len(all_symbols) > meta['capacity']:
+                return self.rebuild()
+
+            # 先追加新交易日的空行，再原地写入数值
+            capacity = meta['capacity']
+            n_dates = len(calendar)
+            if new_dates:
+                blank = np.full((len(new_dates), capacity), np.nan)
+                for field in FIELDS:
+                    with open(build_dir / f'{field}.f8', 'ab') as f:
+                        blank.tofile(f)
+                self._write_calendar(build_dir, calendar)
+
+            col_index = pd.Index(all_symbols).get_indexer(rows['symbol'])
+            for field in FIELDS:
+                matrix = np.memmap(build_dir / f'{field}.f8', dtype=np.float64, mode='r+',
+                                   shape=(n_dates, capacity))
+                matrix[row_index, col_index] = pd.to_numeric(rows[field], errors='coerce').to_numpy(dtype=np.float64)
+                matrix.flush()
+                del matrix
+
+            meta.update({
+                'n_dates': n_dates,
+                'symbols': all_symbols,
+                'last_date': calendar[-1].strftime('%Y-%m-%d') if n_dates else None,
+            })
+            self._write_meta(build_dir, meta)
+            self._opened = None
+
+            result = {'mode': 'incremental', 'dates': len(new_dates), 'symbols': len(new_symbols),
+                      'rows': len(rows), 'seconds': round(time.time() - start, 3)}
+            logger.info(f"价格缓存增量更新完成: {result}")
+            return result
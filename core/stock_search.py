@@ -0,0 +1,250 @@
+"""
+股票搜索模块
+stock_info 的代码、名称和名称拼音首字母建立 FTS5 全文索引（trigram 分词，支持任意子串匹配），
+由触发器随 stock_info 的增删改同步；数值筛选字段建有 (字段, symbol) 复合索引。
+分页使用按排序键的游标（keyset），深度翻页不再扫描前面的行；总数按筛选条件缓存一段时间
+"""
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    from pypinyin import lazy_pinyin, Style
+except ImportError:  # 可选依赖，未安装时不建立拼音首字母索引
+    lazy_pinyin = None
+
+from utils.logger import logger
+from utils.config import config
+from utils.pagination import encode_cursor, decode_cursor, keyset_condition, CountCache
+from core.storage import db_manager
+
+
+FTS_TABLE = 'stock_info_fts'
+
+# trigram 分词只能匹配不少于3个字符的关键词，更短的关键词退回 LIKE
+TRIGRAM_MIN_LENGTH = 3
+
+RESULT_COLUMNS = ('symbol', 'name', 'industry', 'market_cap', 'pe_ratio', 'pb_ratio', 'updated_at')
+SORT_FIELDS = RESULT_COLUMNS
+
+# 区间筛选参数 -> (字段, 运算符)
+RANGE_FILTERS = {
+    'min_market_cap': ('market_cap', '>='),
+    'max_market_cap': ('market_cap', '<='),
+    'min_pe_ratio': ('pe_ratio', '>='),
+    'max_pe_ratio': ('pe_ratio', '<='),
+    'min_pb_ratio': ('pb_ratio', '>='),
+    'max_pb_ratio': ('pb_ratio', '<='),
+}
+
+
+def name_initials(name: str) -> Optional[str]:
+    """股票名称的拼音首字母（如 平安银行 -> payh），未安装 pypinyin 时返回 None"""
+    if lazy_pinyin is None or not name:
+        return None
+    return ''.join(lazy_pinyin(name, style=Style.FIRST_LETTER)).lower()
+
+
+def _escape_like(keyword: str) -> str:
+    return keyword.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+class StockSearch:
+    """股票搜索"""
+
+    def __init__(self, db_manager, count_ttl: float = None):
+        """
+        Args:
+            db_manager: 数据库管理器
+            count_ttl: 筛选结果总数的缓存时长(秒)，默认读取 SEARCH.count_cache_ttl
+        """
+        self.db_manager = db_manager
+        count_ttl = count_ttl if count_ttl is not None else config.get('SEARCH.count_cache_ttl', 300)
+        self.counts = CountCache(count_ttl)
+        self.max_page_size = config.get('SEARCH.max_page_size', 200)
+        self.fts_enabled = False
+        self._ready = False
+        self.lock = threading.Lock()
+
+    def ensure_index(self):
+        """创建全文索引和同步触发器（每个进程只执行一次）"""
+        if self._ready:
+            return
+        with self.lock:
+            if self._ready:
+                return
+            with self.db_manager.connection() as conn:
+                try:
+                    exists = conn.execute(
+                        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (FTS_TABLE,)
+                    ).fetchone()
+                    conn.execute(f'''
+                        CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE}
+                        USING fts5(symbol, name, pinyin, tokenize = 'trigram')
+                    ''')
+                    # 触发器只用SQL维护索引，其他进程或脚本写入 stock_info 时同样生效
+                    conn.execute(f'''
+                        CREATE TRIGGER IF NOT EXISTS stock_info_fts_ai AFTER INSERT ON stock_info BEGIN
+                            INSERT OR REPLACE INTO {FTS_TABLE} (rowid, symbol, name, pinyin)
+                            VALUES (new.rowid, new.symbol, new.name, new.pinyin);
+                        END
+                    ''')
+                    conn.execute(f'''
+                        CREATE TRIGGER IF NOT EXISTS stock_info_fts_au
+                        AFTER UPDATE OF symbol, name, pinyin ON stock_info BEGIN
+                            DELETE FROM {FTS_TABLE} WHERE rowid = old.rowid;
+                            INSERT OR REPLACE INTO {FTS_TABLE} (rowid, symbol, name, pinyin)
+                            VALUES (new.rowid, new.symbol, new.name, new.pinyin);
+                        END
+                    ''')
+                    conn.execute(f'''
+                        CREATE TRIGGER IF NOT EXISTS stock_info_fts_ad AFTER DELETE ON stock_info BEGIN
+                            DELETE FROM {FTS_TABLE} WHERE rowid = old.rowid;
+                        END
+                    ''')
+                    if not exists:
+                        conn.execute(f'''
+                            INSERT INTO {FTS_TABLE} (rowid, symbol, name, pinyin)
+                            SELECT rowid, symbol, name, pinyin FROM stock_info
+                        ''')
+                    self.fts_enabled = True
+                except sqlite3.OperationalError as e:
+                    logger.warning(f"当前SQLite不支持FTS5 trigram分词，股票搜索使用LIKE匹配: {e}")
+            self._ready = True
+        self.refresh_pinyin()
+
+    def rebuild(self) -> int:
+        """重建全文索引（清除 REPLACE INTO 等绕过删除触发器留下的旧条目），返回索引行数"""
+        self.ensure_index()
+        if not self.fts_enabled:
+            return 0
+        with self.db_manager.connection() as conn:
+            conn.execute(f"DELETE FROM {FTS_TABLE}")
+            cursor = conn.execute(f'''
+                INSERT INTO {FTS_TABLE} (rowid, symbol, name, pinyin)
+                SELECT rowid, symbol, name, pinyin FROM stock_info
+            ''')
+            count = cursor.rowcount
+        self.invalidate_counts()
+        return count
+
+    def refresh_pinyin(self) -> int:
+        """为尚无拼音首字母（新增或改名）的股票计算拼音，返回更新的行数"""
+        if lazy_pinyin is None:
+            return 0
+        with self.db_manager.connection() as conn:
+            rows = conn.execute(
+                "SELECT symbol, name FROM stock_info WHERE pinyin IS NULL AND name IS NOT NULL AND name != ''"
+            ).fetchall()
+            if rows:
+                conn.executemany("UPDATE stock_info SET pinyin = ? WHERE symbol = ?",
+                                 [(name_initials(name), symbol) for symbol, name in rows])
+        return len(rows)
+
+    def invalidate_counts(self):
+        """清空总数缓存（股票列表同步后调用）"""
+        self.counts.clear()
+
+    def _keyword_condition(self, keyword: str) -> Tuple[str, list]:
+        if self.fts_enabled and len(keyword) >= TRIGRAM_MIN_LENGTH:
+            # 整个关键词作为短语匹配，即代码、名称或拼音首字母中包含该子串
+            phrase = '"' + keyword.replace('"', '""') + '"'
+            return (f"s.rowid IN (SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH ?)", [phrase])
+        pattern = f"%{_escape_like(keyword)}%"
+        return ("(s.symbol LIKE ? ESCAPE '\\' OR s.name LIKE ? ESCAPE '\\' OR s.pinyin LIKE ? ESCAPE '\\')",
+                [pattern, pattern, pattern])
+
+    def search(self,
+               keyword: str = None,
+               industry: str = None,
+               sort_by: str = 'symbol',
+               sort_order: str = 'ASC',
+               cursor: str = None,
+               page: int = 1,
+               page_size: int = 20,
+               with_total: bool = True,
+               **ranges) -> Dict[str, Any]:
+        """
+        搜索股票
+
+        Args:
+            keyword: 股票代码、名称或拼音首字母关键词
+            industry: 行业筛选
+            sort_by: 排序字段
+            sort_order: 排序顺序(ASC/DESC)
+            cursor: 上一页返回的 next_cursor，为空时从第一页（或 page 指定的页）开始
+            page: 页码，仅在没有游标时按 OFFSET 定位（兼容旧接口）
+            page_size: 每页数量
+            with_total: 是否返回总数（按筛选条件缓存 count_ttl 秒）
+            ranges: 区间筛选，见 RANGE_FILTERS
+        """
+        self.ensure_index()
+        page = max(1, int(page or 1))
+        page_size = max(1, min(int(page_size or 20), self.max_page_size))
+        sort_by = sort_by if sort_by in SORT_FIELDS else 'symbol'
+        descending = str(sort_order).upper() == 'DESC'
+
+        conditions, params = [], []
+        keyword = (keyword or '').strip()
+        if keyword:
+            sql, values = self._keyword_condition(keyword)
+            conditions.append(sql)
+            params.extend(values)
+        if industry:
+            conditions.append("s.industry = ?")
+            params.append(industry)
+        for name, (column, op) in RANGE_FILTERS.items():
+            value = ranges.get(name)
+            if value is not None:
+                conditions.append(f"s.{column} {op} ?")
+                params.append(value)
+        where_sql = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+        page_conditions, page_params = list(conditions), list(params)
+        if cursor:
+            last_value, last_symbol = decode_cursor(cursor, 2)
+            sql, values = keyset_condition(f"s.{sort_by}", 's.symbol', descending, last_value, last_symbol)
+            page_conditions.append(sql)
+            page_params.extend(values)
+        page_where = f"WHERE {' AND '.join(page_conditions)}" if page_conditions else ''
+
+        direction = 'DESC' if descending else 'ASC'
+        order_sql = f"s.{sort_by} {direction}"
+        if sort_by != 'symbol':
+            order_sql += f", s.symbol {direction}"
+        query = (f"SELECT {', '.join('s.' + c for c in RESULT_COLUMNS)} FROM stock_info s "
+                 f"{page_where} ORDER BY {order_sql} LIMIT ?")
+        # 多取一行判断是否还有下一页
+        page_params.append(page_size + 1)
+        if not cursor and page > 1:
+            query += " OFFSET ?"
+            page_params.append((page - 1) * page_size)
+
+        with self.db_manager.connection() as conn:
+            rows = conn.execute(query, page_params).fetchall()
+            total_count = self.counts.get_or_compute(
+                [where_sql, params],
+                lambda: conn.execute(f"SELECT COUNT(*) FROM stock_info s {where_sql}", params).fetchone()[0]
+            ) if with_total else None
+
+        has_more = len(rows) > page_size
+        stocks = [dict(zip(RESULT_COLUMNS, row)) for row in rows[:page_size]]
+        next_cursor = None
+        if has_more:
+            last = stocks[-1]
+            next_cursor = encode_cursor([last[sort_by], last['symbol']])
+
+        pagination = {
+            'current_page': page,
+            'page_size': page_size,
+            'has_more': has_more,
+            'next_cursor': next_cursor,
+        }
+        if total_count is not None:
+            pagination['total_count'] = total_count
+            pagination['total_pages'] = (total_count + page_size - 1) // page_size
+        return {'stocks': stocks, 'pagination': pagination}
+
+
+# 全局搜索实例
+stock_search = StockSearch(db_manager)
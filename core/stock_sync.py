@@ -3,18 +3,21 @@
 负责从AKShare获取股票数据并同步到本地数据库
 """
 import pandas as pd
-import time
-import sqlite3
 import random
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional, Tuple, Any
-import akshare as ak
 
 from utils.logger import logger
+from utils.config import config
 from core.data_source import DataSource
 from core.storage import db_manager
 from core.analyzer import TechnicalAnalyzer
+from core.indicator_state import IndicatorStateUpdater
 from core.sync_progress import sync_progress_manager
+from core.sync_engine import ConcurrentSyncEngine
+from core.stock_search import stock_search
+from core.catalog import table_catalog
+from core.sync_planner import IncrementalSyncPlanner
 
 
 class StockDataSynchronizer:
@@ -24,7 +27,15 @@ class StockDataSynchronizer:
         self.data_source = DataSource()
         self.db_manager = db_manager
         self.analyzer = TechnicalAnalyzer()
+        self.indicator_updater = IndicatorStateUpdater(self.db_manager)
+        self.planner = IncrementalSyncPlanner(self.db_manager)
+        self._engine: Optional[ConcurrentSyncEngine] = None
         logger.info("股票数据同步管理器初始化完成")
+
+    def stop(self):
+        """停止正在进行的并发同步，已完成的股票保留检查点"""
+        if self._engine is not None:
+            self._engine.stop()
     
     def sync_stock_list(self, session_id: str = None):
         """同步股票列表，包含完整的股票信息和财务数据"""
@@ -44,7 +55,7 @@ class StockDataSynchronizer:
             
             # 创建进度会话
             if session_id:
-                sync_progress_manager.create_session('list', total_count)
+                sync_progress_manager.create_session('list', total_count, session_id=session_id)
             
             # 基于股票代码前缀的行业分类
             def get_industry_by_symbol(symbol):
@@ -135,6 +146,14 @@ class StockDataSynchronizer:
             
             logger.info(f"股票列表同步完成，共同步 {success_count} 只股票，包含完整财务数据")
             
+            # 新增或改名的股票补充拼音首字母，搜索总数缓存失效
+            try:
+                stock_search.refresh_pinyin()
+                stock_search.invalidate_counts()
+            except Exception as e:
+                logger.warning(f"更新股票搜索索引失败: {e}")
+            self._update_catalog('stock_info')
+            
             # 完成同步
             if session_id:
                 sync_progress_manager.complete_sync(session_id, success_count, total_count - success_count)
@@ -147,53 +166,147 @@ class StockDataSynchronizer:
                 sync_progress_manager.fail_sync(session_id, str(e))
             return 0
     
-    def sync_all_stock_daily_data(self, start_date=None, end_date=None, symbols=None, session_id: str = None):
+    def _create_sync_engine(self, batch_size: int = None, delay: float = None) -> ConcurrentSyncEngine:
+        """创建并发同步引擎
+
+        delay 为旧接口的逐只请求间隔，换算为每个并发线程不超过 1/delay 次/秒，
+        与 DATA_SOURCE.rate_limit 取较小值
         """
-        同步所有股票的历史行情数据
+        engine = ConcurrentSyncEngine(self.db_manager, write_batch_size=batch_size)
+        if delay and delay > 0:
+            rate = min(engine.bucket.rate, engine.concurrency / delay)
+            engine.bucket = type(engine.bucket)(rate, engine.bucket.capacity)
+        self._engine = engine
+        return engine
+
+    def _refresh_price_cache(self, symbols: List[str] = None):
+        """同步完成后增量更新列式价格缓存，失败不影响同步结果"""
+        try:
+            self.db_manager.refresh_price_cache(symbols)
+        except Exception as e:
+            logger.error(f"更新价格缓存失败: {e}")
+
+    def _update_catalog(self, *tables: str):
+        """同步写入后更新表目录中的行数，失败不影响同步结果"""
+        for table in tables:
+            try:
+                table_catalog.refresh_table(table)
+            except Exception as e:
+                logger.warning(f"更新表目录失败 {table}: {e}")
+
+    def _materialize_indicators(self, symbols: List[str] = None, rebuild: bool = False) -> Optional[int]:
+        """同步完成后推进增量指标并物化到 indicator_daily，失败不影响同步结果
+
+        rebuild=True 用于历史回填：回填的K线早于指标检查点，需要从头重新计算
+        """
+        try:
+            if rebuild:
+                return self.indicator_updater.rebuild(symbols)['symbols']
+            return self.indicator_updater.refresh(symbols)['symbols']
+        except Exception as e:
+            logger.error(f"刷新增量指标状态失败: {e}")
+            return None
+
+    def _plan_incremental_tasks(self, symbols: List[str], default_start: str, end_date: str,
+                                start_date: str = None) -> Tuple[List[tuple], int]:
+        """按交易日历生成增量同步任务，返回 (任务列表, 已是最新而无需同步的股票数)"""
+        return self.planner.plan(symbols, default_start, end_date, start_date)
+
+    def _snapshot_trade_date(self) -> Optional[str]:
+        """
+        可以用实时行情快照作为当天日线时返回今天（YYYY-MM-DD）：
+        已过 DATA_SOURCE.snapshot_after（收盘后快照不再变化）且指数日线确认今天开市，否则返回 None
+        """
+        now = datetime.now()
+        if now.strftime("%H:%M") < config.get('DATA_SOURCE.snapshot_after', '15:30'):
+            return None
+        today = now.strftime("%Y-%m-%d")
+        return today if self.planner.calendar.is_confirmed(today) else None
+
+    def _ingest_spot_snapshot(self, tasks: List[tuple]) -> Tuple[List[tuple], Dict[str, int]]:
+        """
+        用一次全市场行情快照批量写入当天日线，返回 (仍需逐只请求的任务, 统计)
+
+        只缺当天数据的股票不再请求；更早还有缺口的股票只请求到前一天；
+        快照中没有成交的股票（停牌）记为当天已核对。快照获取失败时任务保持不变
+        """
+        trade_date = self._snapshot_trade_date()
+        if trade_date is None:
+            return tasks, {'rows': 0, 'covered': 0}
+
+        fetcher = self.data_source.stock_fetcher
+        try:
+            spot = fetcher.get_stock_realtime()
+            bars = fetcher.spot_to_daily(spot, trade_date)
+            rows = self.db_manager.upsert_daily_frame(bars)
+        except Exception as e:
+            logger.warning(f"全市场快照写入失败，改为逐只同步: {e}")
+            return tasks, {'rows': 0, 'covered': 0}
+
+        listed = set(spot['代码'].astype(str).str.zfill(6))
+        halted = listed - set(bars['symbol'])
+        remaining, covered = self.planner.exclude_day(tasks, listed, trade_date)
+        # 只缺当天的股票（包括停牌）由快照核对；更早还有缺口的股票不记录，避免已核对区间跨过缺口
+        pending = {task[0] for task in remaining}
+        self.planner.record_checked(
+            [(symbol, trade_date, trade_date) for symbol, _, _ in tasks if symbol not in pending],
+            include_today=True
+        )
+
+        logger.info(f"全市场快照写入 {rows} 条当天日线（停牌 {len(halted)} 只），"
+                    f"{covered} 只股票无需逐只请求，{len(remaining)} 只仍需补齐")
+        return remaining, {'rows': rows, 'covered': covered}
+
+    def sync_all_stock_daily_data(self, start_date=None, end_date=None, symbols=None, session_id: str = None,
+                                  batch_size: int = None, delay: float = None, days: int = None):
+        """
+        同步所有股票的历史行情数据（并发执行，中断后可续传）
         Args:
-            start_date: 开始日期，格式：YYYY-MM-DD，默认为None表示从数据库中最早日期开始
+            start_date: 开始日期，格式：YYYY-MM-DD，默认为None表示从数据库中最新日期之后开始
             end_date: 结束日期，格式：YYYY-MM-DD，默认为None表示今天
             symbols: 指定股票代码列表，默认为None表示同步所有股票
             session_id: 进度会话ID
+            batch_size: 每次批量写入的股票数
+            delay: 兼容旧接口的请求间隔（秒）
+            days: 同步最近多少天的数据（优先级高于start_date）
         """
         try:
+            if days:
+                start_date = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
+            
             if symbols is None:
                 # 获取所有股票代码
-                symbols = self.db_manager.get_all_symbols()
+                symbols = self._get_all_stock_symbols()
             
             total_count = len(symbols)
             logger.info(f"开始同步 {total_count} 只股票的历史行情数据...")
             
-            # 创建进度会话
-            if session_id:
-                sync_progress_manager.create_session('history', total_count)
+            today = datetime.now()
+            end = pd.to_datetime(end_date).strftime("%Y%m%d") if end_date else today.strftime("%Y%m%d")
+            start = pd.to_datetime(start_date).strftime("%Y%m%d") if start_date else None
+            default_start = (today - timedelta(days=365)).strftime("%Y%m%d")
             
-            success_count = 0
-            for i, symbol in enumerate(symbols, 1):
-                try:
-                    # 更新进度
-                    if session_id:
-                        sync_progress_manager.update_progress(
-                            session_id, i, symbol, f"正在同步 {symbol} 的历史数据..."
-                        )
-                    
-                    # 同步单只股票的历史数据
-                    result = self.sync_single_stock_daily_data(symbol, start_date, end_date)
-                    if result > 0:
-                        success_count += 1
-                    
-                    if i % 10 == 0:
-                        logger.info(f"进度: {i}/{total_count}, 成功: {success_count}")
-                        
-                except Exception as e:
-                    logger.error(f"同步股票 {symbol} 历史数据时出错: {e}")
-                    continue
+            tasks, up_to_date = self._plan_incremental_tasks(symbols, default_start, end, start)
+            
+            engine = self._create_sync_engine(batch_size, delay)
+            result = engine.run(tasks, 'history', session_id=session_id)
+            self.planner.record_checked(tasks, result['run_id'])
+            success_count = result['success'] + result['skipped'] + up_to_date
             
-            logger.info(f"历史行情数据同步完成，共成功同步 {success_count}/{total_count} 只股票")
+            # 历史回填会改写已有日期之前的数据，按股票重新载入价格缓存
+            self._refresh_price_cache([task[0] for task in tasks])
+            self._materialize_indicators([task[0] for task in tasks], rebuild=bool(start))
+            self._update_catalog('stock_daily', 'indicator_daily')
+            
+            logger.info(f"历史行情数据同步完成，共成功同步 {success_count}/{total_count} 只股票，"
+                        f"{result['symbols_per_sec']} 只/秒")
             
             # 完成同步
             if session_id:
-                sync_progress_manager.complete_sync(session_id, success_count, total_count - success_count)
+                sync_progress_manager.complete_sync(
+                    session_id, success_count, total_count - success_count,
+                    symbols_per_sec=result['symbols_per_sec'], run_id=result['run_id']
+                )
             
             return success_count
             
@@ -207,14 +320,17 @@ class StockDataSynchronizer:
                               days: int = 30,
                               batch_size: int = 50,
                               delay: float = 1.0,
-                              session_id: str = None) -> Dict[str, int]:
+                              session_id: str = None,
+                              use_snapshot: bool = None) -> Dict[str, int]:
         """
-        同步最新的股票数据（增量更新）
+        同步最新的股票数据（增量更新，并发执行，中断后可续传）
         Args:
-            days: 获取最近多少天的数据
-            batch_size: 批处理大小
-            delay: 请求间隔（秒）
+            days: 本地没有数据的股票获取最近多少天的数据
+            batch_size: 每次批量写入的股票数
+            delay: 兼容旧接口的请求间隔（秒），换算为限速上限
             session_id: 进度会话ID
+            use_snapshot: 收盘后是否用一次全市场行情快照写入当天日线，
+                          None 表示按配置 DATA_SOURCE.spot_snapshot
         Returns:
             Dict[str, int]: 同步统计信息
         """
@@ -232,77 +348,52 @@ class StockDataSynchronizer:
             total_count = len(symbols)
             logger.info(f"共 {total_count} 只股票需要同步")
             
-            # 创建进度会话
-            if session_id:
-                sync_progress_manager.create_session('latest', total_count)
+            # 一次查询得到所有股票的最新日期，只请求缺失的日期
+            today = datetime.now()
+            tasks, up_to_date = self._plan_incremental_tasks(
+                symbols,
+                default_start=(today - timedelta(days=days)).strftime("%Y%m%d"),
+                end_date=today.strftime("%Y%m%d")
+            )
+            logger.info(f"{up_to_date} 只股票数据已是最新，{len(tasks)} 只需要同步")
             
-            # 分批处理
-            success_count = 0
-            failed_count = 0
+            # 收盘后当天的日线来自一次全市场快照，逐只请求只用于补齐更早的缺口
+            if use_snapshot is None:
+                use_snapshot = config.get('DATA_SOURCE.spot_snapshot', True)
+            snapshot = {'rows': 0, 'covered': 0}
+            if use_snapshot and tasks:
+                tasks, snapshot = self._ingest_spot_snapshot(tasks)
+                up_to_date += snapshot['covered']
             
-            for i, symbol in enumerate(symbols, 1):
-                try:
-                    # 更新进度
-                    if session_id:
-                        sync_progress_manager.update_progress(
-                            session_id, i, symbol, f"正在同步 {symbol}..."
-                        )
-                    
-                    # 检查数据库中最新的数据日期
-                    latest_date = self._get_latest_stock_date(symbol)
-                    
-                    # 如果数据库中没有数据或数据不是最新的，则获取最近的数据
-                    if latest_date is None:
-                        # 获取最近days天的数据
-                        df = self.data_source.get_stock_data(symbol, days=days)
-                    else:
-                        # 只获取最新数据
-                        start_date = (latest_date + timedelta(days=1)).strftime("%Y%m%d")
-                        end_date = datetime.now().strftime("%Y%m%d")
-                        
-                        if start_date <= end_date:
-                            df = self.data_source.get_stock_data(
-                                symbol, 
-                                start_date=start_date, 
-                                end_date=end_date
-                            )
-                        else:
-                            # 数据已经是最新的
-                            logger.debug(f"股票 {symbol} 数据已是最新的")
-                            success_count += 1
-                            continue
-                    
-                    if not df.empty:
-                        # 保存到数据库
-                        self.db_manager.save_stock_daily_data(symbol, df)
-                        success_count += 1
-                        logger.debug(f"股票 {symbol} 最新数据同步成功，共 {len(df)} 条记录")
-                    else:
-                        logger.warning(f"股票 {symbol} 未获取到最新数据")
-                        success_count += 1  # 没有新数据也算成功
-                    
-                    # 延时避免请求过快
-                    if delay > 0:
-                        time.sleep(delay)
-                        
-                except Exception as e:
-                    logger.error(f"同步股票 {symbol} 最新数据时出错: {e}")
-                    failed_count += 1
-                    continue
-                
-                # 显示进度
-                if i % 10 == 0 or i == total_count:
-                    logger.info(f"进度: {i}/{total_count} ({i/total_count*100:.1f}%)")
+            engine = self._create_sync_engine(batch_size, delay)
+            sync_result = engine.run(tasks, 'latest', session_id=session_id)
+            self.planner.record_checked(tasks, sync_result['run_id'])
+            
+            # 没有新数据也算成功
+            success_count = sync_result['success'] + sync_result['skipped'] + up_to_date
+            failed_count = sync_result['failed']
             
             result = {
                 'total': total_count,
                 'success': success_count,
-                'failed': failed_count
+                'failed': failed_count,
+                'rows': sync_result['rows'] + snapshot['rows'],
+                'snapshot_rows': snapshot['rows'],
+                'symbols_per_sec': sync_result['symbols_per_sec']
             }
             
+            # 新K线入库后增量推进技术指标状态并物化
+            result['indicators_updated'] = self._materialize_indicators()
+            
+            self._refresh_price_cache()
+            self._update_catalog('stock_daily', 'indicator_daily')
+            
             # 完成同步
             if session_id:
-                sync_progress_manager.complete_sync(session_id, success_count, failed_count)
+                sync_progress_manager.complete_sync(
+                    session_id, success_count, failed_count,
+                    symbols_per_sec=sync_result['symbols_per_sec'], run_id=sync_result['run_id']
+                )
             
             logger.info(f"最新股票数据同步完成: {result}")
             return result
@@ -327,14 +418,15 @@ class StockDataSynchronizer:
                      sort_by: str = 'symbol',
                      sort_order: str = 'ASC',
                      page: int = 1,
-                     page_size: int = 20) -> Dict[str, Any]:
+                     page_size: int = 20,
+                     cursor: str = None) -> Dict[str, Any]:
         """
-        搜索股票
+        搜索股票（全文索引 + 游标分页，见 core.stock_search）
         Args:
-            keyword: 股票代码或名称关键词
+            keyword: 股票代码、名称或拼音首字母关键词
             industry: 行业筛选
-            min_price: 最低价格
-            max_price: 最高价格
+            min_price: 最低价格（暂不支持）
+            max_price: 最高价格（暂不支持）
             min_market_cap: 最小市值
             max_market_cap: 最大市值
             min_pe_ratio: 最小市盈率
@@ -343,98 +435,23 @@ class StockDataSynchronizer:
             max_pb_ratio: 最大市净率
             sort_by: 排序字段
             sort_order: 排序顺序(ASC/DESC)
-            page: 页码
+            page: 页码（没有游标时使用）
             page_size: 每页数量
+            cursor: 上一页返回的 next_cursor
         Returns:
             Dict[str, Any]: 股票信息列表和分页信息
         """
         try:
-            # 构建查询语句
-            query = "SELECT symbol, name, industry, market_cap, pe_ratio, pb_ratio, updated_at FROM stock_info WHERE 1=1"
-            count_query = "SELECT COUNT(*) FROM stock_info WHERE 1=1"
-            params = []
-            
-            # 添加搜索条件
-            if keyword:
-                query += " AND (symbol LIKE ? OR name LIKE ?)"
-                count_query += " AND (symbol LIKE ? OR name LIKE ?)"
-                params.extend([f"%{keyword}%", f"%{keyword}%"])
-            
-            if industry:
-                query += " AND industry = ?"
-                count_query += " AND industry = ?"
-                params.append(industry)
-            
-            # 注意：由于数据库中没有close字段，我们暂时不支持价格筛选
-            # 如果需要价格筛选功能，需要从stock_daily表中获取最新价格
-            
-            if min_market_cap is not None:
-                query += " AND market_cap >= ?"
-                count_query += " AND market_cap >= ?"
-                params.append(min_market_cap)
-                
-            if max_market_cap is not None:
-                query += " AND market_cap <= ?"
-                count_query += " AND market_cap <= ?"
-                params.append(max_market_cap)
-                
-            if min_pe_ratio is not None:
-                query += " AND pe_ratio >= ?"
-                count_query += " AND pe_ratio >= ?"
-                params.append(min_pe_ratio)
-                
-            if max_pe_ratio is not None:
-                query += " AND pe_ratio <= ?"
-                count_query += " AND pe_ratio <= ?"
-                params.append(max_pe_ratio)
-                
-            if min_pb_ratio is not None:
-                query += " AND pb_ratio >= ?"
-                count_query += " AND pb_ratio >= ?"
-                params.append(min_pb_ratio)
-                
-            if max_pb_ratio is not None:
-                query += " AND pb_ratio <= ?"
-                count_query += " AND pb_ratio <= ?"
-                params.append(max_pb_ratio)
-            
-            # 添加排序
-            valid_sort_fields = ['symbol', 'name', 'industry', 'market_cap', 'pe_ratio', 'pb_ratio', 'updated_at']
-            if sort_by in valid_sort_fields:
-                query += f" ORDER BY {sort_by} {sort_order}"
-            else:
-                query += " ORDER BY symbol ASC"
-            
-            # 添加分页
-            offset = (page - 1) * page_size
-            query += " LIMIT ? OFFSET ?"
-            params.extend([page_size, offset])
-            
-            # 获取总数
-            with sqlite3.connect(self.db_manager.db_path) as conn:
-                count_cursor = conn.execute(count_query, params[:-2])  # 不包含LIMIT和OFFSET参数
-                total_count = count_cursor.fetchone()[0]
-                
-                # 获取数据
-                df = pd.read_sql_query(query, conn, params=params)
-            
-            # 转换为字典列表
-            stocks = df.to_dict('records') if not df.empty else []
-            
-            # 计算分页信息
-            total_pages = (total_count + page_size - 1) // page_size
-            
-            result = {
-                'stocks': stocks,
-                'pagination': {
-                    'current_page': page,
-                    'page_size': page_size,
-                    'total_count': total_count,
-                    'total_pages': total_pages
-                }
-            }
-            
-            logger.info(f"股票搜索完成，找到 {total_count} 条记录，当前页 {page}/{total_pages}")
+            result = stock_search.search(
+                keyword=keyword, industry=industry,
+                min_market_cap=min_market_cap, max_market_cap=max_market_cap,
+                min_pe_ratio=min_pe_ratio, max_pe_ratio=max_pe_ratio,
+                min_pb_ratio=min_pb_ratio, max_pb_ratio=max_pb_ratio,
+                sort_by=sort_by, sort_order=sort_order,
+                cursor=cursor, page=page, page_size=page_size
+            )
+            pagination = result['pagination']
+            logger.info(f"股票搜索完成，找到 {pagination.get('total_count')} 条记录，当前页 {pagination['current_page']}")
             return result
             
         except Exception as e:
@@ -559,28 +576,33 @@ class StockDataSynchronizer:
             if days:
                 start_date = (datetime.now() - timedelta(days=days)).strftime("%Y%m%d")
                 end_date = datetime.now().strftime("%Y%m%d")
-            elif not start_date:
-                # 获取数据库中最新的数据日期
-                latest_date = self._get_latest_stock_date(symbol)
-                if latest_date:
-                    start_date = (latest_date + timedelta(days=1)).strftime("%Y%m%d")
-                else:
-                    start_date = (datetime.now() - timedelta(days=365)).strftime("%Y%m%d")
             
             if not end_date:
                 end_date = datetime.now().strftime("%Y%m%d")
             
+            if not start_date:
+                # 按交易日历确定第一个缺失的交易日，没有缺失时不请求远程
+                tasks, _ = self._plan_incremental_tasks(
+                    [symbol], (datetime.now() - timedelta(days=365)).strftime("%Y%m%d"), end_date
+                )
+                if not tasks:
+                    logger.info(f"股票 {symbol} 数据已是最新，无需同步")
+                    return 0
+                start_date = tasks[0][1]
+            
             logger.info(f"开始同步股票 {symbol} 的历史数据，时间范围：{start_date} 到 {end_date}")
             
             # 获取股票数据
             df = self.data_source.get_stock_data(
                 symbol=symbol,
                 start_date=start_date,
-                end_date=end_date
+                end_date=end_date,
+                use_cache=False
             )
             
             if df.empty:
                 logger.warning(f"股票 {symbol} 未获取到数据")
+                self.planner.record_checked([(symbol, start_date, end_date)])
                 return 0
             
             # 保存到数据库
@@ -611,7 +633,7 @@ class StockDataSynchronizer:
                 query += " AND date >= ?"
                 params.append(min_date)
             
-            with sqlite3.connect(self.db_manager.db_path) as conn:
+            with self.db_manager.connection() as conn:
                 cursor = conn.execute(query, params)
                 result = cursor.fetchone()
             
@@ -626,7 +648,7 @@ class StockDataSynchronizer:
     def _get_all_stock_symbols(self) -> List[str]:
         """获取数据库中所有股票代码"""
         try:
-            with sqlite3.connect(self.db_manager.db_path) as conn:
+            with self.db_manager.connection() as conn:
                 cursor = conn.execute("SELECT symbol FROM stock_info")
                 symbols = [row[0] for row in cursor.fetchall()]
             return symbols
@@ -637,7 +659,7 @@ class StockDataSynchronizer:
     def _get_latest_stock_date(self, symbol: str) -> Optional[datetime]:
         """获取股票在数据库中的最新数据日期"""
         try:
-            with sqlite3.connect(self.db_manager.db_path) as conn:
+            with self.db_manager.connection() as conn:
                 cursor = conn.execute(
                     "SELECT MAX(date) FROM stock_daily WHERE symbol = ?", 
                     (symbol,)
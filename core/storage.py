@@ -5,29 +5,232 @@
 import sqlite3
 import pandas as pd
 import json
+import queue
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Iterator, Tuple
 from pathlib import Path
-import pickle
 from utils.logger import logger
 from utils.config import config
+# 兼容旧的导入路径：缓存管理器已移至 core.cache
+from core.cache import CacheManager, cache_manager
+from core.indicator_state import INDICATOR_COLUMNS
+
+
+# 连接级PRAGMA默认值，可通过 DATABASE.pragmas 覆盖
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',       # 读写并发：写入时不阻塞读取
+    'synchronous': 'NORMAL',     # WAL模式下安全且明显快于FULL
+    'cache_size': -65536,        # 负数单位为KB，约64MB页缓存
+    'mmap_size': 268435456,      # 256MB内存映射读取
+    'busy_timeout': 5000,        # 锁等待时间(毫秒)
+    'temp_store': 'MEMORY',
+}
+
+
+class ConnectionPool:
+    """SQLite连接池
+
+    线程安全地复用数据库连接。连接按需创建（不超过 max_size），
+    创建时统一设置WAL日志模式及性能相关PRAGMA，并记录获取连接的等待时间等指标。
+    """
+
+    def __init__(self, db_path: str, max_size: int = 8, timeout: float = 30.0,
+                 pragmas: Dict[str, Any] = None):
+        self.db_path = str(db_path)
+        self.max_size = max(1, int(max_size))
+        self.timeout = timeout
+        self.pragmas = dict(DEFAULT_PRAGMAS)
+        if pragmas:
+            self.pragmas.update(pragmas)
+
+        # 后进先出，优先复用最近使用过的（缓存更热的）连接
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._in_use = 0
+        self._closed = False
+        self._acquire_count = 0
+        self._timeout_count = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    def create_connection(self) -> sqlite3.Connection:
+        """创建并配置新连接（不计入连接池，单独使用时由调用方关闭）"""
+        busy_timeout = float(self.pragmas.get('busy_timeout', 5000)) / 1000
+        conn = sqlite3.connect(self.db_path, timeout=busy_timeout, check_same_thread=False)
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name}={value}")
+        return conn
+
+    def acquire(self, timeout: float = None) -> sqlite3.Connection:
+        """从连接池获取连接，池满时最多等待 timeout 秒"""
+        if self._closed:
+            raise RuntimeError("连接池已关闭")
+
+        start = time.perf_counter()
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_create = self._created < self.max_size
+                if can_create:
+                    self._created += 1
+
+            if can_create:
+                try:
+                    conn = self.create_connection()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                try:
+                    conn = self._idle.get(timeout=self.timeout if timeout is None else timeout)
+                except queue.Empty:
+                    with self._lock:
+                        self._timeout_count += 1
+                    raise TimeoutError(f"获取数据库连接超时，连接池大小: {self.max_size}")
+
+        wait = time.perf_counter() - start
+        with self._lock:
+            self._in_use += 1
+            self._acquire_count += 1
+            self._total_wait += wait
+            self._max_wait = max(self._max_wait, wait)
+        return conn
+
+    def release(self, conn: sqlite3.Connection):
+        """归还连接，未提交的事务会被回滚"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.row_factory = None
+        except sqlite3.Error as e:
+            # 连接已损坏，直接丢弃
+            logger.warning(f"丢弃损坏的数据库连接: {e}")
+            with self._lock:
+                self._in_use -= 1
+                self._created -= 1
+            conn.close()
+            return
+
+        with self._lock:
+            self._in_use -= 1
+            discard = self._closed
+            if discard:
+                self._created -= 1
+
+        if discard:
+            conn.close()
+        else:
+            self._idle.put(conn)
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """获取连接的上下文管理器，正常退出时提交，异常时回滚"""
+        conn = self.acquire()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.release(conn)
+
+    def stats(self) -> Dict[str, Any]:
+        """连接池指标"""
+        with self._lock:
+            return {
+                'max_size': self.max_size,
+                'created': self._created,
+                'in_use': self._in_use,
+                'idle': self._idle.qsize(),
+                'acquire_count': self._acquire_count,
+                'timeout_count': self._timeout_count,
+                'avg_wait_ms': (self._total_wait / self._acquire_count * 1000) if self._acquire_count else 0.0,
+                'max_wait_ms': self._max_wait * 1000,
+                'journal_mode': self.pragmas.get('journal_mode'),
+            }
+
+    def close_all(self):
+        """关闭所有空闲连接，正在使用的连接会在归还时关闭"""
+        self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
 
 class DatabaseManager:
     """数据库管理器"""
-    
-    def __init__(self, db_path: str = None):
+
+    def __init__(self, db_path: str = None, pool_size: int = None):
         if db_path is None:
             db_path = config.get('DATABASE.path', 'data/finance_data.db')
-        
+
         self.db_path = Path(db_path)
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
-        
+
+        self.pool = ConnectionPool(
+            self.db_path,
+            max_size=pool_size or config.get('DATABASE.pool_size', 8),
+            timeout=config.get('DATABASE.pool_timeout', 30),
+            pragmas=config.get('DATABASE.pragmas', {})
+        )
+
+        self._price_cache = None
+
         self._init_database()
         logger.info(f"数据库管理器初始化完成: {self.db_path}")
-    
+
+    def connection(self):
+        """从连接池获取连接的上下文管理器
+
+        用法:
+            with db_manager.connection() as conn:
+                conn.execute(...)
+        """
+        return self.pool.connection()
+
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """获取连接池指标"""
+        return self.pool.stats()
+
+    @property
+    def price_cache(self):
+        """全市场列式价格缓存（延迟创建）"""
+        if self._price_cache is None:
+            from core.price_cache import PriceCache
+            # 默认与数据库文件放在同一目录
+            cache_dir = config.get('PRICE_CACHE.path') or str(self.db_path.parent / 'price_cache')
+            self._price_cache = PriceCache(cache_dir, db_manager=self)
+        return self._price_cache
+
+    def get_price_matrix(self,
+                         field: str = 'close',
+                         symbols: List[str] = None,
+                         start_date: str = None,
+                         end_date: str = None) -> pd.DataFrame:
+        """从列式价格缓存获取 日期×股票 的价格矩阵，缓存不存在时先全量构建"""
+        if not self.price_cache.is_built():
+            self.price_cache.rebuild()
+        return self.price_cache.get_matrix(field, symbols, start_date, end_date)
+
+    def refresh_price_cache(self, symbols: List[str] = None) -> Dict[str, Any]:
+        """增量更新列式价格缓存，symbols 为发生历史回填的股票"""
+        return self.price_cache.refresh(symbols)
+
     def _init_database(self):
         """初始化数据库表结构"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.connection() as conn:
             # 创建股票基础信息表
             conn.execute('''
                 CREATE TABLE IF NOT EXISTS stock_info (
@@ -38,9 +241,14 @@ class DatabaseManager:
                     pe_ratio REAL,
                     pb_ratio REAL,
                     close REAL,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    pinyin TEXT
                 )
             ''')
+            info_columns = {row[1] for row in conn.execute("PRAGMA table_info(stock_info)")}
+            if 'pinyin' not in info_columns:
+                # 旧库补充名称拼音首字母列（股票搜索索引使用）
+                conn.execute("ALTER TABLE stock_info ADD COLUMN pinyin TEXT")
             
             # 创建股票历史数据表
             conn.execute('''
@@ -54,12 +262,127 @@ class DatabaseManager:
                     close REAL,
                     volume BIGINT,
                     turnover REAL,
+                    amplitude REAL,
+                    change_pct REAL,
+                    change_amount REAL,
+                    turnover_rate REAL,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     UNIQUE(symbol, date)
                 )
             ''')
+            daily_columns = {row[1] for row in conn.execute("PRAGMA table_info(stock_daily)")}
+            for column in ('amplitude', 'change_pct', 'change_amount', 'turnover_rate'):
+                if column not in daily_columns:
+                    # 旧库补充振幅、涨跌幅、涨跌额、换手率列（与远程日线字段一致）
+                    conn.execute(f"ALTER TABLE stock_daily ADD COLUMN {column} REAL")
             
-            # 创建技术指标表
+            # 创建日线数据覆盖区间表（记录已与远程数据源核对过的日期区间）
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS stock_daily_coverage (
+                    symbol TEXT PRIMARY KEY,
+                    start_date DATE,
+                    end_date DATE,
+                    updated_at TIMESTAMP
+                )
+            ''')
+
+            # 创建行情同步任务表与逐股票检查点表（中断后可从检查点续传）
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS sync_runs (
+                    run_id TEXT PRIMARY KEY,
+                    sync_type TEXT,
+                    status TEXT,
+                    total INTEGER,
+                    started_at TIMESTAMP,
+                    finished_at TIMESTAMP,
+                    fingerprint TEXT
+                )
+            ''')
+            run_columns = {row[1] for row in conn.execute("PRAGMA table_info(sync_runs)")}
+            if 'fingerprint' not in run_columns:
+                # 旧库补充任务集指纹列（只有股票和日期区间完全一致的同步才能续传）
+                conn.execute("ALTER TABLE sync_runs ADD COLUMN fingerprint TEXT")
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS sync_checkpoints (
+                    run_id TEXT,
+                    symbol TEXT,
+                    status TEXT,
+                    rows INTEGER,
+                    error TEXT,
+                    updated_at TIMESTAMP,
+                    PRIMARY KEY (run_id, symbol)
+                )
+            ''')
+
+            # 创建后台任务表（状态、进度与结果，供多个Web进程共享查询）
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    job_type TEXT,
+                    task_name TEXT,
+                    status TEXT,
+                    progress TEXT,
+                    result TEXT,
+                    error TEXT,
+                    cancel_requested INTEGER DEFAULT 0,
+                    owner TEXT,
+                    created_at TIMESTAMP,
+                    started_at TIMESTAMP,
+                    finished_at TIMESTAMP,
+                    updated_at TIMESTAMP
+                )
+            ''')
+
+            # 创建增量指标状态检查点表（每只股票一行，state为JSON序列化的指标中间状态）
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS indicator_state (
+                    symbol TEXT PRIMARY KEY,
+                    last_date DATE,
+                    state TEXT,
+                    updated_at TIMESTAMP,
+                    revised_from DATE
+                )
+            ''')
+            state_columns = {row[1] for row in conn.execute("PRAGMA table_info(indicator_state)")}
+            if 'revised_from' not in state_columns:
+                # 旧库补充修订日期列（检查点之前的日线被改写时由触发器记录）
+                conn.execute("ALTER TABLE indicator_state ADD COLUMN revised_from DATE")
+
+            # 检查点覆盖的日线被改写或插入时记录最早的修订日期，下次增量刷新从该日重新计算
+            mark_revised = '''
+                UPDATE indicator_state
+                SET revised_from = MIN(COALESCE(revised_from, NEW.date), NEW.date)
+                WHERE symbol = NEW.symbol AND last_date >= NEW.date;
+            '''
+            conn.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS stock_daily_revised AFTER UPDATE ON stock_daily
+                WHEN OLD.open IS NOT NEW.open OR OLD.high IS NOT NEW.high OR OLD.low IS NOT NEW.low
+                  OR OLD.close IS NOT NEW.close OR OLD.volume IS NOT NEW.volume
+                  OR OLD.turnover IS NOT NEW.turnover OR OLD.date IS NOT NEW.date
+                BEGIN {mark_revised} END
+            ''')
+            conn.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS stock_daily_backfilled AFTER INSERT ON stock_daily
+                BEGIN {mark_revised} END
+            ''')
+
+            # 创建物化技术指标宽表（每只股票每个交易日一行，每个指标一列）
+            indicator_table_exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'indicator_daily'"
+            ).fetchone()
+            conn.execute(f'''
+                CREATE TABLE IF NOT EXISTS indicator_daily (
+                    symbol TEXT NOT NULL,
+                    date DATE NOT NULL,
+                    {', '.join(f'{column} REAL' for column in INDICATOR_COLUMNS)},
+                    PRIMARY KEY (symbol, date)
+                ) WITHOUT ROWID
+            ''')
+            if not indicator_table_exists:
+                # 新建宽表时清空增量指标检查点，下次刷新从全部历史预热并物化
+                conn.execute("DELETE FROM indicator_state")
+
+            # 创建技术指标表（旧的逐指标存储格式，保留兼容）
             conn.execute('''
                 CREATE TABLE IF NOT EXISTS technical_indicators (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -132,54 +455,448 @@ class DatabaseManager:
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     expires_at TIMESTAMP,
                     is_active BOOLEAN DEFAULT 1,
+                    last_seen TIMESTAMP,
                     FOREIGN KEY (user_id) REFERENCES users (id)
                 )
             ''')
+            session_columns = {row[1] for row in conn.execute("PRAGMA table_info(user_sessions)")}
+            if 'last_seen' not in session_columns:
+                # 旧库补充最近访问时间列（由会话缓存批量写入）
+                conn.execute("ALTER TABLE user_sessions ADD COLUMN last_seen TIMESTAMP")
+            
+            # 创建表目录（每张表的行数和列结构，由 core.catalog 维护）
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS table_catalog (
+                    name TEXT PRIMARY KEY,
+                    row_count INTEGER,
+                    columns TEXT,
+                    count_source TEXT,
+                    updated_at TIMESTAMP
+                )
+            ''')
+            
+            # 创建交易日历表（由 core.trading_calendar 从指数日线维护）
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS trading_calendar (
+                    date DATE PRIMARY KEY
+                ) WITHOUT ROWID
+            ''')
+            
+            # 创建AKShare接口下载统计表（由 core.akshare_download 维护，用于跳过未到期接口和调度排序）
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS akshare_download_stats (
+                    interface_name TEXT PRIMARY KEY,
+                    table_name TEXT,
+                    status TEXT,
+                    rows INTEGER,
+                    duration REAL,
+                    avg_duration REAL,
+                    last_attempt_at TIMESTAMP,
+                    last_success_at TIMESTAMP,
+                    message TEXT
+                )
+            ''')
             
             # 创建索引
             conn.execute('CREATE INDEX IF NOT EXISTS idx_stock_daily_symbol_date ON stock_daily(symbol, date)')
             conn.execute('CREATE INDEX IF NOT EXISTS idx_technical_indicators_symbol_date ON technical_indicators(symbol, date)')
             conn.execute('CREATE INDEX IF NOT EXISTS idx_users_username ON users(username)')
+            # 股票搜索的筛选/排序字段，带上 symbol 以支持按 (字段, symbol) 游标分页
+            for column in ('name', 'industry', 'market_cap', 'pe_ratio', 'pb_ratio'):
+                conn.execute(f'CREATE INDEX IF NOT EXISTS idx_stock_info_{column} ON stock_info({column}, symbol)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_type_created ON jobs(job_type, created_at)')
             conn.execute('CREATE INDEX IF NOT EXISTS idx_user_sessions_token ON user_sessions(session_token)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_user_sessions_expires ON user_sessions(expires_at)')
             
             conn.commit()
             logger.info("数据库表结构初始化完成")
     
+    DAILY_COLUMNS = ['symbol', 'date', 'open', 'high', 'low', 'close', 'volume', 'turnover',
+                     'amplitude', 'change_pct', 'change_amount', 'turnover_rate']
+
+    def _prepare_daily_frame(self, symbol: str, data: pd.DataFrame) -> pd.DataFrame:
+        """把日线数据整理成 stock_daily 的列格式"""
+        df = data.copy()
+        df['symbol'] = symbol
+        # 未命名的日期索引视为 date 列
+        if 'date' not in df.columns and isinstance(df.index, pd.DatetimeIndex) and df.index.name is None:
+            df.index.name = 'date'
+        df = df.reset_index()
+        
+        # 选择需要的列并重命名确保字段匹配
+        df = df[[col for col in self.DAILY_COLUMNS if col in df.columns]]
+        
+        # 确保日期格式正确
+        self._check_daily_dates(df, symbol)
+        df['date'] = pd.to_datetime(df['date']).dt.strftime('%Y-%m-%d')
+        return df
+
+    @staticmethod
+    def _check_daily_dates(df: pd.DataFrame, symbol: str = None):
+        """date 缺失或为空的行会绕过 UNIQUE(symbol, date) 重复写入，直接拒绝"""
+        where = f"股票 {symbol} " if symbol else ""
+        if 'date' not in df.columns:
+            raise ValueError(f"{where}日线数据缺少 date 列")
+        missing = int(df['date'].isna().sum())
+        if missing:
+            raise ValueError(f"{where}日线数据有 {missing} 行 date 为空")
+
     def save_stock_daily_data(self, symbol: str, data: pd.DataFrame):
-        """保存股票日线数据"""
+        """保存股票日线数据（已存在的日期会被更新）"""
         try:
-            # 准备数据
-            df = data.copy()
-            df['symbol'] = symbol
-            df = df.reset_index()
-            
-            # 选择需要的列并重命名确保字段匹配
-            columns = ['symbol', 'date', 'open', 'high', 'low', 'close', 'volume', 'turnover']
-            df = df[[col for col in columns if col in df.columns]]
-            
-            # 确保日期格式正确
-            if 'date' in df.columns:
-                df['date'] = pd.to_datetime(df['date']).dt.strftime('%Y-%m-%d')
-            
-            with sqlite3.connect(self.db_path) as conn:
-                # 先删除已存在的记录，避免唯一性约束冲突
-                if not df.empty:
-                    dates = df['date'].tolist()
-                    placeholders = ','.join(['?' for _ in dates])
-                    conn.execute(
-                        f"DELETE FROM stock_daily WHERE symbol = ? AND date IN ({placeholders})",
-                        [symbol] + dates
-                    )
-                
-                # 插入新数据
-                df.to_sql('stock_daily', conn, if_exists='append', index=False, method='multi')
-                
-            logger.info(f"成功保存股票 {symbol} 的 {len(df)} 条日线数据")
+            result = self.upsert_stock_daily([(symbol, data)])
+            logger.info(f"成功保存股票 {symbol} 的 {result['rows']} 条日线数据")
             
         except Exception as e:
             logger.error(f"保存股票日线数据失败: {e}")
             raise
+
+    def _iter_daily_frames(self, data) -> Iterator[tuple]:
+        """把多种输入统一为 (symbol, DataFrame) 序列"""
+        if isinstance(data, pd.DataFrame):
+            # 长表格式：包含 symbol 列，日期为索引或 date 列
+            for symbol, group in data.groupby('symbol', sort=False):
+                yield symbol, group.drop(columns='symbol')
+        elif isinstance(data, dict):
+            yield from data.items()
+        else:
+            yield from data
+
+    def _daily_rows(self, symbol: str, data: pd.DataFrame) -> List[tuple]:
+        """把单只股票的日线数据转为 stock_daily 行元组"""
+        if data is None or data.empty:
+            return []
+        df = self._prepare_daily_frame(symbol, data).reindex(columns=self.DAILY_COLUMNS)
+        return list(df.astype(object).where(df.notna(), None).itertuples(index=False, name=None))
+
+    def _upsert_daily_rows(self, conn: sqlite3.Connection, rows: Iterator[tuple], chunk_size: int) -> int:
+        """分块 executemany 写入 stock_daily，(symbol, date) 冲突时更新行情字段"""
+        value_columns = [c for c in self.DAILY_COLUMNS if c not in ('symbol', 'date')]
+        sql = (
+            f"INSERT INTO stock_daily ({', '.join(self.DAILY_COLUMNS)}) "
+            f"VALUES ({', '.join(['?'] * len(self.DAILY_COLUMNS))}) "
+            f"ON CONFLICT(symbol, date) DO UPDATE SET "
+            + ', '.join(f"{c} = excluded.{c}" for c in value_columns)
+        )
+        count = 0
+        chunk: List[tuple] = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                conn.executemany(sql, chunk)
+                count += len(chunk)
+                chunk = []
+        if chunk:
+            conn.executemany(sql, chunk)
+            count += len(chunk)
+        return count
+
+    def upsert_stock_daily(self, data, chunk_size: int = None) -> Dict[str, Any]:
+        """
+        批量写入日线数据（INSERT ... ON CONFLICT DO UPDATE），多只股票在一个事务中提交
+
+        Args:
+            data: {symbol: DataFrame}、[(symbol, DataFrame), ...]，
+                  或包含 symbol 列的长表 DataFrame
+            chunk_size: 每次 executemany 的行数，默认 DATABASE.upsert_chunk_size
+
+        Returns:
+            Dict: symbols, rows, seconds, rows_per_sec
+        """
+        chunk_size = chunk_size or config.get('DATABASE.upsert_chunk_size', 5000)
+        start = time.time()
+        symbols = set()
+
+        def rows():
+            for symbol, frame in self._iter_daily_frames(data):
+                symbols.add(symbol)
+                yield from self._daily_rows(symbol, frame)
+
+        try:
+            with self.connection() as conn:
+                count = self._upsert_daily_rows(conn, rows(), chunk_size)
+        except Exception as e:
+            logger.error(f"批量写入日线数据失败: {e}")
+            raise
+
+        seconds = time.time() - start
+        result = {
+            'symbols': len(symbols),
+            'rows': count,
+            'seconds': round(seconds, 3),
+            'rows_per_sec': round(count / seconds, 1) if seconds > 0 else float(count)
+        }
+        logger.debug(f"日线数据批量写入完成: {result}")
+        return result
     
+    def upsert_daily_frame(self, data: pd.DataFrame, chunk_size: int = None) -> int:
+        """
+        写入已整理为 stock_daily 列格式的长表（包含 symbol、date 列，如全市场快照生成的当天日线），
+        不按股票分组，所有行在一个事务中批量提交，返回写入行数
+        """
+        if data is None or data.empty:
+            return 0
+        chunk_size = chunk_size or config.get('DATABASE.upsert_chunk_size', 5000)
+        self._check_daily_dates(data)
+        df = data.reindex(columns=self.DAILY_COLUMNS)
+        rows = df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+        try:
+            with self.connection() as conn:
+                return self._upsert_daily_rows(conn, rows, chunk_size)
+        except Exception as e:
+            logger.error(f"批量写入日线数据失败: {e}")
+            raise
+
+    def get_latest_daily_dates(self, symbols: List[str] = None) -> Dict[str, str]:
+        """一次查询获取各股票在 stock_daily 中的最新日期 {symbol: 'YYYY-MM-DD'}"""
+        try:
+            query = "SELECT symbol, MAX(date) FROM stock_daily"
+            params: List[Any] = []
+            if symbols is not None:
+                if not symbols:
+                    return {}
+                query += f" WHERE symbol IN ({','.join(['?'] * len(symbols))})"
+                params = list(symbols)
+            query += " GROUP BY symbol"
+
+            with self.connection() as conn:
+                return {symbol: latest for symbol, latest in conn.execute(query, params) if latest}
+
+        except Exception as e:
+            logger.error(f"获取股票最新日期失败: {e}")
+            raise
+
+    def get_daily_window_stats(self, start_date: str, end_date: str,
+                               symbols: List[str] = None) -> Dict[str, Tuple[str, str, int]]:
+        """
+        一次 GROUP BY 查询各股票在日期窗口内的日线情况（日期格式 YYYY-MM-DD）
+
+        Returns:
+            {symbol: (窗口内最早日期, 窗口内最新日期, 行数)}，窗口内没有数据的股票不返回
+        """
+        try:
+            query = "SELECT symbol, MIN(date), MAX(date), COUNT(*) FROM stock_daily WHERE date BETWEEN ? AND ?"
+            params: List[Any] = [start_date, end_date]
+            if symbols is not None:
+                if not symbols:
+                    return {}
+                query += f" AND symbol IN ({','.join(['?'] * len(symbols))})"
+                params.extend(symbols)
+            query += " GROUP BY symbol"
+
+            with self.connection() as conn:
+                return {row[0]: (row[1], row[2], row[3]) for row in conn.execute(query, params)}
+
+        except Exception as e:
+            logger.error(f"获取日线窗口统计失败: {e}")
+            raise
+
+    def get_daily_coverages(self, symbols: List[str] = None) -> Dict[str, Tuple[str, str, str]]:
+        """批量读取 stock_daily_coverage 中已核对的区间 {symbol: (开始日期, 结束日期, 记录时间)}"""
+        query = "SELECT symbol, start_date, end_date, updated_at FROM stock_daily_coverage"
+        params: List[Any] = []
+        if symbols is not None:
+            if not symbols:
+                return {}
+            query += f" WHERE symbol IN ({','.join(['?'] * len(symbols))})"
+            params = list(symbols)
+        with self.connection() as conn:
+            return {row[0]: (row[1], row[2], row[3]) for row in conn.execute(query, params)}
+
+    def extend_daily_coverages(self, ranges: List[Tuple[str, str, str]]):
+        """批量扩展已核对区间 [(symbol, 开始日期, 结束日期)]，语义同 update_daily_coverage"""
+        if not ranges:
+            return
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with self.connection() as conn:
+            conn.executemany('''
+                INSERT INTO stock_daily_coverage (symbol, start_date, end_date, updated_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(symbol) DO UPDATE SET
+                    start_date = MIN(start_date, excluded.start_date),
+                    end_date = MAX(end_date, excluded.end_date),
+                    updated_at = excluded.updated_at
+            ''', [(symbol, start, end, now) for symbol, start, end in ranges])
+
+    def create_sync_run(self, run_id: str, sync_type: str, total: int, fingerprint: str = None):
+        """登记一次行情同步任务，fingerprint 为任务集（股票及日期区间）的指纹"""
+        with self.connection() as conn:
+            conn.execute('''
+                INSERT INTO sync_runs (run_id, sync_type, status, total, started_at, fingerprint)
+                VALUES (?, ?, 'running', ?, ?, ?)
+                ON CONFLICT(run_id) DO UPDATE SET
+                    status = 'running', total = excluded.total,
+                    fingerprint = COALESCE(excluded.fingerprint, sync_runs.fingerprint)
+            ''', (run_id, sync_type, total, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), fingerprint))
+
+    def finish_sync_run(self, run_id: str, status: str):
+        """标记同步任务结束（completed / failed）"""
+        with self.connection() as conn:
+            conn.execute(
+                "UPDATE sync_runs SET status = ?, finished_at = ? WHERE run_id = ?",
+                (status, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), run_id)
+            )
+
+    def find_resumable_sync_run(self, sync_type: str, since: str, fingerprint: str) -> Optional[str]:
+        """查找 since 之后开始、尚未完成且任务集指纹相同的同类同步任务"""
+        with self.connection() as conn:
+            row = conn.execute('''
+                SELECT run_id FROM sync_runs
+                WHERE sync_type = ? AND fingerprint = ? AND status != 'completed' AND started_at >= ?
+                ORDER BY started_at DESC LIMIT 1
+            ''', (sync_type, fingerprint, since)).fetchone()
+        return row[0] if row else None
+
+    def get_completed_sync_symbols(self, run_id: str) -> List[str]:
+        """获取同步任务中已完成的股票"""
+        with self.connection() as conn:
+            cursor = conn.execute(
+                "SELECT symbol FROM sync_checkpoints WHERE run_id = ? AND status = 'done'",
+                (run_id,)
+            )
+            return [row[0] for row in cursor]
+
+    def save_sync_batch(self,
+                        run_id: str,
+                        frames: List[tuple],
+                        failures: List[tuple] = None) -> int:
+        """在一个事务中写入一批股票的日线数据及其检查点
+
+        Args:
+            run_id: 同步任务ID
+            frames: [(symbol, DataFrame), ...]，DataFrame 可以为空（无新数据）
+            failures: [(symbol, error), ...]
+
+        Returns:
+            int: 写入的日线行数
+        """
+        try:
+            now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            checkpoints = []
+            daily_rows = []
+            for symbol, data in frames:
+                rows = self._daily_rows(symbol, data)
+                daily_rows.extend(rows)
+                checkpoints.append((run_id, symbol, 'done', len(rows), None, now))
+            for symbol, error in failures or []:
+                checkpoints.append((run_id, symbol, 'failed', 0, str(error)[:500], now))
+
+            with self.connection() as conn:
+                count = self._upsert_daily_rows(
+                    conn, iter(daily_rows), config.get('DATABASE.upsert_chunk_size', 5000)
+                )
+                conn.executemany('''
+                    INSERT INTO sync_checkpoints (run_id, symbol, status, rows, error, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(run_id, symbol) DO UPDATE SET
+                        status = excluded.status,
+                        rows = excluded.rows,
+                        error = excluded.error,
+                        updated_at = excluded.updated_at
+                ''', checkpoints)
+
+            return count
+
+        except Exception as e:
+            logger.error(f"批量写入同步数据失败: {e}")
+            raise
+
+    # 后台任务表中可更新的列，progress/result 以JSON保存
+    JOB_COLUMNS = ('status', 'progress', 'result', 'error', 'owner', 'started_at', 'finished_at')
+
+    @staticmethod
+    def _job_json(value: Any) -> str:
+        # numpy 标量转为Python数值，其余无法序列化的值转为字符串
+        return json.dumps(value, ensure_ascii=False,
+                          default=lambda o: o.item() if hasattr(o, 'item') else str(o))
+
+    def create_job(self, job_id: str, job_type: str, task_name: str, owner: str,
+                   status: str = 'PENDING', progress: Dict[str, Any] = None):
+        """登记后台任务"""
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with self.connection() as conn:
+            conn.execute('''
+                INSERT INTO jobs (job_id, job_type, task_name, status, progress, owner, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (job_id, job_type, task_name, status, self._job_json(progress or {}), owner, now, now))
+
+    def update_job(self, job_id: str, **fields):
+        """更新后台任务字段（status/progress/result/error/owner/started_at/finished_at）"""
+        unknown = set(fields) - set(self.JOB_COLUMNS)
+        if unknown:
+            raise ValueError(f"未知的任务字段: {unknown}")
+        for key in ('progress', 'result'):
+            if key in fields:
+                fields[key] = self._job_json(fields[key])
+        fields['updated_at'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        assignments = ', '.join(f"{key} = ?" for key in fields)
+        with self.connection() as conn:
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE job_id = ?", (*fields.values(), job_id))
+
+    @staticmethod
+    def _job_row(cursor, row) -> Dict[str, Any]:
+        job = {column[0]: value for column, value in zip(cursor.description, row)}
+        for key in ('progress', 'result'):
+            if job.get(key) is not None:
+                job[key] = json.loads(job[key])
+        job['cancel_requested'] = bool(job.get('cancel_requested'))
+        return job
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """获取后台任务"""
+        with self.connection() as conn:
+            cursor = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,))
+            row = cursor.fetchone()
+            return self._job_row(cursor, row) if row else None
+
+    def list_jobs(self, job_type: str = None, statuses: tuple = None, limit: Optional[int] = 50) -> List[Dict[str, Any]]:
+        """按创建时间倒序列出后台任务"""
+        conditions, params = [], []
+        if job_type:
+            conditions.append("job_type = ?")
+            params.append(job_type)
+        if statuses:
+            conditions.append(f"status IN ({','.join('?' * len(statuses))})")
+            params.extend(statuses)
+        query = "SELECT * FROM jobs"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY created_at DESC"
+        if limit:
+            query += f" LIMIT {int(limit)}"
+        with self.connection() as conn:
+            cursor = conn.execute(query, params)
+            return [self._job_row(cursor, row) for row in cursor.fetchall()]
+
+    def request_job_cancel(self, job_id: str) -> bool:
+        """标记取消未结束的任务，排队中的任务直接置为 REVOKED"""
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with self.connection() as conn:
+            cursor = conn.execute('''
+                UPDATE jobs SET cancel_requested = 1,
+                    status = CASE WHEN status = 'PENDING' THEN 'REVOKED' ELSE status END,
+                    finished_at = CASE WHEN status = 'PENDING' THEN ? ELSE finished_at END,
+                    updated_at = ?
+                WHERE job_id = ? AND status IN ('PENDING', 'STARTED', 'PROGRESS')
+            ''', (now, now, job_id))
+            return cursor.rowcount > 0
+
+    def is_job_cancel_requested(self, job_id: str) -> bool:
+        """任务是否已被请求取消"""
+        with self.connection() as conn:
+            row = conn.execute("SELECT cancel_requested FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def delete_jobs(self, before: str, statuses: tuple, job_type: str = None) -> int:
+        """删除 before 之前创建且处于 statuses 状态的任务"""
+        query = f"DELETE FROM jobs WHERE created_at < ? AND status IN ({','.join('?' * len(statuses))})"
+        params = [before, *statuses]
+        if job_type:
+            query += " AND job_type = ?"
+            params.append(job_type)
+        with self.connection() as conn:
+            return conn.execute(query, params).rowcount
+
     def get_stock_daily_data(self, 
                            symbol: str, 
                            start_date: str = None, 
@@ -203,7 +920,7 @@ class DatabaseManager:
             if limit:
                 query += f" LIMIT {limit}"
             
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connection() as conn:
                 df = pd.read_sql_query(query, conn, params=params)
                 
             if not df.empty:
@@ -218,13 +935,71 @@ class DatabaseManager:
             logger.error(f"获取股票日线数据失败: {e}")
             raise
     
+    def get_daily_coverage(self, symbol: str) -> Optional[Dict[str, Any]]:
+        """获取股票日线数据在本地的覆盖区间
+
+        只采用 stock_daily_coverage 中记录的已核对区间：stock_daily 的 MIN/MAX(date)
+        无法反映区间内部的缺口，不作为覆盖依据。
+
+        Returns:
+            {'start_date': 'YYYY-MM-DD', 'end_date': 'YYYY-MM-DD', 'updated_at': str或None}，
+            没有已核对区间时返回 None
+        """
+        try:
+            with self.connection() as conn:
+                recorded = conn.execute(
+                    "SELECT start_date, end_date, updated_at FROM stock_daily_coverage WHERE symbol = ?",
+                    (symbol,)
+                ).fetchone()
+
+            if not recorded or not recorded[0] or not recorded[1]:
+                return None
+
+            return {
+                'start_date': recorded[0],
+                'end_date': recorded[1],
+                'updated_at': recorded[2]
+            }
+
+        except Exception as e:
+            logger.error(f"获取股票 {symbol} 数据覆盖区间失败: {e}")
+            return None
+
+    def update_daily_coverage(self, symbol: str, start_date: str, end_date: str):
+        """扩展股票日线数据的已核对区间（日期格式 YYYY-MM-DD）"""
+        try:
+            with self.connection() as conn:
+                conn.execute('''
+                    INSERT INTO stock_daily_coverage (symbol, start_date, end_date, updated_at)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT(symbol) DO UPDATE SET
+                        start_date = MIN(start_date, excluded.start_date),
+                        end_date = MAX(end_date, excluded.end_date),
+                        updated_at = excluded.updated_at
+                ''', (symbol, start_date, end_date, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+
+        except Exception as e:
+            logger.error(f"更新股票 {symbol} 数据覆盖区间失败: {e}")
+            raise
+
     def save_stock_info(self, symbol: str, info: Dict[str, Any]):
         """保存股票基础信息"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connection() as conn:
+                # 按主键更新而不是 REPLACE（删除再插入），保持 rowid 不变以便全文索引触发器同步；
+                # 名称变化时清空拼音，由股票搜索重新计算
                 conn.execute('''
-                    REPLACE INTO stock_info (symbol, name, industry, market_cap, pe_ratio, pb_ratio, close, updated_at)
+                    INSERT INTO stock_info (symbol, name, industry, market_cap, pe_ratio, pb_ratio, close, updated_at)
                     VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(symbol) DO UPDATE SET
+                        name = excluded.name,
+                        industry = excluded.industry,
+                        market_cap = excluded.market_cap,
+                        pe_ratio = excluded.pe_ratio,
+                        pb_ratio = excluded.pb_ratio,
+                        close = excluded.close,
+                        updated_at = excluded.updated_at,
+                        pinyin = CASE WHEN stock_info.name IS excluded.name THEN stock_info.pinyin ELSE NULL END
                 ''', (
                     symbol,
                     info.get('name', info.get('股票简称', '')),
@@ -243,29 +1018,182 @@ class DatabaseManager:
             raise
     
     def save_technical_indicators(self, symbol: str, date: str, indicators: Dict[str, float]):
-        """保存技术指标数据"""
+        """保存单个交易日的技术指标到 indicator_daily，不在宽表中的指标忽略"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                for indicator_name, value in indicators.items():
-                    conn.execute('''
-                        REPLACE INTO technical_indicators (symbol, date, indicator_name, indicator_value)
-                        VALUES (?, ?, ?, ?)
-                    ''', (symbol, date, indicator_name, value))
+            columns = [name for name in indicators if name in INDICATOR_COLUMNS]
+            if not columns:
+                return
+            with self.connection() as conn:
+                conn.execute(
+                    f"INSERT INTO indicator_daily (symbol, date, {', '.join(columns)}) "
+                    f"VALUES ({', '.join(['?'] * (len(columns) + 2))}) "
+                    f"ON CONFLICT(symbol, date) DO UPDATE SET "
+                    + ', '.join(f"{c} = excluded.{c}" for c in columns),
+                    [symbol, date] + [indicators[c] for c in columns]
+                )
                 
-            logger.info(f"成功保存股票 {symbol} 在 {date} 的 {len(indicators)} 个技术指标")
+            logger.info(f"成功保存股票 {symbol} 在 {date} 的 {len(columns)} 个技术指标")
             
         except Exception as e:
             logger.error(f"保存技术指标失败: {e}")
             raise
-    
+
+    def upsert_indicator_daily(self, rows: List[tuple], chunk_size: int = None) -> int:
+        """
+        批量写入物化技术指标
+
+        Args:
+            rows: [(symbol, date, *INDICATOR_COLUMNS 对应的值), ...]
+            chunk_size: 每次 executemany 的行数，默认 DATABASE.upsert_chunk_size
+        """
+        chunk_size = chunk_size or config.get('DATABASE.upsert_chunk_size', 5000)
+        columns = ['symbol', 'date'] + list(INDICATOR_COLUMNS)
+        sql = (
+            f"INSERT INTO indicator_daily ({', '.join(columns)}) "
+            f"VALUES ({', '.join(['?'] * len(columns))}) "
+            f"ON CONFLICT(symbol, date) DO UPDATE SET "
+            + ', '.join(f"{c} = excluded.{c}" for c in INDICATOR_COLUMNS)
+        )
+        try:
+            with self.connection() as conn:
+                for i in range(0, len(rows), chunk_size):
+                    conn.executemany(sql, rows[i:i + chunk_size])
+            return len(rows)
+        except Exception as e:
+            logger.error(f"批量写入技术指标失败: {e}")
+            raise
+
+    def get_indicator_latest_date(self, symbol: str) -> Optional[str]:
+        """物化技术指标的最新日期"""
+        with self.connection() as conn:
+            row = conn.execute("SELECT MAX(date) FROM indicator_daily WHERE symbol = ?", (symbol,)).fetchone()
+        return row[0] if row else None
+
+    def load_indicator_states(self, symbols: List[str] = None) -> Dict[str, str]:
+        """加载增量指标状态检查点，返回 {symbol: state_json}"""
+        try:
+            query = "SELECT symbol, state FROM indicator_state"
+            params: List[Any] = []
+            if symbols is not None:
+                if not symbols:
+                    return {}
+                query += f" WHERE symbol IN ({','.join(['?'] * len(symbols))})"
+                params = list(symbols)
+
+            with self.connection() as conn:
+                return {symbol: state for symbol, state in conn.execute(query, params)}
+
+        except Exception as e:
+            logger.error(f"加载指标状态失败: {e}")
+            raise
+
+    def save_indicator_states(self, records: List[tuple]):
+        """批量保存增量指标状态检查点
+
+        Args:
+            records: [(symbol, last_date, state_json), ...]
+        """
+        try:
+            now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            with self.connection() as conn:
+                conn.executemany('''
+                    INSERT INTO indicator_state (symbol, last_date, state, updated_at)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT(symbol) DO UPDATE SET
+                        last_date = excluded.last_date,
+                        state = excluded.state,
+                        updated_at = excluded.updated_at
+                ''', [(symbol, last_date, state, now) for symbol, last_date, state in records])
+
+            logger.debug(f"成功保存 {len(records)} 只股票的指标状态")
+
+        except Exception as e:
+            logger.error(f"保存指标状态失败: {e}")
+            raise
+
+    def get_indicator_revisions(self, symbols: List[str] = None) -> Dict[str, str]:
+        """检查点之前（含）的日线被修订过的股票 {symbol: 最早修订日期}"""
+        query = "SELECT symbol, revised_from FROM indicator_state WHERE revised_from IS NOT NULL"
+        params: List[Any] = []
+        if symbols is not None:
+            if not symbols:
+                return {}
+            query += f" AND symbol IN ({','.join(['?'] * len(symbols))})"
+            params = list(symbols)
+        with self.connection() as conn:
+            return {symbol: revised_from for symbol, revised_from in conn.execute(query, params)}
+
+    def rewind_indicator_states(self, records: List[tuple]):
+        """把检查点回退到修订日之前的状态并清除修订标记
+
+        Args:
+            records: [(symbol, last_date, state_json), ...]
+        """
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with self.connection() as conn:
+            conn.executemany('''
+                UPDATE indicator_state
+                SET last_date = ?, state = ?, updated_at = ?, revised_from = NULL
+                WHERE symbol = ?
+            ''', [(last_date, state, now, symbol) for symbol, last_date, state in records])
+
+    def delete_indicator_states(self, symbols: List[str] = None):
+        """删除增量指标状态检查点，symbols 为 None 时全部删除"""
+        try:
+            with self.connection() as conn:
+                if symbols is None:
+                    conn.execute("DELETE FROM indicator_state")
+                elif symbols:
+                    conn.execute(
+                        f"DELETE FROM indicator_state WHERE symbol IN ({','.join(['?'] * len(symbols))})",
+                        list(symbols)
+                    )
+
+        except Exception as e:
+            logger.error(f"删除指标状态失败: {e}")
+            raise
+
+    def get_bars_after_indicator_state(self, symbols: List[str] = None) -> Iterator[Dict[str, Any]]:
+        """按 (symbol, date) 顺序逐行返回每只股票指标检查点之后的日线
+
+        没有检查点的股票返回全部历史。以生成器方式读取，避免首次预热时
+        把全市场历史一次性载入内存
+        """
+        query = '''
+            SELECT d.symbol, d.date, d.open, d.high, d.low, d.close, d.volume, d.turnover
+            FROM stock_daily d
+            LEFT JOIN indicator_state s ON s.symbol = d.symbol
+            WHERE (s.last_date IS NULL OR d.date > s.last_date)
+        '''
+        params: List[Any] = []
+        if symbols is not None:
+            if not symbols:
+                return
+            query += f" AND d.symbol IN ({','.join(['?'] * len(symbols))})"
+            params = list(symbols)
+        query += " ORDER BY d.symbol, d.date"
+
+        with self.connection() as conn:
+            conn.row_factory = sqlite3.Row
+            for row in conn.execute(query, params):
+                yield dict(row)
+
     def get_technical_indicators(self, 
                                symbol: str, 
                                start_date: str = None, 
-                               end_date: str = None) -> pd.DataFrame:
-        """获取技术指标数据"""
+                               end_date: str = None,
+                               columns: List[str] = None) -> pd.DataFrame:
+        """获取物化的技术指标，日期为索引、每个指标一列
+
+        日线修订后尚未重新计算的日期（修订日及之后）不返回
+        """
         try:
-            query = "SELECT * FROM technical_indicators WHERE symbol = ?"
-            params = [symbol]
+            columns = [c for c in (columns or INDICATOR_COLUMNS) if c in INDICATOR_COLUMNS]
+            query = (
+                f"SELECT date, {', '.join(columns)} FROM indicator_daily WHERE symbol = ? "
+                "AND date < COALESCE((SELECT revised_from FROM indicator_state WHERE symbol = ?), '9999-12-31')"
+            )
+            params = [symbol, symbol]
             
             if start_date:
                 query += " AND date >= ?"
@@ -277,19 +1205,12 @@ class DatabaseManager:
                 
             query += " ORDER BY date"
             
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connection() as conn:
                 df = pd.read_sql_query(query, conn, params=params)
             
-            if not df.empty:
-                # 转换为透视表格式
-                df['date'] = pd.to_datetime(df['date'])
-                df = df.pivot_table(
-                    index='date', 
-                    columns='indicator_name', 
-                    values='indicator_value'
-                ).fillna(method='ffill')
-            
-            return df
+            df['date'] = pd.to_datetime(df['date'])
+            # 全为NULL的列读出为object类型，统一转为浮点
+            return df.set_index('date').astype(float)
             
         except Exception as e:
             logger.error(f"获取技术指标数据失败: {e}")
@@ -298,7 +1219,7 @@ class DatabaseManager:
     def save_backtest_result(self, result: Dict[str, Any]) -> int:
         """保存回测结果"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connection() as conn:
                 cursor = conn.execute('''
                     INSERT INTO backtest_results (
                         strategy_name, symbol, start_date, end_date,
@@ -331,7 +1252,7 @@ class DatabaseManager:
     def get_stock_info(self, symbol: str) -> Optional[Dict[str, Any]]:
         """获取股票基本信息"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connection() as conn:
                 conn.row_factory = sqlite3.Row
                 cursor = conn.execute('''
                     SELECT symbol, name, industry, market_cap, pe_ratio, pb_ratio, close, updated_at
@@ -360,7 +1281,7 @@ class DatabaseManager:
     def get_stock_list(self) -> List[Dict[str, Any]]:
         """获取股票列表"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connection() as conn:
                 conn.row_factory = sqlite3.Row
                 cursor = conn.execute('''
                     SELECT symbol, name, industry, market_cap, pe_ratio, pb_ratio, close, updated_at
@@ -394,7 +1315,7 @@ class DatabaseManager:
             查询结果列表，每个元素为字典格式的行数据
         """
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connection() as conn:
                 conn.row_factory = sqlite3.Row
                 cursor = conn.cursor()
                 
@@ -414,13 +1335,15 @@ class DatabaseManager:
             raise
     
     def get_connection(self):
-        """获取数据库连接
-        
+        """获取独立的数据库连接（不经过连接池，调用方负责关闭）
+
+        新代码请优先使用 connection() 上下文管理器。
+
         Returns:
             sqlite3.Connection: 数据库连接对象
         """
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self.pool.create_connection()
             return conn
         except Exception as e:
             logger.error(f"获取数据库连接失败: {e}")
@@ -437,7 +1360,7 @@ class DatabaseManager:
             int: 影响的行数
         """
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connection() as conn:
                 cursor = conn.cursor()
                 
                 if params:
@@ -455,124 +1378,5 @@ class DatabaseManager:
             raise
 
 
-class CacheManager:
-    """缓存管理器"""
-    
-    def __init__(self, cache_dir: str = "data/cache"):
-        self.cache_dir = Path(cache_dir)
-        self.cache_dir.mkdir(parents=True, exist_ok=True)
-        self.default_ttl = config.get('REDIS.cache_ttl', 3600)  # 默认1小时
-        logger.info(f"缓存管理器初始化完成: {self.cache_dir}")
-    
-    def _get_cache_path(self, key: str) -> Path:
-        """获取缓存文件路径"""
-        return self.cache_dir / f"{key}.cache"
-    
-    def _get_meta_path(self, key: str) -> Path:
-        """获取缓存元数据文件路径"""
-        return self.cache_dir / f"{key}.meta"
-    
-    def set(self, key: str, value: Any, ttl: int = None):
-        """设置缓存"""
-        try:
-            if ttl is None:
-                ttl = self.default_ttl
-            
-            cache_path = self._get_cache_path(key)
-            meta_path = self._get_meta_path(key)
-            
-            # 保存数据
-            with open(cache_path, 'wb') as f:
-                pickle.dump(value, f)
-            
-            # 保存元数据
-            meta = {
-                'created_at': datetime.now().timestamp(),
-                'ttl': ttl,
-                'expires_at': datetime.now().timestamp() + ttl
-            }
-            
-            with open(meta_path, 'w') as f:
-                json.dump(meta, f)
-            
-            logger.debug(f"缓存已设置: {key}, TTL: {ttl}秒")
-            
-        except Exception as e:
-            logger.error(f"设置缓存失败: {e}")
-    
-    def get(self, key: str) -> Optional[Any]:
-        """获取缓存"""
-        try:
-            cache_path = self._get_cache_path(key)
-            meta_path = self._get_meta_path(key)
-            
-            if not cache_path.exists() or not meta_path.exists():
-                return None
-            
-            # 检查是否过期
-            with open(meta_path, 'r') as f:
-                meta = json.load(f)
-            
-            if datetime.now().timestamp() > meta['expires_at']:
-                self.delete(key)
-                return None
-            
-            # 读取数据
-            with open(cache_path, 'rb') as f:
-                value = pickle.load(f)
-            
-            logger.debug(f"缓存命中: {key}")
-            return value
-            
-        except Exception as e:
-            logger.error(f"获取缓存失败: {e}")
-            return None
-    
-    def delete(self, key: str):
-        """删除缓存"""
-        try:
-            cache_path = self._get_cache_path(key)
-            meta_path = self._get_meta_path(key)
-            
-            if cache_path.exists():
-                cache_path.unlink()
-            if meta_path.exists():
-                meta_path.unlink()
-            
-            logger.debug(f"缓存已删除: {key}")
-            
-        except Exception as e:
-            logger.error(f"删除缓存失败: {e}")
-    
-    def clear_expired(self):
-        """清理过期缓存"""
-        try:
-            current_time = datetime.now().timestamp()
-            cleared_count = 0
-            
-            for meta_file in self.cache_dir.glob("*.meta"):
-                try:
-                    with open(meta_file, 'r') as f:
-                        meta = json.load(f)
-                    
-                    if current_time > meta['expires_at']:
-                        key = meta_file.stem
-                        self.delete(key)
-                        cleared_count += 1
-                        
-                except Exception as e:
-                    logger.warning(f"清理缓存文件 {meta_file} 时出错: {e}")
-            
-            logger.info(f"清理了 {cleared_count} 个过期缓存")
-            
-        except Exception as e:
-            logger.error(f"清理过期缓存失败: {e}")
-
-
 # 全局实例
 db_manager = DatabaseManager()
-cache_manager = CacheManager()
-
-
-
-
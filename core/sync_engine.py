@@ -0,0 +1,320 @@
+"""
+并发行情同步引擎
+有界线程池并发拉取日线数据，令牌桶限制请求速率，
+所有数据库写入由单个写线程批量提交，并按股票记录检查点以支持断点续传
+"""
+import hashlib
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import CancelledError, ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from utils.logger import logger
+from utils.config import config
+from core.sync_progress import sync_progress_manager
+
+
+# (股票代码, 开始日期YYYYMMDD, 结束日期YYYYMMDD)
+SyncTask = Tuple[str, str, str]
+
+
+class TokenBucket:
+    """线程安全的令牌桶限流器"""
+
+    def __init__(self, rate: float, capacity: float = None):
+        """
+        Args:
+            rate: 每秒补充的令牌数（即平均请求速率）
+            capacity: 桶容量（允许的突发请求数），默认等于 rate
+        """
+        if rate <= 0:
+            raise ValueError("令牌桶速率必须大于0")
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity else max(rate, 1))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, timeout: float = None) -> bool:
+        """获取一个令牌，超时返回 False"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate
+
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+
+def _call_with_timeout(func: Callable[[], Any], timeout: float, slot: threading.Semaphore = None) -> Any:
+    """在独立线程中执行请求，超过 timeout 秒抛出 TimeoutError
+
+    AKShare 接口本身不支持超时参数，超时的请求线程会在后台自行结束，结果被丢弃。
+    slot 为调用方已获取的请求名额，在请求线程真正结束时才释放，
+    因此超时后仍在后台运行的请求也计入并发上限
+    """
+    def call():
+        try:
+            return func()
+        finally:
+            if slot is not None:
+                slot.release()
+
+    if not timeout:
+        return call()
+
+    outcome: Dict[str, Any] = {}
+
+    def target():
+        try:
+            outcome['value'] = call()
+        except Exception as e:
+            outcome['error'] = e
+
+    worker = threading.Thread(target=target, daemon=True)
+    worker.start()
+    worker.join(timeout)
+    if worker.is_alive():
+        raise TimeoutError(f"请求超过 {timeout} 秒未返回")
+    if 'error' in outcome:
+        raise outcome['error']
+    return outcome.get('value')
+
+
+def task_fingerprint(tasks: List[SyncTask]) -> str:
+    """计算任务集指纹（股票及日期区间），任务集不同的同步不共享检查点"""
+    digest = hashlib.sha1()
+    for symbol, start_date, end_date in sorted(tasks):
+        digest.update(f"{symbol}|{start_date}|{end_date}\n".encode())
+    return digest.hexdigest()
+
+
+class ConcurrentSyncEngine:
+    """并发行情同步引擎"""
+
+    _STOP = object()
+
+    def __init__(self,
+                 db_manager=None,
+                 fetcher=None,
+                 concurrency: int = None,
+                 rate_limit: float = None,
+                 burst: int = None,
+                 retry_times: int = None,
+                 timeout: float = None,
+                 write_batch_size: int = None,
+                 flush_interval: float = 1.0):
+        if db_manager is None:
+            from core.storage import db_manager
+        if fetcher is None:
+            from core.data_source import StockDataFetcher
+            fetcher = StockDataFetcher()
+            # 重试由引擎负责，每次尝试都消耗一个令牌
+            fetcher.retry_times = 1
+
+        self.db_manager = db_manager
+        self.fetcher = fetcher
+        self.concurrency = concurrency or config.get('DATA_SOURCE.sync_concurrency', 8)
+        self.retry_times = retry_times or config.get('DATA_SOURCE.retry_times', 3)
+        self.timeout = timeout if timeout is not None else config.get('DATA_SOURCE.timeout', 30)
+        self.write_batch_size = write_batch_size or config.get('DATA_SOURCE.sync_write_batch', 50)
+        self.flush_interval = flush_interval
+
+        rate_limit = rate_limit or config.get('DATA_SOURCE.rate_limit', 5)
+        self.bucket = TokenBucket(rate_limit, burst or config.get('DATA_SOURCE.rate_burst', None))
+
+        # 在途请求名额（含超时后仍在后台运行的请求线程），限制对数据源的实际并发
+        self._request_slots = threading.BoundedSemaphore(self.concurrency)
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        """请求停止同步，已完成的股票保留检查点，可稍后续传"""
+        self._stop_event.set()
+
+    def _fetch(self, task: SyncTask) -> pd.DataFrame:
+        """按令牌桶限速拉取单只股票数据，失败时指数退避重试"""
+        symbol, start_date, end_date = task
+        last_exception = None
+        for attempt in range(self.retry_times):
+            # 先占用请求名额再取令牌，避免等待名额时浪费令牌
+            while not self._request_slots.acquire(timeout=self.flush_interval):
+                if self._stop_event.is_set():
+                    raise InterruptedError("同步已停止")
+            if self._stop_event.is_set():
+                self._request_slots.release()
+                raise InterruptedError("同步已停止")
+            self.bucket.acquire()
+            try:
+                return _call_with_timeout(
+                    lambda: self.fetcher.get_stock_hist(symbol, start_date=start_date, end_date=end_date),
+                    self.timeout,
+                    self._request_slots
+                )
+            except Exception as e:
+                last_exception = e
+                if attempt < self.retry_times - 1:
+                    wait_time = 2 ** attempt
+                    logger.warning(f"股票 {symbol} 第 {attempt + 1} 次获取失败: {e}，{wait_time}秒后重试")
+                    time.sleep(wait_time)
+        raise last_exception
+
+    def _writer(self, run_id: str, items: queue.Queue, stats: Dict[str, Any]):
+        """单写线程：批量提交日线数据和检查点"""
+        frames: List[tuple] = []
+        failures: List[tuple] = []
+        last_flush = time.monotonic()
+
+        def flush():
+            nonlocal last_flush
+            if frames or failures:
+                stats['rows'] += self.db_manager.save_sync_batch(run_id, frames, failures)
+                frames.clear()
+                failures.clear()
+            last_flush = time.monotonic()
+
+        try:
+            while True:
+                try:
+                    item = items.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    flush()
+                    continue
+                if item is self._STOP:
+                    flush()
+                    return
+                symbol, data, error = item
+                if error is None:
+                    frames.append((symbol, data))
+                else:
+                    failures.append((symbol, error))
+                if len(frames) + len(failures) >= self.write_batch_size or \
+                        time.monotonic() - last_flush >= self.flush_interval:
+                    flush()
+        except Exception as e:
+            logger.error(f"同步写线程失败: {e}")
+            stats['writer_error'] = e
+            self._stop_event.set()
+            # 继续取出队列中的数据，避免生产者阻塞
+            while items.get() is not self._STOP:
+                pass
+
+    def run(self,
+            tasks: List[SyncTask],
+            sync_type: str,
+            session_id: str = None,
+            run_id: str = None,
+            resume: bool = True) -> Dict[str, Any]:
+        """
+        执行同步
+
+        Args:
+            tasks: 同步任务列表 [(symbol, start_date, end_date)]
+            sync_type: 同步类型（latest/history），用于查找可续传的任务
+            session_id: 进度会话ID
+            run_id: 指定续传的同步任务ID
+            resume: 未指定 run_id 时，是否续传当天未完成、任务集相同的同类任务
+
+        Returns:
+            Dict: total, success, failed, skipped, rows, seconds, symbols_per_sec, run_id
+        """
+        self._stop_event.clear()
+
+        fingerprint = task_fingerprint(tasks)
+        if run_id is None and resume:
+            today = datetime.now().strftime('%Y-%m-%d 00:00:00')
+            run_id = self.db_manager.find_resumable_sync_run(sync_type, today, fingerprint)
+            if run_id:
+                logger.info(f"续传未完成的同步任务: {run_id}")
+        run_id = run_id or str(uuid.uuid4())
+
+        done = set(self.db_manager.get_completed_sync_symbols(run_id))
+        pending = [task for task in tasks if task[0] not in done]
+        skipped = len(tasks) - len(pending)
+
+        self.db_manager.create_sync_run(run_id, sync_type, len(tasks), fingerprint)
+        if session_id:
+            sync_progress_manager.create_session(sync_type, len(tasks), session_id=session_id)
+
+        stats = {'rows': 0}
+        items: queue.Queue = queue.Queue(maxsize=self.write_batch_size * 4)
+        writer = threading.Thread(target=self._writer, args=(run_id, items, stats), daemon=True)
+        writer.start()
+
+        start = time.time()
+        success = failed = 0
+        cancelled = False
+        logger.info(f"开始并发同步 {len(pending)} 只股票（跳过已完成 {skipped} 只），"
+                    f"并发 {self.concurrency}，限速 {self.bucket.rate}/s")
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+                futures = {pool.submit(self._fetch, task): task[0] for task in pending}
+                for processed, future in enumerate(as_completed(futures), 1):
+                    symbol = futures[future]
+                    try:
+                        items.put((symbol, future.result(), None))
+                        success += 1
+                    except (InterruptedError, CancelledError):
+                        # 停止时未完成的股票不写检查点，续传时重新同步
+                        failed += 1
+                    except Exception as e:
+                        logger.error(f"同步股票 {symbol} 失败: {e}")
+                        items.put((symbol, None, e))
+                        failed += 1
+
+                    elapsed = time.time() - start
+                    rate = processed / elapsed if elapsed > 0 else 0.0
+                    if session_id:
+                        sync_progress_manager.update_progress(
+                            session_id, skipped + processed, symbol, f"正在同步 {symbol}...",
+                            success=success, failed=failed, symbols_per_sec=round(rate, 2)
+                        )
+                    if processed % 100 == 0:
+                        logger.info(f"进度: {skipped + processed}/{len(tasks)}, {rate:.1f} 只/秒")
+
+                    if self._stop_event.is_set() and not cancelled:
+                        for pending_future in futures:
+                            pending_future.cancel()
+                        cancelled = True
+        finally:
+            items.put(self._STOP)
+            writer.join()
+
+        if 'writer_error' in stats:
+            self.db_manager.finish_sync_run(run_id, 'failed')
+            raise stats['writer_error']
+
+        stopped = self._stop_event.is_set()
+        self.db_manager.finish_sync_run(run_id, 'stopped' if stopped else 'completed')
+
+        seconds = time.time() - start
+        result = {
+            'run_id': run_id,
+            'total': len(tasks),
+            'success': success,
+            'failed': failed,
+            'skipped': skipped,
+            'rows': stats['rows'],
+            'seconds': round(seconds, 2),
+            'symbols_per_sec': round(len(pending) / seconds, 2) if seconds > 0 else 0.0
+        }
+        logger.info(f"并发同步完成: {result}")
+        return result
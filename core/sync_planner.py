@@ -0,0 +1,133 @@
+"""
+增量同步规划
+基于本地交易日历，一次 GROUP BY 查询各股票在同步窗口内的行数和首尾日期，
+只为真正缺失交易日的股票生成请求；周末、节假日和已核对过没有新数据的停牌股票不再请求
+"""
+import bisect
+from datetime import datetime, timedelta
+from typing import List, Tuple
+
+from utils.logger import logger
+from utils.config import config
+from core.trading_calendar import trading_calendar, normalize_date
+
+
+# (股票代码, 开始日期YYYYMMDD, 结束日期YYYYMMDD)，与 core.sync_engine.SyncTask 相同
+SyncTask = Tuple[str, str, str]
+
+
+class IncrementalSyncPlanner:
+    """增量同步规划器"""
+
+    def __init__(self, db_manager, calendar=None):
+        self.db_manager = db_manager
+        self.calendar = calendar or trading_calendar
+
+    def plan(self, symbols: List[str], default_start: str, end_date: str,
+             start_date: str = None) -> Tuple[List[SyncTask], int]:
+        """
+        生成同步任务（日期格式 YYYYMMDD）
+
+        指定 start_date 时全部从该日开始；否则与 default_start 到 end_date 之间的交易日比较：
+        缺少尾部交易日的从第一个缺失交易日开始，窗口内有缺口（且未被已核对区间覆盖）的从窗口内最早日期开始，
+        窗口内没有数据的从最新日期之后（从未同步的从窗口第一个交易日）开始。
+        当天的数据在收盘前会变化：本地最新一天是今天时只信任到前一天，
+        已核对区间只有在 DATA_SOURCE.snapshot_after 之后记录时才包含今天
+
+        Returns:
+            (任务列表, 已是最新而无需同步的股票数)
+        """
+        if start_date:
+            return [(symbol, start_date, end_date) for symbol in symbols], 0
+
+        self.calendar.ensure(end_date)
+        days = self.calendar.trading_days(default_start, end_date)
+        if not days:
+            return [], len(symbols)
+
+        window = self.db_manager.get_daily_window_stats(days[0], days[-1], symbols)
+        coverages = self.db_manager.get_daily_coverages(symbols)
+        # 窗口内没有数据的股票（长期停牌或久未同步）再查最新日期
+        absent = [symbol for symbol in symbols if symbol not in window]
+        latest_dates = self.db_manager.get_latest_daily_dates(absent) if absent else {}
+
+        now = datetime.now()
+        today = now.strftime("%Y-%m-%d")
+        closed_at = f"{today} {config.get('DATA_SOURCE.snapshot_after', '15:30')}"
+        yesterday = (now - timedelta(days=1)).strftime("%Y-%m-%d")
+
+        tasks = []
+        up_to_date = 0
+        for symbol in symbols:
+            first, latest, count = window.get(symbol, (None, latest_dates.get(symbol), 0))
+            coverage = coverages.get(symbol)
+            checked = []
+            if latest:
+                # 今天的行可能是盘中写入的未完成K线，需要重新获取
+                checked.append(min(latest[:10], yesterday))
+            if coverage and coverage[1] and (coverage[1][:10] < today or (coverage[2] or '') >= closed_at):
+                checked.append(coverage[1][:10])
+            verified_end = max(checked) if checked else None
+
+            begin = None
+            if first is not None and not (coverage and coverage[0] <= first and coverage[1] >= latest):
+                expected = bisect.bisect_right(days, latest) - bisect.bisect_left(days, first)
+                if count < expected:
+                    begin = first
+            if begin is None:
+                if verified_end:
+                    next_day = datetime.strptime(verified_end[:10], "%Y-%m-%d") + timedelta(days=1)
+                    missing = self.calendar.trading_days(next_day, end_date)
+                else:
+                    missing = days
+                if missing:
+                    begin = missing[0]
+
+            if begin is None:
+                up_to_date += 1
+                continue
+            tasks.append((symbol, begin.replace('-', ''), end_date))
+        return tasks, up_to_date
+
+    def exclude_day(self, tasks: List[SyncTask], symbols, day: str) -> Tuple[List[SyncTask], int]:
+        """
+        从任务中去掉 symbols 在 day 当天的请求（当天数据已由其他来源写入，如全市场快照）
+
+        以 day 结束的任务中，只缺当天的整体去掉，更早还有缺口的只请求到前一天
+
+        Returns:
+            (剩余任务, 整体去掉的任务数)
+        """
+        day = normalize_date(day).replace('-', '')
+        previous_day = (datetime.strptime(day, "%Y%m%d") - timedelta(days=1)).strftime("%Y%m%d")
+        symbols = set(symbols)
+        remaining = []
+        covered = 0
+        for symbol, begin, end in tasks:
+            if symbol in symbols and end == day:
+                if begin >= day:
+                    covered += 1
+                    continue
+                end = previous_day
+            remaining.append((symbol, begin, end))
+        return remaining, covered
+
+    def record_checked(self, tasks: List[SyncTask], run_id: str = None, include_today: bool = False):
+        """
+        把同步成功（包括没有新数据）的区间记为已核对，停牌股票下次不再重复请求
+
+        指定 run_id 时只记录该同步任务中已完成的股票；当天数据在收盘前可能变化，
+        除非 include_today（收盘后的数据）否则不计入
+        """
+        try:
+            done = set(self.db_manager.get_completed_sync_symbols(run_id)) if run_id else None
+            last_day = datetime.now() if include_today else datetime.now() - timedelta(days=1)
+            last_day = last_day.strftime("%Y-%m-%d")
+            ranges = []
+            for symbol, begin, end in tasks:
+                begin, end = normalize_date(begin), min(normalize_date(end), last_day)
+                if (done is None or symbol in done) and begin <= end:
+                    ranges.append((symbol, begin, end))
+            self.db_manager.extend_daily_coverages(ranges)
+        except Exception as e:
+            logger.warning(f"记录已核对区间失败: {e}")
@@ -1,93 +1,220 @@
 """
 股票数据同步进度管理器
 用于实时跟踪股票数据同步的进度
+
+进度保存在后台任务表（jobs）中，session_id 即任务ID，
+因此多个Web进程都能查询到同一个同步会话，服务重启后进度也不会丢失。
+逐只股票的进度更新先合并在内存中，按时间间隔或更新次数批量写入数据库；
+每次更新递增 seq，供长轮询和 SSE 判断进度是否变化
 """
+import time
 import uuid
 import threading
-import time
 from typing import Dict, Any, Optional
 from datetime import datetime
 
+from core.jobs import job_manager, PROGRESS, SUCCESS, FAILURE, REVOKED, PROGRESS_STATUS
+from utils.config import config
+
+# 同步已结束的进度状态
+FINISHED_STATUSES = ('completed', 'error', 'cancelled')
+
+
 class SyncProgressManager:
     """同步进度管理器"""
-    
-    def __init__(self):
+
+    def __init__(self, db_manager=None, jobs=None, flush_interval: float = None, flush_every: int = None):
+        self.jobs = jobs or job_manager
+        self.db_manager = db_manager or self.jobs.db_manager
+        # 合并写入：距上次写库超过 flush_interval 秒或累计 flush_every 次更新才写库
+        self.flush_interval = flush_interval if flush_interval is not None else \
+            config.get('JOBS.progress_flush_interval', 0.5)
+        self.flush_every = flush_every or config.get('JOBS.progress_flush_every', 100)
+        # 等待进度变化时查询数据库的间隔（其他进程写入的进度只能轮询得到）
+        self.poll_interval = config.get('JOBS.progress_poll_interval', 0.5)
+        # 本进程正在写入的会话进度，避免每次更新都先读数据库
         self.progress_data: Dict[str, Dict[str, Any]] = {}
+        # 未写库的更新次数和上次写库时间
+        self._pending: Dict[str, int] = {}
+        self._last_flush: Dict[str, float] = {}
+        # 没有后台任务承载、由进度管理器自行登记的会话，需要自己标记结束状态
+        self.standalone_sessions = set()
         self.lock = threading.Lock()
-    
-    def create_session(self, sync_type: str, total_stocks: int) -> str:
-        """创建新的同步会话"""
-        session_id = str(uuid.uuid4())
-        
+        # 本进程写库后唤醒等待进度的请求
+        self.changed = threading.Condition(self.lock)
+
+    def create_session(self, sync_type: str, total_stocks: int, session_id: str = None) -> str:
+        """创建新的同步会话，session_id 为空时自动生成；已有同ID的后台任务时挂在该任务上"""
+        session_id = session_id or str(uuid.uuid4())
+        progress = {
+            'sync_type': sync_type,
+            'total_stocks': total_stocks,
+            'current_stock': 0,
+            'current_symbol': '',
+            'status': 'running',
+            'message': '开始同步...',
+            'start_time': datetime.now().isoformat(),
+            'last_update': datetime.now().isoformat(),
+            'seq': 0
+        }
+
         with self.lock:
-            self.progress_data[session_id] = {
-                'sync_type': sync_type,
-                'total_stocks': total_stocks,
-                'current_stock': 0,
-                'current_symbol': '',
-                'status': 'running',
-                'message': '开始同步...',
-                'start_time': datetime.now().isoformat(),
-                'last_update': datetime.now().isoformat()
-            }
-        
+            self.progress_data[session_id] = progress
+            self._pending[session_id] = 0
+            self._last_flush[session_id] = time.monotonic()
+
+        if self.db_manager.get_job(session_id) is None:
+            self.db_manager.create_job(session_id, 'sync', f'sync.{sync_type}', self.jobs.owner,
+                                       status=PROGRESS, progress=progress)
+            with self.lock:
+                self.standalone_sessions.add(session_id)
+        else:
+            self.db_manager.update_job(session_id, status=PROGRESS, progress=progress)
+
+        self._notify()
         return session_id
-    
-    def update_progress(self, session_id: str, current_stock: int, current_symbol: str, message: str):
-        """更新同步进度"""
+
+    def _update(self, session_id: str, fields: Dict[str, Any], status: str = None, **job_fields):
+        """合并进度字段；进行中的更新按节流条件写库，结束状态立即写库"""
+        with self.lock:
+            progress = self.progress_data.get(session_id)
+        if progress is None:
+            job = self.db_manager.get_job(session_id)
+            if job is None:
+                return
+            progress = job.get('progress') or {}
+
         with self.lock:
-            if session_id in self.progress_data:
-                self.progress_data[session_id].update({
-                    'current_stock': current_stock,
-                    'current_symbol': current_symbol,
-                    'message': message,
-                    'last_update': datetime.now().isoformat(),
-                    'percent': int((current_stock / self.progress_data[session_id]['total_stocks']) * 100)
-                })
-    
-    def complete_sync(self, session_id: str, success_count: int, failed_count: int):
+            progress.update(fields, last_update=datetime.now().isoformat(), seq=progress.get('seq', 0) + 1)
+            snapshot = dict(progress)
+            if status is None:
+                self.progress_data[session_id] = progress
+                pending = self._pending.get(session_id, 0) + 1
+                now = time.monotonic()
+                if pending < self.flush_every and now - self._last_flush.get(session_id, 0) < self.flush_interval:
+                    self._pending[session_id] = pending
+                    return
+                self._pending[session_id] = 0
+                self._last_flush[session_id] = now
+            else:
+                # 会话结束后不再需要本地缓存
+                self.progress_data.pop(session_id, None)
+                self._pending.pop(session_id, None)
+                self._last_flush.pop(session_id, None)
+                if session_id in self.standalone_sessions:
+                    self.standalone_sessions.discard(session_id)
+                    job_fields.update(status=status, finished_at=datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+                else:
+                    # 由后台任务承载的会话，任务状态由 JobManager 在任务结束时写入
+                    job_fields = {}
+
+        self.db_manager.update_job(session_id, progress=snapshot, **job_fields)
+        self._notify()
+
+    def _notify(self):
+        with self.changed:
+            self.changed.notify_all()
+
+    def flush(self, session_id: str = None):
+        """立即写入尚未写库的进度，session_id 为空时写入全部会话"""
+        with self.lock:
+            sessions = [session_id] if session_id else list(self.progress_data)
+            snapshots = {}
+            for sid in sessions:
+                if self._pending.get(sid) and sid in self.progress_data:
+                    snapshots[sid] = dict(self.progress_data[sid])
+                    self._pending[sid] = 0
+                    self._last_flush[sid] = time.monotonic()
+        for sid, snapshot in snapshots.items():
+            self.db_manager.update_job(sid, progress=snapshot)
+        if snapshots:
+            self._notify()
+
+    def update_progress(self, session_id: str, current_stock: int, current_symbol: str, message: str, **stats):
+        """更新同步进度，stats 为附加统计字段（如 symbols_per_sec）"""
+        with self.lock:
+            progress = self.progress_data.get(session_id)
+            total = progress.get('total_stocks') if progress else None
+        if progress is None:
+            job = self.db_manager.get_job(session_id)
+            if job is None:
+                return
+            total = (job.get('progress') or {}).get('total_stocks')
+
+        self._update(session_id, dict({
+            'current_stock': current_stock,
+            'current_symbol': current_symbol,
+            'message': message,
+            'percent': int((current_stock / total) * 100) if total else 100
+        }, **stats))
+
+    def complete_sync(self, session_id: str, success_count: int, failed_count: int, **stats):
         """完成同步"""
         with self.lock:
-            if session_id in self.progress_data:
-                total = self.progress_data[session_id]['total_stocks']
-                self.progress_data[session_id].update({
-                    'status': 'completed',
-                    'message': f'同步完成！成功: {success_count}, 失败: {failed_count}',
-                    'last_update': datetime.now().isoformat(),
-                    'percent': 100,
-                    'total': total,
-                    'success': success_count,
-                    'failed': failed_count
-                })
-    
+            progress = self.progress_data.get(session_id) or {}
+        total = progress.get('total_stocks')
+        if total is None:
+            job = self.db_manager.get_job(session_id)
+            if job is None:
+                return
+            total = (job.get('progress') or {}).get('total_stocks')
+
+        self._update(session_id, dict({
+            'status': 'completed',
+            'message': f'同步完成！成功: {success_count}, 失败: {failed_count}',
+            'percent': 100,
+            'total': total,
+            'success': success_count,
+            'failed': failed_count
+        }, **stats), status=SUCCESS)
+
     def fail_sync(self, session_id: str, error_message: str):
         """同步失败"""
-        with self.lock:
-            if session_id in self.progress_data:
-                self.progress_data[session_id].update({
-                    'status': 'error',
-                    'message': f'同步失败: {error_message}',
-                    'last_update': datetime.now().isoformat()
-                })
-    
+        self._update(session_id, {
+            'status': 'error',
+            'message': f'同步失败: {error_message}'
+        }, status=FAILURE, error=error_message)
+
     def get_progress(self, session_id: str) -> Optional[Dict[str, Any]]:
         """获取同步进度"""
-        with self.lock:
-            return self.progress_data.get(session_id)
-    
+        job = self.db_manager.get_job(session_id)
+        if job is None:
+            return None
+
+        progress = dict(job.get('progress') or {})
+        progress.setdefault('status', PROGRESS_STATUS.get(job['status'], 'running'))
+        progress.setdefault('message', '等待执行...')
+
+        # 任务被取消，或异常结束（如进程退出）而进度仍停留在运行中
+        if job['status'] == REVOKED:
+            progress['status'] = PROGRESS_STATUS[REVOKED]
+            progress['message'] = '同步已取消'
+        elif progress['status'] == 'running' and job['status'] == FAILURE:
+            progress['status'] = PROGRESS_STATUS[FAILURE]
+            progress['message'] = f"同步失败: {job.get('error')}"
+        return progress
+
+    def wait_for_change(self, session_id: str, since: int = None, timeout: float = 30) -> Optional[Dict[str, Any]]:
+        """
+        长轮询：等待进度 seq 大于 since 或同步结束后返回进度
+
+        since 为空时立即返回当前进度；超时后返回当前进度（可能未变化），会话不存在返回 None
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            progress = self.get_progress(session_id)
+            if (progress is None or since is None or progress.get('seq', 0) > since
+                    or progress['status'] in FINISHED_STATUSES):
+                return progress
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return progress
+            with self.changed:
+                self.changed.wait(min(self.poll_interval, remaining))
+
     def cleanup_old_sessions(self, max_age_hours: int = 24):
         """清理旧的会话"""
-        with self.lock:
-            current_time = datetime.now()
-            to_remove = []
-            
-            for session_id, data in self.progress_data.items():
-                start_time = datetime.fromisoformat(data['start_time'])
-                if (current_time - start_time).total_seconds() > max_age_hours * 3600:
-                    to_remove.append(session_id)
-            
-            for session_id in to_remove:
-                del self.progress_data[session_id]
+        return self.jobs.cleanup(max_age_hours, job_type='sync')
 
 # 全局进度管理器实例
-sync_progress_manager = SyncProgressManager()
\ No newline at end of file
+sync_progress_manager = SyncProgressManager()
@@ -0,0 +1,269 @@
+"""
+数据表浏览
+按 rowid（或已建索引的列 + rowid）游标分页浏览 akshare_* 等下载数据表，
+只查询请求的列，筛选和排序限定在已建索引的列上，总数读取表目录或按条件缓存
+"""
+import re
+import sqlite3
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from utils.logger import logger
+from utils.config import config
+from utils.pagination import encode_cursor, decode_cursor, keyset_condition, CountCache
+from core.storage import db_manager
+from core.catalog import table_catalog
+
+
+# 筛选运算符 -> SQL运算符；prefix 转换为范围条件以便使用索引
+FILTER_OPS = {
+    'eq': '=',
+    'ne': '!=',
+    'gt': '>',
+    'gte': '>=',
+    'lt': '<',
+    'lte': '<=',
+    'prefix': None,
+}
+
+# 整表替换时暂存新数据的临时表后缀
+STAGING_SUFFIX = '__staging'
+
+# 前缀匹配的上界：比任何以该前缀开头的字符串都大
+_PREFIX_MAX = '\U0010ffff'
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def parse_filter(expr: str) -> Tuple[str, str, str]:
+    """解析 列:运算符:值 形式的筛选条件，值中可以包含冒号"""
+    parts = expr.split(':', 2)
+    if len(parts) != 3 or parts[1] not in FILTER_OPS:
+        raise ValueError(f"无效的筛选条件: {expr}，格式为 列:运算符:值，运算符 {'/'.join(FILTER_OPS)}")
+    return parts[0], parts[1], parts[2]
+
+
+class TableBrowser:
+    """数据表浏览器"""
+
+    def __init__(self, db_manager, catalog=None, count_ttl: float = None):
+        """
+        Args:
+            db_manager: 数据库管理器
+            catalog: 表目录，无筛选条件时总数从目录读取
+            count_ttl: 带筛选条件的总数缓存时长(秒)，默认读取 DATA_BROWSER.count_cache_ttl
+        """
+        self.db_manager = db_manager
+        self.catalog = catalog or table_catalog
+        count_ttl = count_ttl if count_ttl is not None else config.get('DATA_BROWSER.count_cache_ttl', 300)
+        self.counts = CountCache(count_ttl)
+        self.max_page_size = config.get('DATA_BROWSER.max_page_size', 500)
+
+    @staticmethod
+    def _columns(conn, table: str) -> List[str]:
+        return [row[1] for row in conn.execute(f"PRAGMA table_info({_quote(table)})")]
+
+    @staticmethod
+    def _indexed_columns(conn, table: str) -> List[str]:
+        """各索引的首列（可用于筛选和排序）"""
+        columns = []
+        for index in conn.execute(f"PRAGMA index_list({_quote(table)})"):
+            info = conn.execute(f"PRAGMA index_info({_quote(index[1])})").fetchall()
+            if info and info[0][2] is not None and info[0][2] not in columns:
+                columns.append(info[0][2])
+        return columns
+
+    @staticmethod
+    def _index_sql(conn, table: str) -> List[str]:
+        """表上显式创建的索引定义"""
+        return [row[0] for row in conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (table,)
+        )]
+
+    def table_exists(self, table: str) -> bool:
+        with self.db_manager.connection() as conn:
+            return conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+            ).fetchone() is not None
+
+    def indexed_columns(self, table: str) -> List[str]:
+        with self.db_manager.connection() as conn:
+            return self._indexed_columns(conn, table)
+
+    def create_index(self, table: str, column: str) -> str:
+        """为列创建索引以支持筛选和排序，返回索引名"""
+        with self.db_manager.connection() as conn:
+            if column not in self._columns(conn, table):
+                raise ValueError(f"列不存在: {column}")
+            index_name = 'idx_' + re.sub(r'\W', '_', f"{table}_{column}")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {_quote(index_name)} ON {_quote(table)}({_quote(column)})")
+        self.counts.clear()
+        logger.info(f"已为 {table}.{column} 创建索引 {index_name}")
+        return index_name
+
+    def replace_frame(self, df, table: str) -> int:
+        """
+        用 DataFrame 整表替换数据，返回写入行数
+
+        先写入临时表，再在一个事务中删除旧表、改名并重建原有索引，
+        读取方在替换过程中始终看到完整的旧表或新表；完成后更新表目录
+        """
+        staging = f"{table}{STAGING_SUFFIX}"
+        with self.db_manager.connection() as conn:
+            index_sql = self._index_sql(conn, table)
+            df.to_sql(staging, conn, if_exists='replace', index=False)
+            conn.commit()
+
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(f"DROP TABLE IF EXISTS {_quote(table)}")
+            conn.execute(f"ALTER TABLE {_quote(staging)} RENAME TO {_quote(table)}")
+            for sql in index_sql:
+                try:
+                    conn.execute(sql)
+                except sqlite3.Error as e:
+                    # 新数据缺少原索引的列
+                    logger.warning(f"重建索引失败 {table}: {e}")
+        self.catalog.record_write(table, rows=len(df))
+        self.counts.clear()
+        return len(df)
+
+    @staticmethod
+    def _dense_bounds(conn, table: str, total: Optional[int]) -> Optional[Tuple[int, int]]:
+        """rowid 连续（整表写入或只追加）时返回 (最小, 最大) rowid，可直接计算任意页的起点"""
+        if total is None:
+            return None
+        low, high = conn.execute(f"SELECT MIN(rowid), MAX(rowid) FROM {_quote(table)}").fetchone()
+        if low is None or high - low + 1 != total:
+            return None
+        return low, high
+
+    def browse(self,
+               table: str,
+               columns: Sequence[str] = None,
+               filters: Sequence[Tuple[str, str, Any]] = (),
+               sort_by: str = None,
+               sort_order: str = 'ASC',
+               cursor: str = None,
+               page: int = 1,
+               page_size: int = 20,
+               with_total: bool = True) -> Dict[str, Any]:
+        """
+        分页读取数据表
+
+        Args:
+            table: 表名
+            columns: 返回的列，为空时返回全部列
+            filters: [(列, 运算符, 值)]，列必须已建索引
+            sort_by: 排序列，必须已建索引；为空时按 rowid（写入顺序）
+            sort_order: 排序顺序(ASC/DESC)
+            cursor: 上一页返回的 next_cursor
+            page: 页码，仅在没有游标时使用
+            page_size: 每页数量
+            with_total: 是否返回总数
+        """
+        page = max(1, int(page or 1))
+        page_size = max(1, min(int(page_size or 20), self.max_page_size))
+        descending = str(sort_order).upper() == 'DESC'
+        need_total = with_total or (not cursor and page > 1)
+
+        # 无筛选条件的总数读取表目录（目录中没有该表时精确计数一次）
+        total = None
+        if need_total and not filters:
+            total = self.catalog.get_row_count(table)
+            if total is None and self.table_exists(table):
+                self.catalog.record_write(table)
+                total = self.catalog.get_row_count(table)
+
+        with self.db_manager.connection() as conn:
+            all_columns = self._columns(conn, table)
+            if not all_columns:
+                raise LookupError(f"数据表不存在: {table}")
+            indexed = self._indexed_columns(conn, table)
+
+            selected = [c for c in (columns or all_columns) if c]
+            unknown = [c for c in selected if c not in all_columns]
+            if unknown:
+                raise ValueError(f"列不存在: {', '.join(unknown)}")
+            if sort_by and sort_by not in indexed:
+                raise ValueError(f"只能按已建索引的列排序: {', '.join(indexed) or '无'}")
+
+            conditions, params = [], []
+            for column, op, value in filters:
+                if column not in indexed:
+                    raise ValueError(f"只能按已建索引的列筛选: {', '.join(indexed) or '无'}")
+                if op not in FILTER_OPS:
+                    raise ValueError(f"不支持的筛选运算符: {op}")
+                if op == 'prefix':
+                    conditions.append(f"{_quote(column)} >= ? AND {_quote(column)} < ?")
+                    params.extend([value, f"{value}{_PREFIX_MAX}"])
+                else:
+                    conditions.append(f"{_quote(column)} {FILTER_OPS[op]} ?")
+                    params.append(value)
+
+            if need_total and conditions:
+                where_sql = ' AND '.join(conditions)
+                total = self.counts.get_or_compute(
+                    [table, where_sql, params],
+                    lambda: conn.execute(f"SELECT COUNT(*) FROM {_quote(table)} WHERE {where_sql}",
+                                         params).fetchone()[0]
+                )
+
+            sort_column = _quote(sort_by) if sort_by else 'rowid'
+            page_conditions, page_params = list(conditions), list(params)
+            offset = None
+            if cursor:
+                if sort_by:
+                    last_value, last_rowid = decode_cursor(cursor, 2)
+                else:
+                    last_value, last_rowid = None, decode_cursor(cursor, 1)[0]
+                sql, values = keyset_condition(sort_column, 'rowid', descending, last_value, last_rowid)
+                page_conditions.append(sql)
+                page_params.extend(values)
+            elif page > 1:
+                bounds = None
+                if not sort_by and not conditions:
+                    bounds = self._dense_bounds(conn, table, total)
+                if bounds is not None:
+                    # 跳页不扫描前面的行
+                    skip = (page - 1) * page_size
+                    page_conditions.append("rowid <= ?" if descending else "rowid >= ?")
+                    page_params.append(bounds[1] - skip if descending else bounds[0] + skip)
+                else:
+                    offset = (page - 1) * page_size
+
+            direction = 'DESC' if descending else 'ASC'
+            order_sql = f"{sort_column} {direction}" + (f", rowid {direction}" if sort_by else '')
+            where_sql = f"WHERE {' AND '.join(page_conditions)}" if page_conditions else ''
+            # 前两列为 rowid 和排序值，用于生成下一页游标
+            query = (f"SELECT rowid, {sort_column}, {', '.join(_quote(c) for c in selected)} FROM {_quote(table)} "
+                     f"{where_sql} ORDER BY {order_sql} LIMIT ?")
+            page_params.append(page_size + 1)
+            if offset:
+                query += " OFFSET ?"
+                page_params.append(offset)
+            rows = conn.execute(query, page_params).fetchall()
+
+        has_more = len(rows) > page_size
+        rows = [tuple(row) for row in rows[:page_size]]
+        next_cursor = None
+        if has_more:
+            rowid, sort_value = rows[-1][0], rows[-1][1]
+            next_cursor = encode_cursor([sort_value, rowid] if sort_by else [rowid])
+
+        return {
+            'table_name': table,
+            'columns': selected,
+            'rows': [row[2:] for row in rows],
+            'indexed_columns': indexed,
+            'page': page,
+            'page_size': page_size,
+            'has_more': has_more,
+            'next_cursor': next_cursor,
+            'total_records': total,
+            'total_pages': (total + page_size - 1) // page_size if total is not None else None,
+        }
+
+
+# 全局数据表浏览器实例
+table_browser = TableBrowser(db_manager)
@@ -0,0 +1,141 @@
+"""
+交易日历
+以上证指数日线的日期作为 A 股交易日，缓存在本地 trading_calendar 表中；
+缓存未收录的日期（如尚未收录的最新交易日）按工作日估计，
+供增量同步只请求真正缺失交易日的股票
+"""
+import bisect
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from utils.logger import logger
+from utils.config import config
+from core.storage import db_manager
+
+
+def normalize_date(value) -> str:
+    """YYYYMMDD / YYYY-MM-DD / datetime 统一为 YYYY-MM-DD"""
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d')
+    value = str(value)[:10]
+    if len(value) == 8 and value.isdigit():
+        return f"{value[:4]}-{value[4:6]}-{value[6:]}"
+    return value
+
+
+def _weekdays(start: str, end: str) -> List[str]:
+    """start 到 end（含）之间的工作日"""
+    day = datetime.strptime(start, '%Y-%m-%d')
+    last = datetime.strptime(end, '%Y-%m-%d')
+    days = []
+    while day <= last:
+        if day.weekday() < 5:
+            days.append(day.strftime('%Y-%m-%d'))
+        day += timedelta(days=1)
+    return days
+
+
+class TradingCalendar:
+    """A股交易日历"""
+
+    def __init__(self, db_manager, fetcher=None, index_code: str = None, refresh_interval: float = None):
+        """
+        Args:
+            db_manager: 数据库管理器
+            fetcher: 市场数据获取器（需提供 get_market_index），默认 MarketDataFetcher
+            index_code: 作为交易日来源的指数，默认读取 CALENDAR.index_code
+            refresh_interval: 缓存落后于最近工作日时，两次远程刷新的最小间隔(秒)
+        """
+        self.db_manager = db_manager
+        self._fetcher = fetcher
+        self.index_code = index_code or config.get('CALENDAR.index_code', 'sh000001')
+        self.refresh_interval = refresh_interval if refresh_interval is not None else \
+            config.get('CALENDAR.refresh_interval', 3600)
+        self._days: Optional[List[str]] = None
+        self._last_refresh = 0.0
+        self.lock = threading.Lock()
+
+    @property
+    def fetcher(self):
+        if self._fetcher is None:
+            from core.data_source import MarketDataFetcher
+            self._fetcher = MarketDataFetcher()
+        return self._fetcher
+
+    def _load(self) -> List[str]:
+        with self.db_manager.connection() as conn:
+            return [row[0] for row in conn.execute("SELECT date FROM trading_calendar ORDER BY date")]
+
+    def refresh(self) -> int:
+        """从指数日线更新交易日历，返回新增的交易日数"""
+        df = self.fetcher.get_market_index(self.index_code)
+        dates = sorted({normalize_date(value) for value in df.index}) if df is not None and not df.empty else []
+        with self.db_manager.connection() as conn:
+            before = conn.total_changes
+            conn.executemany("INSERT OR IGNORE INTO trading_calendar (date) VALUES (?)", [(d,) for d in dates])
+            added = conn.total_changes - before
+        with self.lock:
+            self._days = None
+            self._last_refresh = time.monotonic()
+        logger.info(f"交易日历更新完成，新增 {added} 个交易日")
+        return added
+
+    def ensure(self, through: str = None):
+        """缓存落后于 through（默认今天）之前最近的工作日时刷新，失败时继续使用工作日估计"""
+        through = normalize_date(through or datetime.now())
+        days = self.days()
+        recent = _weekdays((datetime.strptime(through, '%Y-%m-%d') - timedelta(days=7)).strftime('%Y-%m-%d'),
+                           through)
+        if days and recent and days[-1] >= recent[-1]:
+            return
+        with self.lock:
+            if self._last_refresh and time.monotonic() - self._last_refresh < self.refresh_interval:
+                return
+            self._last_refresh = time.monotonic()
+        try:
+            self.refresh()
+        except Exception as e:
+            logger.warning(f"更新交易日历失败，按工作日估计交易日: {e}")
+
+    def days(self) -> List[str]:
+        """本地缓存的全部交易日（升序）"""
+        with self.lock:
+            if self._days is None:
+                self._days = self._load()
+            return self._days
+
+    def trading_days(self, start, end) -> List[str]:
+        """start 到 end（含）之间的交易日，缓存之后的日期按工作日估计"""
+        start, end = normalize_date(start), normalize_date(end)
+        if start > end:
+            return []
+        days = self.days()
+        if not days:
+            return _weekdays(start, end)
+
+        # 缓存未收录的日期（缓存之前或之后）按工作日估计
+        result = days[bisect.bisect_left(days, start):bisect.bisect_right(days, end)]
+        if start < days[0]:
+            head_end = (datetime.strptime(days[0], '%Y-%m-%d') - timedelta(days=1)).strftime('%Y-%m-%d')
+            result = _weekdays(start, min(head_end, end)) + result
+        if end > days[-1]:
+            tail_start = (datetime.strptime(days[-1], '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+            result = result + _weekdays(max(tail_start, start), end)
+        return result
+
+    def is_trading_day(self, day) -> bool:
+        day = normalize_date(day)
+        return self.trading_days(day, day) == [day]
+
+    def is_confirmed(self, day) -> bool:
+        """指数日线中已有该日（确认开市，而不是按工作日估计）"""
+        day = normalize_date(day)
+        days = self.days()
+        index = bisect.bisect_left(days, day)
+        return index < len(days) and days[index] == day
+
+
+# 全局交易日历实例
+trading_calendar = TradingCalendar(db_manager)
@@ -9,6 +9,8 @@ matplotlib.use('Agg')  # 使用非交互式后端，避免tkinter线程问题
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 import matplotlib.font_manager as fm
+from matplotlib.collections import LineCollection, PolyCollection
+from matplotlib.colors import to_rgba
 import seaborn as sns
 import plotly.graph_objects as go
 import plotly.express as px
@@ -16,13 +18,26 @@ from plotly.subplots import make_subplots
 import pandas as pd
 import numpy as np
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple, Union
 from utils.logger import logger
+from utils.config import config
+from core.chart_cache import ChartCache, data_fingerprint, report_cache
+import os
 import warnings
 import threading
 import gc
 warnings.filterwarnings('ignore')
 
+# 渲染预设：scale 为相对默认图表尺寸的缩放比例，可通过 CHART.presets 覆盖
+RENDER_PRESETS = {
+    'thumbnail': {'scale': 0.5, 'dpi': 100},
+    'web': {'scale': 1.0, 'dpi': 100},
+    'print': {'scale': 1.0, 'dpi': 300},
+}
+
+# 支持的输出格式（webp 需要安装 Pillow）
+IMAGE_FORMATS = ('png', 'webp', 'svg')
+
 # 配置中文字体
 def setup_chinese_fonts():
     """设置中文字体"""
@@ -75,12 +90,14 @@ setup_chinese_fonts()
 class ChartPlotter:
     """图表绘制器"""
     
-    def __init__(self, style: str = "seaborn-v0_8"):
+    def __init__(self, style: str = "seaborn-v0_8", preset: str = None, image_format: str = None):
         """
         初始化图表绘制器
         
         Args:
             style: matplotlib样式
+            preset: 默认渲染预设（见 RENDER_PRESETS），默认读取 CHART.preset
+            image_format: 默认输出格式 png/webp/svg，默认读取 CHART.format
         """
         try:
             plt.style.use(style)
@@ -96,8 +113,73 @@ class ChartPlotter:
             'volume': '#808080'   # 成交量灰色
         }
         
+        self.presets = dict(RENDER_PRESETS, **config.get('CHART.presets', {}))
+        self.preset = preset or config.get('CHART.preset', 'web')
+        self.image_format = image_format or config.get('CHART.format', 'png')
+        
         logger.info("图表绘制器初始化完成")
     
+    def _render_options(self, preset: str = None) -> Dict[str, float]:
+        """获取渲染预设，未知预设使用 web"""
+        name = preset or self.preset
+        if name not in self.presets:
+            logger.warning(f"未知的渲染预设 {name}，使用 web")
+            name = 'web'
+        return self.presets[name]
+    
+    def _figsize(self, width: float, height: float, preset: str = None) -> Tuple[float, float]:
+        scale = self._render_options(preset)['scale']
+        return width * scale, height * scale
+    
+    def _save_figure(self, fig, save_path: str, name: str, preset: str = None, image_format: str = None) -> str:
+        """
+        按预设分辨率保存图表
+
+        Args:
+            fig: matplotlib Figure
+            save_path: 保存路径，扩展名为支持的格式时按扩展名输出；为空时保存到 static/charts
+            name: 自动生成文件名时的前缀
+            preset: 渲染预设
+            image_format: 输出格式
+        """
+        fmt = (image_format or self.image_format).lower()
+        if save_path:
+            suffix = os.path.splitext(save_path)[1].lstrip('.').lower()
+            if suffix in IMAGE_FORMATS:
+                fmt = suffix
+        if fmt not in IMAGE_FORMATS:
+            raise ValueError(f"不支持的图片格式: {fmt}")
+        if not save_path:
+            os.makedirs('static/charts', exist_ok=True)
+            save_path = f"static/charts/{name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{fmt}"
+        
+        dpi = self._render_options(preset)['dpi']
+        try:
+            fig.savefig(save_path, dpi=dpi, bbox_inches='tight', format=fmt)
+        except ValueError as e:
+            if fmt != 'webp':
+                raise
+            # 当前 matplotlib/Pillow 不支持 webp 时退回 png
+            logger.warning(f"不支持输出webp，改为png: {e}")
+            save_path = os.path.splitext(save_path)[0] + '.png'
+            fig.savefig(save_path, dpi=dpi, bbox_inches='tight', format='png')
+        return save_path
+    
+    @staticmethod
+    def _add_bars(ax, x: np.ndarray, bottom: np.ndarray, top: np.ndarray, width: float,
+                  colors: np.ndarray, alpha: float, zorder: float = 1) -> PolyCollection:
+        """用一个 PolyCollection 绘制全部矩形（K线实体、成交量柱）"""
+        half = width / 2
+        verts = np.stack([
+            np.column_stack([x - half, bottom]),
+            np.column_stack([x - half, top]),
+            np.column_stack([x + half, top]),
+            np.column_stack([x + half, bottom]),
+        ], axis=1)
+        bars = PolyCollection(verts, facecolors=colors, edgecolors='none', alpha=alpha, zorder=zorder)
+        ax.add_collection(bars)
+        return bars
+    
     def safe_plot(self, plot_func):
         """安全绘图装饰器，解决多线程问题"""
         def wrapper(*args, **kwargs):
@@ -135,7 +217,9 @@ class ChartPlotter:
                               show_volume: bool = True,
                               show_ma: bool = True,
                               ma_periods: List[int] = [5, 10, 20],
-                              mark_extremes: str = 'global') -> str:
+                              mark_extremes: str = 'global',
+                              preset: str = None,
+                              image_format: str = None) -> str:
         """
         绘制K线图
         
@@ -148,10 +232,14 @@ class ChartPlotter:
             show_ma: 是否显示移动平均线
             ma_periods: 移动平均线周期
             mark_extremes: 标注模式 ('global': 全局最高低点, 'local': 局部最高低点, 'none': 不标注)
+            preset: 渲染预设 thumbnail/web/print
+            image_format: 输出格式 png/webp/svg
         """
-        return self.safe_plot(self._plot_candlestick_chart)(data, symbol, title, save_path, show_volume, show_ma, ma_periods, mark_extremes)
+        return self.safe_plot(self._plot_candlestick_chart)(data, symbol, title, save_path, show_volume, show_ma,
+                                                           ma_periods, mark_extremes, preset, image_format)
     
-    def _plot_candlestick_chart(self, data, symbol, title, save_path, show_volume, show_ma, ma_periods, mark_extremes='global'):
+    def _plot_candlestick_chart(self, data, symbol, title, save_path, show_volume, show_ma, ma_periods,
+                                mark_extremes='global', preset=None, image_format=None):
         """内部K线图绘制方法"""
         try:
             # 确保中文字体设置
@@ -162,10 +250,10 @@ class ChartPlotter:
             
             # 创建子图
             if show_volume:
-                fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(15, 10), 
+                fig, (ax1, ax2) = plt.subplots(2, 1, figsize=self._figsize(15, 10, preset), 
                                              gridspec_kw={'height_ratios': [3, 1]})
             else:
-                fig, ax1 = plt.subplots(1, 1, figsize=(15, 8))
+                fig, ax1 = plt.subplots(1, 1, figsize=self._figsize(15, 8, preset))
             
             # 准备数据
             df = data.copy()
@@ -174,30 +262,20 @@ class ChartPlotter:
             
             dates = pd.to_datetime(df.index if 'date' not in df.columns else df['date'])
             
-            # 绘制K线图
-            for i in range(len(df)):
-                date = dates[i]
-                open_price = df['open'].iloc[i]
-                high_price = df['high'].iloc[i]
-                low_price = df['low'].iloc[i]
-                close_price = df['close'].iloc[i]
-                
-                # 判断涨跌
-                color = self.colors['up'] if close_price >= open_price else self.colors['down']
-                
-                # 绘制影线
-                ax1.plot([date, date], [low_price, high_price], color='black', linewidth=1)
-                
-                # 绘制实体
-                body_height = abs(close_price - open_price)
-                bottom = min(open_price, close_price)
-                
-                if close_price >= open_price:
-                    # 阳线
-                    ax1.bar(date, body_height, bottom=bottom, color=color, alpha=0.8, width=0.6)
-                else:
-                    # 阴线
-                    ax1.bar(date, body_height, bottom=bottom, color=color, alpha=0.8, width=0.6)
+            # 批量绘制K线：全部影线一个 LineCollection，全部实体一个 PolyCollection
+            x = mdates.date2num(pd.DatetimeIndex(dates).to_pydatetime())
+            opens = df['open'].to_numpy(dtype=float)
+            highs = df['high'].to_numpy(dtype=float)
+            lows = df['low'].to_numpy(dtype=float)
+            closes = df['close'].to_numpy(dtype=float)
+            up = closes >= opens
+            colors = np.where(up[:, None], to_rgba(self.colors['up']), to_rgba(self.colors['down']))
+            
+            ax1.xaxis_date()
+            wicks = np.stack([np.column_stack([x, lows]), np.column_stack([x, highs])], axis=1)
+            ax1.add_collection(LineCollection(wicks, colors='black', linewidths=1, zorder=2))
+            self._add_bars(ax1, x, np.minimum(opens, closes), np.maximum(opens, closes), 0.6, colors, 0.8)
+            ax1.autoscale_view()
             
             # 标注最高低点
             if mark_extremes == 'global':
@@ -236,10 +314,10 @@ class ChartPlotter:
             
             # 绘制成交量
             if show_volume and 'volume' in df.columns:
-                colors = [self.colors['up'] if df['close'].iloc[i] >= df['open'].iloc[i] 
-                         else self.colors['down'] for i in range(len(df))]
-                
-                ax2.bar(dates, df['volume'], color=colors, alpha=0.6)
+                ax2.xaxis_date()
+                volume = df['volume'].to_numpy(dtype=float)
+                self._add_bars(ax2, x, np.zeros_like(volume), volume, 0.8, colors, 0.6)
+                ax2.autoscale_view()
                 ax2.set_ylabel('成交量', fontsize=12, fontproperties='SimHei')
                 ax2.set_xlabel('日期', fontsize=12, fontproperties='SimHei')
                 ax2.grid(True, alpha=0.3)
@@ -252,18 +330,9 @@ class ChartPlotter:
             plt.tight_layout()
             
             # 保存图表
-            if save_path:
-                plt.savefig(save_path, dpi=300, bbox_inches='tight')
-                logger.info(f"K线图已保存: {save_path}")
-                return save_path
-            else:
-                # 确保目录存在
-                import os
-                os.makedirs('static/charts', exist_ok=True)
-                save_path = f"static/charts/candlestick_{symbol}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
-                plt.savefig(save_path, dpi=300, bbox_inches='tight')
-                logger.info(f"K线图已保存: {save_path}")
-                return save_path
+            save_path = self._save_figure(fig, save_path, f"candlestick_{symbol}", preset, image_format)
+            logger.info(f"K线图已保存: {save_path}")
+            return save_path
                 
         except Exception as e:
             logger.error(f"绘制K线图失败: {e}")
@@ -369,7 +438,9 @@ class ChartPlotter:
                                 data: pd.DataFrame, 
                                 symbol: str,
                                 indicators: List[str] = ['RSI', 'MACD', 'KDJ'],
-                                save_path: str = None) -> str:
+                                save_path: str = None,
+                                preset: str = None,
+                                image_format: str = None) -> str:
         """
         绘制技术指标图
         
@@ -378,16 +449,18 @@ class ChartPlotter:
             symbol: 股票代码
             indicators: 要绘制的指标列表
             save_path: 保存路径
+            preset: 渲染预设 thumbnail/web/print
+            image_format: 输出格式 png/webp/svg
         """
-        return self.safe_plot(self._plot_technical_indicators)(data, symbol, indicators, save_path)
+        return self.safe_plot(self._plot_technical_indicators)(data, symbol, indicators, save_path, preset, image_format)
     
-    def _plot_technical_indicators(self, data, symbol, indicators, save_path):
+    def _plot_technical_indicators(self, data, symbol, indicators, save_path, preset=None, image_format=None):
         """内部技术指标图绘制方法"""
         try:
             # 确保中文字体设置
             setup_chinese_fonts()
             # 创建子图
-            fig, axes = plt.subplots(len(indicators), 1, figsize=(15, 4*len(indicators)))
+            fig, axes = plt.subplots(len(indicators), 1, figsize=self._figsize(15, 4*len(indicators), preset))
             
             if len(indicators) == 1:
                 axes = [axes]
@@ -413,7 +486,7 @@ class ChartPlotter:
                         ax.plot(dates, df['MACD_Signal'], label='Signal', linewidth=2)
                         
                         # MACD柱状图
-                        colors = ['red' if x > 0 else 'green' for x in df['MACD_Histogram']]
+                        colors = np.where(df['MACD_Histogram'].to_numpy() > 0, 'red', 'green')
                         ax.bar(dates, df['MACD_Histogram'], color=colors, alpha=0.6, label='Histogram')
                         
                         ax.axhline(y=0, color='black', linestyle='-', alpha=0.3)
@@ -443,18 +516,9 @@ class ChartPlotter:
             plt.tight_layout()
             
             # 保存图表
-            if save_path:
-                plt.savefig(save_path, dpi=300, bbox_inches='tight')
-                logger.info(f"技术指标图已保存: {save_path}")
-                return save_path
-            else:
-                # 确保目录存在
-                import os
-                os.makedirs('static/charts', exist_ok=True)
-                save_path = f"static/charts/indicators_{symbol}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
-                plt.savefig(save_path, dpi=300, bbox_inches='tight')
-                logger.info(f"技术指标图已保存: {save_path}")
-                return save_path
+            save_path = self._save_figure(fig, save_path, f"indicators_{symbol}", preset, image_format)
+            logger.info(f"技术指标图已保存: {save_path}")
+            return save_path
                 
         except Exception as e:
             logger.error(f"绘制技术指标图失败: {e}")
@@ -514,8 +578,7 @@ class ChartPlotter:
             
             # 成交量
             if 'volume' in df.columns:
-                colors = ['red' if df['close'].iloc[i] >= df['open'].iloc[i] else 'green' 
-                         for i in range(len(df))]
+                colors = np.where(df['close'].to_numpy() >= df['open'].to_numpy(), 'red', 'green').tolist()
                 
                 fig.add_trace(
                     go.Bar(x=df.index, y=df['volume'], name='成交量', marker_color=colors),
@@ -549,26 +612,28 @@ class ChartPlotter:
             raise
     
     def plot_correlation_heatmap(self, 
-                               data: Dict[str, pd.DataFrame], 
+                               data: Union[Dict[str, pd.DataFrame], pd.DataFrame], 
                                save_path: str = None) -> str:
         """
         绘制相关性热力图
         
         Args:
-            data: 多只股票的收盘价数据 {symbol: DataFrame}
+            data: 多只股票的收盘价数据 {symbol: DataFrame}，
+                  或 日期×股票 的收盘价矩阵（如 db_manager.get_price_matrix('close', symbols)）
             save_path: 保存路径
         """
         try:
             # 合并数据
-            price_data = pd.DataFrame()
-            for symbol, df in data.items():
-                price_data[symbol] = df['close']
+            if isinstance(data, pd.DataFrame):
+                price_data = data
+            else:
+                price_data = pd.DataFrame({symbol: df['close'] for symbol, df in data.items()})
             
             # 计算相关性矩阵
             correlation_matrix = price_data.corr()
             
             # 创建热力图
-            plt.figure(figsize=(12, 10))
+            plt.figure(figsize=self._figsize(12, 10))
             sns.heatmap(correlation_matrix, 
                        annot=True, 
                        cmap='coolwarm', 
@@ -580,15 +645,9 @@ class ChartPlotter:
             plt.tight_layout()
             
             # 保存图表
-            if save_path:
-                plt.savefig(save_path, dpi=300, bbox_inches='tight')
-                logger.info(f"相关性热力图已保存: {save_path}")
-                return save_path
-            else:
-                save_path = f"static/charts/correlation_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
-                plt.savefig(save_path, dpi=300, bbox_inches='tight')
-                logger.info(f"相关性热力图已保存: {save_path}")
-                return save_path
+            save_path = self._save_figure(plt.gcf(), save_path, "correlation")
+            logger.info(f"相关性热力图已保存: {save_path}")
+            return save_path
                 
         except Exception as e:
             logger.error(f"绘制相关性热力图失败: {e}")
@@ -611,7 +670,7 @@ class ChartPlotter:
             save_path: 保存路径
         """
         try:
-            plt.figure(figsize=(15, 8))
+            plt.figure(figsize=self._figsize(15, 8))
             
             # 绘制投资组合曲线
             plt.plot(portfolio_value.index, portfolio_value.values, 
@@ -636,15 +695,9 @@ class ChartPlotter:
             plt.tight_layout()
             
             # 保存图表
-            if save_path:
-                plt.savefig(save_path, dpi=300, bbox_inches='tight')
-                logger.info(f"投资组合表现图已保存: {save_path}")
-                return save_path
-            else:
-                save_path = f"static/charts/portfolio_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
-                plt.savefig(save_path, dpi=300, bbox_inches='tight')
-                logger.info(f"投资组合表现图已保存: {save_path}")
-                return save_path
+            save_path = self._save_figure(plt.gcf(), save_path, "portfolio")
+            logger.info(f"投资组合表现图已保存: {save_path}")
+            return save_path
                 
         except Exception as e:
             logger.error(f"绘制投资组合表现图失败: {e}")
@@ -656,8 +709,14 @@ class ChartPlotter:
 class ReportGenerator:
     """报告生成器"""
     
-    def __init__(self):
-        self.plotter = ChartPlotter()
+    def __init__(self, plotter: ChartPlotter = None, cache: ChartCache = None):
+        """
+        Args:
+            plotter: 图表绘制器
+            cache: 报告产物缓存，默认使用 static/reports 目录的全局缓存
+        """
+        self.plotter = plotter or ChartPlotter()
+        self.cache = cache or report_cache
         logger.info("报告生成器初始化完成")
     
     def generate_stock_report(self, 
@@ -675,28 +734,34 @@ class ReportGenerator:
             output_dir: 输出目录
         """
         try:
-            from pathlib import Path
-            output_dir = Path(output_dir)
-            output_dir.mkdir(parents=True, exist_ok=True)
-            
-            # 生成图表
-            candlestick_path = self.plotter.plot_candlestick_chart(
-                data, symbol, save_path=str(output_dir / f"{symbol}_candlestick.png")
+            # 报告和图表按数据指纹命名，数据未变化时直接返回已生成的报告
+            cache = self.cache if output_dir == self.cache.directory else ChartCache(output_dir)
+            parts = [symbol, data_fingerprint(data), self.plotter.preset]
+            
+            # 生成图表（命中时同时刷新图表的最近使用时间，避免报告引用的图表先被淘汰）
+            candlestick_path = cache.get_or_render(
+                f"{symbol}_candlestick", parts, 'png',
+                lambda path: self.plotter.plot_candlestick_chart(data, symbol, save_path=path)
             )
-            
-            indicators_path = self.plotter.plot_technical_indicators(
-                data, symbol, save_path=str(output_dir / f"{symbol}_indicators.png")
+            indicators_path = cache.get_or_render(
+                f"{symbol}_indicators", parts, 'png',
+                lambda path: self.plotter.plot_technical_indicators(data, symbol, save_path=path)
             )
             
             # 生成HTML报告
-            html_content = self._generate_html_report(symbol, analysis, candlestick_path, indicators_path)
-            
-            report_path = output_dir / f"{symbol}_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.html"
-            with open(report_path, 'w', encoding='utf-8') as f:
-                f.write(html_content)
+            def render_report(path):
+                html_content = self._generate_html_report(symbol, analysis, candlestick_path, indicators_path)
+                with open(path, 'w', encoding='utf-8') as f:
+                    f.write(html_content)
+                return path
+            
+            report_path = cache.get_or_render(
+                f"{symbol}_report", parts + [os.path.basename(candlestick_path), os.path.basename(indicators_path)],
+                'html', render_report
+            )
             
-            logger.info(f"股票分析报告已生成: {report_path}")
-            return str(report_path)
+            logger.info(f"股票分析报告: {report_path}")
+            return report_path
             
         except Exception as e:
             logger.error(f"生成股票分析报告失败: {e}")
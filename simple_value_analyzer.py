@@ -8,19 +8,19 @@ import pandas as pd
 import numpy as np
 from datetime import datetime
 import json
-import sqlite3
 import os
 
+from core.storage import db_manager
+
 class SimpleValueAnalyzer:
     """简化版价值投资分析器"""
     
     def __init__(self):
-        self.db_path = os.path.join('data', 'finance_data.db')
+        self.db_path = str(db_manager.db_path)
         
     def get_all_stocks(self, limit=None):
         """获取所有股票数据"""
         try:
-            conn = sqlite3.connect(self.db_path)
             query = """
             SELECT symbol, name, industry, market_cap, pe_ratio, pb_ratio, close, updated_at 
             FROM stock_info 
@@ -31,8 +31,8 @@ class SimpleValueAnalyzer:
             if limit:
                 query += f" LIMIT {limit}"
                 
-            df = pd.read_sql_query(query, conn)
-            conn.close()
+            with db_manager.connection() as conn:
+                df = pd.read_sql_query(query, conn)
             
             # 清理数据
             df['market_cap'] = pd.to_numeric(df['market_cap'], errors='coerce')
@@ -181,6 +181,152 @@ class SimpleValueAnalyzer:
         except Exception as e:
             return {'qualified': False, 'error': f'分析错误: {str(e)}'}
 
+    # 批量评分的分项列名 -> analyze_stock 返回的 score_details 键
+    SCORE_DETAIL_COLUMNS = {
+        'market_cap_score': '市值评分',
+        'pe_score': '市盈率评分',
+        'pb_score': '市净率评分',
+        'industry_score': '行业评分',
+        'price_score': '价格评分',
+    }
+    GOOD_INDUSTRIES = ['白酒', '医药', '银行', '保险', '食品饮料', '家电']
+    MEDIUM_INDUSTRIES = ['电力', '公用事业', '交通运输', '房地产']
+
+    @staticmethod
+    def _numeric_column(df, column):
+        """取数值列，返回 (数值, 无法转换为float的掩码)；缺失列按0处理，与 analyze_stock 一致"""
+        if column not in df.columns:
+            return np.zeros(len(df)), np.zeros(len(df), dtype=bool)
+        col = df[column]
+        values = pd.to_numeric(col, errors='coerce').to_numpy(dtype=float)
+        if pd.api.types.is_numeric_dtype(col):
+            return values, np.zeros(len(df), dtype=bool)
+        # object列中的 None 或非数字字符串在 float() 时会报错，NaN 则不会
+        is_nan = col.map(lambda v: isinstance(v, float) and v != v).to_numpy(dtype=bool)
+        return values, np.isnan(values) & ~is_nan
+
+    def score_frame(self, df):
+        """
+        批量计算长期投资价值评分，结果与逐只调用 analyze_stock 完全一致
+
+        Args:
+            df: 股票数据，列同 get_all_stocks 的返回
+
+        出错的行 error 列只记录错误类别，不含具体异常信息
+
+        Returns:
+            DataFrame: 与 df 同索引，包含 symbol/name/industry、各分项评分、score、score_percent、
+            recommendation、risk_level、qualified、error 列
+        """
+        market_cap, bad_cap = self._numeric_column(df, 'market_cap')
+        pe_ratio, bad_pe = self._numeric_column(df, 'pe_ratio')
+        pb_ratio, bad_pb = self._numeric_column(df, 'pb_ratio')
+        price, bad_price = self._numeric_column(df, 'close')
+
+        symbol = df['symbol'] if 'symbol' in df.columns else pd.Series('', index=df.index)
+        industry = df['industry'] if 'industry' in df.columns else pd.Series('', index=df.index)
+        industry_is_str = industry.map(lambda v: isinstance(v, str)).to_numpy(dtype=bool)
+        industry_text = industry.where(industry_is_str, '')
+
+        # 1. 市值评分 (20分) - 偏好中等市值公司
+        market_cap_score = np.select(
+            [(market_cap >= 100) & (market_cap <= 5000),
+             (market_cap > 5000) & (market_cap <= 10000),
+             market_cap > 10000],
+            [20, 15, 10], default=5)
+
+        # 2. 市盈率评分 (25分)、3. 市净率评分 (25分)、5. 价格评分 (15分)：左开右闭区间
+        def bands(values, edges, points, default):
+            conditions = [(values > low) & (values <= high) for low, high in zip(edges[:-1], edges[1:])]
+            return np.select(conditions, points, default=default)
+
+        pe_score = bands(pe_ratio, [0, 15, 25, 40], [25, 20, 15], 5)
+        pb_score = bands(pb_ratio, [0, 2, 3, 5], [25, 20, 15], 5)
+        price_score = bands(price, [0, 50, 100, 200], [15, 12, 10], 5)
+
+        # 4. 行业评分 (15分) - 行业名称包含关键词即匹配
+        good = industry_text.str.contains('|'.join(self.GOOD_INDUSTRIES), regex=True).to_numpy(dtype=bool)
+        medium = industry_text.str.contains('|'.join(self.MEDIUM_INDUSTRIES), regex=True).to_numpy(dtype=bool)
+        industry_score = np.select([good, medium], [15, 10], default=5)
+
+        score = market_cap_score + pe_score + pb_score + industry_score + price_score
+        score_percent = np.minimum(np.trunc(score / 100 * 100), 100).astype(int)
+
+        recommendation = np.select([score >= 85, score >= 75, score >= 65],
+                                   ['强烈推荐', '推荐', '谨慎推荐'], default='观望')
+        risk_level = np.select([score >= 85, score >= 75, score >= 65],
+                               ['低风险', '中低风险', '中等风险'], default='中高风险')
+
+        # analyze_stock 中数据不完整或会抛异常的行，判断顺序与逐只分析一致
+        conversion_error = bad_cap | bad_pe | bad_pb | bad_price
+        incomplete = symbol.map(lambda v: not v).to_numpy(dtype=bool) | (market_cap <= 0) | (price <= 0)
+        failed = conversion_error | incomplete | ~industry_is_str
+        # 显式使用 object 列，避免 None 被推断为字符串列的缺失值；先匹配的条件优先
+        error = pd.Series(None, index=df.index, dtype=object)
+        for mask, message in ((~industry_is_str, '分析错误'), (incomplete, '数据不完整'),
+                              (conversion_error, '分析错误')):
+            error[np.asarray(mask, dtype=bool)] = message
+
+        return pd.DataFrame({
+            'symbol': symbol,
+            'name': df['name'] if 'name' in df.columns else '',
+            'industry': industry,
+            'market_cap': market_cap,
+            'pe_ratio': pe_ratio,
+            'pb_ratio': pb_ratio,
+            'close': price,
+            'market_cap_score': market_cap_score,
+            'pe_score': pe_score,
+            'pb_score': pb_score,
+            'industry_score': industry_score,
+            'price_score': price_score,
+            'score': score,
+            'score_percent': score_percent,
+            'recommendation': recommendation,
+            'risk_level': risk_level,
+            'qualified': (score >= 60) & ~failed,
+            'error': error,
+        }, index=df.index)
+
+    @staticmethod
+    def top_stocks(scored, n=None, min_score=0):
+        """从 score_frame 结果中取合格且不低于 min_score 的前 n 只，同分按原顺序"""
+        candidates = scored[scored['qualified'] & (scored['score'] >= min_score)]
+        if n is None:
+            return candidates.sort_values('score', ascending=False, kind='stable')
+        return candidates.nlargest(n, 'score', keep='first')
+
+    def to_results(self, scored):
+        """把 score_frame 结果转换为 analyze_stock 的返回格式"""
+        analysis_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        results = []
+        for row in scored.itertuples(index=False):
+            if not pd.isna(row.error):
+                results.append({'qualified': False, 'error': row.error})
+                continue
+            results.append({
+                'symbol': row.symbol,
+                'name': row.name,
+                'industry': row.industry,
+                'score': int(row.score),
+                'score_percent': int(row.score_percent),
+                'score_details': {label: int(getattr(row, column))
+                                  for column, label in self.SCORE_DETAIL_COLUMNS.items()},
+                'key_metrics': {
+                    '市值': f'{row.market_cap:.1f}',
+                    '市盈率': f'{row.pe_ratio:.1f}',
+                    '市净率': f'{row.pb_ratio:.1f}',
+                    '当前价': f'{row.close:.2f}',
+                    '行业': row.industry
+                },
+                'recommendation': row.recommendation,
+                'risk_level': row.risk_level,
+                'qualified': bool(row.qualified),
+                'analysis_date': analysis_date
+            })
+        return results
+
+
 if __name__ == "__main__":
     # 测试代码
     analyzer = SimpleValueAnalyzer()
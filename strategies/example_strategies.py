@@ -1,7 +1,7 @@
 """
 示例交易策略
 """
-from core.backtest import Strategy
+from core.backtest import Strategy, ratio_position_size
 import pandas as pd
 import numpy as np
 
@@ -14,6 +14,7 @@ class MACDStrategy(Strategy):
         self.fast = fast
         self.slow = slow
         self.signal = signal
+        self.position_ratio = 0.6
     
     def generate_signals(self, data: pd.DataFrame) -> pd.Series:
         """生成MACD交叉信号"""
@@ -33,10 +34,11 @@ class MACDStrategy(Strategy):
         
         return signals
     
+    @ratio_position_size
     def get_position_size(self, data: pd.DataFrame, signal: int, portfolio) -> int:
         """计算仓位大小"""
         if signal == 1:  # 买入信号
-            target_value = portfolio.cash * 0.6  # 使用60%资金
+            target_value = portfolio.cash * self.position_ratio  # 使用60%资金
             price = data['close'].iloc[-1]
             quantity = int(target_value / price / 100) * 100
             return quantity
@@ -55,6 +57,7 @@ class BollingerBandsStrategy(Strategy):
         super().__init__(name)
         self.period = period
         self.std_dev = std_dev
+        self.position_ratio = 0.4
     
     def generate_signals(self, data: pd.DataFrame) -> pd.Series:
         """生成布林带信号"""
@@ -72,10 +75,11 @@ class BollingerBandsStrategy(Strategy):
         
         return signals
     
+    @ratio_position_size
     def get_position_size(self, data: pd.DataFrame, signal: int, portfolio) -> int:
         """计算仓位大小"""
         if signal == 1:  # 买入信号
-            target_value = portfolio.cash * 0.4  # 使用40%资金
+            target_value = portfolio.cash * self.position_ratio  # 使用40%资金
             price = data['close'].iloc[-1]
             quantity = int(target_value / price / 100) * 100
             return quantity
@@ -92,6 +96,7 @@ class CompositeStrategy(Strategy):
     
     def __init__(self, name: str = "综合策略"):
         super().__init__(name)
+        self.position_ratio = 0.8
     
     def generate_signals(self, data: pd.DataFrame) -> pd.Series:
         """生成综合信号"""
@@ -119,10 +124,11 @@ class CompositeStrategy(Strategy):
         
         return signals
     
+    @ratio_position_size
     def get_position_size(self, data: pd.DataFrame, signal: int, portfolio) -> int:
         """计算仓位大小"""
         if signal == 1:  # 买入信号
-            target_value = portfolio.cash * 0.8  # 使用80%资金
+            target_value = portfolio.cash * self.position_ratio  # 使用80%资金
             price = data['close'].iloc[-1]
             quantity = int(target_value / price / 100) * 100
             return quantity
@@ -141,6 +147,7 @@ class MomentumStrategy(Strategy):
         super().__init__(name)
         self.lookback_period = lookback_period
         self.threshold = threshold
+        self.position_ratio = 0.5
     
     def generate_signals(self, data: pd.DataFrame) -> pd.Series:
         """生成动量信号"""
@@ -161,10 +168,11 @@ class MomentumStrategy(Strategy):
         
         return signals
     
+    @ratio_position_size
     def get_position_size(self, data: pd.DataFrame, signal: int, portfolio) -> int:
         """计算仓位大小"""
         if signal == 1:  # 买入信号
-            target_value = portfolio.cash * 0.5  # 使用50%资金
+            target_value = portfolio.cash * self.position_ratio  # 使用50%资金
             price = data['close'].iloc[-1]
             quantity = int(target_value / price / 100) * 100
             return quantity
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+K线图渲染性能基准
+
+对比逐根K线调用 plot/bar 的旧绘制方式（300dpi）与批量集合绘制（web 预设）
+在 250/1000/5000 根K线下的渲染耗时。完整基准：
+
+    python tests/performance/test_candlestick_render.py --bars 250 1000 5000
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import argparse
+import tempfile
+import time
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+from core.visualization import ChartPlotter
+
+
+def make_frame(bars: int, seed: int = 0) -> pd.DataFrame:
+    """生成随机游走OHLCV数据"""
+    rng = np.random.default_rng(seed)
+    close = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, bars)))
+    open_ = close * (1 + rng.normal(0, 0.01, bars))
+    return pd.DataFrame({
+        'open': open_,
+        'high': np.maximum(open_, close) * 1.01,
+        'low': np.minimum(open_, close) * 0.99,
+        'close': close,
+        'volume': rng.integers(10000, 100000, bars).astype(float)
+    }, index=pd.bdate_range('2000-01-03', periods=bars))
+
+
+def legacy_render(df: pd.DataFrame, path: str):
+    """旧的绘制方式：每根K线一次 plot + 一次 bar，成交量颜色逐行生成"""
+    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(15, 10), gridspec_kw={'height_ratios': [3, 1]})
+    dates = df.index
+    for i in range(len(df)):
+        open_price, high_price = df['open'].iloc[i], df['high'].iloc[i]
+        low_price, close_price = df['low'].iloc[i], df['close'].iloc[i]
+        color = '#FF4444' if close_price >= open_price else '#00AA00'
+        ax1.plot([dates[i], dates[i]], [low_price, high_price], color='black', linewidth=1)
+        ax1.bar(dates[i], abs(close_price - open_price), bottom=min(open_price, close_price),
+                color=color, alpha=0.8, width=0.6)
+    colors = ['#FF4444' if df['close'].iloc[i] >= df['open'].iloc[i] else '#00AA00' for i in range(len(df))]
+    ax2.bar(dates, df['volume'], color=colors, alpha=0.6)
+    plt.tight_layout()
+    fig.savefig(path, dpi=300, bbox_inches='tight')
+    plt.close(fig)
+
+
+def batched_render(plotter: ChartPlotter, df: pd.DataFrame, path: str):
+    plotter.plot_candlestick_chart(df, '000001', save_path=path, show_ma=False, mark_extremes='none')
+
+
+def timed(func, *args) -> float:
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def run_benchmark(bar_counts, legacy: bool = True):
+    plotter = ChartPlotter(preset='web', image_format='png')
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for bars in bar_counts:
+            df = make_frame(bars)
+            batched = timed(batched_render, plotter, df, os.path.join(tmp, f'batched_{bars}.png'))
+            old = timed(legacy_render, df, os.path.join(tmp, f'legacy_{bars}.png')) if legacy else None
+            results[bars] = (old, batched)
+            line = f"{bars:>5} 根K线: 批量绘制 {batched:.2f}s"
+            if old is not None:
+                line += f", 逐根绘制 {old:.2f}s, 加速 {old / batched:.1f}x"
+            print(line)
+    return results
+
+
+def test_batched_render_faster():
+    """1000根K线时批量绘制快于逐根绘制"""
+    old, batched = run_benchmark([1000])[1000]
+    assert batched < old
+
+
+def test_output_formats(tmp_path):
+    plotter = ChartPlotter(preset='thumbnail')
+    df = make_frame(250)
+    svg = plotter.plot_candlestick_chart(df, '000001', save_path=str(tmp_path / 'k.svg'), mark_extremes='none')
+    assert svg.endswith('.svg') and open(svg).read().lstrip().startswith('<?xml')
+
+    webp = plotter.plot_candlestick_chart(df, '000001', save_path=str(tmp_path / 'k.webp'), mark_extremes='none')
+    # 不支持 webp 时退回 png
+    assert os.path.exists(webp) and webp.endswith(('.webp', '.png'))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='K线图渲染性能基准')
+    parser.add_argument('--bars', type=int, nargs='+', default=[250, 1000, 5000])
+    parser.add_argument('--no-legacy', action='store_true', help='不运行旧的逐根绘制')
+    args = parser.parse_args()
+    run_benchmark(args.bars, legacy=not args.no_legacy)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+技术指标流水线性能基准
+
+对比逐个 add_* 计算（每步复制整张表）与 calculate_all_indicators 流水线
+的内存分配峰值和耗时。默认规模适合在测试中运行，完整基准：
+
+    python tests/performance/test_indicator_pipeline.py --bars 5000 --symbols 5000
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from core.analyzer import TechnicalAnalyzer
+
+
+def make_frames(bars: int, symbols: int, seed: int = 0):
+    """生成多只股票的随机游走OHLCV数据"""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2000-01-03', periods=bars)
+    for _ in range(symbols):
+        close = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, bars)))
+        volume = rng.integers(10000, 100000, bars).astype(float)
+        yield pd.DataFrame({
+            'open': close * 0.995, 'high': close * 1.02, 'low': close * 0.98, 'close': close,
+            'volume': volume, 'turnover': volume * close
+        }, index=dates)
+
+
+def chained(analyzer: TechnicalAnalyzer, data: pd.DataFrame) -> pd.DataFrame:
+    """旧的计算方式：每个指标复制一次整张表"""
+    df = data.copy()
+    df = analyzer.add_moving_averages(df)
+    df = analyzer.add_macd(df)
+    df = analyzer.add_rsi(df)
+    df = analyzer.add_bollinger_bands(df)
+    df = analyzer.add_kdj(df)
+    df = analyzer.add_atr(df)
+    return analyzer.add_volume_indicators(df)
+
+
+def measure(func, frames):
+    """返回 (总耗时秒, 单次调用的最大内存峰值字节)"""
+    elapsed = 0.0
+    peak = 0
+    for df in frames:
+        tracemalloc.start()
+        start = time.perf_counter()
+        func(df)
+        elapsed += time.perf_counter() - start
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return elapsed, peak
+
+
+def run_benchmark(bars: int, symbols: int):
+    analyzer = TechnicalAnalyzer()
+    frames = list(make_frames(bars, symbols))
+
+    chained_time, chained_peak = measure(lambda df: chained(analyzer, df), frames)
+    pipeline_time, pipeline_peak = measure(analyzer.calculate_all_indicators, frames)
+
+    print(f"规模: {symbols} 只股票 x {bars} 根K线")
+    print(f"逐个计算: {chained_time:.2f}s, 单次峰值内存 {chained_peak / 1024 / 1024:.1f}MB")
+    print(f"流水线:   {pipeline_time:.2f}s, 单次峰值内存 {pipeline_peak / 1024 / 1024:.1f}MB")
+    print(f"耗时降低 {1 - pipeline_time / chained_time:.1%}, 峰值内存降低 {1 - pipeline_peak / chained_peak:.1%}")
+    return chained_time, chained_peak, pipeline_time, pipeline_peak
+
+
+def test_pipeline_allocates_less():
+    """流水线的内存峰值低于逐个计算"""
+    _, chained_peak, _, pipeline_peak = run_benchmark(bars=5000, symbols=5)
+    assert pipeline_peak < chained_peak
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='技术指标流水线性能基准')
+    parser.add_argument('--bars', type=int, default=5000)
+    parser.add_argument('--symbols', type=int, default=100)
+    args = parser.parse_args()
+    run_benchmark(args.bars, args.symbols)
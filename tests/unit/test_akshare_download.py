@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+测试AKShare接口批量下载：更新频率判断、调度排序、重试和下载统计
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from datetime import datetime
+
+import pytest
+
+from core.storage import DatabaseManager
+from core.catalog import TableCatalog
+from core.table_browser import TableBrowser
+from core.akshare_download import AKShareDownloader, is_fresh, interface_table
+
+
+@pytest.fixture
+def db(tmp_path):
+    return DatabaseManager(str(tmp_path / "download.db"))
+
+
+def _downloader(db, functions, **kwargs):
+    browser = TableBrowser(db, catalog=TableCatalog(db))
+    return AKShareDownloader(db, browser=browser, resolver=functions.get, **kwargs)
+
+
+def test_is_fresh():
+    now = datetime(2024, 5, 15, 10, 0, 0)
+    assert is_fresh('日', '2024-05-15 01:00:00', now)
+    assert not is_fresh('日', '2024-05-14 23:59:59', now)
+    assert is_fresh('周', '2024-05-13 09:00:00', now)
+    assert not is_fresh('周', '2024-05-12 09:00:00', now)
+    assert is_fresh('月', '2024-05-01 00:00:00', now)
+    assert is_fresh('季', '2024-04-01 00:00:00', now)
+    assert not is_fresh('季', '2024-03-31 00:00:00', now)
+    assert not is_fresh('实时', '2024-05-15 09:59:59', now)
+    assert not is_fresh('', '2024-05-15 09:59:59', now)
+    assert not is_fresh('日', None, now)
+
+
+def test_plan_skips_fresh_and_orders_by_duration(db):
+    downloader = _downloader(db, {})
+    with db.connection() as conn:
+        conn.execute(f"CREATE TABLE {interface_table('daily_done')} (v INTEGER)")
+    downloader._record('daily_done', {'status': 'success', 'records': 1}, 1.0)
+    downloader._record('slow', {'status': 'success', 'records': 1}, 30.0)
+    downloader._record('fast', {'status': 'success', 'records': 1}, 2.0)
+
+    interfaces = [
+        {'interface_name': 'daily_done', 'update_frequency': '日'},
+        {'interface_name': 'fast', 'update_frequency': '实时'},
+        {'interface_name': 'slow', 'update_frequency': '日'},
+        {'interface_name': 'new', 'update_frequency': '日'},
+    ]
+    due, fresh = downloader.plan(interfaces)
+    # slow 今天成功过但数据表不存在，仍需下载；没有记录的接口排在最前
+    assert fresh == ['daily_done']
+    assert due == ['new', 'slow', 'fast']
+
+    due, fresh = downloader.plan(interfaces, force=True)
+    assert fresh == [] and len(due) == 4
+
+
+def test_run_retries_and_records_failures(db):
+    calls = {'flaky': 0}
+
+    def flaky():
+        calls['flaky'] += 1
+        raise ConnectionError('connection reset')
+
+    downloader = _downloader(db, {'flaky': flaky, 'none': lambda: None}, max_retries=3, concurrency=2)
+    summary = downloader.run([
+        {'interface_name': 'flaky', 'update_frequency': '日'},
+        {'interface_name': 'none', 'update_frequency': '日'},
+        {'interface_name': 'missing', 'update_frequency': '日'},
+    ])
+
+    statuses = {r['interface_name']: r['status'] for r in summary['results']}
+    assert statuses == {'flaky': 'network_error', 'none': 'empty', 'missing': 'not_found'}
+    assert calls['flaky'] == 3
+    assert summary['success_count'] == 0 and summary['skipped_count'] == 0
+
+    stats = downloader.get_stats()
+    assert stats['flaky']['status'] == 'network_error'
+    assert stats['flaky']['last_success_at'] is None
+    assert stats['flaky']['last_attempt_at'] is not None
+
+
+def test_run_replaces_table_and_skips_next_time(db):
+    pd = pytest.importorskip('pandas')
+    versions = iter([[1, 2, 3], [4, 5]])
+
+    def quotes():
+        return pd.DataFrame({'v': next(versions)})
+
+    downloader = _downloader(db, {'quotes': quotes})
+    interfaces = [{'interface_name': 'quotes', 'update_frequency': '日'}]
+
+    summary = downloader.run(interfaces)
+    assert summary['success_count'] == 1 and summary['total_records'] == 3
+    assert downloader.get_stats()['quotes']['rows'] == 3
+
+    # 当天再次下载时跳过，强制下载时整表替换
+    assert downloader.run(interfaces)['skipped_count'] == 1
+    downloader.run(interfaces, force=True)
+    rows = db.query(f"SELECT v FROM {interface_table('quotes')} ORDER BY v")
+    assert [row['v'] for row in rows] == [4, 5]
+    tables = [row['name'] for row in db.query("SELECT name FROM sqlite_master WHERE type = 'table'")]
+    assert not [name for name in tables if name.endswith('__staging')]
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+测试向量化回测与逐bar回测结果一致
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.backtest import BacktestEngine, MAStrategy, RSIStrategy
+from strategies.example_strategies import (
+    MACDStrategy, BollingerBandsStrategy, CompositeStrategy, MomentumStrategy
+)
+
+
+def _make_data(n=1500, seed=7):
+    """生成随机游走的OHLCV数据"""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2018-01-02', periods=n)
+    close = 20 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+    open_ = close * (1 + rng.normal(0, 0.005, n))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.01, n)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.01, n)))
+    volume = rng.integers(100000, 1000000, n)
+    return pd.DataFrame({
+        'open': open_, 'high': high, 'low': low, 'close': close,
+        'volume': volume, 'turnover': volume * close
+    }, index=dates)
+
+
+STRATEGIES = [
+    MAStrategy, RSIStrategy, MACDStrategy,
+    BollingerBandsStrategy, CompositeStrategy, MomentumStrategy
+]
+
+
+@pytest.mark.parametrize('strategy_cls', STRATEGIES)
+def test_vectorized_matches_loop(strategy_cls):
+    """两种执行模式的净值曲线、交易记录和绩效指标一致"""
+    data = _make_data()
+    engine = BacktestEngine(initial_capital=1000000, commission_rate=0.0003)
+
+    loop = engine.run_backtest(strategy_cls(), data, '000001', engine='loop')
+    vec = engine.run_backtest(strategy_cls(), data, '000001', engine='vectorized')
+
+    assert loop['engine'] == 'loop' and vec['engine'] == 'vectorized'
+    np.testing.assert_allclose(vec['equity_curve'].values, loop['equity_curve'].values, rtol=1e-9)
+    np.testing.assert_allclose(vec['daily_returns'].values, loop['daily_returns'].values, rtol=1e-9, atol=1e-12)
+
+    assert len(vec['trades']) == len(loop['trades'])
+    for a, b in zip(vec['trades'], loop['trades']):
+        assert (a.action, a.quantity, a.date) == (b.action, b.quantity, b.date)
+        assert a.price == pytest.approx(b.price)
+
+    for key in ('final_value', 'total_return', 'max_drawdown', 'sharpe_ratio', 'trade_count', 'win_rate'):
+        assert vec[key] == pytest.approx(loop[key], rel=1e-9, abs=1e-12)
+
+
+def test_loop_sells_whole_position():
+    """逐bar执行时卖出信号能识别持仓并全部卖出"""
+    data = _make_data()
+    results = BacktestEngine().run_backtest(MAStrategy(), data, '000001', engine='loop')
+    assert any(t.action == 'SELL' for t in results['trades'])
+
+
+class FixedLotMA(MAStrategy):
+    """继承 position_ratio 但自定义仓位规则：每次只买一手"""
+
+    def get_position_size(self, data, signal, portfolio):
+        if signal == 1:
+            return 100
+        return super().get_position_size(data, signal, portfolio)
+
+
+def test_custom_position_size_falls_back_to_loop():
+    data = _make_data()
+    engine = BacktestEngine()
+    assert engine.supports_vectorized(MAStrategy()) and not engine.supports_vectorized(FixedLotMA())
+
+    results = engine.run_backtest(FixedLotMA(), data, '000001', engine='vectorized')
+    assert results['engine'] == 'loop'
+    assert all(t.quantity == 100 for t in results['trades'] if t.action == 'BUY')
+
+
+def test_unknown_engine_rejected():
+    with pytest.raises(ValueError):
+        BacktestEngine(engine='gpu')
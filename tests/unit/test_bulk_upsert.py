@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+测试 stock_daily 批量写入
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import pandas as pd
+import pytest
+
+from core.storage import DatabaseManager
+
+
+def _bars(start, periods, close=10.0):
+    dates = pd.bdate_range(start, periods=periods, name='date')
+    return pd.DataFrame({
+        'open': close, 'high': close + 1, 'low': close - 1, 'close': close,
+        'volume': 1000, 'turnover': close * 1000
+    }, index=dates)
+
+
+def test_upsert_many_symbols_in_one_call(tmp_path):
+    """20年回填（超过SQLite变量上限的行数）多只股票一次提交"""
+    db = DatabaseManager(str(tmp_path / "upsert.db"))
+    frames = {symbol: _bars('2004-01-01', 5000) for symbol in ('000001', '000002', '600000')}
+
+    result = db.upsert_stock_daily(frames, chunk_size=1000)
+
+    assert result['symbols'] == 3 and result['rows'] == 15000
+    assert result['rows_per_sec'] > 0
+    assert db.query("SELECT COUNT(*) AS n FROM stock_daily")[0]['n'] == 15000
+
+
+def test_upsert_updates_existing_dates(tmp_path):
+    db = DatabaseManager(str(tmp_path / "upsert.db"))
+    db.save_stock_daily_data('000001', _bars('2024-01-01', 10, close=10.0))
+    db.save_stock_daily_data('000001', _bars('2024-01-08', 10, close=12.0))
+
+    df = db.get_stock_daily_data('000001')
+    assert len(df) == len(pd.bdate_range('2024-01-01', periods=10).union(pd.bdate_range('2024-01-08', periods=10)))
+    assert df.loc['2024-01-08', 'close'] == 12.0
+    assert df.loc['2024-01-05', 'close'] == 10.0
+
+
+def test_upsert_accepts_long_frame(tmp_path):
+    db = DatabaseManager(str(tmp_path / "upsert.db"))
+    long_df = pd.concat([
+        _bars('2024-01-01', 5).assign(symbol='000001'),
+        _bars('2024-01-01', 5).assign(symbol='000002'),
+    ])
+    result = db.upsert_stock_daily(long_df)
+    assert result['symbols'] == 2 and result['rows'] == 10
+    assert set(db.get_latest_daily_dates()) == {'000001', '000002'}
+
+
+def test_upsert_rejects_missing_dates(tmp_path):
+    """未命名的日期索引按 date 写入，缺少或为空的日期直接报错"""
+    db = DatabaseManager(str(tmp_path / "upsert.db"))
+    unnamed = _bars('2024-01-01', 3).rename_axis(None)
+    db.upsert_stock_daily({'000001': unnamed})
+    assert db.get_latest_daily_dates() == {'000001': '2024-01-03'}
+
+    with pytest.raises(ValueError):
+        db.upsert_stock_daily({'000002': _bars('2024-01-01', 3).reset_index(drop=True)})
+    with pytest.raises(ValueError):
+        db.upsert_daily_frame(pd.DataFrame({'symbol': ['000002'], 'date': [None], 'close': [10.0]}))
+    assert db.query("SELECT COUNT(*) AS n FROM stock_daily WHERE date IS NULL")[0]['n'] == 0
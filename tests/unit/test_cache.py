@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+测试分级缓存：内存LRU、磁盘/Redis后端与结果缓存装饰器
+"""
+import sys
+import os
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import pandas as pd
+
+from core.cache import CacheManager, DiskCacheBackend, RedisCacheBackend, memoize, pack_entry
+
+
+class FakeRedis:
+    """本地模拟的Redis客户端，只实现缓存后端用到的命令"""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        value = self.data.get(key)
+        if value is None or (value[1] is not None and time.time() > value[1]):
+            self.data.pop(key, None)
+            return None
+        return value[0]
+
+    def set(self, key, value, ex=None):
+        self.data[key] = (value, time.time() + ex if ex else None)
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    def scan_iter(self, match='*'):
+        prefix = match.rstrip('*')
+        return [key for key in list(self.data) if key.startswith(prefix)]
+
+
+def test_memory_tier_hits_before_backend(tmp_path):
+    cache = CacheManager(backend=DiskCacheBackend(str(tmp_path)))
+    cache.set('a', {'x': 1})
+
+    assert cache.get('a') == {'x': 1}
+    assert cache.stats()['memory_hits'] == 1
+    assert len(list(tmp_path.glob('*.cache'))) == 1
+
+    # 新实例内存为空，从磁盘读取后回填内存
+    other = CacheManager(backend=DiskCacheBackend(str(tmp_path)))
+    assert other.get('a') == {'x': 1}
+    assert other.get('a') == {'x': 1}
+    stats = other.stats()
+    assert stats['backend_hits'] == 1 and stats['memory_hits'] == 1
+
+
+def test_lru_eviction_by_entries(tmp_path):
+    cache = CacheManager(backend='none', max_entries=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.stats()['evictions'] == 1
+
+
+def test_expired_entries(tmp_path):
+    backend = DiskCacheBackend(str(tmp_path))
+    cache = CacheManager(backend=backend)
+    cache.set('old', 'value', ttl=-1)
+    cache.set('new', 'value', ttl=60)
+    (tmp_path / 'legacy.cache').write_bytes(b'not a cache entry')
+
+    assert cache.get('old') is None
+    assert cache.clear_expired() == 1
+    assert cache.get('new') == 'value'
+    assert len(list(tmp_path.glob('*.cache'))) == 1
+
+
+def test_single_file_entry_header(tmp_path):
+    backend = DiskCacheBackend(str(tmp_path))
+    backend.set('k', pack_entry([1, 2], time.time() + 60), 60)
+    assert CacheManager(backend=backend).get('k') == [1, 2]
+
+
+def test_redis_backend_with_fake_client():
+    client = FakeRedis()
+    cache = CacheManager(backend=RedisCacheBackend(client, prefix='test:'))
+    cache.set('a', 'value', ttl=60)
+    assert 'test:a' in client.data
+
+    other = CacheManager(backend=RedisCacheBackend(client, prefix='test:'))
+    assert other.get('a') == 'value'
+
+    other.clear()
+    assert client.data == {}
+
+
+def test_memoize_caches_by_arguments():
+    cache = CacheManager(backend='none')
+    calls = []
+
+    class Loader:
+        @memoize(ttl=60, cache=cache)
+        def load(self, symbol, days=10):
+            calls.append((symbol, days))
+            return pd.DataFrame({'close': range(days)})
+
+    loader = Loader()
+    first = loader.load('000001', days=5)
+    first['close'] = 0
+    second = loader.load('000001', days=5)
+    Loader().load('000001', days=5)
+    loader.load('000002', days=5)
+
+    assert calls == [('000001', 5), ('000002', 5)]
+    assert list(second['close']) == [0, 1, 2, 3, 4]
+
+
+def test_memoize_returns_copies_of_containers():
+    cache = CacheManager(backend='none')
+
+    @memoize(cache=cache)
+    def analyze(symbol):
+        return {'symbol': symbol, 'signals': ['buy']}
+
+    first = analyze('000001')
+    first['signals'].append('sell')
+    first['score'] = 1
+    assert analyze('000001') == {'symbol': '000001', 'signals': ['buy']}
+
+
+def test_memoize_skips_empty_results():
+    cache = CacheManager(backend='none')
+    calls = []
+
+    @memoize(cache=cache)
+    def fetch():
+        calls.append(1)
+        return pd.DataFrame()
+
+    fetch()
+    fetch()
+    assert len(calls) == 2
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+测试表目录：首次读取补充统计、写入方增量更新、ANALYZE 估计和已删除表的移除
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import pytest
+
+from core.storage import DatabaseManager
+from core.catalog import TableCatalog, SOURCE_EXACT, SOURCE_WRITER, SOURCE_STAT
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    db = DatabaseManager(str(tmp_path / "catalog.db"))
+    with db.connection() as conn:
+        conn.execute("CREATE TABLE akshare_demo (code TEXT, price REAL)")
+        conn.executemany("INSERT INTO akshare_demo VALUES (?, ?)", [(f'{i:06d}', i * 1.0) for i in range(50)])
+    return TableCatalog(db)
+
+
+def _entry(listing, name):
+    return next(table for table in listing['tables'] if table['name'] == name)
+
+
+def test_list_fills_new_tables_once(catalog):
+    demo = _entry(catalog.list_tables(), 'akshare_demo')
+    assert demo['row_count'] == 50 and demo['count_source'] == SOURCE_EXACT
+    assert demo['columns'] == [{'name': 'code', 'type': 'TEXT'}, {'name': 'price', 'type': 'REAL'}]
+
+    # 之后的读取只返回目录内容，不重新计数
+    with catalog.db_manager.connection() as conn:
+        conn.execute("INSERT INTO akshare_demo VALUES ('999999', 1.0)")
+    listing = catalog.list_tables()
+    assert _entry(listing, 'akshare_demo')['row_count'] == 50
+    assert listing['last_refreshed'] is not None
+
+
+def test_record_write(catalog):
+    catalog.list_tables()
+    with catalog.db_manager.connection() as conn:
+        conn.executemany("INSERT INTO akshare_demo VALUES (?, ?)", [('a', 1.0)] * 5)
+    catalog.record_write('akshare_demo', delta=5)
+    demo = _entry(catalog.list_tables(), 'akshare_demo')
+    assert demo['row_count'] == 55 and demo['count_source'] == SOURCE_WRITER
+
+    catalog.record_write('akshare_demo', rows=7)
+    assert catalog.get_row_count('akshare_demo') == 7
+
+    # 目录中还没有的表改为精确计数
+    with catalog.db_manager.connection() as conn:
+        conn.execute("CREATE TABLE akshare_new (v INTEGER)")
+        conn.executemany("INSERT INTO akshare_new VALUES (?)", [(i,) for i in range(3)])
+    catalog.record_write('akshare_new', delta=3)
+    assert catalog.get_row_count('akshare_new') == 3
+
+
+def test_refresh_modes_and_dropped_tables(catalog):
+    catalog.list_tables()
+    with catalog.db_manager.connection() as conn:
+        conn.execute("CREATE INDEX idx_demo_code ON akshare_demo(code)")
+
+    catalog.refresh(analyze=True)
+    demo = _entry(catalog.list_tables(), 'akshare_demo')
+    assert demo['count_source'] == SOURCE_STAT and demo['row_count'] == 50
+
+    catalog.refresh(exact=True)
+    assert _entry(catalog.list_tables(), 'akshare_demo')['count_source'] == SOURCE_EXACT
+
+    with catalog.db_manager.connection() as conn:
+        conn.execute("DROP TABLE akshare_demo")
+    names = [table['name'] for table in catalog.list_tables()['tables']]
+    assert 'akshare_demo' not in names
+    assert catalog.get_row_count('akshare_demo') is None
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+测试图表/报告产物缓存：命中、数据变化失效和按大小淘汰
+"""
+import sys
+import os
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import pandas as pd
+
+from core.chart_cache import ChartCache, data_fingerprint
+
+
+def _frame(days, last_close=10.0):
+    index = pd.date_range('2024-01-01', periods=days, freq='D')
+    df = pd.DataFrame({'close': 10.0, 'volume': 1000.0}, index=index)
+    df.iloc[-1, 0] = last_close
+    return df
+
+
+def _writer(calls, size=100):
+    def render(path):
+        calls.append(path)
+        with open(path, 'wb') as f:
+            f.write(b'x' * size)
+        return path
+    return render
+
+
+def test_hit_returns_same_file(tmp_path):
+    cache = ChartCache(str(tmp_path), max_bytes=0)
+    calls = []
+    parts = [data_fingerprint(_frame(30)), 'web', 'png']
+
+    first = cache.get_or_render('candlestick_000001', parts, 'png', _writer(calls))
+    second = cache.get_or_render('candlestick_000001', parts, 'png', _writer(calls))
+
+    assert first == second and len(calls) == 1
+    assert os.path.basename(first).startswith('candlestick_000001_') and first.endswith('.png')
+    # 临时文件已被替换，目录里只有一个产物
+    assert os.listdir(tmp_path) == [os.path.basename(first)]
+    stats = cache.stats()
+    assert stats['hits'] == 1 and stats['misses'] == 1 and stats['files'] == 1
+
+
+def test_new_bar_or_options_invalidate(tmp_path):
+    cache = ChartCache(str(tmp_path), max_bytes=0)
+    calls = []
+    base = cache.get_or_render('c', [data_fingerprint(_frame(30)), 'web'], 'png', _writer(calls))
+    new_bar = cache.get_or_render('c', [data_fingerprint(_frame(31)), 'web'], 'png', _writer(calls))
+    new_close = cache.get_or_render('c', [data_fingerprint(_frame(30, 11.0)), 'web'], 'png', _writer(calls))
+    new_preset = cache.get_or_render('c', [data_fingerprint(_frame(30)), 'print'], 'png', _writer(calls))
+
+    assert len({base, new_bar, new_close, new_preset}) == 4
+    assert len(calls) == 4
+
+
+def test_extension_fallback_is_cached(tmp_path):
+    cache = ChartCache(str(tmp_path), max_bytes=0)
+    calls = []
+
+    def render_png(path):
+        # 模拟 webp 不可用时退回 png
+        return _writer(calls)(os.path.splitext(path)[0] + '.png')
+
+    first = cache.get_or_render('c', ['webp'], 'webp', render_png)
+    second = cache.get_or_render('c', ['webp'], 'webp', render_png)
+    assert first == second and first.endswith('.png') and len(calls) == 1
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = ChartCache(str(tmp_path), max_bytes=250)
+    calls = []
+    # 升级前遗留的时间戳文件同样参与淘汰
+    legacy = tmp_path / 'candlestick_000001_20240101_120000.png'
+    legacy.write_bytes(b'x' * 100)
+    os.utime(legacy, (time.time() - 100, time.time() - 100))
+
+    a = cache.get_or_render('a', [], 'png', _writer(calls))
+    os.utime(a, (time.time() - 50, time.time() - 50))
+
+    b = cache.get_or_render('b', [], 'png', _writer(calls))
+    os.utime(b, (time.time() - 10, time.time() - 10))
+    # 命中刷新 a 的使用时间，c 写入后应淘汰 b
+    cache.get_or_render('a', [], 'png', _writer(calls))
+    c = cache.get_or_render('c', [], 'png', _writer(calls))
+
+    assert os.path.exists(a) and os.path.exists(c)
+    assert not os.path.exists(b) and not legacy.exists()
+    stats = cache.stats()
+    assert stats['bytes'] <= 250 and stats['evictions'] == 2
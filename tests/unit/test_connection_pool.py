@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+测试数据库连接池
+"""
+import sys
+import os
+import threading
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from core.storage import DatabaseManager, ConnectionPool
+
+
+def test_pool_uses_wal_and_reuses_connections(tmp_path):
+    """连接池启用WAL并复用连接"""
+    db = DatabaseManager(str(tmp_path / "pool.db"), pool_size=2)
+
+    with db.connection() as conn:
+        mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+    assert mode.lower() == 'wal'
+
+    for _ in range(10):
+        db.query("SELECT 1")
+
+    stats = db.get_pool_stats()
+    assert stats['created'] <= 2
+    assert stats['in_use'] == 0
+    assert stats['acquire_count'] >= 11
+
+
+def test_pool_concurrent_read_write(tmp_path):
+    """多线程并发读写不报错，连接数不超过上限"""
+    db = DatabaseManager(str(tmp_path / "pool.db"), pool_size=4)
+    errors = []
+
+    def writer(n):
+        try:
+            for i in range(20):
+                db.execute(
+                    "INSERT OR REPLACE INTO stock_info (symbol, name) VALUES (?, ?)",
+                    (f"{n:03d}{i:03d}", f"股票{n}-{i}")
+                )
+        except Exception as e:
+            errors.append(e)
+
+    def reader():
+        try:
+            for _ in range(20):
+                db.get_stock_list()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(3)]
+    threads += [threading.Thread(target=reader) for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert not errors
+    assert len(db.get_stock_list()) == 60
+    assert db.get_pool_stats()['created'] <= 4
+
+
+def test_pool_rollback_on_error(tmp_path):
+    """异常时回滚事务，连接归还连接池"""
+    pool = ConnectionPool(str(tmp_path / "raw.db"), max_size=1)
+    with pool.connection() as conn:
+        conn.execute("CREATE TABLE t (x INTEGER)")
+
+    try:
+        with pool.connection() as conn:
+            conn.execute("INSERT INTO t VALUES (1)")
+            raise ValueError("boom")
+    except ValueError:
+        pass
+
+    with pool.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+
+    assert pool.stats()['in_use'] == 0
+    pool.close_all()
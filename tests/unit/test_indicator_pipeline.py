@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+测试技术指标流水线与逐个 add_* 计算结果一致
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.analyzer import TechnicalAnalyzer
+
+
+def _make_data(n=400, seed=11):
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2021-01-04', periods=n)
+    close = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+    volume = rng.integers(10000, 100000, n).astype(float)
+    return pd.DataFrame({
+        'open': close * 0.995, 'high': close * 1.02, 'low': close * 0.98, 'close': close,
+        'volume': volume, 'turnover': volume * close
+    }, index=dates)
+
+
+def _chained(analyzer, data):
+    """逐个指标计算的参考结果"""
+    df = analyzer.add_moving_averages(data)
+    df = analyzer.add_macd(df)
+    df = analyzer.add_rsi(df)
+    df = analyzer.add_bollinger_bands(df)
+    df = analyzer.add_kdj(df)
+    df = analyzer.add_atr(df)
+    return analyzer.add_volume_indicators(df)
+
+
+def test_pipeline_matches_chained_indicators():
+    analyzer = TechnicalAnalyzer()
+    data = _make_data()
+    expected = _chained(analyzer, data)
+    result = analyzer.calculate_all_indicators(data)
+
+    assert list(result.columns) == list(expected.columns)
+    pd.testing.assert_frame_equal(result, expected)
+    # 原始数据不被修改
+    assert list(data.columns) == ['open', 'high', 'low', 'close', 'volume', 'turnover']
+
+
+def test_pipeline_subset():
+    analyzer = TechnicalAnalyzer()
+    data = _make_data()
+    result = analyzer.calculate_all_indicators(data, indicators=['macd', 'RSI'])
+
+    assert list(result.columns) == list(data.columns) + ['MACD', 'MACD_Signal', 'MACD_Histogram', 'RSI']
+    expected = analyzer.add_rsi(analyzer.add_macd(data))
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_pipeline_rejects_unknown_indicator():
+    with pytest.raises(ValueError):
+        TechnicalAnalyzer().calculate_all_indicators(_make_data(50), indicators=['FOO'])
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+测试增量技术指标状态
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import numpy as np
+import pandas as pd
+
+from core.analyzer import TechnicalAnalyzer
+from core.indicator_state import IndicatorState, IndicatorStateUpdater
+from core.storage import DatabaseManager
+
+
+def _make_data(n=300, seed=5):
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2022-01-03', periods=n, name='date')
+    close = np.round(10 * np.exp(np.cumsum(rng.normal(0, 0.02, n))), 2)
+    volume = rng.integers(10000, 100000, n)
+    return pd.DataFrame({
+        'open': close, 'high': np.round(close * 1.02, 2), 'low': np.round(close * 0.98, 2),
+        'close': close, 'volume': volume, 'turnover': volume * close
+    }, index=dates)
+
+
+def _assert_matches(values, expected_row):
+    for name, value in values.items():
+        expected = expected_row[name]
+        if pd.isna(expected):
+            assert pd.isna(value), name
+        else:
+            assert np.isclose(value, expected, rtol=1e-8, atol=1e-8), name
+
+
+def test_streaming_matches_full_recompute():
+    data = _make_data()
+    full = TechnicalAnalyzer().calculate_all_indicators(data)
+
+    state = IndicatorState('000001')
+    for i, (date, row) in enumerate(data.iterrows()):
+        values = state.update(dict(row, date=date))
+        _assert_matches(values, full.iloc[i])
+
+    assert set(state.values) == set(full.columns) - set(data.columns)
+
+
+def test_checkpoint_roundtrip():
+    """从检查点恢复后继续推进，结果与不中断一致"""
+    data = _make_data()
+    head, tail = data.iloc[:200], data.iloc[200:]
+
+    continuous = IndicatorState.from_history('000001', data)
+    restored = IndicatorState.from_json(IndicatorState.from_history('000001', head).to_json())
+    for date, row in tail.iterrows():
+        restored.update(dict(row, date=date))
+
+    assert restored.last_date == continuous.last_date
+    _assert_matches(restored.values, pd.Series(continuous.values))
+
+
+def test_updater_processes_only_new_bars(tmp_path):
+    db = DatabaseManager(str(tmp_path / "state.db"))
+    data = _make_data()
+    db.save_stock_daily_data('000001', data.iloc[:-1])
+
+    updater = IndicatorStateUpdater(db)
+    first = updater.refresh()
+    assert first['symbols'] == 1 and first['bars'] == len(data) - 1
+
+    db.save_stock_daily_data('000001', data.iloc[-1:])
+    second = updater.refresh()
+    assert second['bars'] == 1
+
+    latest = updater.get_latest('000001')
+    full = TechnicalAnalyzer().calculate_all_indicators(data)
+    assert latest['date'] == data.index[-1].strftime('%Y-%m-%d')
+    _assert_matches(latest['indicators'], full.iloc[-1])
+
+
+def test_refresh_materializes_indicator_table(tmp_path):
+    db = DatabaseManager(str(tmp_path / "state.db"))
+    data = _make_data()
+    analyzer = TechnicalAnalyzer()
+    full = analyzer.calculate_all_indicators(data)
+    window = data.iloc[100:]
+
+    db.save_stock_daily_data('000001', data.iloc[:-1])
+    updater = IndicatorStateUpdater(db)
+    assert updater.refresh()['rows'] == len(data) - 1
+
+    # 最新一天的物化指标缺失，按窗口现算（EMA 从窗口起点开始预热）
+    db.save_stock_daily_data('000001', data.iloc[-1:])
+    stale = analyzer.load_indicators('000001', window, db_manager=db)
+    np.testing.assert_allclose(stale['EMA_60'], analyzer.calculate_all_indicators(window)['EMA_60'])
+
+    assert updater.refresh()['rows'] == 1
+    stored = db.get_technical_indicators('000001')
+    assert len(stored) == len(data)
+    expected = full[stored.columns].replace([np.inf, -np.inf], np.nan)
+    np.testing.assert_allclose(stored.values, expected.values, rtol=1e-8, atol=1e-8)
+
+    # 物化指标基于全部历史计算，直接读取
+    loaded = analyzer.load_indicators('000001', window, db_manager=db)
+    np.testing.assert_allclose(loaded['EMA_60'], full['EMA_60'].iloc[100:], rtol=1e-8)
+    assert list(loaded.columns) == list(full.columns)
+
+
+def test_update_tolerates_missing_fields(tmp_path, monkeypatch):
+    """缺少收盘价的K线跳过，缺少成交量时沿用 OBV；单只股票失败不影响其他股票"""
+    data = _make_data()
+    state = IndicatorState.from_history('000001', data.iloc[:-2])
+    obv = state.values['OBV']
+    bars = state.bars
+
+    assert state.update({'date': '2030-01-01', 'open': None, 'high': None, 'low': None,
+                         'close': None, 'volume': None}) is None
+    assert state.bars == bars and state.last_date == '2030-01-01'
+
+    values = state.update({'date': '2030-01-02', 'open': 10.0, 'high': 10.5, 'low': 9.5,
+                           'close': 10.0, 'volume': None, 'turnover': None})
+    assert values['OBV'] == obv and not np.isnan(values['MA_5'])
+
+    db = DatabaseManager(str(tmp_path / "state.db"))
+    db.save_stock_daily_data('000001', data)
+    db.save_stock_daily_data('000002', data)
+    updater = IndicatorStateUpdater(db)
+    original = IndicatorState.update
+
+    def broken(self, bar):
+        if self.symbol == '000001':
+            raise ValueError('bad bar')
+        return original(self, bar)
+
+    monkeypatch.setattr(IndicatorState, 'update', broken)
+    result = updater.refresh()
+    monkeypatch.undo()
+    assert result['failed'] == ['000001'] and result['symbols'] == 1
+    assert updater.get_latest('000001') is None and updater.get_latest('000002') is not None
+
+
+def test_refresh_recomputes_revised_bars(tmp_path):
+    """检查点之前的日线被改写后重新计算：最后一根回退一根重算，更早的日期从头预热"""
+    db = DatabaseManager(str(tmp_path / "state.db"))
+    data = _make_data()
+    db.save_stock_daily_data('000001', data)
+    updater = IndicatorStateUpdater(db)
+    updater.refresh()
+    analyzer = TechnicalAnalyzer()
+
+    # 盘中写入的最后一根K线收盘后被最终数据覆盖
+    revised = data.copy()
+    revised.iloc[-1, revised.columns.get_loc('close')] *= 1.5
+    db.save_stock_daily_data('000001', revised.iloc[-1:])
+    # 修订后尚未刷新时不返回过期的物化指标
+    assert len(db.get_technical_indicators('000001')) == len(data) - 1
+
+    result = updater.refresh()
+    assert result['bars'] == 1
+    full = analyzer.calculate_all_indicators(revised)
+    _assert_matches(updater.get_latest('000001')['indicators'], full.iloc[-1])
+    assert np.isclose(db.get_technical_indicators('000001')['MA_5'].iloc[-1], full['MA_5'].iloc[-1])
+
+    # 相同数据重复写入不触发重算
+    db.save_stock_daily_data('000001', revised.iloc[-5:])
+    assert updater.refresh()['bars'] == 0
+
+    # 更早的日期被修订时从全部历史重新预热
+    revised.iloc[100, revised.columns.get_loc('close')] *= 2
+    db.save_stock_daily_data('000001', revised.iloc[100:101])
+    assert updater.refresh()['bars'] == len(data)
+    full = analyzer.calculate_all_indicators(revised)
+    stored = db.get_technical_indicators('000001')
+    expected = full[stored.columns].replace([np.inf, -np.inf], np.nan)
+    np.testing.assert_allclose(stored.values, expected.values, rtol=1e-8, atol=1e-8)
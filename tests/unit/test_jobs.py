@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+测试后台任务管理：提交、进度、失败与取消
+"""
+import sys
+import os
+import threading
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import pytest
+
+from core.storage import DatabaseManager
+from core.jobs import JobManager, JobCancelled, JobError, AsyncResult, SUCCESS, FAILURE, REVOKED
+from core.sync_progress import SyncProgressManager
+
+
+@pytest.fixture
+def jobs(tmp_path):
+    return JobManager(DatabaseManager(str(tmp_path / "jobs.db")), max_workers=1)
+
+
+def test_task_result_persisted(jobs):
+    @jobs.task(name='test.add', bind=True)
+    def add(ctx, a, b):
+        ctx.update_progress(1, 2, '计算中')
+        return {'sum': a + b}
+
+    result = add.delay(1, 2)
+    assert result.get(timeout=5) == {'sum': 3}
+    assert result.successful()
+
+    job = jobs.get_job(result.id)
+    assert job['status'] == SUCCESS and job['job_type'] == 'test'
+    assert job['progress'] == {'current': 1, 'total': 2, 'message': '计算中', 'percent': 50}
+
+    # 其他进程通过任务ID读取同一结果
+    assert AsyncResult(result.id, jobs).get(timeout=1) == {'sum': 3}
+
+
+def test_failure_propagates(jobs):
+    @jobs.task(name='test.fail')
+    def fail():
+        raise LookupError('数据不存在')
+
+    result = fail.delay()
+    with pytest.raises(LookupError):
+        result.get(timeout=5)
+    assert jobs.get_job(result.id)['status'] == FAILURE
+
+    with pytest.raises(JobError, match='数据不存在'):
+        AsyncResult(result.id, jobs).get(timeout=1)
+
+
+def test_cancel_pending_and_running(jobs):
+    started = threading.Event()
+    jobs.cancel_poll_interval = 0.01
+
+    @jobs.task(name='test.loop', bind=True)
+    def loop(ctx):
+        started.set()
+        while True:
+            ctx.raise_if_cancelled()
+
+    running = loop.delay()
+    started.wait(5)
+    # 单线程池中第二个任务仍在排队
+    pending = loop.delay()
+    assert jobs.cancel(pending.id)
+    assert jobs.get_job(pending.id)['status'] == REVOKED
+
+    assert running.revoke()
+    with pytest.raises(JobCancelled):
+        running.get(timeout=5)
+    assert jobs.get_job(running.id)['status'] == REVOKED
+    assert not jobs.cancel(running.id)
+
+
+def test_list_and_cleanup(jobs):
+    @jobs.task(name='test.noop', job_type='noop')
+    def noop():
+        return [1, 2, 3]
+
+    ids = [noop.delay().id for _ in range(3)]
+    for job_id in ids:
+        AsyncResult(job_id, jobs).get(timeout=5)
+
+    listed = jobs.list_jobs(job_type='noop')
+    assert sorted(job['job_id'] for job in listed) == sorted(ids)
+    assert all('result' not in job for job in listed)
+
+    assert jobs.cleanup(max_age_hours=-1, job_type='noop') == 3
+    assert jobs.list_jobs(job_type='noop') == []
+
+
+def test_sync_progress_view(jobs):
+    # 每次更新立即写库，便于直接读取任务表中的进度
+    progress = SyncProgressManager(jobs=jobs, flush_interval=0)
+
+    # 独立会话：进度管理器自行登记任务
+    session_id = progress.create_session('history', 4)
+    progress.update_progress(session_id, 2, '000001', '同步中', symbols_per_sec=5.0)
+    assert progress.get_progress(session_id)['percent'] == 50
+    progress.complete_sync(session_id, 3, 1)
+    assert progress.get_progress(session_id)['status'] == 'completed'
+    assert jobs.get_job(session_id)['status'] == SUCCESS
+
+    # 由后台任务承载的会话：任务失败后进度显示为错误
+    @jobs.task(name='test.sync', bind=True)
+    def sync(ctx):
+        progress.create_session('latest', 10, session_id=ctx.job_id)
+        progress.update_progress(ctx.job_id, 1, '000002', '同步中')
+        raise ConnectionError('网络错误')
+
+    result = sync.delay()
+    with pytest.raises(ConnectionError):
+        result.get(timeout=5)
+    view = progress.get_progress(result.id)
+    assert view['status'] == 'error' and '网络错误' in view['message']
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+测试策略参数优化器
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import numpy as np
+import pandas as pd
+
+from core.backtest import MAStrategy
+from core.optimizer import StrategyOptimizer
+
+
+def _make_data(n=600, seed=3):
+    """生成随机游走的OHLCV数据"""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2020-01-02', periods=n, name='date')
+    close = 15 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+    return pd.DataFrame({
+        'open': close, 'high': close * 1.01, 'low': close * 0.99, 'close': close,
+        'volume': rng.integers(100000, 1000000, n).astype(float)
+    }, index=dates)
+
+
+PARAM_GRID = {'short_period': [3, 5, 10, 20], 'long_period': [10, 20, 30]}
+
+
+def test_grid_skips_invalid_combinations():
+    """MA策略短周期必须小于长周期"""
+    combos = StrategyOptimizer(MAStrategy).grid(PARAM_GRID)
+    pairs = sorted((p['short_period'], p['long_period']) for p in combos)
+    assert pairs == [(3, 10), (3, 20), (3, 30), (5, 10), (5, 20), (5, 30), (10, 20), (10, 30), (20, 30)]
+
+
+def test_max_workers_is_capped():
+    """请求指定的进程数不超过CPU核数（或 BACKTEST.optimizer_workers）"""
+    limit = os.cpu_count() or 1
+    assert StrategyOptimizer(MAStrategy, max_workers=10000).max_workers == limit
+    assert StrategyOptimizer(MAStrategy, max_workers=1).max_workers == 1
+    assert StrategyOptimizer(MAStrategy).max_workers == limit
+
+
+def test_random_sample_is_reproducible():
+    optimizer = StrategyOptimizer(MAStrategy)
+    assert optimizer.sample(PARAM_GRID, 4, seed=1) == optimizer.sample(PARAM_GRID, 4, seed=1)
+    assert len(optimizer.sample(PARAM_GRID, 4, seed=1)) == 4
+
+
+def test_parallel_matches_serial_and_is_ranked():
+    """进程池结果与单进程一致，并按夏普比率降序排名"""
+    data = _make_data()
+    serial = StrategyOptimizer('MA策略', max_workers=1).optimize(data, '000001', PARAM_GRID)
+    parallel = StrategyOptimizer('MA策略', max_workers=2).optimize(data, '000001', PARAM_GRID)
+
+    assert list(serial['rank']) == list(range(1, len(serial) + 1))
+    assert serial['sharpe_ratio'].is_monotonic_decreasing
+    assert serial['error'].isna().all()
+
+    key = ['short_period', 'long_period']
+    merged = serial.merge(parallel, on=key, suffixes=('_s', '_p'))
+    assert len(merged) == len(serial)
+    np.testing.assert_allclose(merged['total_return_s'], merged['total_return_p'])
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+测试基于价格矩阵的组合回测
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.backtest import BacktestEngine, MAStrategy
+
+
+DATES = pd.bdate_range('2024-01-01', periods=4)
+
+
+def _engine(commission_rate=0.0):
+    return BacktestEngine(initial_capital=100000, commission_rate=commission_rate)
+
+
+def test_suspended_signal_ignored_and_marked_at_last_close():
+    prices = pd.DataFrame({'A': [10, 10, 11, 12], 'B': [20, np.nan, 22, 22]}, index=DATES, dtype=float)
+    signals = pd.DataFrame({'A': [1, 0, 0, -1], 'B': [0, 1, 1, 0]}, index=DATES)
+
+    results = _engine().run_portfolio_backtest(prices, signals, weights={'A': 0.4, 'B': 0.4})
+
+    # 第0天买入A 4000股；第1天B停牌信号忽略；第2天按净值104000买入B 1800股；第3天清仓A
+    np.testing.assert_allclose(results['equity_curve'].values, [100000, 100000, 104000, 108000])
+    assert [(t.symbol, t.action, t.quantity) for t in results['trades']] == [
+        ('A', 'BUY', 4000), ('B', 'BUY', 1800), ('A', 'SELL', 4000)
+    ]
+    assert results['final_value'] == pytest.approx(108000)
+    assert list(results['positions']['symbol']) == ['B']
+
+
+def test_commission_charged_on_both_sides():
+    prices = pd.DataFrame({'A': [10, 10, 10, 10]}, index=DATES, dtype=float)
+    signals = pd.DataFrame({'A': [1, 0, -1, 0]}, index=DATES)
+
+    results = _engine(0.001).run_portfolio_backtest(prices, signals, weights={'A': 0.5})
+
+    assert results['final_value'] == pytest.approx(100000 - 50000 * 0.001 * 2)
+    assert results['trades'][0].commission == pytest.approx(50)
+
+
+def test_insufficient_cash_fills_in_symbol_order():
+    prices = pd.DataFrame({'A': [10.0] * 4, 'B': [10.0] * 4, 'C': [50.0] * 4}, index=DATES)
+    signals = pd.DataFrame({'A': [1, 0, 0, 0], 'B': [1, 0, 0, 0], 'C': [1, 0, 0, 0]}, index=DATES)
+
+    results = _engine().run_portfolio_backtest(prices, signals, weights={'A': 0.6, 'B': 0.6, 'C': 0.3})
+
+    # A 成交后现金 40000，B 买不起跳过，C 仍可成交
+    assert [(t.symbol, t.quantity) for t in results['trades']] == [('A', 6000), ('C', 600)]
+
+
+def test_periodic_rebalance_trims_overweight():
+    prices = pd.DataFrame({'A': [10, 20, 30, 30]}, index=DATES, dtype=float)
+    signals = pd.DataFrame({'A': [1, 0, 0, 0]}, index=DATES)
+
+    results = _engine().run_portfolio_backtest(prices, signals, weights={'A': 0.5}, rebalance_days=2)
+
+    # 第2天净值 200000，目标市值 100000 -> 3300股，卖出 1700股
+    assert [(t.action, t.quantity) for t in results['trades']] == [('BUY', 5000), ('SELL', 1700)]
+    assert results['positions']['quantity'].iloc[0] == 3300
+    assert results['final_value'] == pytest.approx(200000)
+
+
+def test_multi_stock_uses_union_calendar():
+    rng = np.random.default_rng(3)
+    dates = pd.bdate_range('2020-01-01', periods=300)
+    stock_data = {}
+    for i, symbol in enumerate(['000001', '000002', '000003']):
+        close = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, len(dates))))
+        df = pd.DataFrame({'open': close, 'high': close * 1.01, 'low': close * 0.99, 'close': close,
+                           'volume': 100000}, index=dates)
+        # 第二只股票中间停牌20天，第三只股票晚上市
+        if i == 1:
+            df = df.drop(dates[100:120])
+        elif i == 2:
+            df = df.iloc[50:]
+        stock_data[symbol] = df
+
+    results = _engine().run_multi_stock_backtest(MAStrategy(), stock_data)
+
+    assert len(results['equity_curve']) == len(dates)
+    assert results['symbol_count'] == 3
+    assert not any(t.symbol == '000002' and dates[100] <= t.date < dates[120] for t in results['trades'])
+    assert np.isfinite(results['equity_curve'].values).all()
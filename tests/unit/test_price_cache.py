@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+测试全市场列式价格缓存
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import numpy as np
+import pandas as pd
+
+from core.storage import DatabaseManager
+
+
+def _bars(start, periods, close):
+    dates = pd.bdate_range(start, periods=periods, name='date')
+    closes = close + np.arange(periods, dtype=float)
+    return pd.DataFrame({
+        'open': closes, 'high': closes + 1, 'low': closes - 1, 'close': closes,
+        'volume': 1000, 'turnover': closes * 1000
+    }, index=dates)
+
+
+def _make_db(tmp_path):
+    db = DatabaseManager(str(tmp_path / "cache.db"))
+    db.upsert_stock_daily({
+        '000001': _bars('2024-01-01', 20, 10.0),
+        '000002': _bars('2024-01-08', 15, 20.0),
+    })
+    return db
+
+
+def test_matrix_matches_database(tmp_path):
+    db = _make_db(tmp_path)
+    matrix = db.get_price_matrix('close')
+
+    assert list(matrix.columns) == ['000001', '000002']
+    assert len(matrix) == len(pd.bdate_range('2024-01-01', periods=20).union(pd.bdate_range('2024-01-08', periods=15)))
+    expected = db.get_stock_daily_data('000002')['close']
+    pd.testing.assert_series_equal(matrix['000002'].dropna(), expected, check_names=False, check_freq=False)
+    # 上市前为 NaN
+    assert np.isnan(matrix.loc['2024-01-02', '000002'])
+
+
+def test_incremental_refresh_appends_dates_and_symbols(tmp_path):
+    db = _make_db(tmp_path)
+    db.price_cache.rebuild()
+    build_id = db.price_cache.get_stats()['build_id']
+
+    db.upsert_stock_daily({
+        '000001': _bars('2024-01-29', 3, 50.0),
+        '600000': _bars('2024-01-29', 3, 7.0),
+    })
+    result = db.refresh_price_cache()
+
+    assert result['mode'] == 'incremental' and result['symbols'] == 1
+    stats = db.price_cache.get_stats()
+    assert stats['build_id'] == build_id
+    matrix = db.get_price_matrix('close', symbols=['600000', '000001', '999999'], start_date='2024-01-29')
+    assert matrix['600000'].tolist() == [7.0, 8.0, 9.0]
+    assert matrix['000001'].tolist() == [50.0, 51.0, 52.0]
+    assert matrix['999999'].isna().all()
+
+
+def test_refresh_overwrites_last_date(tmp_path):
+    """缓存最后一天的行情被更新后（如快照后写入收盘数据），增量更新覆盖该行"""
+    db = _make_db(tmp_path)
+    db.price_cache.rebuild()
+    last_date = db.price_cache.get_stats()['last_date']
+
+    revised = _bars(last_date, 1, 88.0)
+    db.upsert_stock_daily({'000001': revised, '000002': revised})
+    result = db.refresh_price_cache()
+
+    assert result['mode'] == 'incremental' and result['dates'] == 0
+    matrix = db.get_price_matrix('close', start_date=last_date)
+    assert matrix.loc[last_date].tolist() == [88.0, 88.0]
+
+
+def test_backfill_symbol_reload(tmp_path):
+    db = _make_db(tmp_path)
+    db.price_cache.rebuild()
+
+    # 回填已有交易日上的修订数据
+    db.upsert_stock_daily({'000002': _bars('2024-01-08', 5, 99.0)})
+    db.refresh_price_cache(symbols=['000002'])
+
+    frame = db.price_cache.get_stock_frame('000002', end_date='2024-01-12')
+    assert frame['close'].tolist() == [99.0, 100.0, 101.0, 102.0, 103.0]
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+测试 DataSource.get_stock_data 本地读穿模式
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import pandas as pd
+from datetime import datetime, timedelta
+
+from core.storage import DatabaseManager
+from core.data_source import DataSource
+
+
+class FakeFetcher:
+    """记录调用的模拟行情获取器，只返回工作日数据"""
+
+    def __init__(self):
+        self.calls = []
+
+    def get_stock_hist(self, symbol, period="daily", start_date=None, end_date=None, adjust="qfq"):
+        self.calls.append((start_date, end_date))
+        dates = pd.bdate_range(pd.to_datetime(start_date), pd.to_datetime(end_date), name='date')
+        n = len(dates)
+        return pd.DataFrame({
+            'open': [10.0] * n,
+            'close': [10.5] * n,
+            'high': [11.0] * n,
+            'low': [9.5] * n,
+            'volume': [1000] * n,
+            'turnover': [10500.0] * n,
+            'amplitude': [15.0] * n,
+            'change_pct': [5.0] * n,
+            'change_amount': [0.5] * n,
+            'turnover_rate': [1.2] * n,
+        }, index=dates)
+
+
+def _make_source(tmp_path):
+    db = DatabaseManager(str(tmp_path / "rt.db"))
+    source = DataSource(db_manager=db, read_through=True)
+    source.stock_fetcher = FakeFetcher()
+    return source
+
+
+def test_read_through_miss_then_hit(tmp_path):
+    """首次请求从远程获取并写回，再次请求完全命中本地"""
+    source = _make_source(tmp_path)
+    end = (datetime.now() - timedelta(days=10)).strftime("%Y%m%d")
+    start = (datetime.now() - timedelta(days=60)).strftime("%Y%m%d")
+
+    first = source.get_stock_data("000001", start_date=start, end_date=end)
+    second = source.get_stock_data("000001", start_date=start, end_date=end)
+
+    assert len(source.stock_fetcher.calls) == 1
+    assert len(first) == len(second) > 0
+    # 本地返回的列与远程日线一致
+    remote = source.stock_fetcher.get_stock_hist("000001", start_date=start, end_date=end)
+    assert list(second.columns) == list(remote.columns)
+    assert second['change_pct'].eq(5.0).all()
+    stats = source.get_read_through_stats()
+    assert stats['miss'] == 1 and stats['hit'] == 1
+
+
+def test_read_through_fetches_only_missing_edges(tmp_path):
+    """区间扩展时只请求缺失的首尾日期"""
+    source = _make_source(tmp_path)
+    base = datetime.now() - timedelta(days=200)
+    fmt = lambda d: d.strftime("%Y%m%d")
+
+    source.get_stock_data("000001", start_date=fmt(base + timedelta(days=50)), end_date=fmt(base + timedelta(days=100)))
+    df = source.get_stock_data("000001", start_date=fmt(base), end_date=fmt(base + timedelta(days=150)))
+
+    calls = source.stock_fetcher.calls
+    assert len(calls) == 3
+    assert calls[1] == (fmt(base), fmt(base + timedelta(days=49)))
+    assert calls[2] == (fmt(base + timedelta(days=101)), fmt(base + timedelta(days=150)))
+    assert len(df) == len(pd.bdate_range(base.date(), (base + timedelta(days=150)).date()))
+    assert source.get_read_through_stats()['partial'] == 1
+
+
+def test_unrecorded_local_rows_are_not_coverage(tmp_path):
+    """stock_daily 中有数据但区间未核对（可能有缺口）时仍向远程请求"""
+    source = _make_source(tmp_path)
+    end = datetime.now() - timedelta(days=10)
+    start = end - timedelta(days=40)
+    fmt = lambda d: d.strftime("%Y%m%d")
+    bars = source.stock_fetcher.get_stock_hist("000001", start_date=fmt(start), end_date=fmt(end))
+    source.db_manager.save_stock_daily_data("000001", bars.iloc[[0, -1]])
+
+    df = source.get_stock_data("000001", start_date=fmt(start), end_date=fmt(end))
+
+    assert len(source.stock_fetcher.calls) == 2
+    assert len(df) == len(bars)
+    assert source.get_read_through_stats()['miss'] == 1
+
+
+def test_read_through_disabled_goes_remote(tmp_path):
+    """关闭本地缓存时每次都请求远程"""
+    source = _make_source(tmp_path)
+    source.get_stock_data("000001", days=30, use_cache=False)
+    source.get_stock_data("000001", days=30, use_cache=False)
+    assert len(source.stock_fetcher.calls) == 2
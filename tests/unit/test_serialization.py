@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+测试行情数据列式序列化
+"""
+import sys
+import os
+import json
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import numpy as np
+import pandas as pd
+
+from utils.serialization import frame_to_columns, frame_to_records, serialize_frame, dumps
+
+
+def _frame(n=500):
+    rng = np.random.default_rng(5)
+    df = pd.DataFrame({
+        'open': rng.uniform(5, 50, n),
+        'close': rng.uniform(5, 50, n),
+        'volume': rng.integers(1000, 10 ** 7, n).astype(float),
+        'MA20': rng.uniform(5, 50, n),
+    }, index=pd.bdate_range('2020-01-01', periods=n))
+    df.iloc[::7, 0] = np.nan
+    df.iloc[::11, 2] = np.nan
+    df.iloc[:19, 3] = np.nan
+    df.iloc[3, 1] = np.inf
+    return df
+
+
+def test_records_match_row_loop():
+    df = _frame()
+
+    def clean(value):
+        return 0.0 if pd.isna(value) or np.isinf(value) else float(value)
+
+    expected = [{
+        'date': index.strftime('%Y-%m-%d'),
+        'open': clean(row['open']),
+        'high': clean(row.get('high', row.get('close', 0))),
+        'close': clean(row['close']),
+        'volume': int(clean(row['volume'])),
+        'ma20': clean(row['MA20']),
+        'rsi': clean(row.get('RSI14', 0)),
+    } for index, row in df.iterrows()]
+
+    actual = frame_to_records(df, {
+        'open': 'open', 'high': ('high', 'close'), 'close': 'close',
+        'volume': 'volume', 'ma20': 'MA20', 'rsi': 'RSI14'
+    }, int_fields=('volume',))
+
+    assert actual == expected
+    assert all(type(r['volume']) is int and type(r['open']) is float for r in actual)
+
+
+def test_columns_layout_and_skip_missing():
+    df = _frame(10)
+    columns = serialize_frame(df, {'close': 'close', 'macd': 'MACD'}, layout='columns', skip_missing=True)
+
+    assert list(columns) == ['date', 'close']
+    assert columns['date'][0] == '2020-01-01' and len(columns['close']) == 10
+    assert frame_to_columns(df, {'close': 'close'}, date_field=None) == {'close': columns['close']}
+
+
+def test_string_index_dates():
+    df = pd.DataFrame({'close': [1.0, 2.0]}, index=['2024-01-02 00:00:00', '2024-01-03'])
+    assert frame_to_columns(df, {'close': 'close'})['date'] == ['2024-01-02', '2024-01-03']
+
+
+def test_dumps_handles_numpy_and_chinese():
+    payload = {'message': '获取成功', 'value': np.float64(1.5), 'count': np.int64(3),
+               'date': pd.Timestamp('2024-01-02')}
+    decoded = json.loads(dumps(payload))
+    assert decoded['message'] == '获取成功'
+    assert decoded['value'] == 1.5 and decoded['count'] == 3
+    assert decoded['date'].startswith('2024-01-02')
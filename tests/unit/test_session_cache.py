@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+测试登录会话缓存：命中、撤销失效、访问时间批量写入和过期会话清理
+"""
+import sys
+import os
+import time
+from datetime import datetime, timedelta
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import pytest
+
+import core.auth as auth
+from core.auth import SessionCache, UserManager
+from core.storage import DatabaseManager
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    db = DatabaseManager(str(tmp_path / "auth.db"))
+    monkeypatch.setattr(auth, 'db_manager', db)
+    manager = UserManager(cache=SessionCache(ttl=60))
+    manager.create_user('tester', 'secret')
+    return manager
+
+
+def _user_id(manager):
+    return manager.authenticate_user('tester', 'secret')['id']
+
+
+def test_validate_hits_cache(manager, monkeypatch):
+    user_id = _user_id(manager)
+    token = manager.create_session(user_id)
+    # 清空缓存，第一次验证查库
+    manager.session_cache.clear()
+    assert manager.validate_session(token) == user_id
+
+    # 之后的验证不再访问数据库
+    monkeypatch.setattr(auth, 'db_manager', None)
+    for _ in range(10):
+        assert manager.validate_session(token) == user_id
+    stats = manager.session_cache.stats()
+    assert stats['hits'] == 10 and stats['misses'] == 1
+
+
+def test_revoke_invalidates(manager):
+    token = manager.create_session(_user_id(manager))
+    assert manager.validate_session(token)
+    manager.revoke_session(token)
+    assert manager.validate_session(token) is None
+    assert manager.validate_session('') is None
+
+
+def test_ttl_and_session_expiry():
+    cache = SessionCache(ttl=0.05)
+    cache.put('a', 1)
+    # 会话过期时间早于TTL时以过期时间为准
+    cache.put('b', 2, datetime.now() - timedelta(seconds=1))
+    assert cache.get('a') == 1 and cache.get('b') is None
+    time.sleep(0.06)
+    assert cache.get('a') is None
+
+    cache.put('c', 3)
+    cache.put('d', 3)
+    cache.invalidate_user(3)
+    assert cache.get('c') is None and cache.get('d') is None
+
+
+def test_last_seen_batched_and_purge(manager):
+    user_id = _user_id(manager)
+    token = manager.create_session(user_id)
+    manager.validate_session(token)
+    manager.validate_session(token)
+
+    assert manager.flush_last_seen() == 1
+    assert manager.flush_last_seen() == 0
+    with auth.db_manager.connection() as conn:
+        last_seen = conn.execute(
+            "SELECT last_seen FROM user_sessions WHERE session_token = ?", (token,)
+        ).fetchone()[0]
+    assert last_seen is not None
+
+    revoked = manager.create_session(user_id)
+    manager.revoke_session(revoked)
+    assert manager.purge_expired_sessions() == 1
+    assert manager.validate_session(token) == user_id
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+测试全市场行情快照转换为当天日线并批量写入
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.storage import DatabaseManager
+from core.data_source import StockDataFetcher
+
+
+def _spot():
+    return pd.DataFrame({
+        '序号': [1, 2, 3],
+        '代码': ['000001', '600519', '300750'],
+        '名称': ['平安银行', '贵州茅台', '停牌股'],
+        '最新价': [10.5, 1700.0, np.nan],
+        '今开': [10.2, 1690.0, np.nan],
+        '最高': [10.8, 1720.0, np.nan],
+        '最低': [10.1, 1685.0, np.nan],
+        '成交量': [1200000, 30000, 0],
+        '成交额': [1.26e9, 5.1e9, 0.0],
+        '振幅': [6.8, 2.1, np.nan],
+        '涨跌幅': [3.45, 0.59, np.nan],
+        '涨跌额': [0.35, 10.0, np.nan],
+        '换手率': [0.62, 0.24, 0.0],
+    })
+
+
+def test_spot_to_daily():
+    bars = StockDataFetcher.spot_to_daily(_spot(), '2024-02-20')
+    assert list(bars['symbol']) == ['000001', '600519']
+    # 与历史日线写入 stock_daily 的列一致
+    assert list(bars.columns) == DatabaseManager.DAILY_COLUMNS
+    assert bars.loc[0, 'change_pct'] == 3.45 and bars.loc[1, 'turnover_rate'] == 0.24
+    assert (bars['date'] == '2024-02-20').all()
+    assert bars.loc[0, 'close'] == 10.5 and bars.loc[1, 'open'] == 1690.0
+
+    with pytest.raises(ValueError):
+        StockDataFetcher.spot_to_daily(_spot().drop(columns='今开'), '2024-02-20')
+
+
+def test_snapshot_bulk_write(tmp_path):
+    db = DatabaseManager(str(tmp_path / "snapshot.db"))
+    bars = StockDataFetcher.spot_to_daily(_spot(), '2024-02-20')
+    assert db.upsert_daily_frame(bars) == 2
+
+    # 再次写入同一天时更新而不是重复插入
+    bars['close'] = bars['close'] + 1
+    db.upsert_daily_frame(bars)
+    rows = db.query("SELECT symbol, close FROM stock_daily WHERE date = '2024-02-20' ORDER BY symbol")
+    assert rows == [{'symbol': '000001', 'close': 11.5}, {'symbol': '600519', 'close': 1701.0}]
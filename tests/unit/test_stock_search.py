@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+测试股票搜索：全文匹配、触发器同步索引、游标分页和总数缓存
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import pytest
+
+from core.storage import DatabaseManager
+from core.stock_search import StockSearch
+from utils.pagination import decode_cursor
+
+
+STOCKS = [
+    ('000001', '平安银行', '银行', 2000.0),
+    ('600036', '招商银行', '银行', 9000.0),
+    ('601318', '中国平安', '保险', 8000.0),
+    ('600519', '贵州茅台', '白酒', None),
+    ('000858', '五粮液', '白酒', 5000.0),
+    ('300750', '宁德时代', '电池', None),
+    ('002594', '比亚迪', '汽车', 7000.0),
+]
+
+
+@pytest.fixture
+def search(tmp_path):
+    db = DatabaseManager(str(tmp_path / "search.db"))
+    for symbol, name, industry, market_cap in STOCKS:
+        db.save_stock_info(symbol, {'name': name, 'industry': industry, 'market_cap': market_cap})
+    return StockSearch(db, count_ttl=60)
+
+
+def _symbols(result):
+    return [stock['symbol'] for stock in result['stocks']]
+
+
+def test_keyword_match(search):
+    # 三个字符以上走全文索引
+    assert _symbols(search.search(keyword='平安银')) == ['000001']
+    assert _symbols(search.search(keyword='600')) == ['600036', '600519']
+    # 短关键词退回 LIKE
+    assert _symbols(search.search(keyword='平安')) == ['000001', '601318']
+    assert search.search(keyword='银行', industry='银行')['pagination']['total_count'] == 2
+
+
+def test_index_follows_updates(search):
+    search.ensure_index()
+    search.db_manager.save_stock_info('000001', {'name': '平安银行股份', 'industry': '银行'})
+    assert _symbols(search.search(keyword='银行股份')) == ['000001']
+
+    with search.db_manager.connection() as conn:
+        conn.execute("DELETE FROM stock_info WHERE symbol = '600036'")
+    assert _symbols(search.search(keyword='招商银')) == []
+
+
+@pytest.mark.parametrize('sort_by,sort_order', [
+    ('symbol', 'ASC'), ('symbol', 'DESC'), ('market_cap', 'ASC'), ('market_cap', 'DESC'), ('industry', 'ASC'),
+])
+def test_keyset_pages_cover_all_rows(search, sort_by, sort_order):
+    full = _symbols(search.search(sort_by=sort_by, sort_order=sort_order, page_size=100))
+
+    seen, cursor = [], None
+    while True:
+        result = search.search(sort_by=sort_by, sort_order=sort_order, page_size=2, cursor=cursor)
+        seen.extend(_symbols(result))
+        cursor = result['pagination']['next_cursor']
+        if not result['pagination']['has_more']:
+            break
+    assert seen == full and len(seen) == len(STOCKS)
+    # 旧接口按页码定位与游标结果一致
+    assert _symbols(search.search(sort_by=sort_by, sort_order=sort_order, page=2, page_size=2)) == full[2:4]
+
+
+def test_count_cached_and_bad_cursor(search):
+    assert search.search(min_market_cap=6000)['pagination']['total_count'] == 3
+    search.db_manager.save_stock_info('601398', {'name': '工商银行', 'industry': '银行', 'market_cap': 20000.0})
+    # 缓存期内返回近似总数，失效后重新统计
+    assert search.search(min_market_cap=6000)['pagination']['total_count'] == 3
+    search.invalidate_counts()
+    assert search.search(min_market_cap=6000)['pagination']['total_count'] == 4
+
+    with pytest.raises(ValueError):
+        decode_cursor('not-a-cursor', 2)
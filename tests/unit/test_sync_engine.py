@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+测试并发行情同步引擎
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import threading
+import time
+
+import pandas as pd
+
+from core.storage import DatabaseManager
+from core.sync_engine import ConcurrentSyncEngine, TokenBucket
+
+
+class FakeFetcher:
+    """模拟行情获取器，可指定失败的股票"""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def get_stock_hist(self, symbol, period="daily", start_date=None, end_date=None, adjust="qfq"):
+        with self.lock:
+            self.calls.append(symbol)
+        if symbol in self.failing:
+            raise ConnectionError("模拟网络错误")
+        dates = pd.bdate_range(pd.to_datetime(start_date), pd.to_datetime(end_date), name='date')
+        n = len(dates)
+        return pd.DataFrame({
+            'open': [10.0] * n, 'close': [10.5] * n, 'high': [11.0] * n, 'low': [9.5] * n,
+            'volume': [1000] * n, 'turnover': [10500.0] * n
+        }, index=dates)
+
+
+def _engine(db, fetcher):
+    return ConcurrentSyncEngine(db, fetcher, concurrency=4, rate_limit=1000, burst=1000,
+                                retry_times=2, timeout=5, write_batch_size=3, flush_interval=0.05)
+
+
+TASKS = [(f"{i:06d}", "20240102", "20240112") for i in range(10)]
+
+
+def test_token_bucket_limits_rate():
+    bucket = TokenBucket(rate=20, capacity=1)
+    start = time.monotonic()
+    for _ in range(11):
+        bucket.acquire()
+    assert time.monotonic() - start >= 0.45
+
+
+def test_sync_writes_all_symbols(tmp_path):
+    db = DatabaseManager(str(tmp_path / "sync.db"))
+    result = _engine(db, FakeFetcher()).run(TASKS, 'history')
+
+    assert result['success'] == 10 and result['failed'] == 0
+    assert result['rows'] == 10 * len(pd.bdate_range('2024-01-02', '2024-01-12'))
+    assert result['symbols_per_sec'] > 0
+    assert len(db.get_latest_daily_dates()) == 10
+
+
+def test_failed_symbols_resume(tmp_path):
+    """失败的股票在续传时重新同步，已完成的股票被跳过"""
+    db = DatabaseManager(str(tmp_path / "sync.db"))
+    fetcher = FakeFetcher(failing={'000003'})
+    first = _engine(db, fetcher).run(TASKS, 'history')
+    assert first['failed'] == 1
+    # 失败的股票按 retry_times 重试
+    assert fetcher.calls.count('000003') == 2
+
+    retry_fetcher = FakeFetcher()
+    second = _engine(db, retry_fetcher).run(TASKS, 'history', run_id=first['run_id'])
+    assert second['skipped'] == 9 and second['success'] == 1
+    assert retry_fetcher.calls == ['000003']
+
+
+def test_resume_requires_same_task_set(tmp_path):
+    """只有股票和日期区间完全相同的同步才自动续传当天未完成的任务"""
+    db = DatabaseManager(str(tmp_path / "sync.db"))
+    first = _engine(db, FakeFetcher(failing={'000003'})).run(TASKS, 'history')
+    # 模拟同步中途被停止
+    db.finish_sync_run(first['run_id'], 'stopped')
+
+    other_tasks = [(symbol, "20240102", "20240119") for symbol, _, _ in TASKS]
+    other_fetcher = FakeFetcher()
+    other = _engine(db, other_fetcher).run(other_tasks, 'history')
+    assert other['run_id'] != first['run_id'] and other['skipped'] == 0
+    assert len(other_fetcher.calls) == 10
+
+    same_fetcher = FakeFetcher()
+    same = _engine(db, same_fetcher).run(list(reversed(TASKS)), 'history')
+    assert same['run_id'] == first['run_id'] and same['skipped'] == 9
+    assert same_fetcher.calls == ['000003']
+
+
+def test_timed_out_requests_count_towards_concurrency(tmp_path):
+    """超时后仍在后台运行的请求占用名额，实际在途请求数不超过并发上限"""
+
+    class SlowFetcher(FakeFetcher):
+        def __init__(self):
+            super().__init__()
+            self.in_flight = self.max_in_flight = 0
+
+        def get_stock_hist(self, symbol, **kwargs):
+            with self.lock:
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            try:
+                time.sleep(0.3)
+                return super().get_stock_hist(symbol, **kwargs)
+            finally:
+                with self.lock:
+                    self.in_flight -= 1
+
+    db = DatabaseManager(str(tmp_path / "sync.db"))
+    fetcher = SlowFetcher()
+    engine = ConcurrentSyncEngine(db, fetcher, concurrency=2, rate_limit=1000, burst=1000,
+                                  retry_times=2, timeout=0.1, write_batch_size=3, flush_interval=0.05)
+    result = engine.run(TASKS[:4], 'history')
+
+    assert result['failed'] == 4
+    assert fetcher.max_in_flight <= 2
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+测试交易日历和增量同步规划：节假日不请求、只为缺失交易日的股票生成任务、停牌股票核对后不再请求
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from core.storage import DatabaseManager
+from core.trading_calendar import TradingCalendar
+import core.sync_planner
+from core.sync_planner import IncrementalSyncPlanner
+
+
+# 2024-02-09 至 2024-02-16 为春节休市
+TRADING_DAYS = ['2024-02-05', '2024-02-06', '2024-02-07', '2024-02-08', '2024-02-19', '2024-02-20']
+
+
+class FakeIndexFetcher:
+    """模拟指数日线，只提供日期索引"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def get_market_index(self, index_code="sh000001"):
+        self.calls += 1
+        return pd.DataFrame({'close': [1.0] * len(TRADING_DAYS)}, index=pd.to_datetime(TRADING_DAYS))
+
+
+def _bars(dates):
+    return pd.DataFrame({
+        'open': 10.0, 'close': 10.5, 'high': 11.0, 'low': 9.5, 'volume': 1000, 'turnover': 10500.0
+    }, index=pd.DatetimeIndex(pd.to_datetime(dates), name='date'))
+
+
+@pytest.fixture
+def planner(tmp_path):
+    db = DatabaseManager(str(tmp_path / "planner.db"))
+    calendar = TradingCalendar(db, fetcher=FakeIndexFetcher(), refresh_interval=3600)
+    return IncrementalSyncPlanner(db, calendar)
+
+
+def test_calendar_skips_holidays(planner):
+    calendar = planner.calendar
+    calendar.ensure('2024-02-20')
+    assert calendar.trading_days('20240208', '20240219') == ['2024-02-08', '2024-02-19']
+    assert not calendar.is_trading_day('2024-02-12')
+    # 缓存之后的日期按工作日估计
+    assert calendar.trading_days('2024-02-20', '2024-02-26') == ['2024-02-20', '2024-02-21', '2024-02-22',
+                                                                 '2024-02-23', '2024-02-26']
+    # 缓存未过期时不重复请求
+    calendar.ensure('2024-02-20')
+    assert calendar.fetcher.calls == 1
+
+
+def test_plan_only_missing_symbols(planner):
+    db = planner.db_manager
+    db.upsert_stock_daily({
+        'full': _bars(TRADING_DAYS),
+        'tail': _bars(TRADING_DAYS[:4]),         # 缺春节后两个交易日
+        'hole': _bars(['2024-02-05', '2024-02-06', '2024-02-19', '2024-02-20']),
+    })
+    tasks, up_to_date = planner.plan(['full', 'tail', 'hole', 'new'], '20240205', '20240220')
+
+    assert up_to_date == 1
+    assert sorted(tasks) == [
+        ('hole', '20240205', '20240220'),
+        ('new', '20240205', '20240220'),
+        ('tail', '20240219', '20240220'),
+    ]
+
+    # 节假日期间同步时，节前数据完整的股票不请求
+    tasks, up_to_date = planner.plan(['tail'], '20240205', '20240218')
+    assert tasks == [] and up_to_date == 1
+
+
+def test_suspended_symbol_checked_once(planner):
+    db = planner.db_manager
+    db.upsert_stock_daily({'halt': _bars(TRADING_DAYS[:4])})
+    tasks, _ = planner.plan(['halt'], '20240205', '20240220')
+    assert tasks == [('halt', '20240219', '20240220')]
+
+    # 远程没有返回新数据（停牌），记录已核对区间后不再请求
+    planner.record_checked(tasks)
+    tasks, up_to_date = planner.plan(['halt'], '20240205', '20240220')
+    assert tasks == [] and up_to_date == 1
+
+
+def test_today_partial_bar_is_refetched(planner, monkeypatch):
+    """今天盘中写入的K线不算已核对；收盘后记录的已核对区间才包含今天"""
+    class FixedDateTime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return cls(2024, 2, 20, 16, 0)
+
+    monkeypatch.setattr(core.sync_planner, 'datetime', FixedDateTime)
+    db = planner.db_manager
+    db.upsert_stock_daily({'partial': _bars(TRADING_DAYS)})
+
+    tasks, up_to_date = planner.plan(['partial'], '20240205', '20240220')
+    assert tasks == [('partial', '20240220', '20240220')] and up_to_date == 0
+
+    # 盘中记录的已核对区间仍不可信
+    with db.connection() as conn:
+        conn.execute("INSERT INTO stock_daily_coverage VALUES ('partial', '2024-02-05', '2024-02-20', "
+                     "'2024-02-20 10:00:00')")
+    assert planner.plan(['partial'], '20240205', '20240220')[0] == tasks
+
+    with db.connection() as conn:
+        conn.execute("UPDATE stock_daily_coverage SET updated_at = '2024-02-20 15:45:00'")
+    assert planner.plan(['partial'], '20240205', '20240220') == ([], 1)
+
+
+def test_exclude_day_covered_by_snapshot(planner):
+    tasks = [('a', '20240220', '20240220'), ('b', '20240205', '20240220'), ('c', '20240220', '20240220')]
+    remaining, covered = planner.exclude_day(tasks, {'a', 'b'}, '2024-02-20')
+    # a 只缺当天，b 只需补到前一天，c 不在快照中仍按原任务请求
+    assert covered == 1
+    assert remaining == [('b', '20240205', '20240219'), ('c', '20240220', '20240220')]
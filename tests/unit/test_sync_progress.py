@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+测试同步进度的合并写入与长轮询
+"""
+import sys
+import os
+import threading
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from core.storage import DatabaseManager
+from core.jobs import JobManager
+from core.sync_progress import SyncProgressManager
+
+
+def _manager(tmp_path, **kwargs):
+    jobs = JobManager(DatabaseManager(str(tmp_path / "progress.db")), max_workers=1)
+    return SyncProgressManager(jobs=jobs, **kwargs)
+
+
+def test_updates_coalesced_by_count(tmp_path):
+    progress = _manager(tmp_path, flush_interval=3600, flush_every=10)
+    session_id = progress.create_session('history', 100)
+
+    for i in range(1, 10):
+        progress.update_progress(session_id, i, f'{i:06d}', '同步中')
+    # 未达到写库条件，其他进程看到的仍是初始进度
+    assert progress.get_progress(session_id)['current_stock'] == 0
+
+    progress.update_progress(session_id, 10, '000010', '同步中')
+    assert progress.get_progress(session_id)['current_stock'] == 10
+
+    progress.update_progress(session_id, 11, '000011', '同步中')
+    progress.flush(session_id)
+    assert progress.get_progress(session_id)['seq'] == 11
+
+    # 结束状态立即写库，包含未写入的统计
+    progress.complete_sync(session_id, 99, 1)
+    final = progress.get_progress(session_id)
+    assert final['status'] == 'completed' and final['success'] == 99
+
+
+def test_wait_for_change(tmp_path):
+    progress = _manager(tmp_path, flush_interval=0)
+    session_id = progress.create_session('latest', 2)
+    seq = progress.wait_for_change(session_id)['seq']
+
+    start = time.monotonic()
+    assert progress.wait_for_change(session_id, since=seq, timeout=0.2)['seq'] == seq
+    assert time.monotonic() - start >= 0.2
+
+    threading.Timer(0.1, progress.update_progress, (session_id, 1, '000001', '同步中')).start()
+    changed = progress.wait_for_change(session_id, since=seq, timeout=5)
+    assert changed['seq'] == seq + 1 and changed['current_stock'] == 1
+
+    assert progress.wait_for_change('missing', since=0, timeout=0.1) is None
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+测试接口数据浏览：游标分页、列投影、索引列筛选排序和总数来源
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import pytest
+
+from core.storage import DatabaseManager
+from core.catalog import TableCatalog
+from core.table_browser import TableBrowser, parse_filter
+
+
+ROWS = [(f'{i:06d}', f'股票{i}', float(i % 7) if i % 5 else None) for i in range(1, 24)]
+
+
+@pytest.fixture
+def browser(tmp_path):
+    db = DatabaseManager(str(tmp_path / "browser.db"))
+    with db.connection() as conn:
+        conn.execute("CREATE TABLE akshare_demo (code TEXT, name TEXT, price REAL)")
+        conn.executemany("INSERT INTO akshare_demo VALUES (?, ?, ?)", ROWS)
+    return TableBrowser(db, catalog=TableCatalog(db), count_ttl=60)
+
+
+def _walk(browser, **kwargs):
+    """按游标读取全部页"""
+    rows, cursor = [], None
+    while True:
+        result = browser.browse('akshare_demo', page_size=4, cursor=cursor, **kwargs)
+        rows.extend(result['rows'])
+        cursor = result['next_cursor']
+        if not result['has_more']:
+            return rows
+
+
+def test_rowid_pages_and_projection(browser):
+    first = browser.browse('akshare_demo', columns=['code'], page_size=5)
+    assert first['columns'] == ['code']
+    assert first['rows'] == [(code,) for code, _, _ in ROWS[:5]]
+    assert first['total_records'] == len(ROWS) and first['total_pages'] == 5
+
+    assert _walk(browser) == ROWS
+    # 按页码跳页（rowid 连续时直接定位）与游标结果一致
+    assert browser.browse('akshare_demo', page=3, page_size=5)['rows'] == ROWS[10:15]
+    assert browser.browse('akshare_demo', page=2, page_size=5, sort_order='DESC')['rows'] == ROWS[::-1][5:10]
+
+    # 删除中间的行后 rowid 不再连续，退回 OFFSET
+    with browser.db_manager.connection() as conn:
+        conn.execute("DELETE FROM akshare_demo WHERE code = '000002'")
+    browser.catalog.record_write('akshare_demo', delta=-1)
+    remaining = [row for row in ROWS if row[0] != '000002']
+    assert browser.browse('akshare_demo', page=3, page_size=5)['rows'] == remaining[10:15]
+
+
+@pytest.mark.parametrize('sort_order', ['ASC', 'DESC'])
+def test_sort_and_filter_on_indexed_columns(browser, sort_order):
+    with pytest.raises(ValueError):
+        browser.browse('akshare_demo', sort_by='price')
+    browser.create_index('akshare_demo', 'price')
+    assert 'price' in browser.indexed_columns('akshare_demo')
+
+    # NULL 值较多时按 (price, rowid) 游标翻页不重复不遗漏
+    rows = _walk(browser, sort_by='price', sort_order=sort_order)
+    assert sorted(rows, key=lambda r: ROWS.index(r)) == ROWS
+    prices = [row[2] for row in rows]
+    non_null = [p is not None for p in prices]
+    assert non_null == sorted(non_null, reverse=sort_order == 'DESC')
+
+    result = browser.browse('akshare_demo', filters=[parse_filter('price:gte:3')], page_size=100)
+    expected = [row for row in ROWS if row[2] is not None and row[2] >= 3]
+    assert result['rows'] == expected and result['total_records'] == len(expected)
+
+
+def test_prefix_filter_and_errors(browser):
+    browser.create_index('akshare_demo', 'code')
+    result = browser.browse('akshare_demo', columns=['code'], filters=[parse_filter('code:prefix:00001')])
+    assert [row[0] for row in result['rows']] == [f'{i:06d}' for i in range(10, 20)]
+
+    with pytest.raises(ValueError):
+        parse_filter('code:like:1')
+    with pytest.raises(ValueError):
+        browser.browse('akshare_demo', filters=[('name', 'eq', '股票1')])
+    with pytest.raises(ValueError):
+        browser.browse('akshare_demo', columns=['missing'])
+    with pytest.raises(LookupError):
+        browser.browse('akshare_missing')
+
+
+def test_replace_frame_keeps_indexes(browser):
+    pd = pytest.importorskip('pandas')
+    browser.create_index('akshare_demo', 'code')
+    df = pd.DataFrame({'code': ['a', 'b'], 'name': ['x', 'y'], 'price': [1.0, 2.0]})
+    assert browser.replace_frame(df, 'akshare_demo') == 2
+    assert 'code' in browser.indexed_columns('akshare_demo')
+    assert browser.browse('akshare_demo')['total_records'] == 2
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+测试批量价值评分与逐只分析结果一致
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import numpy as np
+import pandas as pd
+
+from simple_value_analyzer import SimpleValueAnalyzer
+
+
+def _make_stocks(n=2000, seed=11):
+    rng = np.random.default_rng(seed)
+    industries = ['白酒', '医药生物', '银行', '电力设备', '房地产开发', '计算机', '半导体', '']
+    df = pd.DataFrame({
+        'symbol': [f'{i:06d}' for i in range(n)],
+        'name': [f'股票{i}' for i in range(n)],
+        'industry': rng.choice(industries, n),
+        'market_cap': rng.choice([-1, 0, 50, 100, 5000, 5001, 10000, 20000, np.nan], n),
+        'pe_ratio': rng.choice([-5, 0, 15, 15.01, 25, 40, 41, np.nan], n),
+        'pb_ratio': rng.choice([-1, 0, 2, 3, 5, 5.5, np.nan], n),
+        'close': rng.choice([-1, 0, 0.5, 50, 100, 200, 300, np.nan], n),
+    })
+    df['industry'] = df['industry'].astype(object)
+    df.loc[::97, 'industry'] = None
+    df.loc[::113, 'symbol'] = ''
+    return df
+
+
+def _strip(result):
+    result = dict(result)
+    result.pop('analysis_date', None)
+    if 'error' in result:
+        # 批量评分只保留错误类别
+        result['error'] = result['error'].split(':')[0]
+    return result
+
+
+def test_score_frame_matches_analyze_stock():
+    analyzer = SimpleValueAnalyzer()
+    stocks = _make_stocks()
+
+    expected = [_strip(analyzer.analyze_stock(row.to_dict())) for _, row in stocks.iterrows()]
+    actual = [_strip(r) for r in analyzer.to_results(analyzer.score_frame(stocks))]
+
+    assert actual == expected
+
+
+def test_top_stocks_matches_sorted_loop():
+    analyzer = SimpleValueAnalyzer()
+    stocks = _make_stocks()
+
+    results = [analyzer.analyze_stock(row.to_dict()) for _, row in stocks.iterrows()]
+    qualified = [r for r in results if r.get('qualified', False) and 'error' not in r and r['score'] >= 70]
+    qualified.sort(key=lambda x: x['score'], reverse=True)
+
+    top = analyzer.to_results(analyzer.top_stocks(analyzer.score_frame(stocks), 50, min_score=70))
+    assert [r['symbol'] for r in top] == [r['symbol'] for r in qualified[:50]]
+
+    everything = analyzer.top_stocks(analyzer.score_frame(stocks), min_score=70)
+    assert list(everything['symbol']) == [r['symbol'] for r in qualified]
+
+
+def test_error_column_with_string_inference():
+    """pandas 3 默认推断字符串列时，error 列仍保留 None 并正确区分出错的行"""
+    analyzer = SimpleValueAnalyzer()
+    stocks = _make_stocks(200)
+    expected = [_strip(r) for r in analyzer.to_results(analyzer.score_frame(stocks))]
+
+    with pd.option_context('future.infer_string', True):
+        scored = analyzer.score_frame(stocks)
+        assert scored['error'].dtype == object
+        assert [_strip(r) for r in analyzer.to_results(scored)] == expected
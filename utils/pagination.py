@@ -0,0 +1,75 @@
+"""
+游标分页工具
+按排序键定位下一页（keyset），深度翻页不再扫描前面的行；
+游标为上一页最后一行排序键的 base64 JSON，总数按查询条件缓存一段时间
+"""
+import base64
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+
+def encode_cursor(values: List[Any]) -> str:
+    """把上一页最后一行的排序键编码为游标"""
+    raw = json.dumps(values, ensure_ascii=False, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    """解析游标，格式不合法或排序键个数不是 size 时抛出 ValueError"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+    except Exception as e:
+        raise ValueError(f"无效的分页游标: {cursor}") from e
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError(f"无效的分页游标: {cursor}")
+    return values
+
+
+def keyset_condition(column: str, key_column: str, descending: bool,
+                     last_value: Any, last_key: Any) -> Tuple[str, list]:
+    """
+    游标之后的行的查询条件
+
+    按 (column, key_column) 排序，key_column 唯一；SQLite 中 NULL 最小（升序在前、降序在后）。
+    column 与 key_column 相同时只比较 key_column
+    """
+    if column == key_column:
+        return (f"{key_column} {'<' if descending else '>'} ?", [last_key])
+    if not descending:
+        if last_value is None:
+            return (f"({column} IS NOT NULL OR {key_column} > ?)", [last_key])
+        return (f"({column}, {key_column}) > (?, ?)", [last_value, last_key])
+    if last_value is None:
+        return (f"({column} IS NULL AND {key_column} < ?)", [last_key])
+    return (f"(({column}, {key_column}) < (?, ?) OR {column} IS NULL)", [last_value, last_key])
+
+
+class CountCache:
+    """按查询条件缓存 COUNT(*) 结果（近似总数）"""
+
+    def __init__(self, ttl: float, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # 查询条件 -> (总数, 过期时间)
+        self._counts: Dict[str, Tuple[int, float]] = {}
+        self.lock = threading.Lock()
+
+    def get_or_compute(self, key: Any, compute: Callable[[], int]) -> int:
+        key = json.dumps(key, ensure_ascii=False, default=str)
+        now = time.monotonic()
+        with self.lock:
+            cached = self._counts.get(key)
+            if cached is not None and cached[1] > now:
+                return cached[0]
+        total = compute()
+        with self.lock:
+            if len(self._counts) >= self.max_entries:
+                self._counts = {k: v for k, v in self._counts.items() if v[1] > now}
+            self._counts[key] = (total, now + self.ttl)
+        return total
+
+    def clear(self):
+        with self.lock:
+            self._counts.clear()
@@ -0,0 +1,113 @@
+"""
+行情数据序列化工具
+把 DataFrame 按列整体转换为可直接JSON序列化的Python列表（NaN/inf 统一向量化填充），
+支持逐行记录（records）和按列（columns）两种布局；安装了 orjson 时使用 orjson 编码
+"""
+import json
+from datetime import date, datetime
+from typing import Any, Dict, List, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+try:
+    import orjson
+except ImportError:  # 可选依赖，未安装时使用标准库 json
+    orjson = None
+
+
+# 输出字段 -> 源列名，或按顺序取第一个存在的列的候选列名
+FieldSpec = Union[str, Sequence[str]]
+
+# 接口支持的布局
+LAYOUTS = ('records', 'columns')
+
+
+def format_dates(index, date_format: str = '%Y-%m-%d') -> List[str]:
+    """把索引转换为日期字符串列表"""
+    if isinstance(index, pd.DatetimeIndex):
+        return index.strftime(date_format).tolist()
+    # 非日期索引：去掉日期字符串中的时间部分
+    return [str(value).split(' ')[0] for value in index]
+
+
+def _numeric(series: pd.Series, fill_value: float) -> np.ndarray:
+    values = pd.to_numeric(series, errors='coerce').to_numpy(dtype=float)
+    return np.where(np.isfinite(values), values, fill_value)
+
+
+def frame_to_columns(df: pd.DataFrame,
+                     fields: Dict[str, FieldSpec],
+                     int_fields: Sequence[str] = (),
+                     date_field: str = 'date',
+                     fill_value: float = 0.0,
+                     skip_missing: bool = False) -> Dict[str, list]:
+    """
+    DataFrame 转为按列的字典 {字段: 值列表}
+
+    Args:
+        df: 以日期为索引的数据
+        fields: 输出字段 -> 源列名（或候选列名序列）
+        int_fields: 需要输出为整数的字段
+        date_field: 日期字段名，为空时不输出日期
+        fill_value: NaN/inf 的填充值
+        skip_missing: 源列都不存在时跳过该字段，否则整列填充 fill_value
+    """
+    columns: Dict[str, list] = {}
+    if date_field:
+        columns[date_field] = format_dates(df.index)
+
+    for name, spec in fields.items():
+        candidates = [spec] if isinstance(spec, str) else list(spec)
+        source = next((col for col in candidates if col in df.columns), None)
+        if source is None:
+            if skip_missing:
+                continue
+            values = np.full(len(df), fill_value, dtype=float)
+        else:
+            values = _numeric(df[source], fill_value)
+
+        if name in int_fields:
+            values = values.astype(np.int64)
+        columns[name] = values.tolist()
+
+    return columns
+
+
+def columns_to_records(columns: Dict[str, list]) -> List[Dict[str, Any]]:
+    """按列字典转为逐行记录列表"""
+    keys = list(columns)
+    return [dict(zip(keys, values)) for values in zip(*columns.values())]
+
+
+def frame_to_records(df: pd.DataFrame, fields: Dict[str, FieldSpec], **kwargs) -> List[Dict[str, Any]]:
+    """DataFrame 转为逐行记录列表，参数同 frame_to_columns"""
+    return columns_to_records(frame_to_columns(df, fields, **kwargs))
+
+
+def serialize_frame(df: pd.DataFrame, fields: Dict[str, FieldSpec], layout: str = 'records', **kwargs):
+    """按布局序列化：records 为逐行记录列表，columns 为 {字段: 值列表}"""
+    columns = frame_to_columns(df, fields, **kwargs)
+    return columns if layout == 'columns' else columns_to_records(columns)
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, (datetime, date, pd.Timestamp)):
+        return obj.isoformat()
+    return str(obj)
+
+
+def dumps(obj: Any) -> bytes:
+    """编码为UTF-8 JSON字节串"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=_default,
+                                option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            # orjson 不支持的类型（如超出64位的整数）退回标准库
+            pass
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'), default=_default).encode('utf-8')